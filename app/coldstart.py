@@ -0,0 +1,97 @@
+# app/coldstart.py — cold-start budget: time to first render per page
+"""
+Render every page once in a fresh interpreter and record time-to-first-render.
+
+    python -m app.coldstart           # print report, append to data/perf/coldstart.jsonl
+    python -m app.coldstart --check   # same, exit 1 if any page is over budget
+
+Each page runs in its own subprocess so module imports and ``st.cache_data``
+misses are paid exactly as on a container restart. Streamlit itself is imported
+before the clock starts (the server has it loaded already); everything the page
+pulls in on top of that counts against the budget.
+"""
+from __future__ import annotations
+import argparse, json, os, subprocess, sys, time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_DIR = ROOT / "app"
+CONFIG_PATH = ROOT / "configs" / "config.toml"
+
+def page_scripts() -> List[Path]:
+    """main.py plus every numbered page, in sidebar order."""
+    return [APP_DIR / "main.py"] + sorted(p for p in (APP_DIR / "pages").glob("*.py") if p.name[0].isdigit())
+
+def load_budgets(config_path: Path = CONFIG_PATH) -> Dict[str, Any]:
+    from pipeline.utils import read_toml
+    app_cfg = read_toml(config_path, {}).get("app", {})
+    return {
+        "default": float(app_cfg.get("cold_start_budget_ms", 1500)),
+        "by_page": {k: float(v) for k, v in app_cfg.get("cold_start_budget_ms_by_page", {}).items()},
+        "perf_dir": app_cfg.get("perf_dir", "data/perf"),
+    }
+
+def _measure_child(script: str, timeout: float) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    runtime_ms = (time.perf_counter() - t0) * 1000.0
+
+    t1 = time.perf_counter()
+    at = AppTest.from_file(script, default_timeout=timeout).run()
+    render_ms = (time.perf_counter() - t1) * 1000.0
+    return {
+        "runtime_import_ms": round(runtime_ms, 1),
+        "first_render_ms": round(render_ms, 1),
+        "exceptions": [e.value for e in at.exception],
+    }
+
+def measure_page(script: Path, timeout: float = 60.0) -> Dict[str, Any]:
+    """Run one page in a fresh interpreter (cwd = repo root) and return its timings."""
+    proc = subprocess.run(
+        [sys.executable, "-m", "app.coldstart", "--child", str(script), "--timeout", str(timeout)],
+        cwd=ROOT, capture_output=True, text=True, timeout=timeout + 30,
+    )
+    lines = [ln for ln in proc.stdout.splitlines() if ln.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        return {"first_render_ms": float("nan"), "exceptions": [proc.stderr.strip()[-500:] or "child failed"]}
+    return json.loads(lines[-1])
+
+def run(check: bool = False, timeout: float = 60.0) -> int:
+    budgets = load_budgets()
+    results = []
+    over = 0
+    for script in page_scripts():
+        name = script.stem
+        res = measure_page(script, timeout=timeout)
+        budget = budgets["by_page"].get(name, budgets["default"])
+        ok = res["first_render_ms"] <= budget and not res["exceptions"]
+        over += 0 if ok else 1
+        results.append({"page": name, "budget_ms": budget, "ok": ok, **res})
+        status = "ok  " if ok else "OVER"
+        print(f"{status} {name:<24} {res['first_render_ms']:>8.1f} ms  (budget {budget:.0f} ms)"
+              + (f"  errors: {len(res['exceptions'])}" if res["exceptions"] else ""))
+
+    perf_dir = ROOT / budgets["perf_dir"]
+    perf_dir.mkdir(parents=True, exist_ok=True)
+    record = {"ts": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+              "python": sys.version.split()[0], "pages": results}
+    with open(perf_dir / "coldstart.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return 1 if (check and over) else 0
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--check", action="store_true", help="exit non-zero when a page exceeds its budget")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        os.chdir(ROOT)
+        print(json.dumps(_measure_child(args.child, args.timeout)))
+        return
+    sys.exit(run(check=args.check, timeout=args.timeout))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# app/datasource.py
+"""
+Where pages read pipeline outputs from: the published version (pipeline/publish.py) or, when
+nothing is published, data/cache. Each page calls ``current()`` once per run, which costs one tiny
+file read, and takes every file from that directory. Cached loaders take the directory as an
+argument, so their entries turn over once per publish.
+"""
+from __future__ import annotations
+from pathlib import Path
+from typing import Tuple
+
+from pipeline import publish
+from pipeline.utils import read_toml
+
+def _root(config_path: str = "configs/config.toml") -> str:
+    return publish.publish_settings(read_toml(config_path, {}))["root"]
+
+ROOT = _root()
+
+def current() -> Tuple[str, Path]:
+    """(version, directory); version is "cache" for the data/cache fallback."""
+    return publish.current(ROOT)
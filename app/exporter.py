@@ -1,10 +1,11 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
 import io, pandas as pd
+# reportlab is only needed for PDF export; import it on that path so page loads stay cheap
 def df_to_csv_bytes(df: pd.DataFrame)->bytes: return df.to_csv(index=False).encode('utf-8')
 def tables_pdf(title, sections: dict)->bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib import colors
     buf=io.BytesIO(); doc=SimpleDocTemplate(buf, pagesize=A4, leftMargin=36, rightMargin=36, topMargin=36, bottomMargin=36)
     styles=getSampleStyleSheet(); story=[Paragraph(title, styles['Title']), Spacer(1,12)]
     for t, df in sections.items():
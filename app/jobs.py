@@ -0,0 +1,161 @@
+# app/jobs.py
+from __future__ import annotations
+import hashlib, inspect, itertools, threading, time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+class JobCancelled(Exception):
+    """Raised inside a task (from its progress callback) once cancel() was requested."""
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    label: str = ""
+    status: str = QUEUED
+    progress: float = 0.0
+    message: str = ""
+    partial: Any = None        # best-so-far result reported by the task
+    result: Any = None
+    error: Optional[str] = None
+    submitted: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    collected: bool = False    # a get() has seen it done; only collected jobs are evicted
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, fraction: float, partial: Any = None, message: str = "") -> None:
+        """Progress callback handed to tasks; also the cancellation point."""
+        if self._cancel.is_set():
+            raise JobCancelled(self.id)
+        self.progress = max(0.0, min(1.0, float(fraction)))
+        if partial is not None:
+            self.partial = partial
+        if message:
+            self.message = message
+
+def _hash_part(h, obj: Any) -> None:
+    if isinstance(obj, pd.DataFrame):
+        h.update(repr(list(obj.columns)).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, pd.Series):
+        h.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, dict):
+        for k in sorted(obj, key=str):
+            h.update(str(k).encode())
+            _hash_part(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b"[")
+        for x in obj:
+            _hash_part(h, x)
+        h.update(b"]")
+    else:
+        h.update(repr(obj).encode())
+
+def input_hash(fn: Callable, args: tuple, kwargs: dict) -> str:
+    """Stable key for (task, inputs); DataFrames are hashed by content, not identity."""
+    h = hashlib.sha1(f"{fn.__module__}.{fn.__qualname__}".encode())
+    _hash_part(h, list(args))
+    _hash_part(h, kwargs)
+    return h.hexdigest()
+
+class JobRunner:
+    """
+    Small queue API in front of a thread pool.
+
+    submit() returns a Job immediately; identical submissions (same task + input hash)
+    share one Job whether it is queued, running or finished, so double clicks and
+    reruns reuse the same solve. Finished jobs stay cached (LRU, ``cache_size``); a finished
+    job is pinned until a get() has seen it done (or ``pin_seconds`` passed), so a session
+    still polling for it never finds it evicted.
+    Tasks that accept a ``progress`` keyword get Job.report, which they call with a
+    0..1 fraction and optional best-so-far result; cancel() makes the next report raise.
+    """
+
+    def __init__(self, max_workers: int = 2, cache_size: int = 64, pin_seconds: float = 600.0):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fpl-job")
+        self._lock = threading.Lock()
+        self._by_key: "OrderedDict[str, Job]" = OrderedDict()
+        self._by_id: Dict[str, Job] = {}
+        self._ids = itertools.count(1)
+        self.cache_size = cache_size
+        self.pin_seconds = pin_seconds
+
+    def submit(self, fn: Callable, *args, label: str = "", key: Optional[str] = None, **kwargs) -> Job:
+        key = key or input_hash(fn, args, kwargs)
+        with self._lock:
+            job = self._by_key.get(key)
+            if job is not None and job.status in (QUEUED, RUNNING, DONE):
+                self._by_key.move_to_end(key)
+                return job
+            job = Job(id=f"job-{next(self._ids)}", key=key, label=label or fn.__name__)
+            self._by_key[key] = job
+            self._by_id[job.id] = job
+            self._evict()
+        self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._by_id.get(job_id)
+        if job is not None and job.done:
+            job.collected = True
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._by_id.get(job_id)
+        if job is None or job.done:
+            return False
+        job._cancel.set()
+        return True
+
+    def _run(self, job: Job, fn: Callable, args: tuple, kwargs: dict) -> None:
+        if job._cancel.is_set():
+            job.status, job.finished = CANCELLED, time.time()
+            return
+        job.status, job.started = RUNNING, time.time()
+        try:
+            if "progress" in inspect.signature(fn).parameters:
+                kwargs = {**kwargs, "progress": job.report}
+            job.result = fn(*args, **kwargs)
+            job.progress, job.status = 1.0, DONE
+        except JobCancelled:
+            job.status = CANCELLED
+        except Exception as e:  # surfaced to the page through job.error
+            job.status, job.error = FAILED, f"{type(e).__name__}: {e}"
+        finally:
+            job.finished = time.time()
+
+    def _evict(self) -> None:
+        now = time.time()
+        finished = [k for k, j in self._by_key.items()
+                    if j.done and (j.collected or now - (j.finished or now) > self.pin_seconds)]
+        for k in finished[: max(0, len(self._by_key) - self.cache_size)]:
+            job = self._by_key.pop(k)
+            self._by_id.pop(job.id, None)
+
+_RUNNER: Optional[JobRunner] = None
+_RUNNER_LOCK = threading.Lock()
+
+def get_runner() -> JobRunner:
+    """Process-wide runner shared by every session (the app package is imported once per process)."""
+    global _RUNNER
+    with _RUNNER_LOCK:
+        if _RUNNER is None:
+            _RUNNER = JobRunner()
+        return _RUNNER
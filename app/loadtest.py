@@ -0,0 +1,289 @@
+# app/loadtest.py — scripted sessions against every page, headless
+"""
+Load & latency harness built on Streamlit's AppTest.
+
+    python -m app.loadtest                                   # 8 sessions, 4 at a time, real data/cache
+    python -m app.loadtest --sessions 64 --concurrency 8
+    python -m app.loadtest --data synthetic --players 5000   # scaled-up inputs
+
+A session walks main.py and every page in app/pages/ the way a user would (sliders,
+searching and picking a squad, "Rebuild Best 15", "Suggest 1 transfer", ...). Every
+rerun is timed (optimisation buttons as submit + wait-for-result steps); peak Python heap per page comes from tracemalloc (``--no-memory``
+turns it off for cleaner latency numbers). Sessions run in a process pool so they
+really execute concurrently; each worker gets its own copy of the data directory, so
+user state written by one session never leaks into another worker.
+Results are printed per page (p50/p90/p95/p99/max, peak MB, failed sessions) and written as JSON
+to data/perf/.
+"""
+from __future__ import annotations
+import argparse, json, os, shutil, sys, tempfile, time, tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.coldstart import ROOT, load_budgets, page_scripts
+
+CACHE_FILES = [
+    "projections_next_gw.csv", "projections_next_3gws.csv", "projections_next_5gws.csv",
+    "captaincy_rankings.csv", "bootstrap-static.json", "fixtures.json", "ep_components.csv", "xgxa_players.csv",
+]
+CONFIG = "configs/config.toml"
+
+# ---------------------------- inputs ----------------------------
+def synthetic_cache(dest: Path, n_players: int = 700, n_teams: int = 20, seed: int = 7) -> None:
+    """Write a data/cache with the same schema as the pipeline output, at any scale."""
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    dest.mkdir(parents=True, exist_ok=True)
+    teams = [{"id": t + 1, "name": f"Team {t + 1:02d}", "short_name": f"T{t + 1:02d}"} for t in range(n_teams)]
+    pos = rng.choice(["GK", "DEF", "MID", "FWD"], size=n_players, p=[0.1, 0.35, 0.4, 0.15])
+    base_price = {"GK": 4.0, "DEF": 4.0, "MID": 4.5, "FWD": 4.5}
+    price = np.round([base_price[p] + rng.gamma(1.5, 1.0) for p in pos], 1).clip(3.5, 15.0)
+    team_id = rng.integers(1, n_teams + 1, size=n_players)
+    mins = rng.choice([0.0, 30.0, 70.0, 88.0], size=n_players, p=[0.3, 0.2, 0.25, 0.25])
+    ep1 = np.round(mins / 90.0 * (1.5 + price * 0.35 + rng.normal(0, 0.5, n_players)).clip(0), 2)
+    frame = pd.DataFrame({
+        "id": np.arange(1, n_players + 1),
+        "web_name": [f"Player{i:05d}" for i in range(1, n_players + 1)],
+        "team_name": [teams[t - 1]["name"] for t in team_id],
+        "position": pos, "price": price,
+    })
+    for horizon, fname in [(1, "projections_next_gw.csv"), (3, "projections_next_3gws.csv"), (5, "projections_next_5gws.csv")]:
+        out = frame.assign(ep_total=np.round(ep1 * horizon * rng.uniform(0.85, 1.15, n_players), 2),
+                           exp_minutes=mins * horizon)
+        out.to_csv(dest / fname, index=False)
+    frame.assign(ep_total=ep1).sort_values("ep_total", ascending=False).head(50).to_csv(dest / "captaincy_rankings.csv", index=False)
+
+    fixtures, fid = [], 1
+    for ev in range(1, 39):
+        order = rng.permutation(n_teams) + 1
+        for h, a in zip(order[::2], order[1::2]):
+            fixtures.append({"id": fid, "event": ev, "team_h": int(h), "team_a": int(a),
+                             "team_h_difficulty": int(rng.integers(2, 6)), "team_a_difficulty": int(rng.integers(2, 6))})
+            fid += 1
+    (dest / "fixtures.json").write_text(json.dumps(fixtures), encoding="utf-8")
+    (dest / "bootstrap-static.json").write_text(json.dumps({"teams": teams, "events": [], "elements": []}), encoding="utf-8")
+
+def prepare_workspace(kind: str, n_players: int) -> Path:
+    """Temp directory laid out like the repo root (configs/, data/cache, data/user_state) for the app to chdir into."""
+    ws = Path(tempfile.mkdtemp(prefix="fpl-load-"))
+    cache = ws / "data" / "cache"
+    if kind == "synthetic":
+        synthetic_cache(cache, n_players=n_players)
+    else:
+        cache.mkdir(parents=True)
+        for name in CACHE_FILES:
+            src = ROOT / "data" / "cache" / name
+            if src.exists():
+                shutil.copy2(src, cache / name)
+    (ws / "data" / "user_state").mkdir(parents=True)
+    # pages read their settings from the repo config; without it they would run on built-in defaults
+    (ws / "configs").mkdir()
+    shutil.copy2(ROOT / CONFIG, ws / CONFIG)
+    return ws
+
+# ---------------------------- scripted sessions ----------------------------
+def _find(widgets, label_part: str):
+    for w in widgets:
+        if label_part in str(getattr(w, "label", "")):
+            return w
+    raise LookupError(label_part)
+
+def _click(label_part: str) -> Callable:
+    return lambda at: _find(at.button, label_part).click().run()
+
+def _wait_jobs(at, timeout: float = 60.0, poll: float = 0.02):
+    """Rerun until the page has no optimisation jobs in flight (what the polling fragment does)."""
+    deadline = time.perf_counter() + timeout
+    while at.session_state["pending_jobs"] if "pending_jobs" in at.session_state else False:
+        if time.perf_counter() > deadline:
+            raise TimeoutError("optimisation job still running")
+        time.sleep(poll)
+        at.run()
+    return at
+
+SCENARIOS: Dict[str, List[tuple]] = {}
+
+def _scenario(page: str):
+    def deco(fn):
+        SCENARIOS[page] = fn()
+        return fn
+    return deco
+
+@_scenario("main")
+def _main():
+    return [("load", lambda at: at.run())]
+
+@_scenario("0_Team_Builder")
+def _team_builder():
+    def search_and_pick(at):
+        at.text_input(key="pick_search_MID").input("a").run()
+        sb = at.selectbox(key="pick_MID_0")
+        return sb.select_index(min(1, len(sb.options) - 1)).run()
+    return [
+        ("load", lambda at: at.run()),
+        ("minutes_gate", lambda at: _find(at.sidebar.slider, "Minutes gate").set_value(0.6).run()),
+        ("bookmaker", lambda at: _find(at.sidebar.slider, "Bookmaker").set_value(0.2).run()),
+        ("search_pick", search_and_pick),
+        ("rebuild_15", _click("Rebuild Best 15")),
+        ("rebuild_15_result", _wait_jobs),
+        ("suggest_transfer", _click("Suggest 1 transfer")),
+        ("suggest_transfer_result", _wait_jobs),
+        ("optimize_starters", _click("Optimize Starters")),
+        ("optimize_starters_result", _wait_jobs),
+    ]
+
+@_scenario("1_Picks")
+def _picks():
+    return [
+        ("load", lambda at: at.run()),
+        ("show_all", lambda at: at.sidebar.checkbox[0].check().run()),
+        ("positions", lambda at: at.sidebar.multiselect[0].set_value(["MID", "FWD"]).run()),
+    ]
+
+@_scenario("2_Captaincy")
+def _captaincy():
+    return [("load", lambda at: at.run()), ("top_n", lambda at: at.slider[0].set_value(40).run())]
+
+@_scenario("3_Fixtures")
+def _fixtures():
+    def widen(at):
+        s = at.slider[0]
+        lo, hi = s.min, s.max
+        return s.set_range(lo, min(lo + 7, hi)).run()
+    return [("load", lambda at: at.run()), ("gw_range", widen)]
+
+@_scenario("4_Team_Planner")
+def _planner():
+    def pick(at):
+        at.text_input(key="planner_search").input("a").run()
+        ms = at.multiselect(key="sel_mid")
+        return ms.select(ms.options[0]).run()  # AppTest matches the formatted label
+    return [("load", lambda at: at.run()), ("search_pick", pick)]
+
+@_scenario("5_Exports_and_Share")
+def _exports():
+    return [("load", lambda at: at.run())]
+
+@_scenario("6_Query")
+def _query():
+    return [("load", lambda at: at.run()),
+            ("example", lambda at: at.selectbox(key="query_example").set_value("fixture_runs").run())]
+
+def run_session(session_id: int, trace_memory: bool, timeout: float) -> Dict[str, dict]:
+    """
+    One user walking every page. Returns {page: {latencies_ms, peak_mb, errors, failed}}. A step
+    that raises or leaves a page exception fails the page's session there: it is not timed.
+    """
+    from streamlit.testing.v1 import AppTest
+    out: Dict[str, dict] = {}
+    for script in page_scripts():
+        name = script.stem
+        steps = SCENARIOS.get(name, [("load", lambda at: at.run())])
+        at = AppTest.from_file(str(script), default_timeout=timeout)
+        lat, errors = [], []
+        if trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        for step, fn in steps:
+            t0 = time.perf_counter()
+            try:
+                fn(at)
+            except Exception as e:  # scripted step could not be performed (widget missing, ...)
+                errors.append(f"{step}: {type(e).__name__}: {e}")
+                break
+            ms = (time.perf_counter() - t0) * 1000.0
+            if at.exception:
+                errors += [f"{step}: {x.value}" for x in at.exception]
+                break
+            lat.append(ms)
+        peak_mb = (tracemalloc.get_traced_memory()[1] - base) / 2**20 if trace_memory else float("nan")
+        out[name] = {"latencies_ms": lat, "peak_mb": peak_mb, "errors": errors, "failed": bool(errors)}
+    return out
+
+# ---------------------------- worker plumbing ----------------------------
+def _init_worker(workspace: str, trace_memory: bool) -> None:
+    own = Path(tempfile.mkdtemp(prefix="fpl-load-w-"))
+    shutil.copytree(workspace, own, dirs_exist_ok=True)
+    os.chdir(own)
+    if str(ROOT) not in sys.path:
+        sys.path.insert(0, str(ROOT))
+    import logging
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    if trace_memory:
+        tracemalloc.start()
+
+def _task(args) -> Dict[str, dict]:
+    return run_session(*args)
+
+def summarise(sessions: List[Dict[str, dict]]) -> Dict[str, dict]:
+    pages: Dict[str, dict] = {}
+    for s in sessions:
+        for name, res in s.items():
+            p = pages.setdefault(name, {"lat": [], "peak": [], "errors": [], "failed": 0})
+            p["failed"] += int(res["failed"])
+            p["lat"] += res["latencies_ms"]
+            p["peak"].append(res["peak_mb"])
+            p["errors"] += res["errors"]
+    summary = {}
+    for name, p in pages.items():
+        lat = np.asarray(p["lat"]) if p["lat"] else np.asarray([np.nan])
+        q = np.nanpercentile(lat, [50, 90, 95, 99]) if p["lat"] else [np.nan] * 4
+        summary[name] = {
+            "reruns": len(p["lat"]),
+            "p50_ms": round(float(q[0]), 1), "p90_ms": round(float(q[1]), 1),
+            "p95_ms": round(float(q[2]), 1), "p99_ms": round(float(q[3]), 1),
+            "max_ms": round(float(np.nanmax(lat)), 1),
+            "peak_mb": round(float(np.nanmax(p["peak"])), 1) if not np.all(np.isnan(p["peak"])) else None,
+            "failed_sessions": p["failed"],
+            "errors": len(p["errors"]),
+            "error_samples": sorted(set(p["errors"]))[:5],
+        }
+    return summary
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=8)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--data", choices=["real", "synthetic"], default="real")
+    ap.add_argument("--players", type=int, default=700, help="synthetic player count")
+    ap.add_argument("--timeout", type=float, default=60.0, help="per-rerun AppTest timeout (s)")
+    ap.add_argument("--no-memory", action="store_true", help="skip tracemalloc (lower overhead, no peak MB)")
+    ap.add_argument("--out", default=None, help="JSON report path (default data/perf/loadtest_<ts>.json)")
+    args = ap.parse_args()
+
+    ws = prepare_workspace(args.data, args.players)
+    trace = not args.no_memory
+    t0 = time.perf_counter()
+    # refer to the workers through the package path: AppTest swaps sys.modules["__main__"]
+    # while a page runs, so "__main__._task" would not resolve in the pool processes
+    from app import loadtest as harness
+    with ProcessPoolExecutor(max_workers=args.concurrency, initializer=harness._init_worker, initargs=(str(ws), trace)) as pool:
+        sessions = list(pool.map(harness._task, [(i, trace, args.timeout) for i in range(args.sessions)]))
+    wall = time.perf_counter() - t0
+    shutil.rmtree(ws, ignore_errors=True)
+
+    summary = summarise(sessions)
+    print(f"{args.sessions} sessions, concurrency {args.concurrency}, data={args.data}"
+          + (f" ({args.players} players)" if args.data == "synthetic" else "") + f", wall {wall:.1f}s")
+    print(f"{'page':<22}{'reruns':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}{'peakMB':>8}{'failed':>8}")
+    for name, s in summary.items():
+        print(f"{name:<22}{s['reruns']:>7}{s['p50_ms']:>9.1f}{s['p90_ms']:>9.1f}{s['p95_ms']:>9.1f}"
+              f"{s['p99_ms']:>9.1f}{s['max_ms']:>9.1f}{(s['peak_mb'] or float('nan')):>8.1f}{s['failed_sessions']:>8}")
+        for e in s["error_samples"]:
+            print(f"    ! {e[:160]}")
+
+    ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M-%SZ")
+    out = Path(args.out) if args.out else ROOT / load_budgets()["perf_dir"] / f"loadtest_{ts}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "ts": ts, "sessions": args.sessions, "concurrency": args.concurrency, "data": args.data,
+        "players": args.players if args.data == "synthetic" else None, "wall_s": round(wall, 2), "pages": summary,
+    }, indent=2), encoding="utf-8")
+    print(f"Report: {out}")
+
+if __name__ == "__main__":
+    main()
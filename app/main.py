@@ -5,6 +5,11 @@ ROOT = pathlib.Path(__file__).resolve().parent  # .../app
 
 import streamlit as st
 
+from app import datasource, telemetry
+from pipeline import publish
+
+_rerun = telemetry.Rerun("main")
+
 # Basic layout (you can customize later)
 st.set_page_config(page_title="FPL Analytics", layout="wide")
 st.title("FPL Analytics Home")
@@ -12,5 +17,9 @@ st.write(
     "Use the sidebar to open **Team Builder**, **Captaincy**, **Fixtures**, etc. "
     "If Team Builder errors, double-check that projections CSVs exist in `data/cache/`."
 )
+_version, _data_dir = datasource.current()
+_man = publish.manifest(_version, datasource.ROOT) if _version != "cache" else None
+st.caption(f"Data version {_version}, published {_man['created_at']}" if _man else f"Data from `{_data_dir}` (nothing published)")
 st.sidebar.title("Navigation")
 st.sidebar.info("Pages appear in the sidebar automatically (0_Team_Builder, Captaincy, Fixtures, ...)")
+_rerun.stop()
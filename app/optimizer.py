@@ -1,7 +1,11 @@
 ﻿# app/optimizer.py
 from __future__ import annotations
 import pandas as pd
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
+
+from pipeline import metrics
+
+Progress = Optional[Callable[..., None]]  # progress(fraction, best_so_far) — see app/jobs.py
 
 _POS_NEED = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
 _START_NEED = {"GK": 1, "DEF": 3, "MID": 4, "FWD": 3}  # baseline 3-4-3
@@ -29,21 +33,30 @@ def _mins_scale(row: pd.Series) -> float:
         return 0.8
     return 1.0
 
+def _objective(df: pd.DataFrame, horizon: int) -> pd.Series:
+    # Pages that already built obj_1 / obj_3 (minutes gate, bookmaker nudges) take precedence
+    col = "obj_1" if horizon == 1 else "obj_3"
+    if col in df.columns:
+        return df[col].astype(float).fillna(0.0)
+    o1, o3, _ = _obj_cols(df)
+    src = o1 if horizon == 1 else o3
+    return df.get(src, df.get(o1, pd.Series(0.0, index=df.index))).fillna(0.0) * df.apply(_mins_scale, axis=1)
+
 def _team_col(df: pd.DataFrame) -> str:
     return "team_name" if "team_name" in df.columns else "team"
 
 def _name_col(df: pd.DataFrame) -> str:
     return "web_name" if "web_name" in df.columns else ("name" if "name" in df.columns else "id")
 
-def solve_squad(df: pd.DataFrame, *, budget: float = 100.0, max_per_team: int = 3) -> List[int]:
+@metrics.timer("fpl_app_optimizer_solve_seconds", solver="squad")
+def solve_squad(df: pd.DataFrame, *, budget: float = 100.0, max_per_team: int = 3,
+                progress: Progress = None) -> List[int]:
     """Greedy value-for-money 15-man squad under FPL rules."""
     price_c = _price_col(df)
     team_c = _team_col(df)
-    o1, o3, _ = _obj_cols(df)
 
     work = df.copy()
-    work["mins_scale"] = work.apply(_mins_scale, axis=1)
-    work["obj"] = work.get(o3, work.get(o1, 0.0)).fillna(0.0) * work["mins_scale"]
+    work["obj"] = _objective(work, 3)
     work["price"] = work[price_c].astype(float)
     work["team"] = work[team_c].astype(str)
     work["pos"] = work["position"].astype(str)
@@ -69,7 +82,9 @@ def solve_squad(df: pd.DataFrame, *, budget: float = 100.0, max_per_team: int =
     for pos in ["GK","DEF","MID","FWD"]:
         rounds += [pos] * max(0, _POS_NEED[pos] - rounds.count(pos))
 
-    for pos in rounds:
+    for step, pos in enumerate(rounds):
+        if progress:
+            progress(step / len(rounds), list(chosen))
         pool = pools[pos]
         picked = False
         # best value first
@@ -105,12 +120,18 @@ def solve_squad(df: pd.DataFrame, *, budget: float = 100.0, max_per_team: int =
                     break
     return chosen[:15]
 
-def choose_starting_xi(df: pd.DataFrame, squad_ids: List[int]) -> Tuple[List[int], int, int]:
-    """Pick a 3-4-3 XI and captain/vice by next-GW expected points × minutes scale."""
-    o1, _, _ = _obj_cols(df)
+def solve_squad_15(df: pd.DataFrame, *, budget: float = 100.0, max_per_team: int = 3,
+                   progress: Progress = None) -> List[int]:
+    """Team Builder entry point for the 15-man rebuild."""
+    return solve_squad(df, budget=budget, max_per_team=max_per_team, progress=progress)
+
+def choose_starting_xi(df: pd.DataFrame, squad_ids: List[int], *, return_bench: bool = False):
+    """Pick a 3-4-3 XI and captain/vice by next-GW expected points × minutes scale.
+
+    With ``return_bench=True`` the bench (GK first, then by objective) is returned as a 4th item.
+    """
     work = df[df["id"].isin(squad_ids)].copy()
-    work["mins_scale"] = work.apply(_mins_scale, axis=1)
-    work["obj1"] = work.get(o1, work.get("ep_total", 0.0)).fillna(0.0) * work["mins_scale"]
+    work["obj1"] = _objective(work, 1)
 
     xi: List[int] = []
     def top(pos: str, n: int) -> List[int]:
@@ -126,39 +147,61 @@ def choose_starting_xi(df: pd.DataFrame, squad_ids: List[int]) -> Tuple[List[int
     starters = work[work["id"].isin(xi)].sort_values("obj1", ascending=False)
     captain = int(starters["id"].iloc[0]) if not starters.empty else (xi[0] if xi else -1)
     vice = int(starters["id"].iloc[1]) if len(starters) > 1 else (xi[0] if xi else -1)
-    return xi, captain, vice
+    if not return_bench:
+        return xi, captain, vice
+    rest = work[~work["id"].isin(xi)].copy()
+    rest["gk_first"] = (rest["position"] != "GK").astype(int)
+    bench = [int(x) for x in rest.sort_values(["gk_first", "obj1"], ascending=[True, False])["id"].tolist()]
+    return xi, captain, vice, bench
 
 def _squad_cost(df: pd.DataFrame, ids: List[int]) -> float:
     price_c = _price_col(df)
     return float(df[df["id"].isin(ids)][price_c].astype(float).sum())
 
+def squad_value(df: pd.DataFrame, ids: List[int]) -> float:
+    """Total price of the given squad (£m)."""
+    return _squad_cost(df, ids) if ids else 0.0
+
+@metrics.timer("fpl_app_optimizer_solve_seconds", solver="transfers")
 def suggest_transfers(
     df: pd.DataFrame,
-    squad_ids: List[int],
+    current_squad: List[int],
     *,
-    bank: float,
+    bank_left: float,
     transfers_allowed: int = 1,
     budget: float = 100.0,
-    max_per_team: int = 3
+    max_per_team: int = 3,
+    drift_weight: float = 0.0,
+    progress: Progress = None
 ) -> Dict[str, object]:
-    """One-transfer suggestion (like-for-like by position), respecting bank & team limits."""
+    """
+    One-transfer suggestion (like-for-like by position), respecting bank & team limits.
+    With a ``price_drift`` column (expected overnight price change, £m) and ``drift_weight``
+    (EP per £m), buying a likely riser / selling a likely faller scores the value it saves;
+    it only breaks ties between moves that don't lose EP (``delta_ep1`` is never negative).
+    """
     price_c = _price_col(df)
     team_c = _team_col(df)
-    o1, _, _ = _obj_cols(df)
+    name_c = _name_col(df)
+    squad_ids = list(current_squad)
 
     base = df.copy()
-    base["mins_scale"] = base.apply(_mins_scale, axis=1)
-    base["obj1"] = base.get(o1, base.get("ep_total", 0.0)).fillna(0.0) * base["mins_scale"]
+    base["obj1"] = _objective(base, 1)
     base["price"] = base[price_c].astype(float)
     base["team"] = base[team_c].astype(str)
+    base["drift"] = base["price_drift"].fillna(0.0).astype(float) if "price_drift" in base.columns else 0.0
+    base["score"] = base["obj1"] + float(drift_weight) * base["drift"]
 
-    remaining_bank = float(bank)
+    remaining_bank = float(bank_left)
     team_counts = base[base["id"].isin(squad_ids)]["team"].value_counts().to_dict()
 
-    best = {"out": None, "in": None, "delta_ep1": 0.0}
+    best = {"out": None, "in": None, "out_name": None, "in_name": None, "delta_ep1": 0.0, "delta_value": 0.0}
+    best_score = 0.0
     in_squad = set(squad_ids)
 
-    for out_id in squad_ids:
+    for step, out_id in enumerate(squad_ids):
+        if progress:
+            progress(step / max(1, len(squad_ids)), dict(best))
         prow = base[base["id"] == out_id]
         if prow.empty:
             continue
@@ -178,13 +221,20 @@ def suggest_transfers(
             return cnt < max_per_team
 
         cand = cand[cand["team"].apply(ok_team)]
-        cand = cand.sort_values("obj1", ascending=False)
+        cand = cand[cand["obj1"] >= prow["obj1"].iloc[0]]   # price drift never pays for lost EP
+        cand = cand.sort_values("score", ascending=False)
         if cand.empty:
             continue
 
         best_in_row = cand.iloc[0]
-        delta = float(best_in_row["obj1"] - prow["obj1"].iloc[0])
-        if delta > best["delta_ep1"]:
-            best = {"out": int(out_id), "in": int(best_in_row["id"]), "delta_ep1": float(delta)}
+        gain = float(best_in_row["score"] - prow["score"].iloc[0])
+        if gain > best_score:
+            best_score = gain
+            best = {
+                "out": int(out_id), "in": int(best_in_row["id"]),
+                "out_name": str(prow[name_c].iloc[0]), "in_name": str(best_in_row[name_c]),
+                "delta_ep1": float(best_in_row["obj1"] - prow["obj1"].iloc[0]),
+                "delta_value": float(best_in_row["drift"] - prow["drift"].iloc[0]),
+            }
 
     return best
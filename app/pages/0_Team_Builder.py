@@ -1,27 +1,17 @@
 import streamlit as st
 import pandas as pd
-import pathlib, sys, importlib.util
+import pathlib
 
-# ---------- robust imports from absolute paths ----------
-APP_DIR = pathlib.Path(__file__).resolve().parents[1]   # .../app
+from app import datasource, jobs, optimizer, pitch, search, state, telemetry
+from pipeline import live, price_series, scoring, whatif
 
-def _import_from_app(mod_name: str):
-    file = APP_DIR / f"{mod_name}.py"
-    spec = importlib.util.spec_from_file_location(mod_name, file)
-    mod = importlib.util.module_from_spec(spec)
-    sys.modules[mod_name] = mod
-    assert spec.loader is not None
-    spec.loader.exec_module(mod)
-    return mod
-
-state = _import_from_app("state")
-optimizer = _import_from_app("optimizer")
-pitch = _import_from_app("pitch")
-# --------------------------------------------------------
+_rerun = telemetry.Rerun("0_Team_Builder")
 
 st.title("Team Builder — Optimizer, Transfers & Chips")
 
-DATA_DIR = pathlib.Path("data/cache")
+_, DATA_DIR = datasource.current()   # one consistent published version per run
+PICKER_TOP_K = 25  # options sent to the browser per squad slot
+PRICES = price_series.price_settings()
 
 # ---------------------------- Helpers ----------------------------
 def _ensure_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -83,19 +73,10 @@ def _bookmaker_mult(df: pd.DataFrame, strength: float) -> pd.Series:
       team_cs_prob (0..1), team_gs_prob (0..1)  [goals conceded clean-sheet / goals scored]
     Multiplier = (1 - strength) + strength * factor(pos)
     """
-    strength = max(0.0, min(1.0, float(strength)))
-    base = pd.Series(1.0, index=df.index)
-    cs = df.get("team_cs_prob", pd.Series(0.0, index=df.index)).astype(float).clip(0,1)
-    gs = df.get("team_gs_prob", pd.Series(0.5, index=df.index)).astype(float).clip(0,1)
-    pos = df["position"].astype(str)
-
-    # pos-specific factor:
-    # GK/DEF: 0.7 weight on CS; MID/FWD: 0.7 weight on Goals; all have small bias to 1.0
-    factor = pd.Series(1.0, index=df.index)
-    factor = factor.where(~pos.isin(["GK","DEF"]), 0.3 + 0.7*cs)      # ~[0.3..1.0]
-    factor = factor.where(~pos.isin(["MID","FWD"]), 0.3 + 0.7*gs)     # ~[0.3..1.0]
-
-    return (1 - strength) + strength * factor
+    cs = df.get("team_cs_prob", pd.Series(0.0, index=df.index)).astype(float)
+    gs = df.get("team_gs_prob", pd.Series(0.5, index=df.index)).astype(float)
+    # GK/DEF: 0.7 weight on CS; MID/FWD: 0.7 weight on goals; all have a small bias to 1.0
+    return pd.Series(scoring.bookmaker_multiplier(scoring.pos_index(df["position"]), cs, gs, strength), index=df.index)
 
 def _make_objective(df: pd.DataFrame, w1: float, w3: float, w5: float,
                     minutes_gate: float, minutes_scale: float,
@@ -116,22 +97,14 @@ def _make_objective(df: pd.DataFrame, w1: float, w3: float, w5: float,
         df = df[play_prob >= minutes_gate].copy()
         play_prob = play_prob.loc[df.index]
 
-    # Scale EP by (minutes_scale*play_prob + (1-minutes_scale)*1.0)
+    # Scale EP by (minutes_scale*play_prob + (1-minutes_scale)*1.0) and the bookmaker multiplier
     # minutes_scale=1 → fully scaled by probability; 0 → ignore minutes in scaling
-    minutes_mult = (1.0 - minutes_scale) + minutes_scale * play_prob
-
-    # Bookmaker multiplier (optional columns)
-    bm_mult = _bookmaker_mult(df, bm_strength)
+    bm_mult = _bookmaker_mult(df, bm_strength).to_numpy()
 
-    # Next GW (obj_1) uses ep_1
-    obj_1 = df["ep_1"].astype(float) * minutes_mult * bm_mult
-
-    # 15-man selection (obj_3) uses horizon blend
-    obj_3 = (w1 * df["ep_1"].astype(float) + w3 * df["ep_3"].astype(float) + w5 * df["ep_5"].astype(float))
-    obj_3 = obj_3 * minutes_mult * bm_mult
-
-    df["obj_1"] = obj_1
-    df["obj_3"] = obj_3
+    # Next GW (obj_1) uses ep_1; 15-man selection (obj_3) uses the horizon blend
+    ep_blend = w1 * df["ep_1"].astype(float) + w3 * df["ep_3"].astype(float) + w5 * df["ep_5"].astype(float)
+    df["obj_1"] = scoring.objective(df["ep_1"], play_prob, minutes_scale, bm_mult)
+    df["obj_3"] = scoring.objective(ep_blend, play_prob, minutes_scale, bm_mult)
     # keep label possibly stale after filtering
     if "label" not in df.columns and {"web_name","team_name","price"}.issubset(df.columns):
         df["label"] = (
@@ -142,11 +115,11 @@ def _make_objective(df: pd.DataFrame, w1: float, w3: float, w5: float,
     return df
 
 # ---------------------------- Load & adjust projections ----------------------------
-@st.cache_data(show_spinner=False)
-def load_proj():
-    p1_path = DATA_DIR / "projections_next_gw.csv"
-    p3_path = DATA_DIR / "projections_next_3gws.csv"
-    p5_path = DATA_DIR / "projections_next_5gws.csv"
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_proj(data_dir: pathlib.Path):
+    p1_path = data_dir / "projections_next_gw.csv"
+    p3_path = data_dir / "projections_next_3gws.csv"
+    p5_path = data_dir / "projections_next_5gws.csv"
 
     def _read(path):
         return pd.read_csv(path) if path.exists() else None
@@ -161,17 +134,91 @@ def load_proj():
         )
         st.stop()
 
-    df = _ensure_columns(p1)
+    # p1 only seeds ep_3/ep_5 placeholders; drop them so the merges below don't suffix to _x/_y
+    df = _ensure_columns(p1).drop(columns=["ep_3", "ep_5"])
     if p3 is not None:
         p3 = _ensure_columns(p3)
         df = df.merge(p3[["id", "ep_3"]], on="id", how="left")
     if p5 is not None:
         p5 = _ensure_columns(p5)
         df = df.merge(p5[["id", "ep_5"]], on="id", how="left")
+    px_path = data_dir / "price_predictions.csv"
+    if not px_path.exists():
+        px_path = pathlib.Path(PRICES["predictions_path"])
+    if px_path.exists():  # overnight rise/fall odds (pipeline/price_series.py predict)
+        px = pd.read_csv(px_path, usecols=["id", "p_rise", "p_fall", "price_drift"])
+        df = df.merge(px, on="id", how="left")
     df = _ensure_columns(df)
     return df
 
-df_raw = load_proj()
+@st.cache_resource(show_spinner=False, max_entries=2)
+def player_index(data_dir: pathlib.Path) -> search.PlayerIndex:
+    return search.PlayerIndex(load_proj(data_dir))
+
+def _reset_pickers():
+    """Drop picker widget state so a rebuilt / reset squad shows up in the slots."""
+    for k in [k for k in st.session_state if str(k).startswith("pick_") and not str(k).startswith("pick_filter")]:
+        del st.session_state[k]
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def whatif_base(data_dir: pathlib.Path):
+    """Baseline override engine (None until the pipeline has written ep_components.csv)."""
+    try:
+        return whatif.WhatIfEngine.load(str(data_dir / "ep_components.csv"))
+    except FileNotFoundError:
+        return None
+
+def _apply_whatif(df: pd.DataFrame, overrides: list):
+    """Per-session engine copy with the user's overrides; patches only the players they touch."""
+    base = whatif_base(DATA_DIR)
+    if base is None:
+        return df, None
+    eng = base.copy()
+    if not overrides:
+        return df, eng
+    rows = eng.apply(overrides)
+    patch = eng.to_frame(rows).set_index("id")[["ep_1", "ep_3", "ep_5"]]
+    df = df.copy()
+    hit = df["id"].isin(patch.index)
+    for col in ("ep_1", "ep_3", "ep_5"):
+        df.loc[hit, col] = df.loc[hit, "id"].map(patch[col]).to_numpy()
+    return df, eng
+
+LIVE = live.live_settings()
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def live_tracker(gw: int, replay_dir: str, data_dir: pathlib.Path) -> live.LiveTracker:
+    """One poller per GW for every session; sessions only read its state."""
+    feed = live.ReplayFeed(replay_dir) if replay_dir else live.LiveFeed(gw, LIVE["base_url"])
+    state_ = live.LiveState(live.load_components(str(data_dir / "ep_components.csv")), gw)
+    return live.LiveTracker(state_, feed, min_interval=LIVE["poll_seconds"] if not replay_dir else 0)
+
+@st.fragment(run_every=LIVE["poll_seconds"])
+def _live_pitch(df: pd.DataFrame, xi, bench, captain, vice):
+    """Re-runs on its own every poll interval; only this block redraws."""
+    tracker = live_tracker(live.current_gw(str(DATA_DIR / "bootstrap-static.json")), LIVE["replay_dir"], DATA_DIR)
+    info = tracker.tick()
+    s = tracker.state
+    tot = s.squad(xi, captain, vice, bench)
+    m1, m2, m3 = st.columns(3)
+    m1.metric(f"GW{s.gw} live points", tot["live"])
+    m2.metric("xP still to play", f"{tot['remaining_ep']:.1f}")
+    m3.metric("Projected total", f"{tot['projected']:.1f}")
+    caps = {}
+    for pid in list(xi) + list(bench):
+        p = s.player(pid)
+        caps[pid] = f"{p['points']} pts · {p['minutes']}' · {p['remaining_ep']:.1f} xP left"
+    pitch.render_pitch(df, xi_ids=xi, bench_ids=bench, captain_id=captain, vice_id=vice, live=caps)
+    if vice is not None and tot["armband"] == vice and vice != captain:
+        st.caption("Captain did not play: the vice-captain's points are doubled.")
+    if info["error"]:
+        st.warning(f"Live feed: {info['error']} (showing last good data)")
+    else:
+        st.caption(f"Last poll {info['at'] or '—'}: {info['changed']} players updated in {info['ms']:.1f} ms")
+
+df_raw = load_proj(DATA_DIR)
+whatif_overrides = st.session_state.setdefault("whatif", [])
+df_raw, engine = _apply_whatif(df_raw, whatif_overrides)
 
 # ---------------------------- Sidebar controls ----------------------------
 st.sidebar.header("Model settings (free & optional)")
@@ -186,6 +233,48 @@ minutes_scale  = st.sidebar.slider("Minutes scaling strength", 0.0, 1.0, 0.8, 0.
 bm_strength    = st.sidebar.slider("Bookmaker adjustment strength", 0.0, 1.0, 0.4, 0.05,
                                    help="Uses optional columns: team_cs_prob, team_gs_prob (if present)")
 
+with st.sidebar.expander(f"What-if overrides ({len(whatif_overrides)})"):
+    if engine is None:
+        st.caption("Run `python pipeline/compute_phase3.py` to enable (needs data/cache/ep_components.csv).")
+    else:
+        wi_index = player_index(DATA_DIR)
+        wi_q = st.text_input("Player", key="whatif_search", placeholder="search name")
+        wi_hits = [h for h in wi_index.search(wi_q, k=10) if h in engine.row_of]
+        wi_pid = st.selectbox("Player match", [0] + wi_hits, format_func=wi_index.label, key="whatif_player")
+        wi_avail = st.slider("Chance of playing (%)", 0, 100, 100, 5, key="whatif_avail")
+        wi_mins = st.number_input("…or expected minutes per fixture (0 = model)", 0, 90, 0, key="whatif_mins")
+        if st.button("Apply player override", disabled=not wi_pid):
+            if wi_mins:
+                whatif_overrides.append({"kind": "minutes", "id": int(wi_pid), "value": float(wi_mins)})
+            else:
+                whatif_overrides.append({"kind": "avail", "id": int(wi_pid), "value": wi_avail / 100.0})
+            st.rerun()
+
+        teams = sorted(engine.team_names, key=engine.team_names.get)
+        wi_team = st.selectbox("Team", teams, format_func=engine.team_names.get, key="whatif_team")
+        t = engine.team_of[wi_team]
+        wi_att = st.slider("Attack rating", 1.0, 5.0, float(round(engine.att[t], 2)), 0.05, key=f"whatif_att_{wi_team}")
+        wi_def = st.slider("Defence rating", 1.0, 5.0, float(round(engine.def_[t], 2)), 0.05, key=f"whatif_def_{wi_team}")
+        if st.button("Apply team strength"):
+            whatif_overrides.append({"kind": "team", "team": int(wi_team), "att": wi_att, "def": wi_def})
+            st.rerun()
+        fx_rows = engine.rows_by_team[t]
+        fx_opts = [int(engine.f_fixture[r]) for r in fx_rows]
+        fx_label = {int(engine.f_fixture[r]): f"GW{engine.f_event[r]} vs {engine.team_names[int(engine.team_ids[engine.f_opp[r]])]}"
+                    f" ({'H' if engine.f_home[r] else 'A'}), FDR {engine.base_difficulty[r]:.0f}" for r in fx_rows}
+        if fx_opts:
+            wi_fx = st.selectbox("Fixture", fx_opts, format_func=fx_label.get, key=f"whatif_fixture_{wi_team}")
+            wi_fdr = st.slider("Difficulty", 2, 5, 3, key="whatif_fdr")
+            if st.button("Apply fixture difficulty"):
+                whatif_overrides.append({"kind": "difficulty", "fixture": int(wi_fx), "team": int(wi_team), "value": wi_fdr})
+                st.rerun()
+
+        for o in whatif_overrides:
+            st.caption("• " + ", ".join(f"{k}={v}" for k, v in o.items()))
+        if whatif_overrides and st.button("Clear overrides"):
+            whatif_overrides.clear()
+            st.rerun()
+
 df_view = _make_objective(
     df_raw, w1=w1, w3=w3, w5=w5,
     minutes_gate=minutes_gate, minutes_scale=minutes_scale,
@@ -212,6 +301,73 @@ if squad_ids and squad_value > budget + 1e-6:
     st.sidebar.error("Over budget. Make transfers to get under budget.")
 
 # ---------------------------- Actions ----------------------------
+# Optimisation runs on the shared job runner; the page only submits and polls, so a slow
+# solve never blocks the script thread and identical requests reuse one run.
+runner = jobs.get_runner()
+pending = st.session_state.setdefault("pending_jobs", {})  # kind -> job id
+
+def _rebuild_task(df: pd.DataFrame, budget: float, progress=None) -> dict:
+    chosen = optimizer.solve_squad_15(df, budget=budget, max_per_team=3, progress=progress)
+    xi, c, v, bench = optimizer.choose_starting_xi(df, chosen, return_bench=True)
+    return {"squad": chosen, "starters": xi, "captain": c, "vice": v}
+
+def _starters_task(df: pd.DataFrame, squad: list, progress=None) -> dict:
+    xi, c, v, bench = optimizer.choose_starting_xi(df, squad, return_bench=True)
+    return {"starters": xi, "captain": c, "vice": v}
+
+def _suggest_task(df: pd.DataFrame, squad: list, budget: float, bank: float, progress=None) -> dict:
+    return optimizer.suggest_transfers(df, current_squad=squad, budget=budget, bank_left=bank,
+                                       drift_weight=float(PRICES["drift_weight"]), progress=progress)
+
+def _apply_finished_jobs():
+    for kind, job_id in list(pending.items()):
+        job = runner.get(job_id)
+        if job is None:   # evicted from the runner's cache before this session picked it up
+            del pending[kind]
+            st.warning(f"{kind.capitalize()} result expired; please run it again.")
+            continue
+        if not job.done:
+            continue
+        del pending[kind]
+        if job.status == jobs.CANCELLED:
+            st.warning(f"{job.label} cancelled.")
+        elif job.status == jobs.FAILED:
+            st.error(f"{job.label} failed: {job.error}")
+        elif kind == "suggest":
+            sug = job.result
+            st.session_state["last_suggestion"] = sug
+            if sug["out_name"]:
+                msg = f"Suggested OUT: **{sug['out_name']}** → IN: **{sug['in_name']}** | ΔEP1={sug['delta_ep1']:.2f}"
+                if sug.get("delta_value"):
+                    msg += f" | overnight value {sug['delta_value']:+.2f}m"
+                st.info(msg)
+            else:
+                st.warning("No legal single-transfer improvement found within your bank/budget.")
+        else:
+            state_dict.update(job.result)
+            state.save_state(state_dict)
+            if kind == "rebuild":
+                _reset_pickers()
+                st.success("New 15-man squad built.")
+            else:
+                st.success("Starting XI optimized.")
+
+@st.fragment(run_every=0.5)
+def _job_panel():
+    for kind, job_id in list(pending.items()):
+        job = runner.get(job_id)
+        if job is None or job.done:
+            st.rerun()  # full rerun applies the result above the pickers
+        st.progress(job.progress, text=f"{job.label} — {job.status}, {job.elapsed:.1f}s")
+        if job.partial:
+            best = job.partial
+            st.caption(f"Best so far: {len(best)} picked" if isinstance(best, list)
+                       else f"Best so far: ΔEP1={best.get('delta_ep1', 0.0):.2f}")
+        if st.button("✖ Cancel", key=f"cancel_{kind}"):
+            runner.cancel(job.id)
+
+_apply_finished_jobs()
+
 colA, colB, colC = st.columns(3)
 with colA:
     if st.button("💾 Save Team"):
@@ -224,6 +380,7 @@ with colB:
     if st.button("🗑 Reset Team"):
         state_dict = state.default_state()
         state.save_state(state_dict)
+        _reset_pickers()
         st.warning("State reset. Pick a new squad below.")
 
 with colC:
@@ -231,17 +388,10 @@ with colC:
         if len(squad_ids) < 1:
             st.error("No current squad. Pick players or rebuild first.")
         else:
-            sug = optimizer.suggest_transfers(
-                df_view,                # uses obj_1 for the delta
-                current_squad=squad_ids,
-                budget=float(budget),
-                bank_left=float(bank_left),
-            )
-            st.session_state["last_suggestion"] = sug
-            if sug["out_name"]:
-                st.info(f"Suggested OUT: **{sug['out_name']}** → IN: **{sug['in_name']}** | ΔEP1={sug['delta_ep1']:.2f}")
-            else:
-                st.warning("No legal single-transfer improvement found within your bank/budget.")
+            # uses obj_1 for the delta
+            job = runner.submit(_suggest_task, df_view, list(squad_ids), float(budget), float(bank_left),
+                                label="Suggest 1 transfer")
+            pending["suggest"] = job.id
 
 st.divider()
 
@@ -251,51 +401,59 @@ with left:
         if len(squad_ids) != 15:
             st.error("You need 15 players picked to optimize starters.")
         else:
-            xi, c, v, bench = optimizer.choose_starting_xi(df_view, squad_ids, return_bench=True)
-            state_dict["starters"], state_dict["captain"], state_dict["vice"] = xi, c, v
-            state.save_state(state_dict)
-            st.success("Starting XI optimized.")
+            job = runner.submit(_starters_task, df_view, list(squad_ids), label="Optimize starters")
+            pending["starters"] = job.id
 
 with mid:
     if st.button("🧱 Rebuild Best 15 (under budget)"):
-        chosen = optimizer.solve_squad_15(df_view, budget=float(budget), max_per_team=3)
-        state_dict["squad"] = chosen
-        xi, c, v, bench = optimizer.choose_starting_xi(df_view, chosen, return_bench=True)
-        state_dict["starters"], state_dict["captain"], state_dict["vice"] = xi, c, v
-        state.save_state(state_dict)
-        st.success("New 15-man squad built.")
+        job = runner.submit(_rebuild_task, df_view, float(budget), label="Rebuild best 15")
+        pending["rebuild"] = job.id
 
 with right:
     st.caption("Tune the sliders in the sidebar to influence selections.")
 
+if pending:
+    _job_panel()
+
 # ---------------------------- Pickers by position ----------------------------
 st.subheader("Pick Your Squad (15)")
 pos_groups = {"GK": 2, "DEF": 5, "MID": 5, "FWD": 3}
+index = player_index(DATA_DIR)
+scores = index.align(df_view["id"], df_view["obj_3"])  # NaN = hidden by the minutes gate
+
+with st.expander("Search filters"):
+    f_teams = st.multiselect("Teams", sorted(set(index.team)), key="pick_filter_teams")
+    f_max_price = st.slider("Max price (£)", 3.5, 15.5, 15.5, 0.5, key="pick_filter_price")
 
+# saved squad grouped by position (O(1) per id through the index)
+saved_by_pos = {pos: [] for pos in pos_groups}
+for pid in state_dict.get("squad", []):
+    p = index.position_of(pid)
+    if p in saved_by_pos:
+        saved_by_pos[p].append(pid)
+
+picked_by_pos = {}
 for pos, need in pos_groups.items():
-    pool = df_view[df_view["position"] == pos].sort_values("obj_3", ascending=False).reset_index(drop=True)
-    labels = ["-- none --"] + pool["label"].tolist()
+    query = st.text_input(f"Search {pos}", key=f"pick_search_{pos}", placeholder="name, e.g. 'sal' or 'odegard'")
+    hits = index.search(query, position=pos, team=f_teams or None, max_price=f_max_price, scores=scores, k=PICKER_TOP_K)
+    # current value per slot: widget state first, then the saved squad
+    current = []
+    for i in range(need):
+        saved = saved_by_pos[pos][i] if i < len(saved_by_pos[pos]) else 0
+        current.append(int(st.session_state.get(f"pick_{pos}_{i}", saved) or 0))
     picks = []
+    cols = st.columns(need)
     for i in range(need):
-        key = f"pick_{pos}_{i}"
-        # prefill from state
-        prelabel = None
-        if state_dict.get("squad"):
-            ids_pos = [pid for pid in state_dict["squad"] if df_raw.loc[df_raw["id"] == pid, "position"].iloc[0] == pos]
-            if i < len(ids_pos):
-                row = pool[pool["id"] == ids_pos[i]]
-                if not row.empty:
-                    prelabel = row["label"].iloc[0]
-        idx_default = labels.index(prelabel) if prelabel in labels else 0
-        choice = st.selectbox(f"{pos} {i+1}", options=labels, index=idx_default, key=key)
-        if choice != "-- none --":
-            idx = labels.index(choice) - 1
-            picks.append(int(pool.iloc[idx]["id"]))
-
-    # replace picks of that position in the saved squad
-    existing = state_dict.get("squad", [])
-    existing = [pid for pid in existing if df_raw.loc[df_raw["id"] == pid, "position"].iloc[0] != pos]
-    state_dict["squad"] = existing + picks
+        opts = search.picker_options(hits, current[i], exclude=[c for j, c in enumerate(current) if j != i])
+        choice = cols[i].selectbox(
+            f"{pos} {i+1}", options=opts, index=opts.index(current[i]) if current[i] in opts else 0,
+            format_func=index.label, key=f"pick_{pos}_{i}",
+        )
+        if choice:
+            picks.append(int(choice))
+    picked_by_pos[pos] = picks
+
+state_dict["squad"] = [pid for pos in pos_groups for pid in picked_by_pos[pos]]
 
 # recompute bank/value after picks
 squad_ids = state_dict.get("squad", [])
@@ -311,7 +469,11 @@ if len(squad_ids) == 15:
     xi, c, v, bench = optimizer.choose_starting_xi(df_view, squad_ids, return_bench=True)
     state_dict["starters"], state_dict["captain"], state_dict["vice"] = xi, c, v
     state.save_state(state_dict)
-    pitch.render_pitch(df_view, xi_ids=xi, bench_ids=bench, captain_id=c, vice_id=v)
+    if st.toggle("Live GW mode", key="live_mode", help="Live points and remaining xP, refreshed every "
+                 f"{LIVE['poll_seconds']:.0f}s from the FPL live feed"):
+        _live_pitch(df_view, xi, bench, c, v)
+    else:
+        pitch.render_pitch(df_view, xi_ids=xi, bench_ids=bench, captain_id=c, vice_id=v)
 else:
     st.info("Select 15 players to render the pitch.")
 # ---------------------------- Captaincy helper ----------------------------
@@ -323,7 +485,7 @@ if "obj_1" in df_view.columns:
     # Minutes uncertainty drives a simple risk band:
     #   EP_high = obj_1 (already scaled)
     #   EP_low  = obj_1 * (0.5 + 0.5 * minutes_prob)  -> lower if minutes_prob is small
-    pmin = tmp["minutes_prob_flag"].astype(float).clip(0, 1)
+    pmin = _minutes_probability(tmp).astype(float).clip(0, 1)
     ep_hi = tmp["obj_1"].astype(float)
     ep_lo = ep_hi * (0.5 + 0.5 * pmin)
 
@@ -358,6 +520,16 @@ if "obj_1" in df_view.columns:
 else:
     st.info("No next-GW objective available (obj_1). Recompute projections.")
 
+# ---------------------------- EP breakdown ----------------------------
+if engine is not None and squad_ids:
+    with st.expander("EP breakdown per fixture (with your what-if overrides)"):
+        bd_pid = st.selectbox("Player", [p for p in squad_ids if p in engine.row_of],
+                              format_func=player_index(DATA_DIR).label, key="breakdown_player")
+        if bd_pid:
+            bd = engine.breakdown(bd_pid, horizon=5)
+            bd["opp"] = bd["opp"].map(engine.team_names)
+            st.dataframe(bd.round(2), hide_index=True)
+
 # ---------------------------- Footer ----------------------------
 st.divider()
 st.caption(
@@ -366,3 +538,4 @@ st.caption(
     "Transfers respect budget/bank, formation, and 3-per-club rules."
 )
 
+_rerun.stop()
@@ -1,11 +1,16 @@
 import streamlit as st
 import pandas as pd
 
+from app import datasource, telemetry
+
+_rerun = telemetry.Rerun("1_Picks")
+
 st.title("Picks — Expected Points")
 
-p1 = pd.read_csv("data/cache/projections_next_gw.csv")
-p3 = pd.read_csv("data/cache/projections_next_3gws.csv")
-p5 = pd.read_csv("data/cache/projections_next_5gws.csv")
+_, DATA_DIR = datasource.current()
+p1 = pd.read_csv(DATA_DIR / "projections_next_gw.csv")
+p3 = pd.read_csv(DATA_DIR / "projections_next_3gws.csv")
+p5 = pd.read_csv(DATA_DIR / "projections_next_5gws.csv")
 
 p1 = p1.rename(columns={"ep_total":"ep_1"})
 p3 = p3.rename(columns={"ep_total":"ep_3"})
@@ -42,3 +47,5 @@ with tab5:
     d = df.sort_values("ep_5", ascending=False)
     st.dataframe(d[["web_name","team_name","position","price","ep_1","ep_3","ep_5","ep_3_avg","ep_5_avg"]], hide_index=True)
     st.download_button("Download current view (CSV)", d.to_csv(index=False).encode("utf-8"), "picks_next_5gws.csv", "text/csv")
+
+_rerun.stop()
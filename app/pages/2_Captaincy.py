@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
-from pathlib import Path
+
+from app import datasource, telemetry
+
+_rerun = telemetry.Rerun("2_Captaincy")
 
 st.title("Captaincy")
 
-# Locations produced by the pipeline
-CAP_PATH = Path("data/cache/captaincy_rankings.csv")
-PROJ1_PATH = Path("data/cache/projections_next_gw.csv")
+# Locations produced by the pipeline (the published version, else data/cache)
+_, DATA_DIR = datasource.current()
+CAP_PATH = DATA_DIR / "captaincy_rankings.csv"
+PROJ1_PATH = DATA_DIR / "projections_next_gw.csv"
 
 def load_normalised_dataframe() -> pd.DataFrame:
     """
@@ -67,3 +71,5 @@ if not cols:
     st.stop()
 
 st.dataframe(df.head(topn)[cols], use_container_width=True)
+
+_rerun.stop()
@@ -1,11 +1,16 @@
 import streamlit as st
 import pandas as pd
 
+from app import datasource, search, telemetry
+
+_rerun = telemetry.Rerun("4_Team_Planner")
+
 st.title("Team Planner — Next 1/3/5 GWs")
 
-p1 = pd.read_csv("data/cache/projections_next_gw.csv")[["id","web_name","team_name","position","price","ep_total","exp_minutes"]].rename(columns={"ep_total":"ep_1"})
-p3 = pd.read_csv("data/cache/projections_next_3gws.csv")[["id","ep_total"]].rename(columns={"ep_total":"ep_3"})
-p5 = pd.read_csv("data/cache/projections_next_5gws.csv")[["id","ep_total"]].rename(columns={"ep_total":"ep_5"})
+_, DATA_DIR = datasource.current()
+p1 = pd.read_csv(DATA_DIR / "projections_next_gw.csv")[["id","web_name","team_name","position","price","ep_total","exp_minutes"]].rename(columns={"ep_total":"ep_1"})
+p3 = pd.read_csv(DATA_DIR / "projections_next_3gws.csv")[["id","ep_total"]].rename(columns={"ep_total":"ep_3"})
+p5 = pd.read_csv(DATA_DIR / "projections_next_5gws.csv")[["id","ep_total"]].rename(columns={"ep_total":"ep_5"})
 
 df = (
     p1.merge(p3, on="id", how="left")
@@ -17,18 +22,29 @@ show_all_planner = st.sidebar.checkbox("Show ALL players in pickers (include 0 m
 if not show_all_planner:
     df = df[df["exp_minutes"].fillna(0) > 0]
 
-st.subheader("Select your Best XI (by names)")
-gk_pool = df[df["position"]=="GK"]
-def_pool = df[df["position"]=="DEF"]
-mid_pool = df[df["position"]=="MID"]
-fwd_pool = df[df["position"]=="FWD"]
+PICKER_TOP_K = 25
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def player_index(data_dir) -> search.PlayerIndex:
+    return search.PlayerIndex(pd.read_csv(data_dir / "projections_next_gw.csv"))
 
-sel_gk = st.multiselect("Goalkeepers", gk_pool["web_name"].tolist(), max_selections=2, key="sel_gk")
-sel_def = st.multiselect("Defenders", def_pool["web_name"].tolist(), max_selections=5, key="sel_def")
-sel_mid = st.multiselect("Midfielders", mid_pool["web_name"].tolist(), max_selections=5, key="sel_mid")
-sel_fwd = st.multiselect("Forwards", fwd_pool["web_name"].tolist(), max_selections=3, key="sel_fwd")
+st.subheader("Select your Best XI")
+index = player_index(DATA_DIR)
+scores = index.align(df["id"], df["ep_3"])  # players filtered out above stay NaN -> not offered
+query = st.text_input("Search players", key="planner_search", placeholder="name, e.g. 'sal' or 'odegard'")
 
-selected = df[df["web_name"].isin(sel_gk+sel_def+sel_mid+sel_fwd)].copy()
+def _pick(label: str, pos: str, n: int, key: str):
+    chosen = [int(x) for x in st.session_state.get(key, [])]
+    hits = index.search(query, position=pos, scores=scores, k=PICKER_TOP_K)
+    opts = chosen + [h for h in hits if h not in chosen]
+    return st.multiselect(label, opts, format_func=index.label, max_selections=n, key=key)
+
+sel_gk = _pick("Goalkeepers", "GK", 2, "sel_gk")
+sel_def = _pick("Defenders", "DEF", 5, "sel_def")
+sel_mid = _pick("Midfielders", "MID", 5, "sel_mid")
+sel_fwd = _pick("Forwards", "FWD", 3, "sel_fwd")
+
+selected = df[df["id"].isin(sel_gk+sel_def+sel_mid+sel_fwd)].copy()
 
 st.dataframe(selected[["web_name","team_name","position","price","ep_1","ep_3","ep_5"]], hide_index=True)
 
@@ -41,3 +57,5 @@ c1, c2, c3 = st.columns(3)
 c1.metric("Next GW", f"{ep1:.1f}")
 c2.metric("Next 3 GWs", f"{ep3:.1f}")
 c3.metric("Next 5 GWs", f"{ep5:.1f}")
+
+_rerun.stop()
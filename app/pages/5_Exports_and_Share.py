@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
-from pathlib import Path
+
+from app import datasource, telemetry
+
+_rerun = telemetry.Rerun("5_Exports_and_Share")
 
 st.title("Exports & Share")
 
-PROJ1_PATH = Path("data/cache/projections_next_gw.csv")
+_, DATA_DIR = datasource.current()
+PROJ1_PATH = DATA_DIR / "projections_next_gw.csv"
 
 def load_normalised_proj() -> pd.DataFrame:
     if not PROJ1_PATH.exists():
@@ -67,3 +71,5 @@ st.download_button(
     file_name="suggested_xi.csv",
     mime="text/csv",
 )
+
+_rerun.stop()
@@ -0,0 +1,60 @@
+import time
+
+import streamlit as st
+
+from app import datasource, telemetry
+from pipeline import query
+from pipeline.utils import read_toml
+
+_rerun = telemetry.Rerun("6_Query")
+
+st.title("SQL Query")
+
+if query.duckdb is None:
+    st.info("SQL queries need DuckDB: `pip install duckdb`")
+    st.stop()
+
+_, DATA_DIR = datasource.current()
+
+@st.cache_resource(show_spinner=False)
+def settings(config_path: str = "configs/config.toml") -> dict:
+    return query.query_settings(read_toml(config_path, {}))
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def connection(data_dir):
+    # Sandboxed: the views' source directories only, no writes elsewhere, settings locked
+    return query.connect(settings(), data_dir, sandbox=True)
+
+con, made, skipped = connection(DATA_DIR)
+max_rows = settings()["max_rows"]
+
+with st.expander(f"Views ({len(made)})"):
+    for name, about, cols in query.describe(con, made):
+        st.markdown(f"**{name}** — {about}  \n`{', '.join(cols)}`")
+    if skipped:
+        st.caption(f"No source files yet: {', '.join(skipped)}")
+
+example = st.selectbox("Example", ["—"] + sorted(query.EXAMPLES), key="query_example")
+sql = st.text_area("SQL (SELECT only)", value=query.EXAMPLES.get(example, "SELECT * FROM player_projections ORDER BY ep_5 DESC LIMIT 20"),
+                   height=160, key=f"query_sql_{example}")
+
+if sql.strip():
+    cur = con.cursor()   # one cursor per run: sessions don't share statement state
+    try:
+        if not query.read_only(cur, sql):
+            st.error("Only SELECT queries run here; use `python pipeline/query.py` for anything else.")
+        else:
+            t0 = time.perf_counter()
+            df = cur.sql(sql).limit(max_rows + 1).df()
+            secs = time.perf_counter() - t0
+            more = len(df) > max_rows
+            st.dataframe(df.head(max_rows), hide_index=True)
+            st.caption(f"{min(len(df), max_rows)} rows{f' (first {max_rows} shown)' if more else ''} · {secs * 1000:.0f} ms")
+            if not more:
+                st.download_button("Download CSV", df.to_csv(index=False).encode("utf-8"), "query.csv", "text/csv")
+    except query.duckdb.Error as e:
+        st.error(str(e).strip())
+    finally:
+        cur.close()
+
+_rerun.stop()
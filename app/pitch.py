@@ -9,10 +9,12 @@ def _names(df: pd.DataFrame, ids):
     # preserve input order
     order = {pid: i for i, pid in enumerate(ids)}
     sub["ord"] = sub["id"].map(order)
-    return [t for _, t in sub.sort_values("ord")[["id","nm"]].itertuples(index=False, name=None)]
+    return list(sub.sort_values("ord")[["id","nm"]].itertuples(index=False, name=None))
 
-def render_pitch(df: pd.DataFrame, xi_ids, bench_ids=None, captain_id=None, vice_id=None):
+def render_pitch(df: pd.DataFrame, xi_ids, bench_ids=None, captain_id=None, vice_id=None, live=None):
+    """``live``: optional {player id: caption} shown under each name (live GW mode)."""
     bench_ids = bench_ids or []
+    live = live or {}
     # bucket starters by position for a clean grid
     pos = df.set_index("id")["position"].to_dict()
     gk = [p for p in xi_ids if pos.get(p) == "GK"]
@@ -28,9 +30,11 @@ def render_pitch(df: pd.DataFrame, xi_ids, bench_ids=None, captain_id=None, vice
             if captain_id == pid: badge = " (C)"
             elif vice_id == pid: badge = " (VC)"
             c.write(f"**{label}{badge}**")
+            if pid in live: c.caption(live[pid])
 
     if bench_ids:
         st.subheader("Bench")
         cols = st.columns(len(bench_ids))
         for c, (pid, label) in zip(cols, _names(df, bench_ids)):
             c.write(label)
+            if pid in live: c.caption(live[pid])
@@ -0,0 +1,153 @@
+# app/search.py
+from __future__ import annotations
+import unicodedata
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+def normalize(s: str) -> str:
+    """Lowercase, strip accents and punctuation: 'Ødegaard' -> 'odegaard', 'M.Salah' -> 'm salah'."""
+    if not isinstance(s, str):
+        return ""
+    s = unicodedata.normalize("NFKD", s)
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    s = "".join(ch if ch.isalnum() else " " for ch in s.lower())
+    return " ".join(s.split())
+
+class PlayerIndex:
+    """
+    Prebuilt player search index for pickers.
+
+    Built once per projections load; every lookup afterwards is either an array mask
+    (team / position / price filters), a binary search over sorted name tokens (prefix)
+    or a rapidfuzz pass over the already-filtered names (fuzzy fallback). Selections are
+    player ids, resolved through a dict in O(1) instead of scanning label lists.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        df = df.drop_duplicates("id").reset_index(drop=True)
+        self.ids = df["id"].astype(int).to_numpy()
+        self.position = df["position"].astype(str).to_numpy()
+        self.team = df.get("team_name", df.get("team", pd.Series("", index=df.index))).astype(str).to_numpy()
+        self.price = pd.to_numeric(df.get("price", pd.Series(0.0, index=df.index)), errors="coerce").fillna(0.0).to_numpy(float)
+        self.web_name = df["web_name"].astype(str).to_numpy()
+        self.labels = np.array([f"{n} ({t}, £{p:.1f})" for n, t, p in zip(self.web_name, self.team, self.price)], dtype=object)
+        self.row_of: Dict[int, int] = {int(pid): i for i, pid in enumerate(self.ids)}
+        self._id_index = pd.Index(self.ids)
+
+        # search keys: web_name plus full name when the frame carries it
+        full = (df.get("first_name", pd.Series("", index=df.index)).fillna("").astype(str) + " "
+                + df.get("second_name", pd.Series("", index=df.index)).fillna("").astype(str))
+        self.keys = [normalize(f"{w} {f}") for w, f in zip(self.web_name, full)]
+
+        tokens, rows = [], []
+        for i, key in enumerate(self.keys):
+            for tok in set(key.split()):
+                tokens.append(tok)
+                rows.append(i)
+        order = np.argsort(np.array(tokens, dtype=object), kind="stable")
+        self._tokens = np.array(tokens, dtype=str)[order]
+        self._token_rows = np.array(rows, dtype=np.int64)[order]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ---------------------------- id lookups ----------------------------
+    def label(self, pid: int) -> str:
+        i = self.row_of.get(int(pid))
+        return "-- none --" if i is None else str(self.labels[i])
+
+    def position_of(self, pid: int) -> Optional[str]:
+        i = self.row_of.get(int(pid))
+        return None if i is None else str(self.position[i])
+
+    def align(self, ids: Iterable[int], values: Iterable[float]) -> np.ndarray:
+        """Scatter per-id values (e.g. the page's obj_3) onto index rows; missing ids are NaN."""
+        rows = self._id_index.get_indexer(np.asarray(ids, dtype=int))
+        vals = np.asarray(values, dtype=float)
+        out = np.full(len(self.ids), np.nan)
+        out[rows[rows >= 0]] = vals[rows >= 0]
+        return out
+
+    # ---------------------------- search ----------------------------
+    def _mask(self, position=None, team=None, max_price=None, min_price=None, allowed=None) -> np.ndarray:
+        m = np.ones(len(self.ids), dtype=bool)
+        if position:
+            m &= self.position == position
+        if team:
+            m &= np.isin(self.team, [team] if isinstance(team, str) else list(team))
+        if max_price is not None:
+            m &= self.price <= float(max_price) + 1e-9
+        if min_price is not None:
+            m &= self.price >= float(min_price) - 1e-9
+        if allowed is not None:
+            m &= allowed
+        return m
+
+    def _prefix_rows(self, q: str) -> np.ndarray:
+        lo = np.searchsorted(self._tokens, q, side="left")
+        hi = np.searchsorted(self._tokens, q + "\uffff", side="left")
+        return np.unique(self._token_rows[lo:hi])
+
+    def search(
+        self,
+        query: str = "",
+        *,
+        position: Optional[str] = None,
+        team=None,
+        max_price: Optional[float] = None,
+        min_price: Optional[float] = None,
+        scores: Optional[np.ndarray] = None,
+        k: int = 25,
+        fuzzy_cutoff: float = 75.0,
+        fuzzy_min_len: int = 4,
+    ) -> List[int]:
+        """
+        Top-k player ids for a query.
+
+        Empty query: best ``scores`` (e.g. obj_3) within the filters. Otherwise prefix
+        matches on any name token first (ordered by score), then fuzzy matches on the
+        remaining filtered names (queries of ``fuzzy_min_len`` characters or more; shorter
+        ones are too noisy). Rows whose score is NaN (hidden by the page) are skipped.
+        """
+        allowed = None if scores is None else ~np.isnan(scores)
+        mask = self._mask(position, team, max_price, min_price, allowed)
+        rank = np.nan_to_num(scores, nan=-np.inf) if scores is not None else -self.price
+        q = normalize(query)
+
+        if not q:
+            rows = np.flatnonzero(mask)
+            top = rows[np.argsort(-rank[rows], kind="stable")[:k]]
+            return [int(self.ids[i]) for i in top]
+
+        # multi-word queries: every word must prefix-match some token
+        hit = None
+        for word in q.split():
+            rows = self._prefix_rows(word)
+            hit = rows if hit is None else np.intersect1d(hit, rows, assume_unique=True)
+        hit = hit[mask[hit]]
+        hit = hit[np.argsort(-rank[hit], kind="stable")][:k]
+        out = [int(self.ids[i]) for i in hit]
+
+        if len(out) < k and len(q) >= fuzzy_min_len:
+            seen = np.zeros(len(self.ids), dtype=bool)
+            seen[hit] = True
+            rest = np.flatnonzero(mask & ~seen)
+            if len(rest):
+                matches = process.extract(
+                    q, [self.keys[i] for i in rest], scorer=fuzz.WRatio,
+                    limit=k - len(out), score_cutoff=fuzzy_cutoff,
+                )
+                out += [int(self.ids[rest[j]]) for _, _, j in matches]
+        return out
+
+def picker_options(hits: List[int], current: Optional[int] = None, exclude: Iterable[int] = ()) -> List[int]:
+    """Selectbox options: 0 ('-- none --'), the current pick (kept stable), then search hits."""
+    skip = set(int(x) for x in exclude)
+    opts = [0]
+    if current:
+        opts.append(int(current))
+    opts += [h for h in hits if h != current and h not in skip]
+    return opts
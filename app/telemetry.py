@@ -0,0 +1,31 @@
+# app/telemetry.py
+"""
+App metrics for the metrics export (pipeline/metrics.py): rerun time per page here, solve times
+in app/optimizer.py. The server process is the ``app`` job. It writes data/metrics/app.json at
+most every ``[metrics] flush_seconds`` (checked when a rerun ends) and once more at exit.
+
+    _rerun = telemetry.Rerun("1_Picks")   # top of the page
+    ...
+    _rerun.stop()                       # bottom; runs cut short by st.stop() are not recorded
+"""
+from __future__ import annotations
+import time
+
+from pipeline import metrics
+from pipeline.utils import read_toml
+
+def _settings(config_path: str = "configs/config.toml") -> dict:
+    return metrics.metrics_settings(read_toml(config_path, {}))
+
+SETTINGS = _settings()
+if SETTINGS["enabled"] and not metrics.started():
+    metrics.start("app", SETTINGS["dir"], SETTINGS["flush_seconds"])
+
+class Rerun:
+    """Times one page run from construction (right after the page's imports) to ``stop()``."""
+    def __init__(self, page: str):
+        self.page, self.t0 = page, time.perf_counter()
+
+    def stop(self) -> None:
+        metrics.observe("fpl_app_rerun_duration_seconds", time.perf_counter() - self.t0, page=self.page)
+        metrics.maybe_flush()
@@ -0,0 +1,228 @@
+"""
+Rolling backtest: replay projections at past GW deadlines and score them against actual points.
+
+For every finished GW ``g`` the engine is re-run as it would have run at the deadline: players,
+flags, form and team ratings from the bootstrap-static snapshot taken before the deadline when
+the store has one (otherwise today's bootstrap with form / selected-by rebuilt from history), and
+xG/xA per 90 from the player's earlier GWs only (0 until ``min_prior_minutes``; today's
+xgxa_players.csv is never read, it covers the GWs being scored). Each variant projects 1/3/5 GWs from ``g`` and
+is compared with the points actually scored in that window (player_history.csv):
+
+  * mae / rmse      over players with a history row in the window
+  * spearman        rank correlation of projected vs actual points
+  * cap_pts / hit   actual points of the top-projected player and whether that player
+                    finished in the window's actual top ``captain_top_k``
+
+Variants: ``baseline`` (hand-tuned defaults), ``fitted`` (configs/model_params.toml),
+``params:<file.toml>`` (any parameter set) and ``dir:<path>`` (projections recorded earlier with
+``--record``, so a code change to the engine can be compared with the engine before it).
+GWs run in a process pool; every variant of a GW shares that GW's replayed inputs.
+
+    python pipeline/backtest.py --variants baseline fitted
+    python pipeline/backtest.py --variants baseline --record data/backtest/before
+    python pipeline/backtest.py --variants dir:data/backtest/before/baseline baseline --from 3 --to 20
+"""
+from __future__ import annotations
+import argparse, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from utils import read_toml
+from snapshots import SnapshotStore
+import compute_phase3 as cp3
+import train
+
+HORIZONS = (1, 3, 5)
+
+# ============================================================
+# Variants
+# ============================================================
+def parse_variant(spec: str) -> Tuple[str, Optional[dict], Optional[str]]:
+    """spec -> (name, params or None, recorded projections dir or None)."""
+    if spec == "baseline":
+        return spec, cp3.DEFAULT_PARAMS, None
+    if spec == "fitted":
+        return spec, cp3.load_model_params(cp3.MODEL_PARAMS_PATH), None
+    if spec.startswith("params:"):
+        path = spec.split(":", 1)[1]
+        if not os.path.exists(path):
+            raise SystemExit(f"variant {spec}: {path} not found")
+        return os.path.splitext(os.path.basename(path))[0], cp3.load_model_params(path), None
+    if spec.startswith("dir:"):
+        path = spec.split(":", 1)[1].rstrip("/")
+        return "dir:" + os.path.basename(path), None, path
+    raise SystemExit(f"unknown variant {spec!r} (baseline | fitted | params:<toml> | dir:<path>)")
+
+# ============================================================
+# Replay
+# ============================================================
+class Replay:
+    """Everything needed to rebuild the engine inputs at any past deadline (one per worker)."""
+    def __init__(self, cfg: dict, cache_dir: str, hist_path: str):
+        t = cfg.get("train", {})
+        with open(os.path.join(cache_dir, "bootstrap-static.json"), "r", encoding="utf-8") as f:
+            self.bs = json.load(f)
+        with open(os.path.join(cache_dir, "fixtures.json"), "r", encoding="utf-8") as f:
+            self.fx = json.load(f)
+        self.hist = pd.read_csv(hist_path)
+        self.store = SnapshotStore.from_config(cfg) if cfg.get("snapshots") else None
+        self.max_age = float(t.get("max_snapshot_age_days", 7))
+        self.feats = train.history_features(self.hist, float(t.get("min_prior_minutes", 270)),
+                                            int(t.get("form_window", 4)), self.bs.get("total_players") or 1e7)
+
+    def inputs(self, gw: int, horizon: int):
+        """(players, fixture rows, xgxa, team strengths) as of GW ``gw``'s deadline."""
+        b, src = train.asof_bootstraps(self.bs, self.store, [gw], self.max_age)[gw]
+        players = cp3.elements_df(b)
+        f = self.feats[self.feats["event"] == gw].set_index("element")
+        if src != "snapshot":
+            players["chance_of_playing_next_round"] = np.nan
+            players["form"] = players["id"].map(f["form_hist"])
+            players["selected_by_percent"] = players["id"].map(f["sel_hist"])
+        # as-of rates only: under min_prior_minutes a player gets 0, never today's xgxa_players.csv
+        # (that season-to-date table includes the matches being scored)
+        ids = players["id"]
+        xgxa = pd.DataFrame({"fpl_id": ids, "xg_per90": ids.map(f["xg90"]).fillna(0.0),
+                             "xa_per90": ids.map(f["xa90"]).fillna(0.0)})
+        ft = cp3.build_fixture_rows(b, self.fx, horizon=horizon, start=gw)
+        return players, ft, xgxa, cp3.build_team_strengths(b)
+
+def project(inputs, gw: int, params: dict, horizons=HORIZONS) -> pd.DataFrame:
+    """id, ep_1, ep_3, ... from the per-fixture components (one engine call for every horizon)."""
+    players, ft, xgxa, ts = inputs
+    comp = cp3.ep_components(players, ft, xgxa, ts, params=params)
+    out = pd.DataFrame({"id": players["id"].to_numpy()})
+    for h in horizons:
+        ep = comp[comp["event"] < gw + h].groupby("id")["ep"].sum()
+        out[f"ep_{h}"] = out["id"].map(ep).fillna(0.0).to_numpy()
+    return out
+
+_REPLAY: Optional[Replay] = None
+
+def _init_worker(cfg: dict, cache_dir: str, hist_path: str) -> None:
+    global _REPLAY
+    _REPLAY = Replay(cfg, cache_dir, hist_path)
+
+def _task(args) -> List[pd.DataFrame]:
+    """One GW: replay inputs once, project every variant (recorded ones are read from disk)."""
+    gw, variants, horizons, record = args
+    inputs, frames = None, []
+    for name, params, rec_dir in variants:
+        if rec_dir is not None:
+            path = os.path.join(rec_dir, f"gw{gw:02d}.csv")
+            if not os.path.exists(path):
+                continue
+            proj = pd.read_csv(path)
+        else:
+            inputs = inputs or _REPLAY.inputs(gw, max(horizons))
+            proj = project(inputs, gw, params, horizons)
+            if record:
+                os.makedirs(os.path.join(record, name), exist_ok=True)
+                proj.to_csv(os.path.join(record, name, f"gw{gw:02d}.csv"), index=False)
+        frames.append(proj.assign(variant=name, gw=gw))
+    return frames
+
+# ============================================================
+# Scoring
+# ============================================================
+def actual_windows(hist: pd.DataFrame, horizons=HORIZONS) -> pd.DataFrame:
+    """Long table (id, gw, horizon, actual) of points over GWs gw..gw+h-1, only for finished windows."""
+    pts = hist.groupby(["element", "round"])["total_points"].sum().unstack(fill_value=np.nan)
+    events = np.arange(int(pts.columns.min()), int(pts.columns.max()) + 1)
+    pts = pts.reindex(columns=events)
+    seen = pts.notna().to_numpy()
+    csum = np.concatenate([np.zeros((len(pts), 1)), np.nancumsum(pts.to_numpy(float), axis=1)], axis=1)
+    cseen = np.concatenate([np.zeros((len(pts), 1)), np.cumsum(seen, axis=1)], axis=1)
+    frames = []
+    for h in horizons:
+        n = len(events) - h + 1
+        if n <= 0:
+            continue
+        tot = csum[:, h:h + n] - csum[:, :n]
+        any_row = (cseen[:, h:h + n] - cseen[:, :n]) > 0
+        r, c = np.nonzero(any_row)
+        frames.append(pd.DataFrame({"id": pts.index.to_numpy()[r], "gw": events[c], "horizon": h, "actual": tot[r, c]}))
+    return pd.concat(frames, ignore_index=True)
+
+def score(proj: pd.DataFrame, actual: pd.DataFrame, horizons=HORIZONS, captain_top_k: int = 5) -> pd.DataFrame:
+    """Per (variant, gw, horizon) metrics; every step is a grouped vector operation."""
+    long = proj.melt(id_vars=["variant", "gw", "id"], value_vars=[f"ep_{h}" for h in horizons if f"ep_{h}" in proj],
+                     var_name="horizon", value_name="proj")
+    long["horizon"] = long["horizon"].str[3:].astype(int)
+    d = long.merge(actual, on=["id", "gw", "horizon"], how="inner")
+    keys = ["variant", "gw", "horizon"]
+    g = d.groupby(keys, sort=True)
+    d["err"] = d["proj"] - d["actual"]
+    d["rp"] = g["proj"].rank()
+    d["ra"] = g["actual"].rank()
+    d["rank_actual"] = g["actual"].rank(ascending=False, method="min")
+    d["rp_ra"], d["rp2"], d["ra2"] = d["rp"] * d["ra"], d["rp"] ** 2, d["ra"] ** 2
+    d["abs_err"], d["sq_err"] = d["err"].abs(), d["err"] ** 2
+    g = d.groupby(keys, sort=True)
+    m = g.agg(n=("id", "size"), mae=("abs_err", "mean"), mse=("sq_err", "mean"), rp=("rp", "mean"), ra=("ra", "mean"),
+              rp_ra=("rp_ra", "mean"), rp2=("rp2", "mean"), ra2=("ra2", "mean"), best_pts=("actual", "max"))
+    cov = m["rp_ra"] - m["rp"] * m["ra"]
+    m["spearman"] = cov / np.sqrt((m["rp2"] - m["rp"] ** 2) * (m["ra2"] - m["ra"] ** 2)).replace(0, np.nan)
+    m["rmse"] = np.sqrt(m["mse"])
+    cap = d.loc[g["proj"].idxmax(), keys + ["id", "actual", "rank_actual"]].set_index(keys)
+    m["cap_id"], m["cap_pts"] = cap["id"], cap["actual"]
+    m["cap_hit"] = (cap["rank_actual"] <= captain_top_k).astype(float)
+    return m[["n", "mae", "rmse", "spearman", "cap_id", "cap_pts", "best_pts", "cap_hit"]].reset_index()
+
+def summary(res: pd.DataFrame) -> pd.DataFrame:
+    return (res.groupby(["horizon", "variant"])
+               .agg(gws=("gw", "size"), mae=("mae", "mean"), rmse=("rmse", "mean"), spearman=("spearman", "mean"),
+                    cap_pts=("cap_pts", "mean"), cap_hit=("cap_hit", "mean"))
+               .round(3))
+
+# ============================================================
+# CLI
+# ============================================================
+def main():
+    ap = argparse.ArgumentParser(description="Backtest projection variants against actual points")
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--variants", nargs="+", default=None)
+    ap.add_argument("--from", dest="gw_from", type=int, default=None)
+    ap.add_argument("--to", dest="gw_to", type=int, default=None)
+    ap.add_argument("--workers", type=int, default=None, help="processes (default [backtest] workers, 0 = CPUs)")
+    ap.add_argument("--record", default=None, help="write each replayed variant's projections to DIR/<variant>/")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    cfg = read_toml(args.config)
+    bt = cfg.get("backtest", {})
+    cache_dir = cfg.get("caching", {}).get("cache_dir", "data/cache")
+    hist_path = cfg.get("train", {}).get("history_path", os.path.join(cache_dir, "player_history.csv"))
+    if not os.path.exists(hist_path):
+        raise SystemExit(f"{hist_path} missing; run `python pipeline/fetch_fpl_data.py history`")
+    horizons = tuple(int(h) for h in bt.get("horizons", HORIZONS))
+    variants = [parse_variant(v) for v in (args.variants or bt.get("variants", ["baseline", "fitted"]))]
+    workers = args.workers if args.workers is not None else int(bt.get("workers", 0))
+    workers = workers or os.cpu_count() or 1
+
+    t0 = time.perf_counter()
+    actual = actual_windows(pd.read_csv(hist_path, usecols=["element", "round", "total_points"]), horizons)
+    gws = sorted(actual["gw"].unique().tolist())
+    gws = [g for g in gws if (args.gw_from is None or g >= args.gw_from) and (args.gw_to is None or g <= args.gw_to)]
+    tasks = [(g, variants, horizons, args.record) for g in gws]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(cfg, cache_dir, hist_path)) as pool:
+            frames = [f for fs in pool.map(_task, tasks) for f in fs]
+    else:
+        _init_worker(cfg, cache_dir, hist_path)
+        frames = [f for t in tasks for f in _task(t)]
+    if not frames:
+        raise SystemExit("nothing to score (no finished GWs in range?)")
+    t1 = time.perf_counter()
+    res = score(pd.concat(frames, ignore_index=True), actual, horizons, int(bt.get("captain_top_k", 5)))
+    out = args.out or bt.get("out_path", "data/backtest/results.csv")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    res.to_csv(out, index=False)
+    print(f"{len(gws)} GWs x {len(variants)} variants replayed in {t1 - t0:.1f}s ({workers} workers), "
+          f"scored in {time.perf_counter() - t1:.2f}s -> {out}")
+    print(summary(res).to_string())
+
+if __name__ == "__main__":
+    main()
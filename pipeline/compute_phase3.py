@@ -1,6 +1,12 @@
 from __future__ import annotations
-import argparse, json, os, math
+import argparse, copy, json, os, math
 import pandas as pd, numpy as np
+try:
+    import metrics, players as player_tables, scoring, team_model
+    from utils import read_toml
+except ImportError:  # imported from the app as pipeline.compute_phase3
+    from pipeline import metrics, players as player_tables, scoring, team_model
+    from pipeline.utils import read_toml
 
 # ============================================================
 # Data loading
@@ -20,23 +26,94 @@ def current_event(bs):
     unfinished = [int(e["id"]) for e in evs if not e.get("finished")]
     return min(unfinished) if unfinished else 1
 
+# ============================================================
+# Model parameters (defaults are the original hand-tuned values; pipeline/train.py fits them)
+# ============================================================
+MODEL_PARAMS_PATH = "configs/model_params.toml"
+DEFAULT_PARAMS = {
+    "minutes": {"base_min": {"GK":90.0, "DEF":85.0, "MID":78.0, "FWD":78.0},
+                "form_lo": 0.9, "form_span": 0.2, "sel_lo": 0.98, "sel_span": 0.04},
+    "attack": {"w_def": 0.5, "w_ease": 0.5},
+    "clean_sheet": {"k_def": 0.9, "k_ease": 0.4, "bias": 0.0},
+}
+
+def load_model_params(path: str = MODEL_PARAMS_PATH) -> dict:
+    """DEFAULT_PARAMS overlaid with the fitted values in ``path``; a missing file or key keeps the default."""
+    params = copy.deepcopy(DEFAULT_PARAMS)
+    fitted = read_toml(path, {})
+    for sec, vals in params.items():
+        for k, v in fitted.get(sec, {}).items():
+            if k in vals:
+                vals[k] = {**vals[k], **{p: float(x) for p, x in v.items()}} if isinstance(vals[k], dict) else float(v)
+    return params
+
+PARAMS = load_model_params()
+
+# ============================================================
+# Formulas (shared by ep_engine, ep_components, pipeline/whatif.py and pipeline/train.py;
+# points per goal / assist / CS / appearance come from pipeline/scoring.py)
+# ============================================================
+POS_BASE_MIN = PARAMS["minutes"]["base_min"]
+
+def ease_from_difficulty(d):
+    """FPL difficulty (2 easy .. 5 hard) -> ease multiplier 0.6..1.4 approx."""
+    try:
+        d=float(d)
+    except:
+        d=3.0
+    return (6.0 - max(2.0, min(5.0, d))) / 2.5 + 0.6
+
+def minutes_inputs(chance, form, selected_by):
+    """availability (0..1), form and selected_by scaled to 0..1; NaN-safe."""
+    num = lambda x: pd.to_numeric(x, errors="coerce").astype(float)   # float32 table columns widen here
+    avail = (num(chance).fillna(90.0)/100.0).clip(0.0,1.0)
+    form_u = num(form).fillna(3.0).clip(0,12)/12.0
+    sel_u = num(selected_by).fillna(5.0).clip(0,60)/60.0
+    return avail, form_u, sel_u
+
+def minutes_factors(chance, form, selected_by, params=None):
+    """availability (0..1), form bump (0.9..1.1), selected_by bump (0.98..1.02) with the default params."""
+    m = (params or PARAMS)["minutes"]
+    avail, form_u, sel_u = minutes_inputs(chance, form, selected_by)
+    return avail, m["form_lo"] + form_u*m["form_span"], m["sel_lo"] + sel_u*m["sel_span"]
+
+def attack_multiplier(opp_def, ease, params=None, opp_factor=None):
+    """
+    Per-fixture attack multiplier: blend of 3/opp_def and FDR ease (50/50 by default). With the
+    team model, its ``opp_factor`` (goals vs this opponent and venue / vs an average one) replaces 3/opp_def.
+    """
+    a = (params or PARAMS)["attack"]
+    if opp_factor is None:
+        opp_def = np.where(np.asarray(opp_def, dtype=float) == 0, 3.0, opp_def)
+        opp_factor = 3.0 / opp_def
+    return a["w_def"]*np.asarray(opp_factor, dtype=float) + a["w_ease"]*np.asarray(ease, dtype=float)
+
+def clean_sheet_probability(team_def, opp_att, ease, params=None, xg_against=None):
+    """
+    Logistic on (team_def - opp_att), nudged by ease (0.6..1.4 -> -0.16..+0.16 by default).
+    With the team model it is the Poisson chance of conceding none, exp(-xg_against).
+    """
+    if xg_against is not None:
+        return np.exp(-np.asarray(xg_against, dtype=float))
+    c = (params or PARAMS)["clean_sheet"]
+    z = c["bias"] + c["k_def"]*(np.asarray(team_def, dtype=float) - np.asarray(opp_att, dtype=float)) + (np.asarray(ease, dtype=float)-1.0)*c["k_ease"]
+    return 1/(1+np.exp(-z))
+
 # ============================================================
 # Core tables
 # ============================================================
 def elements_df(bs):
-    df = pd.DataFrame(bs["elements"])
-    teams = pd.DataFrame(bs["teams"])[["id","name"]].rename(columns={"id":"team","name":"team_name"})
-    df = df.merge(teams, on="team", how="left")
-    pos_map = {1:"GK",2:"DEF",3:"MID",4:"FWD"}
-    df["position"] = df["element_type"].map(pos_map)
-    df = df.rename(columns={"id":"id","web_name":"web_name","now_cost":"price"})
-    df["price"] = df["price"].astype(float)/10.0
-    # helpful fields
-    for c in ["chance_of_playing_next_round","form","selected_by_percent","status"]:
-        if c not in df.columns: df[c] = np.nan
-    return df
+    """The compact, typed player table (pipeline/players.py): only the columns the engine reads, id order."""
+    return player_tables.player_table(bs)
+
+def load_team_model():
+    """The fitted results model (pipeline/team_model.py) when its state exists, else None."""
+    return team_model.load()
 
-def build_team_strengths(bs):
+def build_team_strengths(bs, model=None):
+    """Team att/def ratings (mean 3.0): the results model's when given, else FPL's static strengths."""
+    if model is not None:
+        return model.ratings()
     t = pd.DataFrame(bs["teams"]).copy()
     # FPL includes overall strengths; sometimes separate attack/defence H/A exist; if not, fallback
     cols = ["strength", "strength_overall_home","strength_overall_away",
@@ -55,64 +132,60 @@ def build_team_strengths(bs):
             t[c] = 3.0
     return t[["id","att_rating","def_rating"]].rename(columns={"id":"team"})
 
-def build_fixture_rows(bs, fx, horizon):
-    """Return per-fixture rows for next N events with team-centric view and difficulty."""
-    ev = current_event(bs)
+def build_fixture_rows(bs, fx, horizon, start=None):
+    """Return per-fixture rows for next N events (from ``start``, default the current one) with team-centric view and difficulty."""
+    ev = start or current_event(bs)
     f = pd.DataFrame(fx)
     f = f[(f["event"].fillna(0) >= ev) & (f["event"].fillna(0) < ev + horizon)].copy()
     # carry difficulty; FPL lower is easier (2 easy .. 5 hard). We map to ease in 0.6..1.4
-    def to_ease(d): 
-        try:
-            d=float(d)
-        except:
-            d=3.0
-        return (6.0 - max(2.0, min(5.0, d))) / 2.5 + 0.6  # 0.6..1.4 approx
-        
-    f["ease_h"] = f.get("team_h_difficulty", 3).apply(to_ease)
-    f["ease_a"] = f.get("team_a_difficulty", 3).apply(to_ease)
+    f["ease_h"] = f.get("team_h_difficulty", 3).apply(ease_from_difficulty)
+    f["ease_a"] = f.get("team_a_difficulty", 3).apply(ease_from_difficulty)
+    f["fixture"] = f["id"] if "id" in f.columns else np.arange(len(f))
+    f["difficulty_h"] = f.get("team_h_difficulty", 3)
+    f["difficulty_a"] = f.get("team_a_difficulty", 3)
     home = f.rename(columns={"team_h":"team","team_a":"opp"})
     away = f.rename(columns={"team_a":"team","team_h":"opp"})
-    home_rows = home.assign(home=1, ease=lambda x: x["ease_h"])[["event","team","opp","home","ease"]]
-    away_rows = away.assign(home=0, ease=lambda x: x["ease_a"])[["event","team","opp","home","ease"]]
+    cols = ["fixture","event","team","opp","home","ease","difficulty"]
+    home_rows = home.assign(home=1, ease=lambda x: x["ease_h"], difficulty=lambda x: x["difficulty_h"])[cols]
+    away_rows = away.assign(home=0, ease=lambda x: x["ease_a"], difficulty=lambda x: x["difficulty_a"])[cols]
     ft = pd.concat([home_rows, away_rows], ignore_index=True)
     return ft
 
+def attach_fixture_xg(ft: pd.DataFrame, model=None) -> pd.DataFrame:
+    """Per-fixture xg_for / xg_against / opp_factor from the team model (unchanged without one)."""
+    return ft if model is None else model.fixture_xg(ft)
+
 # ============================================================
 # Minutes model (free, heuristic)
 # ============================================================
-def expected_minutes_model(players: pd.DataFrame, fixtures_team: pd.DataFrame) -> pd.DataFrame:
+def expected_minutes_model(players: pd.DataFrame, fixtures_team: pd.DataFrame, with_factors: bool = False, params=None) -> pd.DataFrame:
     """
-    Heuristic EM:
-      - base minutes per fixture by position: GK 90, DEF 85, MID 78, FWD 78
+    Heuristic EM (coefficients from PARAMS["minutes"]):
+      - base minutes per fixture by position (defaults GK 90, DEF 85, MID 78, FWD 78)
       - availability factor from chance_of_playing_next_round (0..1)
       - form bump (0.9..1.1) from 'form'
       - selected_by bump small (0.98..1.02)
       - multiply by number of fixtures in horizon
     """
-    base_pos = {"GK":90.0, "DEF":85.0, "MID":78.0, "FWD":78.0}
     p = players[["id","position","chance_of_playing_next_round","form","selected_by_percent"]].copy()
-    p["base_min"] = p["position"].map(base_pos).fillna(75.0)
-    # availability (if NaN, assume 0.9)
-    p["avail"] = pd.to_numeric(p["chance_of_playing_next_round"], errors="coerce").fillna(90.0)/100.0
-    p["avail"] = p["avail"].clip(0.0,1.0)
-    # form bump (FPL form is roughly 0..12). Map to 0.9..1.1
-    f = pd.to_numeric(p["form"], errors="coerce").fillna(3.0)
-    p["form_bump"] = (0.9 + (f.clip(0,12)/12.0)*0.2)
-    # selected_by bump 0..60% -> 0.98..1.02
-    sb = pd.to_numeric(p["selected_by_percent"], errors="coerce").fillna(5.0)
-    p["sel_bump"] = 0.98 + (sb.clip(0,60)/60.0)*0.04
+    p["base_min"] = p["position"].map((params or PARAMS)["minutes"]["base_min"]).fillna(75.0)
+    # availability (if NaN, assume 0.9); form (FPL ~0..12) -> 0.9..1.1; selected_by 0..60% -> 0.98..1.02
+    p["avail"], p["form_bump"], p["sel_bump"] = minutes_factors(
+        p["chance_of_playing_next_round"], p["form"], p["selected_by_percent"], params)
     p["exp_per_fixture"] = p["base_min"] * p["avail"] * p["form_bump"] * p["sel_bump"]
     # fixtures count
     team_counts = fixtures_team.groupby("team").size().rename("fixtures_n")
     out = players[["id","team"]].merge(team_counts, left_on="team", right_index=True, how="left").fillna({"fixtures_n":0})
-    out = out.merge(p[["id","exp_per_fixture"]], on="id", how="left")
+    out = out.merge(p[["id","exp_per_fixture","base_min","avail","form_bump","sel_bump"]], on="id", how="left")
     out["exp_minutes_total"] = out["fixtures_n"] * out["exp_per_fixture"].fillna(0.0)
+    if with_factors:
+        return out[["id","exp_minutes_total","fixtures_n","exp_per_fixture","base_min","avail","form_bump","sel_bump"]]
     return out[["id","exp_minutes_total","fixtures_n"]]
 
 # ============================================================
 # Opponent-strength adjustment
 # ============================================================
-def per_fixture_attack_multiplier(fixtures_team: pd.DataFrame, team_strengths: pd.DataFrame) -> pd.DataFrame:
+def per_fixture_attack_multiplier(fixtures_team: pd.DataFrame, team_strengths: pd.DataFrame, params=None) -> pd.DataFrame:
     """Compute an attack multiplier for each (team, fixture) vs opponent defence & ease."""
     st = team_strengths.set_index("team")
     ft = fixtures_team.copy()
@@ -120,13 +193,12 @@ def per_fixture_attack_multiplier(fixtures_team: pd.DataFrame, team_strengths: p
     # lower opponent def => higher multiplier; normalise around 1.0
     # also factor in FDR ease (0.6..1.4). Use 50/50 blend.
     ft["opp_def"] = ft["opp_def"].fillna(3.0)
-    mul_def = 3.0 / ft["opp_def"].replace(0,3.0)
-    ft["att_mult"] = 0.5*mul_def + 0.5*ft["ease"].fillna(1.0)
+    ft["att_mult"] = attack_multiplier(ft["opp_def"], ft["ease"].fillna(1.0), params, ft.get("opp_factor"))
     # sum across fixtures per team (if two fixtures, the multipliers add)
     agg = ft.groupby("team")["att_mult"].sum().rename("att_mult_sum")
     return agg
 
-def clean_sheet_points_proxy(fixtures_team: pd.DataFrame, team_strengths: pd.DataFrame, position_series: pd.Series) -> pd.Series:
+def clean_sheet_points_proxy(fixtures_team: pd.DataFrame, team_strengths: pd.DataFrame, position_series: pd.Series, params=None) -> pd.Series:
     """Estimate CS points using team defence vs opp attack & home flag via ease already captured."""
     st = team_strengths.set_index("team")
     ft = fixtures_team.copy()
@@ -135,83 +207,126 @@ def clean_sheet_points_proxy(fixtures_team: pd.DataFrame, team_strengths: pd.Dat
     ft["team_def"] = ft["team_def"].fillna(3.0)
     ft["opp_att"] = ft["opp_att"].fillna(3.0)
     # logistic on def - opp_att, nudged by ease (already 0.6..1.4 -> map to -0.2..+0.2)
-    z = 0.9*(ft["team_def"] - ft["opp_att"]) + (ft["ease"]-1.0)*0.4
-    cs_prob = 1/(1+np.exp(-z))
+    cs_prob = pd.Series(clean_sheet_probability(ft["team_def"], ft["opp_att"], ft["ease"], params, ft.get("xg_against")), index=ft.index)
     # sum CS probs per team (DGW adds)
     cs_sum = cs_prob.groupby(ft["team"]).sum().rename("cs_prob_sum")
     # map to points by position
-    pos_cs = {"GK":4.0,"DEF":4.0,"MID":1.0,"FWD":0.0}
-    pos_pts = position_series.map(pos_cs).fillna(0.0)
+    pos_pts = pd.Series(scoring.CS_PTS[scoring.pos_index(position_series)], index=position_series.index)
     # will add later per player by merging cs_sum
     return cs_sum, pos_pts
 
 # ============================================================
 # EP engine
 # ============================================================
-def ep_engine(players: pd.DataFrame, fixtures_team: pd.DataFrame, n: int, xgxa: pd.DataFrame, team_strengths: pd.DataFrame):
-    df = players.copy()
-    # Merge xg/xa
-    if "fpl_id" in xgxa.columns:
-        df = df.merge(xgxa.rename(columns={"fpl_id":"id"}), on="id", how="left")
-    else:
-        df = df.merge(xgxa.rename(columns={"fpl_name":"web_name"}), on="web_name", how="left")
+def attach_xgxa(players: pd.DataFrame, xgxa: pd.DataFrame) -> pd.DataFrame:
+    """Join xg_per90 / xa_per90 by FPL id (or web_name for files without fpl_id); 0 when missing."""
+    key, on = ("fpl_id", "id") if "fpl_id" in xgxa.columns else ("fpl_name", "web_name")
+    rates = xgxa[[c for c in (key, "xg_per90", "xa_per90") if c in xgxa.columns]].rename(columns={key: on})
+    df = players.merge(rates, on=on, how="left")
     for c in ["xg_per90","xa_per90"]:
         if c not in df.columns: df[c]=0.0
         df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
+    return df
+
+def ep_engine(players: pd.DataFrame, fixtures_team: pd.DataFrame, n: int, xgxa: pd.DataFrame, team_strengths: pd.DataFrame, params=None):
+    # Merge xg/xa
+    df = attach_xgxa(players, xgxa)
 
     # Minutes
-    em = expected_minutes_model(df, fixtures_team)
-    df = df.merge(em, on="id", how="left").fillna({"exp_minutes_total":0,"fixtures_n":0})
+    # (per-team and per-player columns are mapped onto the table; no full-frame merges)
+    em = expected_minutes_model(df, fixtures_team, params=params).set_index("id")
+    df["exp_minutes_total"] = df["id"].map(em["exp_minutes_total"]).fillna(0)
+    df["fixtures_n"] = df["id"].map(em["fixtures_n"]).fillna(0)
 
     # Opponent adjustment (attack)
-    att_mult = per_fixture_attack_multiplier(fixtures_team, team_strengths)
-    df = df.merge(att_mult, left_on="team", right_index=True, how="left").fillna({"att_mult_sum":0.0})
+    att_mult = per_fixture_attack_multiplier(fixtures_team, team_strengths, params)
+    df["att_mult_sum"] = df["team"].map(att_mult).fillna(0.0)
 
     # Clean sheet proxy
-    cs_sum, pos_pts = clean_sheet_points_proxy(fixtures_team, team_strengths, df["position"])
-    df = df.merge(cs_sum, left_on="team", right_index=True, how="left").fillna({"cs_prob_sum":0.0})
+    cs_sum, _ = clean_sheet_points_proxy(fixtures_team, team_strengths, df["position"], params)
+    df["cs_prob_sum"] = df["team"].map(cs_sum).fillna(0.0)
 
-    # Appearance points
-    df["appearance_pts"] = np.where(df["fixtures_n"]>0, 2.0*df["fixtures_n"], 0.0)
-
-    # Attacking points
-    factor = (df["exp_minutes_total"]/90.0).clip(lower=0.0)
-    # average attack multiplier per fixture -> if zero fixtures keep zero
-    avg_att_mult = np.where(df["fixtures_n"]>0, df["att_mult_sum"]/df["fixtures_n"].clip(lower=1), 0.0)
-    goals_exp = factor * df["xg_per90"] * avg_att_mult
-    assists_exp = factor * df["xa_per90"] * avg_att_mult
-    pos_goal = {"GK":0.0,"DEF":6.0,"MID":5.0,"FWD":4.0}
-    pos_ast = {"GK":3.0,"DEF":3.0,"MID":3.0,"FWD":3.0}
-    df["att_pts"] = goals_exp*df["position"].map(pos_goal).fillna(0.0) + assists_exp*df["position"].map(pos_ast).fillna(0.0)
-
-    # CS points
-    df["cs_pts"] = df["cs_prob_sum"] * pos_pts
+    # Appearance, attacking and CS points; the average attack multiplier per fixture is zero without fixtures
+    n_fix = df["fixtures_n"].to_numpy(float)
+    avg_att_mult = np.where(n_fix>0, df["att_mult_sum"]/df["fixtures_n"].clip(lower=1), 0.0)
+    pts = scoring.expected_points(scoring.pos_index(df["position"]), df["exp_minutes_total"], df["xg_per90"],
+                                  df["xa_per90"], avg_att_mult, df["cs_prob_sum"], plays=n_fix, plays_full=n_fix)
+    for c in ("appearance_pts", "att_pts", "cs_pts"):
+        df[c] = pts[c]
 
     df["ep_total"] = (df["appearance_pts"] + df["cs_pts"] + df["att_pts"]).round(2)
     return df[["id","web_name","team_name","position","price","ep_total","exp_minutes_total"]].rename(
         columns={"exp_minutes_total":"exp_minutes"}
     )
 
+def ep_components(players: pd.DataFrame, fixtures_team: pd.DataFrame, xgxa: pd.DataFrame, team_strengths: pd.DataFrame, params=None) -> pd.DataFrame:
+    """
+    Per player × fixture breakdown of ep_engine: appearance, attacking and CS points plus every
+    input they were built from (minutes factors, team ratings, ease). Summing a player's rows over
+    a horizon reproduces ep_total (before rounding); pipeline/whatif.py recomputes from these.
+    """
+    df = attach_xgxa(players, xgxa)
+    em = expected_minutes_model(df, fixtures_team, with_factors=True, params=params)
+    df = df.merge(em.drop(columns=["exp_minutes_total","fixtures_n"]), on="id", how="left")
+    st = team_strengths.set_index("team")
+    ft = fixtures_team.copy()
+    ft["team_att"] = ft["team"].map(st["att_rating"]).fillna(3.0)
+    ft["team_def"] = ft["team"].map(st["def_rating"]).fillna(3.0)
+    ft["opp_att"] = ft["opp"].map(st["att_rating"]).fillna(3.0)
+    ft["opp_def"] = ft["opp"].map(st["def_rating"]).fillna(3.0)
+    ft["att_mult"] = attack_multiplier(ft["opp_def"], ft["ease"].fillna(1.0), params, ft.get("opp_factor"))
+    ft["cs_prob"] = clean_sheet_probability(ft["team_def"], ft["opp_att"], ft["ease"], params, ft.get("xg_against"))
+
+    cols = ["id","web_name","team_name","position","team","xg_per90","xa_per90",
+            "exp_per_fixture","base_min","avail","form_bump","sel_bump"]
+    rows = df[cols].merge(ft, on="team", how="inner").rename(columns={"exp_per_fixture":"exp_minutes"})
+    rows["exp_minutes"] = rows["exp_minutes"].fillna(0.0)
+    pts = scoring.expected_points(scoring.pos_index(rows["position"]), rows["exp_minutes"], rows["xg_per90"],
+                                  rows["xa_per90"], rows["att_mult"].to_numpy(float), rows["cs_prob"])
+    for c in ("appearance_pts", "att_pts", "cs_pts", "ep"):
+        rows[c] = pts[c]
+    return rows.sort_values(["id","event","fixture"]).reset_index(drop=True)
+
+HORIZONS = (1, 3, 5)   # ep_components.csv always covers the longest: whatif / live sum ep_1/3/5 from it
+
+def write_components(bs, fx, xgxa, n: int = max(HORIZONS)):
+    players = elements_df(bs)
+    model = load_team_model()
+    ft = attach_fixture_xg(build_fixture_rows(bs, fx, horizon=n), model)
+    comp = ep_components(players, ft, xgxa, build_team_strengths(bs, model))
+    comp.insert(0, "gw_start", current_event(bs))
+    comp.to_csv("data/cache/ep_components.csv", index=False)
+    metrics.gauge("fpl_ep_component_rows", len(comp))
+
 # ============================================================
 # Public functions
 # ============================================================
 def build_projection_for_range(bs, fx, xgxa, n: int):
     players = elements_df(bs)
-    ft = build_fixture_rows(bs, fx, horizon=n)
-    team_str = build_team_strengths(bs)
+    model = load_team_model()
+    ft = attach_fixture_xg(build_fixture_rows(bs, fx, horizon=n), model)
+    team_str = build_team_strengths(bs, model)
     proj = ep_engine(players, ft, n, xgxa, team_str)
+    metrics.gauge("fpl_projection_rows", len(proj), horizon=n)
     return proj
 
 def write_captaincy(out_next: pd.DataFrame):
-    cap = out_next.sort_values("ep_total", ascending=False).head(50).copy()
+    cap = out_next.sort_values("ep_total", ascending=False, kind="stable").head(50).copy()
     cap = cap[["id","web_name","team_name","position","price","ep_total"]]
     cap.to_csv("data/cache/captaincy_rankings.csv", index=False)
 
 def main():
     ap=argparse.ArgumentParser()
     ap.add_argument("--next_n", type=int, default=None)
+    ap.add_argument("--stage", choices=["all","project","captaincy"], default="all",
+                    help="project: 1/3/5 projections + components; captaincy: rankings from projections_next_gw.csv")
     args=ap.parse_args()
 
+    if args.stage == "captaincy":
+        write_captaincy(pd.read_csv("data/cache/projections_next_gw.csv"))
+        print("Captaincy written to data/cache/.")
+        return
+
     bs, fx, xgxa = load_inputs()
 
     if args.next_n:
@@ -225,6 +340,7 @@ def main():
             out.to_csv("data/cache/projections_next_5gws.csv", index=False)
         else:
             out.to_csv(f"data/cache/projections_next_{args.next_n}gws.csv", index=False)
+        write_components(bs, fx, xgxa, n=max(HORIZONS))
         print("Projections & captaincy written to data/cache/.")
         return
 
@@ -236,7 +352,9 @@ def main():
     out3.to_csv("data/cache/projections_next_3gws.csv", index=False)
     out5.to_csv("data/cache/projections_next_5gws.csv", index=False)
 
-    write_captaincy(out1)
+    if args.stage == "all":
+        write_captaincy(out1)
+    write_components(bs, fx, xgxa, n=max(HORIZONS))
     print("Projections & captaincy written to data/cache/.")
 
 if __name__=="__main__":
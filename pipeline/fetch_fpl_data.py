@@ -1,31 +1,120 @@
-
 from __future__ import annotations
-import argparse, os, shutil
+import argparse, asyncio, os, time
+import pandas as pd
 from utils import read_toml, write_json, utcnow_str
-from fpl_client import FPLClient
+from fpl_client import AsyncFPLClient, BASE_URL
+from snapshots import SnapshotStore
+from http_cache import HttpCache
+import price_series
+
+_STORE = None
 
 def save(data, name, cfg):
+    global _STORE
+    if _STORE is None:
+        _STORE = SnapshotStore.from_config(cfg)
     ts = utcnow_str(cfg['caching']['timestamp_format'])
-    raw = os.path.join(cfg['caching']['raw_dir'], f"{name}_{ts}.json")
-    write_json(data, raw)
+    _STORE.put(name, data, ts)
+    if name == "bootstrap-static":
+        price_series.append(data, ts, cfg.get('prices', {}).get('root', price_series.SERIES_ROOT))
     if cfg['caching']['write_latest_copies']:
-        shutil.copyfile(raw, os.path.join(cfg['caching']['cache_dir'], f"{name}.json"))
+        write_json(data, os.path.join(cfg['caching']['cache_dir'], f"{name}.json"))
+
+def make_client(cfg, base_url=None) -> AsyncFPLClient:
+    net = cfg['network']
+    return AsyncFPLClient(
+        base_url=base_url or net.get('base_url', BASE_URL),
+        timeout=net['timeout_seconds'], headers={"User-Agent": cfg['user_agent']['value']},
+        concurrency=net.get('concurrency', 8), rate_per_second=net.get('rate_per_second', 5.0),
+        max_retries=net.get('max_retries', 4), backoff_base=net.get('backoff_base_seconds', 0.5),
+        cache=HttpCache.from_config(cfg),
+    )
+
+def history_frame(summaries) -> pd.DataFrame:
+    """Flatten element-summary ``history`` (one row per player per past fixture)."""
+    rows = [dict(h, element=int(pid)) for pid, s in summaries.items() for h in (s.get('history') or [])]
+    return pd.DataFrame(rows)
+
+def live_frame(lives) -> pd.DataFrame:
+    """Flatten event/{gw}/live into one row per player per GW (stats columns)."""
+    rows = [dict(e.get('stats') or {}, element=int(e['id']), event=int(gw))
+            for gw, live in lives.items() for e in (live.get('elements') or [])]
+    return pd.DataFrame(rows)
+
+async def fetch_all(cli, cfg):
+    print("Fetching bootstrap-static + fixtures ...")
+    (b, b_new), (f, f_new) = await asyncio.gather(cli.get_bootstrap(), cli.get_fixtures())
+    for data, new, name in ((b, b_new, "bootstrap-static"), (f, f_new, "fixtures")):
+        if new or not os.path.exists(os.path.join(cfg['caching']['cache_dir'], f"{name}.json")):
+            save(data, name, cfg)
+        else: print(f"  {name}: not modified, kept cached copy")
+    return b
+
+async def fetch_one(cli, cfg, name):
+    """Just bootstrap-static or fixtures (one pipeline stage each)."""
+    get = cli.get_bootstrap if name == "bootstrap-static" else cli.get_fixtures
+    data, new = await get()
+    if new or not os.path.exists(os.path.join(cfg['caching']['cache_dir'], f"{name}.json")):
+        save(data, name, cfg)
+    else: print(f"  {name}: not modified, kept cached copy")
+    return data
+
+async def fetch_history(cli, cfg, ids=None):
+    if ids is None:
+        b, _ = await cli.get_bootstrap()
+        ids = [e['id'] for e in b['elements']]
+    print(f"Fetching element-summary for {len(ids)} players ...")
+    summaries, errors = await cli.element_summaries(ids)
+    save({str(k): v for k, v in summaries.items()}, "element-summaries", cfg)
+    out = os.path.join(cfg['caching']['cache_dir'], "player_history.csv")
+    history_frame(summaries).to_csv(out, index=False)
+    print(f"  {len(summaries)} ok, {len(errors)} failed -> {out}")
+    return errors
+
+async def fetch_live(cli, cfg, gws=None):
+    if not gws:
+        b, _ = await cli.get_bootstrap()
+        gws = [e['id'] for e in b['events'] if e.get('finished') or e.get('is_current')]
+    print(f"Fetching event live for GW {gws[0]}..{gws[-1]} ..." if gws else "No started GWs.")
+    lives, errors = await cli.events_live(gws)
+    if lives:
+        save({str(k): v for k, v in lives.items()}, "event-live", cfg)
+        out = os.path.join(cfg['caching']['cache_dir'], "player_gw_live.csv")
+        live_frame(lives).to_csv(out, index=False)
+        print(f"  {len(lives)} GWs ok, {len(errors)} failed -> {out}")
+    return errors
+
+async def run(args, cfg):
+    errors = {}
+    async with make_client(cfg, args.base_url) as cli:
+        t0 = time.perf_counter()
+        if args.cmd in ("all", "full"):
+            await fetch_all(cli, cfg)
+        if args.cmd in ("bootstrap", "fixtures"):
+            await fetch_one(cli, cfg, "bootstrap-static" if args.cmd == "bootstrap" else "fixtures")
+        if args.cmd in ("history", "full"):
+            errors.update(await fetch_history(cli, cfg, args.ids))
+        if args.cmd in ("live", "full"):
+            errors.update(await fetch_live(cli, cfg, args.gw))
+        s = cli.stats
+        print(f"{s['requests']} requests, {s['cached']} from cache ({s['not_modified']} not modified, {s['retries']} retries, "
+              f"{s['failed']} failed) in {time.perf_counter() - t0:.1f}s.")
+    print("Saved to data/cache/.")
+    return errors
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("cmd", choices=["all"])
+    ap.add_argument("cmd", choices=["all", "bootstrap", "fixtures", "history", "live", "full"])
     ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--base-url", default=None, help="API root (e.g. a local stub server)")
+    ap.add_argument("--ids", type=int, nargs="*", default=None, help="history: only these player ids")
+    ap.add_argument("--gw", type=int, nargs="*", default=None, help="live: these GWs (default: all started)")
     args = ap.parse_args()
 
     cfg = read_toml(args.config)
-    cli = FPLClient(timeout=cfg['network']['timeout_seconds'], headers={"User-Agent": cfg['user_agent']['value']})
-
-    if args.cmd == "all":
-        print("Fetching bootstrap-static ...")
-        b = cli.get_bootstrap(); save(b, "bootstrap-static", cfg)
-        print("Fetching fixtures ...")
-        f = cli.get_fixtures();   save(f, "fixtures", cfg)
-        print("Saved to data/cache/.")
+    errors = asyncio.run(run(args, cfg))
+    if errors:
+        print(f"WARNING: {len(errors)} requests failed, e.g. {next(iter(errors.items()))}")
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,155 @@
-
 from __future__ import annotations
+import asyncio, json, random, time
+from typing import Any, Dict, Iterable, Optional, Tuple
 import httpx
-BOOTSTRAP_URL = "https://fantasy.premierleague.com/api/bootstrap-static/"
-FIXTURES_URL = "https://fantasy.premierleague.com/api/fixtures/"
+try:
+    import metrics
+    from http_cache import HttpCache
+except ImportError:
+    from pipeline import metrics
+    from pipeline.http_cache import HttpCache
+BASE_URL = "https://fantasy.premierleague.com/api/"
+BOOTSTRAP_URL = BASE_URL + "bootstrap-static/"
+FIXTURES_URL = BASE_URL + "fixtures/"
 class FPLClient:
-    def __init__(self, timeout=25, headers=None):
+    def __init__(self, timeout=25, headers=None, cache: Optional[HttpCache] = None):
         self.client = httpx.Client(timeout=timeout, headers=headers or {"User-Agent":"FPL-Analytics"})
+        self.cache = cache
     def get_json(self, url):
-        r = self.client.get(url); r.raise_for_status(); return r.json()
+        if self.cache is None:
+            r = self._get(url); r.raise_for_status(); return r.json()
+        body, extra, entry = self.cache.begin(url)
+        if body is None:
+            r = self._get(url, headers=extra)
+            if r.status_code != 304: r.raise_for_status()
+            body = self.cache.finish(url, None, entry, r.status_code, r.headers, r.content)
+        return json.loads(body)
+    def _get(self, url, headers=None):
+        t0 = time.perf_counter()
+        try:
+            r = self.client.get(url, headers=headers)
+        except httpx.TransportError:
+            metrics.http(url, "error", time.perf_counter() - t0)
+            raise
+        metrics.http(url, r.status_code, time.perf_counter() - t0, len(r.content))
+        return r
     def get_bootstrap(self): return self.get_json(BOOTSTRAP_URL)
     def get_fixtures(self): return self.get_json(FIXTURES_URL)
+
+# ============================================================
+# Async client: pooled, rate limited, retried, conditional
+# ============================================================
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """Evenly spaced request starts: at most ``rate`` per second across all tasks (0 = unlimited)."""
+    def __init__(self, rate: float = 0.0):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class AsyncFPLClient:
+    """
+    httpx.AsyncClient with a bounded pool, a shared rate limit, retries with full-jitter
+    exponential backoff (Retry-After honoured) and conditional GETs through the shared
+    HttpCache (fresh entries are served without a request; offline mode never hits the network).
+
+    ``base_url`` points at the FPL API by default; pass a local stub server's URL to test.
+    Use as ``async with AsyncFPLClient(...) as cli: ...``.
+    """
+    def __init__(self, *, base_url: str = BASE_URL, timeout: float = 25, headers=None,
+                 concurrency: int = 8, rate_per_second: float = 5.0, max_retries: int = 4,
+                 backoff_base: float = 0.5, backoff_cap: float = 30.0,
+                 cache: Optional[HttpCache] = None, transport=None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.max_retries, self.backoff_base, self.backoff_cap = max_retries, backoff_base, backoff_cap
+        self.limiter = RateLimiter(rate_per_second)
+        self.cache = cache or HttpCache(mode="off")
+        self._sem = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=timeout, headers=headers or {"User-Agent": "FPL-Analytics"}, transport=transport,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self.stats = {"requests": 0, "cached": 0, "not_modified": 0, "retries": 0, "failed": 0}
+
+    async def __aenter__(self): return self
+    async def __aexit__(self, *exc): await self.aclose()
+    async def aclose(self): await self.client.aclose()
+
+    def url(self, path: str) -> str:
+        return path if path.startswith("http") else self.base_url + path.lstrip("/")
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        if retry_after:
+            try:
+                return min(self.backoff_cap, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    async def get_json(self, path: str) -> Tuple[Any, bool]:
+        """(payload, changed). ``changed`` is False when served from cache or answered 304."""
+        url = self.url(path)
+        body, headers, entry = self.cache.begin(url)
+        if body is not None:
+            self.stats["cached"] += 1
+            return json.loads(body), False
+        attempt = 0
+        while True:
+            async with self._sem:
+                await self.limiter.wait()
+                self.stats["requests"] += 1
+                t0 = time.perf_counter()
+                try:
+                    r = await self.client.get(url, headers=headers)
+                    metrics.http(url, r.status_code, time.perf_counter() - t0, len(r.content))
+                except httpx.TransportError:
+                    metrics.http(url, "error", time.perf_counter() - t0)
+                    if attempt >= self.max_retries:
+                        self.stats["failed"] += 1; raise
+                    r = None
+            if r is not None:
+                if r.status_code == 304 and entry is not None:
+                    self.stats["not_modified"] += 1
+                    return json.loads(self.cache.finish(url, None, entry, 304, r.headers, b"")), False
+                if r.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    if r.is_error: self.stats["failed"] += 1
+                    r.raise_for_status()
+                    return json.loads(self.cache.finish(url, None, entry, r.status_code, r.headers, r.content)), True
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt, r.headers.get("retry-after") if r is not None else None))
+            attempt += 1
+
+    async def get_bootstrap(self): return await self.get_json("bootstrap-static/")
+    async def get_fixtures(self): return await self.get_json("fixtures/")
+    async def get_element_summary(self, pid: int): return await self.get_json(f"element-summary/{int(pid)}/")
+    async def get_event_live(self, gw: int): return await self.get_json(f"event/{int(gw)}/live/")
+
+    async def _bulk(self, keys: Iterable[int], fetch) -> Tuple[Dict[int, Any], Dict[int, str]]:
+        keys = list(keys)
+        results = await asyncio.gather(*(fetch(k) for k in keys), return_exceptions=True)
+        out, errors = {}, {}
+        for k, res in zip(keys, results):
+            if isinstance(res, Exception):
+                errors[k] = f"{type(res).__name__}: {res}"
+            else:
+                out[k] = res[0]
+        return out, errors
+
+    async def element_summaries(self, ids: Iterable[int]):
+        """{id: element-summary} for every id, plus {id: error} for the ones that failed after retries."""
+        return await self._bulk(ids, self.get_element_summary)
+
+    async def events_live(self, gws: Iterable[int]):
+        """{gw: event/{gw}/live} plus {gw: error}."""
+        return await self._bulk(gws, self.get_event_live)
@@ -0,0 +1,133 @@
+"""
+Shared on-disk HTTP response cache for the FPL client and the Understat / FBref scrapers.
+
+Entries are keyed by method + URL + sorted query params and stored as ``<key>.json`` (url,
+status, validators, stored_at) next to ``<key>.body.gz``. Each client wraps its request in
+
+    body, extra_headers, entry = cache.begin(url, params)
+    if body is None:
+        ... send the request with extra_headers (If-None-Match / If-Modified-Since) ...
+        body = cache.finish(url, params, entry, status, headers, content)
+
+Modes: ``normal`` (serve fresh entries, revalidate stale ones), ``refresh`` (always revalidate),
+``offline`` (replay only; a miss raises OfflineCacheMiss, nothing touches the network) and
+``off``. ``FPL_HTTP_CACHE=offline`` in the environment overrides the configured mode, so a
+whole pipeline run can be replayed and benchmarked deterministically.
+"""
+from __future__ import annotations
+import gzip, hashlib, json, os, time
+from typing import Dict, Optional, Tuple
+try:
+    import metrics
+except ImportError:
+    from pipeline import metrics
+
+MODES = ("normal", "refresh", "offline", "off")
+
+class OfflineCacheMiss(RuntimeError):
+    """Offline mode and no recorded response for this request."""
+
+def cache_key(url: str, params: Optional[dict] = None, method: str = "GET") -> str:
+    q = "&".join(f"{k}={params[k]}" for k in sorted(params)) if params else ""
+    return hashlib.sha1(f"{method} {url}?{q}".encode()).hexdigest()
+
+class HttpCache:
+    def __init__(self, root: str = "data/cache/http", *, mode: str = "normal",
+                 default_ttl: float = 3600, ttl: Optional[Dict[str, float]] = None):
+        mode = os.environ.get("FPL_HTTP_CACHE", mode)
+        if mode not in MODES:
+            raise ValueError(f"http cache mode must be one of {MODES}, got {mode!r}")
+        self.root, self.mode, self.default_ttl = root, mode, float(default_ttl)
+        # longest pattern first so 'event/' style specifics beat broad host rules
+        self.rules = sorted(((p, float(s)) for p, s in (ttl or {}).items()), key=lambda r: -len(r[0]))
+        self.stats = {"hit": 0, "revalidated": 0, "miss": 0, "stored": 0}
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "HttpCache":
+        c = cfg.get("http_cache", {})
+        return _shared(c.get("root", "data/cache/http"), c.get("mode", "normal"),
+                       c.get("default_ttl_seconds", 3600), c.get("ttl_seconds", {}))
+
+    def ttl_for(self, url: str) -> float:
+        for pattern, seconds in self.rules:
+            if pattern in url:
+                return seconds
+        return self.default_ttl
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.root, key[:2], key)
+        return base + ".json", base + ".body.gz"
+
+    def lookup(self, url: str, params: Optional[dict] = None) -> Optional[dict]:
+        meta_path, body_path = self._paths(cache_key(url, params))
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            with open(body_path, "rb") as f:
+                entry["body"] = gzip.decompress(f.read())
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def begin(self, url: str, params: Optional[dict] = None):
+        """(cached body or None, conditional headers to send, entry for finish())."""
+        if self.mode == "off":
+            return None, {}, None
+        entry = self.lookup(url, params)
+        if self.mode == "offline":
+            if entry is None:
+                raise OfflineCacheMiss(f"offline: no recorded response for {url} {params or ''}")
+            self.stats["hit"] += 1
+            return entry["body"], {}, entry
+        if entry is None:
+            self.stats["miss"] += 1
+            return None, {}, None
+        if self.mode == "normal" and time.time() - entry["stored_at"] < self.ttl_for(url):
+            self.stats["hit"] += 1
+            return entry["body"], {}, entry
+        headers = {}
+        if entry.get("etag"): headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"): headers["If-Modified-Since"] = entry["last_modified"]
+        return None, headers, entry
+
+    def finish(self, url: str, params: Optional[dict], entry: Optional[dict], status: int, headers, body: bytes) -> bytes:
+        """Record a response; a 304 refreshes ``entry`` and returns its body. Only 200s are stored."""
+        if status == 304 and entry is not None:
+            self.stats["revalidated"] += 1
+            self._write(url, params, {k: v for k, v in entry.items() if k != "body"}, entry["body"])
+            return entry["body"]
+        if self.mode != "off" and status == 200:
+            get = (lambda k: headers.get(k)) if headers is not None else (lambda k: None)
+            meta = {"url": url, "params": params or {}, "status": status,
+                    "etag": get("etag"), "last_modified": get("last-modified"), "content_type": get("content-type")}
+            self._write(url, params, meta, body)
+            self.stats["stored"] += 1
+        return body
+
+    def _write(self, url, params, meta: dict, body: bytes) -> None:
+        meta_path, body_path = self._paths(cache_key(url, params))
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = dict(meta, stored_at=time.time())
+        for path, data in ((body_path, gzip.compress(body, mtime=0)), (meta_path, json.dumps(meta).encode())):
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+_CACHES: Dict[tuple, HttpCache] = {}
+
+@metrics.collector
+def _cache_metrics(reg) -> None:
+    totals: Dict[str, int] = {}
+    for c in _CACHES.values():
+        for k, v in c.stats.items():
+            totals[k] = totals.get(k, 0) + v
+    for k, v in totals.items():
+        reg.set("fpl_http_cache_total", v, result=k)
+
+def _shared(root, mode, default_ttl, ttl) -> HttpCache:
+    """One cache object per configuration and process, so stats add up across clients."""
+    k = (root, os.environ.get("FPL_HTTP_CACHE", mode), float(default_ttl), tuple(sorted(ttl.items())))
+    if k not in _CACHES:
+        _CACHES[k] = HttpCache(root, mode=mode, default_ttl=default_ttl, ttl=ttl)
+    return _CACHES[k]
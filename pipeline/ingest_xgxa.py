@@ -1,23 +1,48 @@
 
 from __future__ import annotations
-import argparse, asyncio, json, os
+import argparse, asyncio, json, os, threading, time
 import pandas as pd
 import numpy as np
-from utils import read_toml
-from mapping import build_player_mapping
+from utils import read_toml, utcnow_str
+from mapping import build_player_mapping, load_crosswalk, load_overrides, save_crosswalk
+from players import player_table
+import metrics
 
 def load_fpl_cache():
+    """The compact player table (pipeline/players.py), with the provider position labels ("GKP") used for blocking."""
     with open("data/cache/bootstrap-static.json","r",encoding="utf-8") as f:
         bs = json.load(f)
-    players = pd.DataFrame(bs["elements"])
-    teams = pd.DataFrame(bs["teams"])[["id","name"]].rename(columns={"id":"team","name":"team_name"})
-    players = players.merge(teams, on="team", how="left")
+    players = player_table(bs)
+    players["position"] = players["position"].cat.rename_categories({"GK": "GKP"})
     return players
 
 async def fetch_understat(cfg):
     from providers.understat_provider import UnderstatProvider
-    prov = UnderstatProvider()
-    raw = await prov.fetch_players(cfg.get("xgxa",{}).get("season", 2024))
+    xcfg = cfg.get("xgxa", {})
+    season = xcfg.get("season", 2024)
+    async with UnderstatProvider() as prov:
+        raw = await prov.fetch_players(season)
+        df = understat_rows(raw)
+        if xcfg.get("match_logs", False):
+            df = await attach_rolling_rates(prov, df, season, xcfg)
+    return df
+
+async def attach_rolling_rates(prov, df, season, xcfg):
+    """Update the per-match table for players with new matches and join their rolling per-90 rates."""
+    from match_logs import rolling_rates, update_match_table, TABLE_PATH
+    min_minutes = float(xcfg.get("min_minutes", 180))
+    eligible = df.loc[df["minutes"] >= min_minutes, "provider_id"]
+    t0 = time.perf_counter()
+    table, fetched, errors = await update_match_table(
+        prov, df, season, xcfg.get("match_table_path", TABLE_PATH),
+        keep_seasons=int(xcfg.get("match_keep_seasons", 2)), only=pd.to_numeric(eligible, errors="coerce").dropna())
+    print(f"Match logs: fetched {fetched} players ({len(errors)} failed) in {time.perf_counter() - t0:.1f}s; "
+          f"table has {len(table)} rows")
+    rates = rolling_rates(table, halflife=float(xcfg.get("ewm_halflife_matches", 5)), last_n=int(xcfg.get("last_n", 6)))
+    df["provider_id"] = pd.to_numeric(df["provider_id"], errors="coerce").fillna(-1).astype(int)
+    return df.merge(rates.drop(columns=["last_match"]).rename(columns={"player_id": "provider_id"}), on="provider_id", how="left")
+
+def understat_rows(raw) -> pd.DataFrame:
 
     rows = []
     if isinstance(raw, dict):
@@ -30,8 +55,11 @@ async def fetch_understat(cfg):
     for p in iterable:
         rows.append({
             "provider": "understat",
+            "provider_id": p.get("id"),
+            "games": p.get("games", 0),
             "player_name": p.get("player_name") or p.get("PLAYER_NAME") or "",
             "team_name": p.get("team_title") or p.get("TEAM_TITLE") or "",
+            "position": p.get("position") or "",
             "minutes": float(p.get("time", 0) or p.get("TIME", 0) or 0),
             "xg": float(p.get("xG", 0) or p.get("xg", 0) or 0),
             "xa": float(p.get("xA", 0) or p.get("xa", 0) or 0),
@@ -42,69 +70,224 @@ async def fetch_understat(cfg):
 def fetch_fbref(cfg):
     from providers.fbref_provider import FBRefProvider
     prov = FBRefProvider()
-    raw = prov.fetch_players()
-    rows = []
-    for rec in raw["players"]:
-        rows.append({
-            "provider": "fbref",
-            "player_name": rec.get("Player", rec.get("player", "")),
-            "team_name": rec.get("Squad", rec.get("squad", "")),
-            "minutes": float(rec.get("min", rec.get("Min", 0)) or 0),
-            "xg": float(rec.get("xg", rec.get("Expected_xG", 0)) or 0),
-            "xa": float(rec.get("xag", rec.get("Expected_xAG", 0)) or 0),
-            "shots": float(rec.get("sh", rec.get("Sh", 0)) or 0),
-        })
-    return pd.DataFrame(rows)
+    t = prov.fetch_players()["table"]
+    path = cfg.get("xgxa", {}).get("fbref_table_path", "data/cache/fbref_players.parquet")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    t.to_parquet(path, index=False)   # full typed multi-page table for feature work
+    xa = t["xg_assist"] if "xg_assist" in t.columns else pd.Series(0.0, index=t.index)
+    minutes = t["minutes"] if "minutes" in t.columns else t["minutes_90s"] * 90   # playing-time page missing
+    return pd.DataFrame({
+        "provider": "fbref",
+        "player_name": t["player"],
+        "team_name": t["team"].astype(str),
+        "position": t["position"].astype(str),
+        "minutes": minutes.astype(float),
+        "xg": t["xg"].astype(float).fillna(0.0),
+        "xa": xa.astype(float).fillna(0.0),
+        "shots": t["shots"].astype(float),
+    })
 
-def compute_rates(df: pd.DataFrame, min_minutes: int) -> pd.DataFrame:
+def compute_rates(df: pd.DataFrame, min_minutes: int, window: str = "season", min_recent_minutes: float = 270) -> pd.DataFrame:
     df = df.copy()
     df["minutes"] = pd.to_numeric(df["minutes"], errors="coerce").fillna(0)
     df = df[df["minutes"] >= float(min_minutes)]
     per90 = (df["minutes"] / 90.0).replace(0, np.nan)
     df["xg_per90"] = df["xg"] / per90
     df["xa_per90"] = df["xa"] / per90
+    # recency-weighted rates from match logs replace season rates where enough recent minutes back them
+    if window in ("ewm", "last_n") and f"xg_per90_{window}" in df.columns:
+        df["xg_per90_season"], df["xa_per90_season"] = df["xg_per90"], df["xa_per90"]
+        ok = pd.to_numeric(df[f"minutes_{window}"], errors="coerce").fillna(0) >= min_recent_minutes
+        df["xg_per90"] = df["xg_per90"].where(~ok, df[f"xg_per90_{window}"])
+        df["xa_per90"] = df["xa_per90"].where(~ok, df[f"xa_per90_{window}"])
     return df.replace([np.inf, -np.inf], np.nan).fillna(0.0)
 
+# ============================================================
+# Provider registry: concurrent fetch, health, merge
+# ============================================================
+PROVIDERS = {"understat": fetch_understat, "fbref": fetch_fbref}
+RATE_COLS = ["xg_per90", "xa_per90", "xg_per90_season", "xa_per90_season"]
+
+def register_provider(name: str, fetch) -> None:
+    """``fetch(cfg)`` returns (or, if async, resolves to) provider rows: player_name, team_name,
+    position, minutes, xg, xa. Sync fetchers run on a daemon thread so a timeout never waits on them."""
+    PROVIDERS[name] = fetch
+
+def _in_daemon_thread(fn, *args):
+    loop = asyncio.get_running_loop()
+    fut = loop.create_future()
+    def run():
+        try:
+            res = fn(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_exception(e))
+        else:
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(res))
+    threading.Thread(target=run, daemon=True, name="xgxa-provider").start()
+    return fut
+
+async def _fetch_one(name, cfg, timeout):
+    t0 = time.perf_counter()
+    fetch = PROVIDERS[name]
+    try:
+        aw = fetch(cfg) if asyncio.iscoroutinefunction(fetch) else _in_daemon_thread(fetch, cfg)
+        df = await asyncio.wait_for(aw, timeout)
+        if df is None or len(df) == 0:
+            raise RuntimeError("no rows")
+        return name, df, {"ok": True, "rows": int(len(df)), "latency_s": round(time.perf_counter() - t0, 2), "error": None}
+    except Exception as e:
+        err = "timeout" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+        return name, None, {"ok": False, "rows": 0, "latency_s": round(time.perf_counter() - t0, 2), "error": err}
+
+async def fetch_providers(names, cfg, timeout):
+    """Fetch every provider at once; wall time is the slowest provider (capped by ``timeout``), not the sum."""
+    res = await asyncio.gather(*(_fetch_one(n, cfg, timeout) for n in names))
+    return {n: df for n, df, _ in res if df is not None}, {n: h for n, _, h in res}
+
+def write_health(health: dict, path: str) -> None:
+    """Latest status per provider plus running failure streak / last success."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            prev = json.load(f)
+    except (OSError, ValueError):
+        prev = {}
+    now = utcnow_str()
+    for name, h in health.items():
+        p = prev.get(name, {})
+        h["checked_at"] = now
+        h["consecutive_failures"] = 0 if h["ok"] else int(p.get("consecutive_failures", 0)) + 1
+        h["last_ok"] = now if h["ok"] else p.get("last_ok")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**prev, **health}, f, indent=2)
+
+def save_frames(frames: dict, names, raw_dir: str) -> None:
+    """Provider rows as fetched, one parquet per provider, for a later ``--stage map``; failed providers are dropped."""
+    os.makedirs(raw_dir, exist_ok=True)
+    for name in names:
+        path = os.path.join(raw_dir, f"{name}.parquet")
+        if name in frames:
+            frames[name].to_parquet(path, index=False)
+        elif os.path.exists(path):
+            os.remove(path)
+
+def load_frames(names, raw_dir: str) -> dict:
+    paths = {n: os.path.join(raw_dir, f"{n}.parquet") for n in names}
+    return {n: pd.read_parquet(p) for n, p in paths.items() if os.path.exists(p)}
+
+def map_provider(df_fpl, df_prov, provider, cfg) -> pd.DataFrame:
+    """Per-90 rates for one provider, mapped to FPL ids (team-blocked, crosswalk + manual overrides)."""
+    xcfg = cfg.get("xgxa", {})
+    df_prov = compute_rates(df_prov, xcfg.get("min_minutes", 180), xcfg.get("rate_window", "season"),
+                            xcfg.get("min_recent_minutes", 270)).reset_index(drop=True)
+    crosswalk_path = xcfg.get("crosswalk_path", "data/cache/xgxa_crosswalk.csv")
+    t0 = time.perf_counter()
+    df_map = build_player_mapping(
+        df_fpl, df_prov, "player_name",
+        provider_team_col="team_name",
+        provider_position_col="position" if xcfg.get("block_by_position", False) else None,
+        crosswalk=load_crosswalk(crosswalk_path),
+        overrides=load_overrides(xcfg.get("overrides_path"), provider),
+        provider=provider,
+        cutoff=xcfg.get("name_cutoff", 86),
+        cross_team_cutoff=xcfg.get("cross_team_cutoff", 95),
+    )
+    counts = df_map["method"].replace("", "unmatched").value_counts().to_dict()
+    print(f"{provider}: matched players in {time.perf_counter() - t0:.2f}s: {counts}")
+    for method, n in counts.items():
+        metrics.gauge("fpl_xgxa_players_matched", n, provider=provider, method=method)
+    metrics.gauge("fpl_xgxa_match_rate", (df_map["method"] != "").mean() if len(df_map) else 0.0, provider=provider)
+    save_crosswalk(df_map, crosswalk_path, provider)
+
+    idx = df_map["provider_index"].to_numpy()
+    out = df_map[["fpl_id", "fpl_name", "match_score"]].copy()
+    for c in RATE_COLS:
+        src = df_prov[c] if c in df_prov.columns else df_prov[c.replace("_season", "")]
+        out[c] = np.where(idx >= 0, src.to_numpy()[np.maximum(idx, 0)], np.nan)
+    return out
+
+def merge_providers(tables: dict, order, mode: str = "precedence", weights=None) -> pd.DataFrame:
+    """
+    One row per FPL id. ``precedence``: rates from the first provider in ``order`` that matched
+    the player. ``weighted``: weighted mean over the providers that matched (weights renormalised
+    per player). ``source`` records which providers contributed.
+    """
+    order = [n for n in order if n in tables]
+    base = tables[order[0]][["fpl_id", "fpl_name"]].copy()
+    ids = base["fpl_id"].to_numpy()
+    got = {n: tables[n].set_index("fpl_id").reindex(ids) for n in order}
+    has = {n: got[n]["xg_per90"].notna().to_numpy() for n in order}
+    out = base
+    if mode == "weighted":
+        w = {n: float((weights or {}).get(n, 1.0)) for n in order}
+        tot = sum(np.where(has[n], w[n], 0.0) for n in order)
+        for c in RATE_COLS + ["match_score"]:
+            acc = sum(np.where(has[n], w[n] * got[n][c].fillna(0).to_numpy(), 0.0) for n in order)
+            out[c] = np.where(tot > 0, acc / np.where(tot > 0, tot, 1), np.nan)
+        out["source"] = ["+".join(n for n in order if has[n][i]) for i in range(len(ids))]
+    else:
+        for c in RATE_COLS + ["match_score"]:
+            out[c] = np.nan
+        out["source"] = ""
+        for n in reversed(order):   # earlier providers overwrite later ones
+            m = has[n]
+            for c in RATE_COLS + ["match_score"]:
+                out.loc[m, c] = got[n][c].to_numpy()[m]
+            out.loc[m, "source"] = n
+    for n in order:   # per-source columns for inspection
+        out[f"xg_per90_{n}"], out[f"xa_per90_{n}"] = got[n]["xg_per90"].to_numpy(), got[n]["xa_per90"].to_numpy()
+    return out
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--config", default="configs/config.toml")
     ap.add_argument("--season", type=int)
+    ap.add_argument("--providers", nargs="*", default=None, help="override [xgxa] providers (in precedence order)")
+    ap.add_argument("--stage", choices=["all", "fetch", "map"], default="all",
+                    help="fetch: providers only (no FPL data needed); map: match the last fetch to bootstrap")
     args = ap.parse_args()
 
     cfg = read_toml(args.config)
-    provider = cfg.get("xgxa", {}).get("provider", "understat").lower()
+    xcfg = cfg.setdefault("xgxa", {})
+    names = [n.lower() for n in (args.providers or xcfg.get("providers") or [xcfg.get("provider", "understat")])]
+    unknown = [n for n in names if n not in PROVIDERS]
+    if unknown:
+        raise SystemExit(f"Unknown xG/xA provider(s) {unknown}; registered: {sorted(PROVIDERS)}")
     if args.season is not None:
-        cfg["xgxa"]["season"] = args.season
+        xcfg["season"] = args.season
 
-    df_fpl = load_fpl_cache()
+    raw_dir = xcfg.get("raw_frames_dir", "data/cache/xgxa_raw")
+    if args.stage in ("all", "fetch"):
+        t0 = time.perf_counter()
+        frames, health = asyncio.run(fetch_providers(names, cfg, float(xcfg.get("provider_timeout_seconds", 180))))
+        for n in names:
+            h = health[n]
+            print(f"{n}: {'ok' if h['ok'] else 'FAILED'} in {h['latency_s']}s, {h['rows']} rows" + (f" ({h['error']})" if h["error"] else ""))
+        print(f"Providers fetched in {time.perf_counter() - t0:.1f}s")
+        write_health(health, xcfg.get("health_path", "data/cache/xgxa_provider_health.json"))
+        save_frames(frames, names, raw_dir)
+        if args.stage == "fetch":
+            return
+    else:
+        frames = load_frames(names, raw_dir)
 
-    try:
-        if provider == "understat":
-            df_prov = asyncio.run(fetch_understat(cfg))
-        else:
-            df_prov = fetch_fbref(cfg)
-    except Exception as e:
-        print("Phase 2 warning:", e)
+    df_fpl = load_fpl_cache()
+    os.makedirs("data/cache", exist_ok=True)
+    if not frames and args.stage == "map" and os.path.exists("data/cache/xgxa_players.csv"):
+        print(f"No provider frames in {raw_dir}; kept data/cache/xgxa_players.csv.")
+        return
+    if not frames:
+        print("Phase 2 warning: every provider failed.")
         print("Falling back to an empty xG/xA file so you can proceed.")
-        os.makedirs("data/cache", exist_ok=True)
         pd.DataFrame(columns=["fpl_id","fpl_name","xg_per90","xa_per90"]).to_csv("data/cache/xgxa_players.csv", index=False)
         return
 
-    df_prov = compute_rates(df_prov, cfg.get("xgxa", {}).get("min_minutes", 180))
-
-    # Map provider names to FPL players
-    df_prov["name"] = df_prov["player_name"].astype(str)
-    df_map = build_player_mapping(df_fpl, df_prov.rename(columns={"name":"provider_name"}), "provider_name")
-
-    # Simple join on normalized name
-    df_prov["name_norm"] = df_prov["player_name"].str.lower().str.replace("-", " ", regex=False).str.replace(".", "", regex=False).str.strip()
-    df_map["provider_match_name_norm"] = df_map["provider_match_name"].str.lower().str.strip()
-    joined = df_map.merge(df_prov, left_on="provider_match_name_norm", right_on="name_norm", how="left")
-
-    out = joined[["fpl_id","fpl_name","xg_per90","xa_per90","match_score"]].copy().fillna(0.0)
-    os.makedirs("data/cache", exist_ok=True)
+    tables = {n: map_provider(df_fpl, frames[n], n, cfg) for n in names if n in frames}
+    out = merge_providers(tables, names, xcfg.get("merge", "precedence"), xcfg.get("weights"))
+    out = out.fillna({c: 0.0 for c in RATE_COLS + ["match_score"]})
     out.to_csv("data/cache/xgxa_players.csv", index=False)
-    print("Wrote data/cache/xgxa_players.csv using provider:", provider)
+    print(f"Wrote data/cache/xgxa_players.csv from {', '.join(tables)} ({xcfg.get('merge', 'precedence')}):",
+          out["source"].replace("", "none").value_counts().to_dict())
 
 if __name__ == "__main__":
     main()
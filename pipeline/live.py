@@ -0,0 +1,272 @@
+"""
+Live gameweek mode.
+
+LiveState keeps live points per player and the remaining EP of the GW, built from the
+per-fixture rows of data/cache/ep_components.csv. A poll brings ``event/{gw}/live`` and the GW's
+fixtures; only players whose stats signature changed are touched, and only the component rows
+of fixtures whose status moved are re-scaled. Remaining EP for a fixture is its EP times the
+share not yet played (1 before kick-off, 1 - minutes/90 in play, 0 once finished).
+
+LiveFeed polls the FPL API with its own ETag / Last-Modified per URL (a 304 means "nothing
+new"); ReplayFeed plays back frames recorded with ``--record``. LiveTracker wraps a feed and a
+state behind a lock and a minimum poll interval so every app session shares one poller.
+
+    python pipeline/live.py --gw 7 --polls 20 --interval 30 [--record data/live/gw7]
+    python pipeline/live.py --gw 7 --replay data/live/gw7 --interval 0
+"""
+from __future__ import annotations
+import argparse, glob, json, os, threading, time
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import httpx
+try:
+    from utils import read_toml
+except ImportError:  # imported from the app as pipeline.live
+    from pipeline.utils import read_toml
+
+BASE_URL = "https://fantasy.premierleague.com/api/"
+SIG_STATS = ("minutes", "total_points", "goals_scored", "assists", "clean_sheets", "bonus", "bps", "saves")
+
+def _frac_left(fx: dict) -> float:
+    if fx.get("finished") or fx.get("finished_provisional"):
+        return 0.0
+    if not fx.get("started"):
+        return 1.0
+    return max(0.0, 1.0 - float(fx.get("minutes") or 0) / 90.0)
+
+class LiveState:
+    def __init__(self, comp: pd.DataFrame, gw: int):
+        self.gw = int(gw)
+        c = comp[comp["event"] == self.gw] if "event" in comp.columns else comp.iloc[0:0]
+        self.r_pid = c["id"].to_numpy(np.int64)
+        self.r_fixture = c["fixture"].to_numpy(np.int64)
+        self.r_ep = c["ep"].to_numpy(np.float64)
+        self.r_left = np.ones(len(c))
+        self.rows_by_fixture: Dict[int, np.ndarray] = {int(f): np.flatnonzero(self.r_fixture == f) for f in np.unique(self.r_fixture)}
+        self.rows_by_player: Dict[int, np.ndarray] = {int(p): np.flatnonzero(self.r_pid == p) for p in np.unique(self.r_pid)}
+        self.remaining: Dict[int, float] = {p: float(self.r_ep[r].sum()) for p, r in self.rows_by_player.items()}
+        self.points: Dict[int, int] = {}
+        self.minutes: Dict[int, int] = {}
+        self._sig: Dict[int, tuple] = {}
+        self._fx: Dict[int, tuple] = {}
+        self.fixtures: Dict[int, dict] = {}
+
+    # ---------------- updates ----------------
+    def apply_live(self, payload: dict) -> set:
+        """event/{gw}/live: update players whose stats signature changed; returns their ids."""
+        changed = set()
+        for e in payload.get("elements") or []:
+            s = e.get("stats") or {}
+            sig = tuple(s.get(k, 0) for k in SIG_STATS)
+            pid = int(e["id"])
+            if self._sig.get(pid) != sig:
+                self._sig[pid] = sig
+                self.points[pid] = int(s.get("total_points", 0) or 0)
+                self.minutes[pid] = int(s.get("minutes", 0) or 0)
+                changed.add(pid)
+        return changed
+
+    def apply_fixtures(self, fixtures: Iterable[dict]) -> set:
+        """Fixture status/minutes: re-scale remaining EP rows of fixtures that moved; returns affected players."""
+        changed = set()
+        for fx in fixtures:
+            if int(fx.get("event") or -1) != self.gw:
+                continue
+            fid = int(fx["id"])
+            key = (bool(fx.get("started")), bool(fx.get("finished") or fx.get("finished_provisional")), int(fx.get("minutes") or 0))
+            self.fixtures[fid] = fx
+            if self._fx.get(fid) == key:
+                continue
+            self._fx[fid] = key
+            rows = self.rows_by_fixture.get(fid)
+            if rows is None or not len(rows):
+                continue
+            self.r_left[rows] = _frac_left(fx)
+            for pid in np.unique(self.r_pid[rows]):
+                pr = self.rows_by_player[int(pid)]
+                self.remaining[int(pid)] = float((self.r_ep[pr] * self.r_left[pr]).sum())
+                changed.add(int(pid))
+        return changed
+
+    # ---------------- reads ----------------
+    def player(self, pid: int) -> dict:
+        pid = int(pid)
+        pts, rem = self.points.get(pid, 0), self.remaining.get(pid, 0.0)
+        return {"points": pts, "minutes": self.minutes.get(pid, 0), "remaining_ep": rem, "projected": pts + rem}
+
+    def did_not_play(self, pid: int) -> bool:
+        """Every fixture of ``pid`` this GW finished (or there is none) and no minutes: FPL's 'did not play'."""
+        pid = int(pid)
+        rows = self.rows_by_player.get(pid)
+        fixtures = self.r_fixture[rows] if rows is not None else ()
+        done = all(self._fx.get(int(f), (False, False, 0))[1] for f in fixtures)
+        return done and self.minutes.get(pid, 0) == 0
+
+    def squad(self, xi: List[int], captain: Optional[int] = None, vice: Optional[int] = None,
+              bench: Iterable[int] = ()) -> dict:
+        """
+        Live and projected totals for a starting XI, the armband's points doubled: the captain's, or
+        the vice's once the captain did not play (as FPL scores it); bench reported separately.
+        """
+        armband = vice if captain is not None and vice is not None and self.did_not_play(captain) else captain
+        live = sum(self.points.get(int(p), 0) * (2 if p == armband else 1) for p in xi)
+        rem = sum(self.remaining.get(int(p), 0.0) * (2 if p == armband else 1) for p in xi)
+        return {"live": live, "remaining_ep": rem, "projected": live + rem, "armband": armband,
+                "bench_live": sum(self.points.get(int(p), 0) for p in bench)}
+
+# ============================================================
+# Feeds
+# ============================================================
+class LiveFeed:
+    """Conditional polling of event live + the GW's fixtures. poll() -> (live|None, fixtures|None)."""
+    def __init__(self, gw: int, base_url: str = BASE_URL, timeout: float = 10, headers=None,
+                 record_dir: Optional[str] = None, transport=None):
+        self.gw = int(gw)
+        self.base_url = base_url.rstrip("/") + "/"
+        self.client = httpx.Client(timeout=timeout, headers=headers or {"User-Agent": "FPL-Analytics"}, transport=transport)
+        self._validators: Dict[str, dict] = {}
+        self.record_dir, self._seq = record_dir, 0
+
+    def _get(self, path: str):
+        url = self.base_url + path
+        r = self.client.get(url, headers=self._validators.get(url, {}))
+        if r.status_code == 304:
+            return None
+        r.raise_for_status()
+        v = {}
+        if r.headers.get("etag"): v["If-None-Match"] = r.headers["etag"]
+        if r.headers.get("last-modified"): v["If-Modified-Since"] = r.headers["last-modified"]
+        self._validators[url] = v
+        return r.json()
+
+    def poll(self) -> Tuple[Optional[dict], Optional[list]]:
+        live = self._get(f"event/{self.gw}/live/")
+        fixtures = self._get(f"fixtures/?event={self.gw}")
+        if self.record_dir and (live is not None or fixtures is not None):
+            self._seq += 1
+            os.makedirs(self.record_dir, exist_ok=True)
+            for name, obj in (("live", live), ("fixtures", fixtures)):
+                if obj is not None:
+                    with open(os.path.join(self.record_dir, f"{name}_{self._seq:04d}.json"), "w", encoding="utf-8") as f:
+                        json.dump(obj, f)
+        return live, fixtures
+
+class ReplayFeed:
+    """Plays back live_NNNN.json / fixtures_NNNN.json frames; a missing file means 'unchanged'."""
+    def __init__(self, directory: str):
+        seqs = {int(os.path.basename(p).split("_")[1].split(".")[0]) for p in glob.glob(os.path.join(directory, "*_[0-9]*.json"))}
+        self.dir, self.frames, self._i = directory, sorted(seqs), 0
+
+    def _load(self, name: str, seq: int):
+        path = os.path.join(self.dir, f"{name}_{seq:04d}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @property
+    def exhausted(self) -> bool:
+        return self._i >= len(self.frames)
+
+    def poll(self):
+        if self.exhausted:
+            return None, None
+        seq = self.frames[self._i]
+        self._i += 1
+        return self._load("live", seq), self._load("fixtures", seq)
+
+class LiveTracker:
+    """One feed + state per process; tick() polls at most every ``min_interval`` seconds."""
+    def __init__(self, state: LiveState, feed, min_interval: float = 30.0):
+        self.state, self.feed, self.min_interval = state, feed, float(min_interval)
+        self.lock = threading.Lock()
+        self.last_poll = 0.0
+        self.last = {"changed": 0, "players": set(), "ms": 0.0, "polls": 0, "error": None, "at": None}
+
+    def tick(self) -> dict:
+        with self.lock:
+            if time.time() - self.last_poll < self.min_interval:
+                return self.last
+            self.last_poll = time.time()
+            try:
+                live, fixtures = self.feed.poll()
+                t0 = time.perf_counter()
+                changed = set()
+                if fixtures is not None:
+                    changed |= self.state.apply_fixtures(fixtures)
+                if live is not None:
+                    changed |= self.state.apply_live(live)
+                self.last = {"changed": len(changed), "players": changed, "ms": (time.perf_counter() - t0) * 1000,
+                             "polls": self.last["polls"] + 1, "error": None, "at": time.strftime("%H:%M:%S")}
+            except Exception as e:   # keep the last good state on screen
+                self.last = dict(self.last, error=f"{type(e).__name__}: {e}")
+            return self.last
+
+def live_settings(config_path: str = "configs/config.toml") -> dict:
+    """[live] settings plus the API base URL; ``FPL_LIVE_REPLAY`` overrides ``replay_dir``."""
+    cfg = read_toml(config_path, {})
+    lv = cfg.get("live", {})
+    return {"poll_seconds": float(lv.get("poll_seconds", 30)),
+            "replay_dir": os.environ.get("FPL_LIVE_REPLAY", lv.get("replay_dir", "")),
+            "base_url": cfg.get("network", {}).get("base_url", BASE_URL)}
+
+def load_components(path: str = "data/cache/ep_components.csv") -> pd.DataFrame:
+    if os.path.exists(path):
+        return pd.read_csv(path, usecols=["id", "fixture", "event", "ep"])
+    return pd.DataFrame(columns=["id", "fixture", "event", "ep"])
+
+def live_gw(bs: dict) -> int:
+    """The GW in play: is_current, else the next one."""
+    for e in bs.get("events", []):
+        if e.get("is_current"):
+            return int(e["id"])
+    nxt = [int(e["id"]) for e in bs.get("events", []) if e.get("is_next")]
+    return nxt[0] if nxt else 1
+
+def current_gw(bootstrap_path: str = "data/cache/bootstrap-static.json", default: int = 1) -> int:
+    try:
+        with open(bootstrap_path, "r", encoding="utf-8") as f:
+            return live_gw(json.load(f))
+    except FileNotFoundError:
+        return default
+
+def main():
+    ap = argparse.ArgumentParser(description="Live GW points + remaining EP")
+    ap.add_argument("--gw", type=int, default=None)
+    ap.add_argument("--components", default="data/cache/ep_components.csv")
+    ap.add_argument("--state", default="data/user_state/state.json", help="squad (starters/captain) to total")
+    ap.add_argument("--base-url", default=BASE_URL)
+    ap.add_argument("--replay", default=None, help="directory of recorded frames")
+    ap.add_argument("--record", default=None, help="write changed payloads here")
+    ap.add_argument("--interval", type=float, default=30.0)
+    ap.add_argument("--polls", type=int, default=0, help="stop after N polls (0 = until replay ends / Ctrl-C)")
+    args = ap.parse_args()
+
+    gw = args.gw or current_gw()
+    state = LiveState(load_components(args.components), gw)
+    feed = ReplayFeed(args.replay) if args.replay else LiveFeed(gw, args.base_url, record_dir=args.record)
+    tracker = LiveTracker(state, feed, min_interval=0)
+    squad = {}
+    if os.path.exists(args.state):
+        with open(args.state, "r", encoding="utf-8-sig") as f:
+            squad = json.load(f)
+    xi, cap, vice = squad.get("starters") or [], squad.get("captain"), squad.get("vice")
+
+    n = 0
+    while True:
+        info = tracker.tick()
+        n += 1
+        tot = state.squad(xi, cap, vice) if xi else None
+        msg = f"GW{gw} poll {n}: {info['changed']} players changed, applied in {info['ms']:.2f} ms"
+        if tot:
+            msg += f" | squad live {tot['live']} + {tot['remaining_ep']:.1f} xP left = {tot['projected']:.1f}"
+        if info["error"]:
+            msg += f" | error: {info['error']}"
+        print(msg, flush=True)
+        if (args.polls and n >= args.polls) or getattr(feed, "exhausted", False):
+            break
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
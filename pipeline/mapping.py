@@ -1,22 +1,181 @@
-
 from __future__ import annotations
+import os, unicodedata
+from typing import Optional
+import numpy as np
 import pandas as pd
 from rapidfuzz import process, fuzz
 
 def normalize_name(s: str) -> str:
     if not isinstance(s, str): return ""
-    return " ".join(s.lower().replace("-", " ").replace(".", "").split())
-
-def build_player_mapping(df_fpl: pd.DataFrame, df_provider: pd.DataFrame, provider_name_col: str) -> pd.DataFrame:
-    prov_names = df_provider[provider_name_col].fillna("").astype(str).map(normalize_name).tolist()
-    rows = []
-    for _, r in df_fpl.iterrows():
-        nm = normalize_name(f"{r.get('first_name','')} {r.get('second_name','')}")
-        match = process.extractOne(nm, prov_names, scorer=fuzz.WRatio, score_cutoff=86)
-        rows.append({
-            "fpl_id": r["id"],
-            "fpl_name": f"{r.get('first_name','')} {r.get('second_name','')}".strip(),
-            "provider_match_name": match[0] if match else "",
-            "match_score": match[1] if match else 0,
-        })
-    return pd.DataFrame(rows)
+    s = "".join(ch for ch in unicodedata.normalize("NFKD", s) if not unicodedata.combining(ch))
+    return " ".join(s.lower().replace("-", " ").replace(".", "").replace("'", "").split())
+
+# FPL short names and provider spellings -> one key per club
+TEAM_ALIASES = {
+    "man city": "manchester city", "man utd": "manchester united", "manchester utd": "manchester united",
+    "spurs": "tottenham", "tottenham hotspur": "tottenham", "nottm forest": "nottingham forest",
+    "nottham forest": "nottingham forest", "wolves": "wolverhampton wanderers",
+    "newcastle": "newcastle united", "newcastle utd": "newcastle united", "brighton and hove albion": "brighton",
+    "brighton & hove albion": "brighton", "west ham united": "west ham", "ipswich town": "ipswich",
+    "leicester city": "leicester", "leeds united": "leeds", "afc bournemouth": "bournemouth",
+    "sheffield utd": "sheffield united", "luton town": "luton",
+}
+
+def normalize_team(s: str) -> str:
+    t = normalize_name(s)
+    return TEAM_ALIASES.get(t, t)
+
+# provider position tokens -> FPL positions (Understat 'F M S', FBref 'FW,MF')
+_POS_TOKENS = {"gk": "GKP", "d": "DEF", "df": "DEF", "m": "MID", "mf": "MID", "f": "FWD", "fw": "FWD"}
+
+def provider_positions(s) -> frozenset:
+    if not isinstance(s, str): return frozenset()
+    return frozenset(_POS_TOKENS[t] for t in s.lower().replace(",", " ").split() if t in _POS_TOKENS)
+
+CROSSWALK_COLS = ["fpl_id", "provider", "fpl_key", "provider_match_name", "provider_team", "match_score", "method"]
+
+def load_crosswalk(path: Optional[str]) -> pd.DataFrame:
+    if path and os.path.exists(path):
+        return pd.read_csv(path, dtype={"provider_match_name": str, "provider_team": str}, keep_default_na=False)
+    return pd.DataFrame(columns=CROSSWALK_COLS)
+
+def save_crosswalk(df_map: pd.DataFrame, path: str, provider: str) -> None:
+    """Persist matched rows for ``provider``; other providers' rows in the file are kept."""
+    old = load_crosswalk(path)
+    new = df_map.loc[df_map["provider_match_name"] != "", [c for c in CROSSWALK_COLS if c != "provider"]].assign(provider=provider)
+    out = pd.concat([old[old["provider"] != provider], new[CROSSWALK_COLS]], ignore_index=True)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    out.to_csv(path, index=False)
+
+def load_overrides(path: Optional[str], provider: str) -> dict:
+    """{fpl_id: provider_name} from a CSV with fpl_id, provider, provider_name; a blank name forces 'no match'."""
+    if not path or not os.path.exists(path):
+        return {}
+    o = pd.read_csv(path, dtype=str, keep_default_na=False, comment="#")
+    o = o[(o.get("provider", "") == "") | (o.get("provider", "") == provider)] if "provider" in o else o
+    return {int(r.fpl_id): r.provider_name for r in o.itertuples()}
+
+def _score_block(keys_a, keys_b, cand_names, cutoff):
+    """cdist over every key variant of the FPL players, max per pair."""
+    S = None
+    for keys in (keys_a, keys_b):
+        M = process.cdist(keys, cand_names, scorer=fuzz.WRatio, score_cutoff=cutoff, workers=-1, dtype=np.uint8)
+        S = M if S is None else np.maximum(S, M)
+    return S
+
+def build_player_mapping(
+    df_fpl: pd.DataFrame,
+    df_provider: pd.DataFrame,
+    provider_name_col: str,
+    *,
+    provider_team_col: Optional[str] = None,
+    provider_position_col: Optional[str] = None,
+    fpl_team_col: str = "team_name",
+    crosswalk: Optional[pd.DataFrame] = None,
+    overrides: Optional[dict] = None,
+    provider: str = "",
+    cutoff: float = 86,
+    cross_team_cutoff: float = 95,
+) -> pd.DataFrame:
+    """
+    FPL id -> provider row. Order of resolution per FPL player:
+      1. manual override (``overrides``; '' means leave unmatched)
+      2. crosswalk entry whose FPL name/team key is unchanged and whose provider name still exists
+      3. fuzzy match (WRatio on full name and web_name, rapidfuzz cdist) inside the player's team
+         block (and position block when ``provider_position_col`` is given), at ``cutoff``
+      4. fuzzy match across all teams at the stricter ``cross_team_cutoff`` (transfers, promoted clubs)
+    Each provider row is assigned at most once, best score first.
+    Returns fpl_id, fpl_name, provider_match_name, provider_team, provider_index, match_score, method, fpl_key.
+    """
+    fpl = df_fpl.reset_index(drop=True)
+    n = len(fpl)
+    first = fpl.get("first_name", pd.Series("", index=fpl.index)).fillna("").astype(str)
+    second = fpl.get("second_name", pd.Series("", index=fpl.index)).fillna("").astype(str)
+    full = (first + " " + second).str.strip()
+    key_full = full.map(normalize_name).tolist()
+    key_web = fpl.get("web_name", full).fillna("").astype(str).map(normalize_name).tolist()
+    # astype(object) first: the player table's team_name / position are categorical, and fillna("") on
+    # a categorical raises when "" is not a category (unknown team id or element_type)
+    fpl_team = fpl.get(fpl_team_col, pd.Series("", index=fpl.index)).astype(object).fillna("").astype(str).map(normalize_team).to_numpy()
+    fpl_pos = fpl.get("position", pd.Series("", index=fpl.index)).astype(object).fillna("").astype(str).to_numpy()
+    fpl_key = [f"{k}|{t}" for k, t in zip(key_full, fpl_team)]
+
+    prov_raw = df_provider[provider_name_col].fillna("").astype(str).tolist()
+    prov_names = [normalize_name(x) for x in prov_raw]
+    prov_team_raw = (df_provider[provider_team_col].fillna("").astype(str).tolist()
+                     if provider_team_col else [""] * len(prov_raw))
+    prov_teams = [frozenset(normalize_team(t) for t in s.split(",") if t.strip()) for s in prov_team_raw]
+    prov_pos = ([provider_positions(x) for x in df_provider[provider_position_col].tolist()]
+                if provider_position_col else [frozenset()] * len(prov_raw))
+    by_name = {}
+    for j, nm in enumerate(prov_names):
+        by_name.setdefault(nm, j)
+
+    match = np.full(n, -1, dtype=np.int64)
+    score = np.zeros(n, dtype=float)
+    method = np.array([""] * n, dtype=object)
+    taken = np.zeros(len(prov_names), dtype=bool)
+
+    def claim(i, j, s, how):
+        match[i], score[i], method[i] = j, s, how
+        taken[j] = True
+
+    # 1) overrides, 2) crosswalk
+    overrides = overrides or {}
+    locked = np.zeros(n, dtype=bool)
+    ids = fpl["id"].astype(int).to_numpy()
+    for i, pid in enumerate(ids):
+        if pid in overrides:
+            locked[i] = True
+            j = by_name.get(normalize_name(overrides[pid]))
+            if j is not None and not taken[j]:
+                claim(i, j, 100.0, "override")
+    if crosswalk is not None and len(crosswalk):
+        cw = crosswalk[crosswalk["provider"] == provider] if provider and "provider" in crosswalk else crosswalk
+        known = {(int(r.fpl_id), r.fpl_key): (r.provider_match_name, float(r.match_score)) for r in cw.itertuples()}
+        for i, pid in enumerate(ids):
+            hit = None if locked[i] else known.get((pid, fpl_key[i]))
+            j = by_name.get(normalize_name(hit[0])) if hit else None
+            if j is not None and not taken[j]:
+                claim(i, j, hit[1], "crosswalk")
+                locked[i] = True
+
+    # 3) team (+ position) blocks, 4) cross-team fallback; greedy one-to-one by score
+    def resolve(rows, cols, cut, how):
+        if not len(rows) or not len(cols):
+            return
+        S = _score_block([key_full[i] for i in rows], [key_web[i] for i in rows], [prov_names[j] for j in cols], cut)
+        if provider_position_col:
+            ok = np.array([[not prov_pos[j] or fpl_pos[i] in prov_pos[j] for j in cols] for i in rows])
+            S = np.where(ok, S, 0)
+        r, c = np.nonzero(S)
+        for k in np.argsort(-S[r, c], kind="stable"):
+            i, j = rows[r[k]], cols[c[k]]
+            if match[i] < 0 and not taken[j]:
+                claim(i, j, float(S[r[k], c[k]]), how)
+
+    todo = np.flatnonzero(~locked)
+    if provider_team_col:
+        team_rows = {}
+        for j, ts in enumerate(prov_teams):
+            for t in ts:
+                team_rows.setdefault(t, []).append(j)
+        for t in np.unique(fpl_team[todo]):
+            rows = [i for i in todo if fpl_team[i] == t and match[i] < 0]
+            resolve(rows, [j for j in team_rows.get(t, []) if not taken[j]], cutoff, "team")
+        rest = [i for i in todo if match[i] < 0]
+        resolve(rest, np.flatnonzero(~taken).tolist(), cross_team_cutoff, "cross_team")
+    else:
+        resolve(todo.tolist(), np.flatnonzero(~taken).tolist(), cutoff, "fuzzy")
+
+    has = match >= 0
+    return pd.DataFrame({
+        "fpl_id": ids,
+        "fpl_name": full.to_numpy(),
+        "provider_match_name": np.where(has, [prov_raw[j] if j >= 0 else "" for j in match], ""),
+        "provider_team": np.where(has, [prov_team_raw[j] if j >= 0 else "" for j in match], ""),
+        "provider_index": match,
+        "match_score": np.where(has, score, 0.0),
+        "method": method,
+        "fpl_key": fpl_key,
+    })
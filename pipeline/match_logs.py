@@ -0,0 +1,121 @@
+"""
+Per-match Understat xG/xA table and rolling per-90 rates.
+
+The table (data/cache/understat_matches.parquet) holds one row per player per league match,
+typed columns only. Each run compares the league page's ``games`` count per player with the
+rows already stored for that season and fetches match logs only for players with new matches.
+Rolling rates are computed over the whole table at once: per-player ages (0 = most recent
+match) drive exponential weights (``halflife`` in matches) and a last-N mask; sums are
+bincounts over player codes, so there is no per-player Python loop.
+"""
+from __future__ import annotations
+import os
+from typing import Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+
+TABLE_PATH = "data/cache/understat_matches.parquet"
+INT_COLS = {"player_id": "int32", "match_id": "int64", "season": "int16", "minutes": "int16",
+            "goals": "int16", "assists": "int16", "shots": "int16", "key_passes": "int16"}
+FLOAT_COLS = {"xg": "float32", "xa": "float32", "npxg": "float32"}
+CAT_COLS = ["h_team", "a_team", "position"]
+SOURCE = {"match_id": "id", "minutes": "time", "xg": "xG", "xa": "xA", "npxg": "npxG"}
+
+def empty_table() -> pd.DataFrame:
+    t = pd.DataFrame({c: pd.Series(dtype=d) for c, d in {**INT_COLS, **FLOAT_COLS}.items()})
+    t["date"] = pd.Series(dtype="datetime64[ns]")
+    for c in CAT_COLS:
+        t[c] = pd.Series(dtype="category")
+    return t
+
+def logs_to_frame(logs: Dict[str, list]) -> pd.DataFrame:
+    """{understat player id: matchesData list} -> typed match rows."""
+    rows = [dict(m, player_id=pid) for pid, ms in logs.items() for m in ms]
+    if not rows:
+        return empty_table()
+    raw = pd.DataFrame(rows)
+    out = pd.DataFrame(index=raw.index)
+    for c, d in {**INT_COLS, **FLOAT_COLS}.items():
+        src = raw.get(SOURCE.get(c, c), pd.Series(0, index=raw.index))
+        out[c] = pd.to_numeric(src, errors="coerce").fillna(0).astype(d)
+    out["date"] = pd.to_datetime(raw.get("date"), errors="coerce")
+    for c in CAT_COLS:
+        out[c] = raw.get(c, pd.Series("", index=raw.index)).fillna("").astype("category")
+    return out
+
+def load_table(path: str = TABLE_PATH) -> pd.DataFrame:
+    return pd.read_parquet(path) if os.path.exists(path) else empty_table()
+
+def save_table(table: pd.DataFrame, path: str = TABLE_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    table.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+def merge_tables(table: pd.DataFrame, new: pd.DataFrame, min_season: Optional[int] = None) -> pd.DataFrame:
+    """Append ``new`` (newer rows win on player_id+match_id) and drop seasons before ``min_season``."""
+    both = pd.concat([table, new], ignore_index=True) if len(table) else new.copy()
+    for c in CAT_COLS:
+        both[c] = both[c].astype(str).astype("category")
+    both = both.drop_duplicates(["player_id", "match_id"], keep="last")
+    if min_season is not None:
+        both = both[both["season"] >= min_season]
+    return both.sort_values(["player_id", "date"]).reset_index(drop=True)
+
+def stale_players(table: pd.DataFrame, league: pd.DataFrame, season: int) -> list:
+    """Understat ids whose league-page ``games`` exceed the rows stored for ``season``."""
+    have = table.loc[table["season"] == season].groupby("player_id").size()
+    ids = pd.to_numeric(league["provider_id"], errors="coerce").fillna(-1).astype(int)
+    games = pd.to_numeric(league["games"], errors="coerce").fillna(0).astype(int)
+    stored = have.reindex(ids.to_numpy()).fillna(0).astype(int).to_numpy()
+    return ids[(games.to_numpy() > stored) & (ids.to_numpy() >= 0)].tolist()
+
+def rolling_rates(table: pd.DataFrame, halflife: float = 5.0, last_n: int = 6) -> pd.DataFrame:
+    """
+    Per player: exponentially weighted xG/xA per 90 (weights 0.5 ** (age / halflife)) and
+    plain last-``last_n`` per 90, plus the minutes behind each.
+    """
+    cols = ["player_id", "matches", "minutes_ewm", "xg_per90_ewm", "xa_per90_ewm",
+            "minutes_last_n", "xg_per90_last_n", "xa_per90_last_n", "last_match"]
+    t = table[table["minutes"] > 0]
+    if t.empty:
+        return pd.DataFrame(columns=cols)
+    t = t.sort_values(["player_id", "date"], ascending=[True, False])
+    codes, players = pd.factorize(t["player_id"], sort=True)
+    age = t.groupby("player_id", sort=False).cumcount().to_numpy()
+    mins = t["minutes"].to_numpy(np.float64)
+    xg, xa = t["xg"].to_numpy(np.float64), t["xa"].to_numpy(np.float64)
+    n = len(players)
+
+    def per90(w):
+        m = np.bincount(codes, w * mins, n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (m, np.where(m > 0, 90 * np.bincount(codes, w * xg, n) / m, 0.0),
+                    np.where(m > 0, 90 * np.bincount(codes, w * xa, n) / m, 0.0))
+
+    m_e, xg_e, xa_e = per90(0.5 ** (age / float(halflife)))
+    m_n, xg_n, xa_n = per90((age < last_n).astype(np.float64))
+    last = t.groupby("player_id", sort=True)["date"].max().to_numpy()
+    return pd.DataFrame({
+        "player_id": players.astype(int), "matches": np.bincount(codes, minlength=n),
+        "minutes_ewm": m_e, "xg_per90_ewm": xg_e, "xa_per90_ewm": xa_e,
+        "minutes_last_n": m_n, "xg_per90_last_n": xg_n, "xa_per90_last_n": xa_n, "last_match": last,
+    })
+
+async def update_match_table(prov, league: pd.DataFrame, season: int, path: str = TABLE_PATH,
+                             keep_seasons: int = 2, only: Optional[Iterable[int]] = None):
+    """
+    Fetch match logs for players with new matches (``only`` restricts the candidates, e.g. to
+    players above the minutes floor), merge into the stored table and save it.
+    Returns (table, n_fetched, errors).
+    """
+    table = load_table(path)
+    todo = stale_players(table, league, season)
+    if only is not None:
+        keep = set(int(x) for x in only)
+        todo = [p for p in todo if p in keep]
+    logs, errors = await prov.fetch_match_logs(todo) if todo else ({}, {})
+    if logs:
+        table = merge_tables(table, logs_to_frame(logs), min_season=season - keep_seasons + 1)
+        save_table(table, path)
+    return table, len(logs), errors
@@ -1,19 +1,300 @@
+"""
+Operational metrics for the pipeline and the app, as Prometheus text and JSON.
 
-ATTACK_MULTIPLIER={1:1.15,2:1.10,3:1.00,4:0.90,5:0.82}
-CS_PROB_BY_DIFF={1:0.55,2:0.45,3:0.30,4:0.18,5:0.10}
-POSITION_MAP={1:"GK",2:"DEF",3:"MID",4:"FWD"}
-
-def cap01(x): return max(0.0,min(1.0,x))
-def expected_minutes(mins, completed, chance):
-    base=1.0 if completed<=0 else cap01((mins/(completed*90.0)) if completed>0 else 1.0)
-    if chance is not None: base*=cap01(chance/100.0)
-    return 90.0*base
-def appearance_points(m): return 2.0 if m>=60 else 1.0
-def get_attack_multiplier(d): return ATTACK_MULTIPLIER.get(int(d),1.0)
-def get_cs_prob(d): return CS_PROB_BY_DIFF.get(int(d),0.30)
-def compute_fixture_ep(row,pos):
-    scale=row['expected_minutes']/90.0; atk=row['attack_mult']
-    ep_att=(row['xg_per90']*scale)*4.0 + (row['xa_per90']*scale)*3.0
-    ep_att*=atk
-    ep_cs=row['cs_prob']*4.0 if pos in ("DEF","GK") else 0.0
-    return ep_att + ep_cs + appearance_points(row['expected_minutes'])
+Every metric is declared once in ``METRICS`` (type and help). Code records into a process-wide
+``Registry`` with ``inc`` / ``gauge`` / ``observe`` / ``timer``. Each call is a dict update under a
+lock, a few microseconds, so it stays on in production. A process that has been ``start``-ed
+writes a snapshot of its registry to ``<dir>/<job>.json`` at exit (and at most every
+``flush_seconds`` through ``maybe_flush``). It then re-renders ``<dir>/fpl_analytics.prom`` from
+every job's JSON, so node_exporter's textfile collector can point at ``dir``. Alternatively,
+``serve`` exposes the same text on a small local HTTP endpoint.
+
+The pipeline runner starts each stage's interpreter with ``FPL_METRICS_JOB=<stage>``, so stage
+processes write their own job file with no code of their own. The runner writes the ``pipeline``
+job (stage durations, status, last success). The app writes ``app`` and the daemon writes
+``scheduler``.
+
+    python pipeline/metrics.py show                 # every job's metrics, readable
+    python pipeline/metrics.py prom                 # the Prometheus text
+    python pipeline/metrics.py serve [--port 9108]  # GET /metrics, /metrics.json
+"""
+from __future__ import annotations
+import argparse, atexit, bisect, contextlib, glob, json, math, os, re, threading, time
+from typing import Callable, Dict, List, Optional, Tuple
+
+DIR = "data/metrics"
+PROM_FILE = "fpl_analytics.prom"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+METRICS: Dict[str, Tuple[str, str]] = {
+    # pipeline runner
+    "fpl_pipeline_run_timestamp_seconds": ("gauge", "When the last pipeline run finished"),
+    "fpl_pipeline_run_duration_seconds": ("gauge", "Wall time of the last pipeline run"),
+    "fpl_pipeline_stage_duration_seconds": ("gauge", "Seconds the stage took in the last run (0 when skipped)"),
+    "fpl_pipeline_stage_status": ("gauge", "1 for the stage's status in the last run (ran, skipped, failed, blocked)"),
+    "fpl_pipeline_stage_last_success_timestamp_seconds": ("gauge", "When the stage last ran successfully"),
+    # HTTP (FPL API, Understat, FBref)
+    "fpl_http_requests_total": ("counter", "HTTP responses by endpoint and status (error: no response)"),
+    "fpl_http_request_duration_seconds": ("histogram", "HTTP request latency by endpoint"),
+    "fpl_http_response_bytes_total": ("counter", "Response body bytes downloaded by endpoint"),
+    "fpl_http_cache_total": ("counter", "Shared HTTP cache lookups and writes by result"),
+    # data
+    "fpl_xgxa_players_matched": ("gauge", "FPL players matched to a provider row, by provider and method"),
+    "fpl_xgxa_match_rate": ("gauge", "Share of FPL players matched to a provider row"),
+    "fpl_projection_rows": ("gauge", "Players projected, by horizon in GWs"),
+    "fpl_ep_component_rows": ("gauge", "Player x fixture rows in ep_components.csv"),
+    # refresh daemon
+    "fpl_scheduler_events_total": ("counter", "Refresh daemon polls, 304s, changes, runs, coalesced kicks and errors"),
+    # app
+    "fpl_app_rerun_duration_seconds": ("histogram", "Streamlit page rerun time by page"),
+    "fpl_app_optimizer_solve_seconds": ("histogram", "Optimizer solve time by solver"),
+    # every job
+    "fpl_metrics_written_timestamp_seconds": ("gauge", "When the job last wrote its metrics"),
+}
+
+# ============================================================
+# Registry
+# ============================================================
+class Registry:
+    """Thread-safe counters, gauges and fixed-bucket histograms keyed by (name, labels)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[str, Dict[tuple, object]] = {}
+        self._collectors: List[Callable[["Registry"], None]] = []
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        if name not in METRICS:
+            raise KeyError(f"undeclared metric {name!r}")
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        k = self._key(name, labels)
+        with self._lock:
+            s = self._series.setdefault(name, {})
+            s[k] = s.get(k, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Gauge value (or a counter's absolute value, for stats kept elsewhere)."""
+        k = self._key(name, labels)
+        with self._lock:
+            self._series.setdefault(name, {})[k] = float(value)
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        k = self._key(name, labels)
+        i = bisect.bisect_left(BUCKETS, value)
+        with self._lock:
+            h = self._series.setdefault(name, {}).get(k)
+            if h is None:
+                h = self._series[name][k] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+            h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the seconds spent in the block (or the decorated function) into a histogram."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    def collector(self, fn: Callable[["Registry"], None]) -> None:
+        """``fn(registry)`` runs before every snapshot (for stats kept in other objects)."""
+        self._collectors.append(fn)
+
+    def snapshot(self) -> dict:
+        """{name: {"type", "help", "series": [{"labels", "value"} | {"labels", "buckets", "sum", "count"}]}}"""
+        for fn in self._collectors:
+            fn(self)
+        out = {}
+        with self._lock:
+            for name, series in self._series.items():
+                typ, help_ = METRICS[name]
+                rows = []
+                for k, v in series.items():
+                    if typ == "histogram":
+                        counts, total, n = v
+                        rows.append({"labels": dict(k), "buckets": list(counts), "sum": total, "count": n})
+                    else:
+                        rows.append({"labels": dict(k), "value": v})
+                out[name] = {"type": typ, "help": help_, "series": rows}
+        return out
+
+    def write(self, job: str, out_dir: str = DIR) -> str:
+        """Write ``<out_dir>/<job>.json`` and re-render the combined .prom file; returns the JSON path."""
+        self.set("fpl_metrics_written_timestamp_seconds", time.time())
+        snap = {"job": job, "written_at": time.time(), "buckets": list(BUCKETS), "metrics": self.snapshot()}
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, f"{job}.json")
+        _atomic_write(path, json.dumps(snap))
+        _atomic_write(os.path.join(out_dir, PROM_FILE), render(load(out_dir)))
+        return path
+
+def _atomic_write(path: str, text: str) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+# ============================================================
+# Process-wide registry
+# ============================================================
+REGISTRY = Registry()
+inc, gauge, observe, timer, collector = REGISTRY.inc, REGISTRY.set, REGISTRY.observe, REGISTRY.timer, REGISTRY.collector
+_job: Optional[str] = None
+_dir, _flush_seconds, _last_flush = DIR, 30.0, 0.0
+
+def metrics_settings(cfg: dict) -> dict:
+    m = cfg.get("metrics", {})
+    return {"enabled": bool(m.get("enabled", True)), "dir": m.get("dir", DIR),
+            "flush_seconds": float(m.get("flush_seconds", 30)), "port": int(m.get("port", 9108))}
+
+def start(job: str, out_dir: str = DIR, flush_seconds: float = 30.0) -> None:
+    """Name this process's job and write its metrics at exit (and through ``maybe_flush``). Idempotent."""
+    global _job, _dir, _flush_seconds, _last_flush
+    if _job is None:
+        atexit.register(flush)
+    _job, _dir, _flush_seconds, _last_flush = job, out_dir, float(flush_seconds), time.time()
+
+def started() -> bool:
+    return _job is not None
+
+def flush() -> None:
+    global _last_flush
+    if _job is not None:
+        _last_flush = time.time()
+        try:
+            REGISTRY.write(_job, _dir)
+        except OSError as e:   # metrics never take the process down
+            print(f"metrics: could not write {_dir}/{_job}.json ({e})")
+
+def maybe_flush() -> None:
+    """Write if ``flush_seconds`` have passed since the last write (long-running processes)."""
+    if _job is not None and time.time() - _last_flush >= _flush_seconds:
+        flush()
+
+_ID = re.compile(r"/\d+(?=/|$)")
+
+def endpoint(url: str) -> str:
+    """host/path with numeric segments as {id} and no query: a bounded label set."""
+    u = url.split("://", 1)[-1].split("?", 1)[0]
+    return _ID.sub("/{id}", u)
+
+def http(url: str, status, seconds: float, nbytes: int = 0) -> None:
+    """One HTTP response (``status`` "error" when none arrived)."""
+    ep = endpoint(url)
+    REGISTRY.inc("fpl_http_requests_total", endpoint=ep, status=status)
+    REGISTRY.observe("fpl_http_request_duration_seconds", seconds, endpoint=ep)
+    if nbytes:
+        REGISTRY.inc("fpl_http_response_bytes_total", nbytes, endpoint=ep)
+
+if os.environ.get("FPL_METRICS_JOB"):   # a pipeline stage started by the runner
+    start(os.environ["FPL_METRICS_JOB"], os.environ.get("FPL_METRICS_DIR", DIR))
+
+# ============================================================
+# Readers
+# ============================================================
+def load(out_dir: str = DIR) -> List[dict]:
+    snaps = []
+    for p in sorted(glob.glob(os.path.join(out_dir, "*.json"))):
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                snaps.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snaps
+
+def _labels(d: dict) -> str:
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in d.items()) + "}" if d else ""
+
+def _num(v: float) -> str:
+    v = float(v)
+    if math.isnan(v):
+        return "NaN"
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return str(int(v)) if v.is_integer() and abs(v) < 1e15 else repr(v)
+
+def render(snaps: List[dict]) -> str:
+    """Prometheus text exposition of job snapshots; every series carries a ``job`` label."""
+    families: Dict[str, Tuple[dict, List[Tuple[dict, dict, list]]]] = {}
+    for snap in snaps:
+        for name, fam in snap.get("metrics", {}).items():
+            families.setdefault(name, (fam, []))[1].extend(
+                (dict(job=snap["job"], **s["labels"]), s, snap.get("buckets", BUCKETS)) for s in fam["series"])
+    lines = []
+    for name in sorted(families):
+        fam, rows = families[name]
+        lines += [f"# HELP {name} {fam['help']}", f"# TYPE {name} {fam['type']}"]
+        for labels, s, buckets in rows:
+            if fam["type"] != "histogram":
+                lines.append(f"{name}{_labels(labels)} {_num(s['value'])}")
+                continue
+            cum = 0
+            for le, c in zip(list(buckets) + ["+Inf"], s["buckets"]):
+                cum += c
+                lines.append(f"{name}_bucket{_labels(dict(labels, le=le if le == '+Inf' else _num(le)))} {cum}")
+            lines.append(f"{name}_sum{_labels(labels)} {_num(s['sum'])}")
+            lines.append(f"{name}_count{_labels(labels)} {s['count']}")
+    return "\n".join(lines) + "\n"
+
+def show(snaps: List[dict]) -> None:
+    for snap in snaps:
+        age = time.time() - snap.get("written_at", 0)
+        print(f"{snap['job']} (written {age:.0f}s ago)")
+        for name, fam in sorted(snap["metrics"].items()):
+            for s in fam["series"]:
+                lab = ",".join(f"{k}={v}" for k, v in s["labels"].items())
+                val = (f"n={s['count']} mean={s['sum'] / s['count']:.3f}s" if "count" in s and s["count"]
+                       else _num(s.get("value", 0)))
+                print(f"  {name}{'{' + lab + '}' if lab else ''} {val}")
+
+def serve(out_dir: str = DIR, host: str = "127.0.0.1", port: int = 9108) -> None:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split("?", 1)[0]
+            if path == "/metrics":
+                body, ctype = render(load(out_dir)).encode(), "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/metrics.json":
+                body, ctype = json.dumps(load(out_dir)).encode(), "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    print(f"Serving {out_dir} on http://{host}:{port}/metrics")
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+def main():
+    from utils import read_toml
+    ap = argparse.ArgumentParser(description="Pipeline and app metrics (Prometheus text / JSON)")
+    ap.add_argument("cmd", choices=["show", "prom", "serve"])
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=None)
+    args = ap.parse_args()
+    ms = metrics_settings(read_toml(args.config))
+    if args.cmd == "serve":
+        try:
+            serve(ms["dir"], args.host, args.port or ms["port"])
+        except KeyboardInterrupt:
+            pass
+    elif args.cmd == "prom":
+        print(render(load(ms["dir"])), end="")
+    else:
+        show(load(ms["dir"]))
+
+if __name__ == "__main__":
+    main()
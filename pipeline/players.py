@@ -0,0 +1,80 @@
+"""
+Compact, typed player table built from bootstrap-static.
+
+``bs["elements"]`` carries ~100 fields per player, most of them strings; a DataFrame of all of
+them is mostly object columns, and every merge in the engine used to copy the lot. ``player_table``
+reads only the fields the pipeline uses, straight from the element dicts, into narrow dtypes:
+int16/int8 ids and codes, float32 numerics (the API's one-decimal strings parsed once),
+categorical team name / position / status. Rows are sorted by id; FPL ids run 1..N without gaps,
+so ``rows`` turns ids into row positions with one subtraction (searchsorted if they ever do not).
+
+    python pipeline/players.py     # memory: full elements frame vs this table
+"""
+from __future__ import annotations
+import json
+import numpy as np
+import pandas as pd
+try:
+    import scoring
+except ImportError:  # imported from the app as pipeline.players
+    from pipeline import scoring
+
+NAMES = ["web_name", "first_name", "second_name"]
+NUMERIC = {   # bootstrap field -> dtype (NaN where missing / unparsable)
+    "chance_of_playing_next_round": np.float32,
+    "form": np.float32,
+    "selected_by_percent": np.float32,
+}
+STATUSES = ["a", "d", "i", "n", "s", "u"]
+
+def _column(elements, key, dtype):
+    vals = pd.to_numeric(pd.Series([e.get(key) for e in elements], dtype=object), errors="coerce")
+    return vals.to_numpy(dtype=dtype, na_value=np.nan)
+
+def player_table(bs: dict) -> pd.DataFrame:
+    """id, names, team, team_name, element_type, position, price, status and the minutes inputs; one row per player, id order."""
+    els = sorted(bs["elements"], key=lambda e: e["id"])
+    teams = sorted(bs.get("teams") or [], key=lambda t: t["id"])
+    team = np.array([e["team"] for e in els], dtype=np.int16)
+    etype = np.array([e["element_type"] for e in els], dtype=np.int8)
+    df = pd.DataFrame({"id": np.array([e["id"] for e in els], dtype=np.int16)})
+    for c in NAMES:
+        df[c] = pd.Series([e.get(c) or "" for e in els], dtype="string")
+    df["team"] = team
+    names = pd.Categorical.from_codes(
+        pd.Index([t["id"] for t in teams]).get_indexer(team), categories=[t["name"] for t in teams]) \
+        if teams else pd.Categorical([None] * len(els))
+    df["team_name"] = names
+    df["element_type"] = etype
+    df["position"] = pd.Categorical(scoring.position_labels(etype), categories=list(scoring.POSITIONS))
+    df["price"] = (np.array([e.get("now_cost") or 0 for e in els], dtype=np.float32) / np.float32(10))
+    df["status"] = pd.Categorical([e.get("status") for e in els], categories=STATUSES)
+    for c, dt in NUMERIC.items():
+        df[c] = _column(els, c, dt)
+    return df
+
+def rows(table: pd.DataFrame, ids) -> np.ndarray:
+    """Row positions of ``ids`` in ``table`` (-1 where absent)."""
+    have = table["id"].to_numpy()
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(have) and have[-1] - have[0] == len(have) - 1:
+        pos = ids - int(have[0])
+    else:
+        pos = np.searchsorted(have, ids)
+    ok = (pos >= 0) & (pos < len(have))
+    ok[ok] = have[pos[ok]] == ids[ok]
+    return np.where(ok, pos, -1)
+
+def memory_report(bs: dict) -> dict:
+    """Bytes (deep) of the full elements frame, as the engine used to build it, vs ``player_table``."""
+    full = pd.DataFrame(bs["elements"])
+    compact = player_table(bs)
+    return {"players": len(compact), "full_columns": full.shape[1], "full_bytes": int(full.memory_usage(deep=True).sum()),
+            "compact_columns": compact.shape[1], "compact_bytes": int(compact.memory_usage(deep=True).sum())}
+
+if __name__ == "__main__":
+    with open("data/cache/bootstrap-static.json", "r", encoding="utf-8") as f:
+        r = memory_report(json.load(f))
+    print(f"{r['players']} players: full frame {r['full_columns']} columns, {r['full_bytes'] / 1e6:.2f} MB; "
+          f"player table {r['compact_columns']} columns, {r['compact_bytes'] / 1e3:.0f} kB "
+          f"({r['full_bytes'] / r['compact_bytes']:.0f}x smaller)")
@@ -0,0 +1,249 @@
+"""
+Snapshot x player price time series and an overnight price-change predictor.
+
+Every bootstrap-static snapshot becomes one small parquet part under ``root`` (default
+data/cache/price_series) named ``<first_ts>_<last_ts>.parquet``; ``compact`` folds the parts into
+one file. ``load_series`` is a single ``read_parquet`` over the directory, one typed row per
+(ts, player): now_cost, season and GW transfers in/out, selected_by_percent, total_players.
+
+The predictor works on (snapshot x player) matrices. FPL moves a price once net transfers since
+the player's last change pass a threshold that scales with ownership, so for every cell
+
+    progress = net transfers since the last change / (frac * max(owners, min_owners))
+
+and the next window's progress adds the last ``rate_hours`` of net transfers, scaled to the
+horizon. P(rise) / P(fall) are logistic in that projection; ``calibrate`` grid-searches
+rise_frac / fall_frac against the changes seen in the series (Brier score, all candidates at
+once). ``price_drift`` = 0.1 x (P(rise) - P(fall)) in £m is what the optimizer reads.
+
+    python pipeline/price_series.py backfill     # ingest every stored snapshot not yet in the series
+    python pipeline/price_series.py predict [--calibrate]
+    python pipeline/price_series.py compact
+"""
+from __future__ import annotations
+import argparse, glob, json, os, time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+try:
+    from utils import read_toml
+except ImportError:  # imported from the app as pipeline.price_series
+    from pipeline.utils import read_toml
+
+SERIES_ROOT = "data/cache/price_series"
+PREDICTIONS_PATH = "data/cache/price_predictions.csv"
+TS_FMT = "%Y-%m-%dT%H-%M-%SZ"
+DTYPES = {"id": np.int32, "team": np.int16, "element_type": np.int8, "now_cost": np.int16,
+          "transfers_in": np.int32, "transfers_out": np.int32,
+          "transfers_in_event": np.int32, "transfers_out_event": np.int32,
+          "selected_by_percent": np.float32, "total_players": np.int32, "event": np.int16}
+DEFAULTS = {"rise_frac": 0.08, "fall_frac": 0.04, "min_owners": 20000.0, "slope": 6.0,
+            "horizon_hours": 24.0, "rate_hours": 24.0, "drift_weight": 0.0}
+
+# ============================================================
+# Store
+# ============================================================
+def snapshot_frame(bs: dict, ts) -> pd.DataFrame:
+    """One typed row per player of a bootstrap-static payload taken at ``ts``."""
+    el = pd.DataFrame(bs.get("elements") or [])
+    if el.empty:
+        return pd.DataFrame(columns=["ts"] + list(DTYPES))
+    cur = [int(e["id"]) for e in bs.get("events", []) if e.get("is_current")]
+    for c in DTYPES:
+        if c not in el.columns:
+            el[c] = 0
+    el["selected_by_percent"] = pd.to_numeric(el["selected_by_percent"], errors="coerce")
+    el["total_players"] = int(bs.get("total_players") or 0)
+    el["event"] = cur[0] if cur else 0
+    out = el[list(DTYPES)].fillna(0).astype(DTYPES)
+    out.insert(0, "ts", pd.Timestamp(_parse_ts(ts)))
+    return out
+
+def _parse_ts(ts) -> datetime:
+    if isinstance(ts, datetime):
+        return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+    return datetime.strptime(str(ts), TS_FMT).replace(tzinfo=timezone.utc)
+
+def _parts(root: str) -> List[tuple]:
+    """[(first_ts, last_ts, path)] sorted by time."""
+    out = []
+    for p in glob.glob(os.path.join(root, "*_*.parquet")):
+        a, b = os.path.basename(p)[:-len(".parquet")].split("_", 1)
+        out.append((a, b, p))
+    return sorted(out)
+
+def last_ts(root: str = SERIES_ROOT) -> Optional[str]:
+    parts = _parts(root)
+    return max(b for _, b, _ in parts) if parts else None
+
+def append(bs: dict, ts, root: str = SERIES_ROOT) -> bool:
+    """Add one snapshot as a new part; snapshots at or before the series' last ts are skipped."""
+    key = _parse_ts(ts).strftime(TS_FMT)
+    last = last_ts(root)
+    if last is not None and key <= last:
+        return False
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"{key}_{key}.parquet")
+    snapshot_frame(bs, key).to_parquet(path + ".tmp", index=False)
+    os.replace(path + ".tmp", path)
+    return True
+
+def backfill(store, root: str = SERIES_ROOT) -> int:
+    """Append every ``bootstrap-static`` snapshot in the SnapshotStore newer than the series."""
+    last = last_ts(root)
+    n = 0
+    for ts, sha in store.list("bootstrap-static"):
+        if last is None or ts > last:
+            n += append(json.loads(store.get_bytes(sha)), ts, root)
+    return n
+
+def compact(root: str = SERIES_ROOT) -> int:
+    """Fold every part into one file; returns the number of parts merged."""
+    parts = _parts(root)
+    if len(parts) < 2:
+        return 0
+    df = load_series(root)
+    path = os.path.join(root, f"{parts[0][0]}_{max(b for _, b, _ in parts)}.parquet")
+    df.to_parquet(path + ".tmp", index=False)
+    for _, _, p in parts:
+        os.remove(p)
+    os.replace(path + ".tmp", path)
+    return len(parts)
+
+def load_series(root: str = SERIES_ROOT, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Every snapshot x player row in one read, sorted by (ts, id)."""
+    if not _parts(root):
+        return pd.DataFrame(columns=["ts"] + list(DTYPES))
+    df = pd.read_parquet(root, columns=columns)
+    return df.sort_values(["ts", "id"], kind="stable").reset_index(drop=True)
+
+# ============================================================
+# Predictor
+# ============================================================
+def _matrices(series: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Pivot to (snapshot x player) arrays, forward-filled; players unseen so far stay NaN."""
+    s = series.assign(net=series["transfers_in"].astype(np.int64) - series["transfers_out"],
+                      owners=series["selected_by_percent"].astype(np.float64) / 100.0 * series["total_players"])
+    wide = s.pivot_table(index="ts", columns="id", values=["now_cost", "net", "owners"], aggfunc="last").ffill()
+    ts = wide.index.as_unit("s").asi8 / 3600.0
+    return {"hours": ts, "ids": wide["now_cost"].columns.to_numpy(),
+            "cost": wide["now_cost"].to_numpy(np.float64), "net": wide["net"].to_numpy(np.float64),
+            "owners": wide["owners"].to_numpy(np.float64)}
+
+def _features(m: Dict[str, np.ndarray], rate_hours: float, horizon_hours: float) -> Dict[str, np.ndarray]:
+    """Net transfers since each cell's last price change, plus the projected net over the horizon."""
+    cost, net, hours = m["cost"], m["net"], m["hours"]
+    T = len(hours)
+    rows = np.arange(T)[:, None]
+    changed = np.zeros_like(cost, dtype=bool)
+    changed[1:] = cost[1:] != cost[:-1]
+    first = np.argmax(~np.isnan(cost), axis=0)                  # first snapshot the player exists
+    since = np.maximum.accumulate(np.where(changed, rows, first[None, :]), axis=0)
+    cols = np.broadcast_to(np.arange(cost.shape[1]), cost.shape)
+    net_since = net - net[since, cols]
+    back = np.searchsorted(hours, hours - rate_hours, side="left")  # snapshot ~rate_hours ago
+    span = np.maximum(hours - hours[back], 1e-9)[:, None]
+    rate = np.where(span > 0.5, (net - net[back]) / span, 0.0)  # net transfers per hour
+    return {"net_since": net_since, "projected": net_since + rate * horizon_hours, "rate": rate * 24.0}
+
+def _probabilities(projected, owners, rise_frac, fall_frac, min_owners, slope):
+    base = np.maximum(np.nan_to_num(owners), min_owners)
+    up = projected / (rise_frac * base)
+    down = -projected / (fall_frac * base)
+    p_rise = 1.0 / (1.0 + np.exp(-slope * (up - 1.0)))
+    p_fall = 1.0 / (1.0 + np.exp(-slope * (down - 1.0)))
+    return up, down, p_rise, p_fall
+
+def calibrate(series: pd.DataFrame, params: Optional[dict] = None,
+              grid: np.ndarray = np.linspace(0.01, 0.3, 59)) -> dict:
+    """Grid-search rise_frac / fall_frac on every (snapshot, player) with a snapshot one horizon later."""
+    p = dict(DEFAULTS, **(params or {}))
+    m = _matrices(series)
+    f = _features(m, p["rate_hours"], p["horizon_hours"])
+    nxt = np.searchsorted(m["hours"], m["hours"] + p["horizon_hours"] - 1.0, side="left")
+    ok_t = nxt < len(m["hours"])
+    cost, owners = m["cost"][ok_t], m["owners"][ok_t]
+    later = m["cost"][nxt[ok_t]]
+    ok = ~(np.isnan(cost) | np.isnan(later))
+    x = f["projected"][ok_t][ok] / np.maximum(owners[ok], p["min_owners"])
+    rise, fall = (later > cost)[ok], (later < cost)[ok]
+    out = dict(p, samples=int(ok.sum()), rises=int(rise.sum()), falls=int(fall.sum()))
+    if not len(x):
+        return out
+    k = p["slope"]
+    for name, sign, y in (("rise_frac", 1.0, rise), ("fall_frac", -1.0, fall)):
+        prob = 1.0 / (1.0 + np.exp(-k * (sign * x[None, :] / grid[:, None] - 1.0)))
+        brier = ((prob - y[None, :]) ** 2).mean(axis=1)
+        out[name] = float(grid[int(np.argmin(brier))])
+        out[name.replace("frac", "brier")] = float(brier.min())
+    return out
+
+def predict(series: pd.DataFrame, params: Optional[dict] = None) -> pd.DataFrame:
+    """Per player at the latest snapshot: progress towards a rise/fall, P(rise), P(fall), price_drift (£m)."""
+    p = dict(DEFAULTS, **(params or {}))
+    cols = ["id", "now_cost", "net_since_change", "net_per_day", "owners", "progress_rise", "progress_fall",
+            "p_rise", "p_fall", "price_drift"]
+    if series.empty:
+        return pd.DataFrame(columns=cols)
+    m = _matrices(series)
+    f = _features(m, p["rate_hours"], p["horizon_hours"])
+    owners = m["owners"][-1]
+    up, down, p_rise, p_fall = _probabilities(f["projected"][-1], owners, p["rise_frac"], p["fall_frac"],
+                                              p["min_owners"], p["slope"])
+    base = np.maximum(np.nan_to_num(owners), p["min_owners"])
+    out = pd.DataFrame({
+        "id": m["ids"].astype(int), "now_cost": m["cost"][-1] / 10.0,
+        "net_since_change": f["net_since"][-1], "net_per_day": f["rate"][-1], "owners": owners,
+        "progress_rise": f["net_since"][-1] / (p["rise_frac"] * base),
+        "progress_fall": -f["net_since"][-1] / (p["fall_frac"] * base),
+        "p_rise": p_rise, "p_fall": p_fall,
+    })
+    out["price_drift"] = 0.1 * (out["p_rise"] - out["p_fall"])
+    return out[cols].dropna(subset=["now_cost"]).reset_index(drop=True)
+
+def price_settings(config_path: str = "configs/config.toml") -> dict:
+    """[prices] settings over DEFAULTS plus the series/predictions paths."""
+    cfg = read_toml(config_path, {}).get("prices", {})
+    return {**DEFAULTS, "root": SERIES_ROOT, "predictions_path": PREDICTIONS_PATH, **cfg}
+
+def main():
+    from snapshots import SnapshotStore
+    ap = argparse.ArgumentParser(description="Price time series + overnight change predictor")
+    ap.add_argument("cmd", choices=["backfill", "predict", "compact"])
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--calibrate", action="store_true", help="refit rise/fall thresholds on the series first")
+    args = ap.parse_args()
+    cfg = read_toml(args.config)
+    ps = price_settings(args.config)
+    root = ps["root"]
+
+    t0 = time.perf_counter()
+    if args.cmd == "backfill":
+        n = backfill(SnapshotStore.from_config(cfg), root)
+        print(f"Appended {n} snapshots to {root} (last {last_ts(root)}) in {time.perf_counter() - t0:.2f}s")
+    elif args.cmd == "compact":
+        print(f"Compacted {compact(root)} parts in {time.perf_counter() - t0:.2f}s")
+    else:
+        series = load_series(root)
+        if series.empty:
+            print(f"No snapshots in {root} yet (fetch bootstrap-static or run backfill); nothing to predict.")
+            return
+        print(f"Loaded {len(series)} rows, {series['ts'].nunique()} snapshots in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        if args.calibrate:
+            c = calibrate(series, ps)
+            print(f"Calibrated on {c['samples']} samples ({c['rises']} rises, {c['falls']} falls): "
+                  f"rise_frac={c['rise_frac']:.3f} fall_frac={c['fall_frac']:.3f}")
+            ps.update(rise_frac=c["rise_frac"], fall_frac=c["fall_frac"])
+        t1 = time.perf_counter()
+        pred = predict(series, ps)
+        os.makedirs(os.path.dirname(ps["predictions_path"]) or ".", exist_ok=True)
+        pred.round(4).to_csv(ps["predictions_path"], index=False)
+        print(f"Predicted {len(pred)} players in {(time.perf_counter() - t1) * 1000:.0f} ms -> {ps['predictions_path']}")
+        top = pred.sort_values("p_rise", ascending=False).head(5)
+        print("Likely risers:", ", ".join(f"{i} ({p:.0%})" for i, p in zip(top["id"], top["p_rise"])))
+        low = pred.sort_values("p_fall", ascending=False).head(5)
+        print("Likely fallers:", ", ".join(f"{i} ({p:.0%})" for i, p in zip(low["id"], low["p_fall"])))
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,91 @@
 from __future__ import annotations
-import time
+import re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+import numpy as np
 import requests, pandas as pd
-from bs4 import BeautifulSoup
-from utils import read_toml, utcnow_str, write_json
+from lxml import html as lxml_html
+from utils import read_toml, utcnow_str
+from snapshots import SnapshotStore
+from http_cache import HttpCache
+import metrics
 
 FBREF_BASE = "https://fbref.com"
-EPL_2024_SQUAD_SHOOTING = "/en/comps/9/2024/shooting/players/2024-2025-Premier-League-Stats"
-EPL_FALLBACK = "/en/comps/9/shooting/players"  # broader listing; still contains xG/xAG columns
+SEASON_PAGE = "/en/comps/9/{s}-{e}/{page}/{s}-{e}-Premier-League-Stats"
+CURRENT_PAGE = "/en/comps/9/{page}/Premier-League-Stats"   # current season listing
+
+# page slug -> (table id, data-stat columns kept). FBref ships the player tables inside HTML
+# comments; the extractor slices the <table id=...> markup out of the raw text either way.
+PAGES: Dict[str, tuple] = {
+    "shooting": ("stats_shooting", ["minutes_90s", "shots", "shots_on_target", "goals", "xg", "npxg", "xg_net", "average_shot_distance"]),
+    "playingtime": ("stats_playing_time", ["games", "minutes", "games_starts", "games_subs", "points_per_game", "xg_plus_minus_per90"]),
+    "passing": ("stats_passing", ["assists", "xg_assist", "pass_xa", "assisted_shots", "passes_into_final_third", "progressive_passes"]),
+    "gca": ("stats_gca", ["sca", "sca_per90", "gca", "gca_per90"]),
+}
+KEY_COLS = ["fbref_id", "player", "team", "position", "age"]
+INT_STATS = {"games", "minutes", "games_starts", "games_subs", "shots", "shots_on_target", "goals", "assists",
+             "assisted_shots", "passes_into_final_third", "progressive_passes", "sca", "gca"}
+
+class PoliteLimiter:
+    """Thread-safe minimum spacing between request starts (FBref bans bursts)."""
+    def __init__(self, min_interval: float):
+        self.min_interval = float(min_interval)
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+def extract_table(page: str, table_id: str, columns: List[str]) -> pd.DataFrame:
+    """
+    Parse only ``<table id=table_id>`` out of the page text (commented out or not) with lxml and
+    read cells by their ``data-stat`` attribute. Header rows repeated inside tbody are skipped.
+    """
+    m = re.search(r'<table[^>]*\bid="%s"' % re.escape(table_id), page)
+    if not m:
+        raise RuntimeError(f"FBref: table {table_id} not found")
+    end = page.find("</table>", m.start())
+    table = lxml_html.fragment_fromstring(page[m.start(): end + len("</table>")])
+    want = set(KEY_COLS) | set(columns)
+    rows = []
+    for tr in table.iterfind(".//tbody/tr"):
+        if "thead" in (tr.get("class") or ""):
+            continue
+        rec = {}
+        for cell in tr:
+            stat = cell.get("data-stat")
+            if stat == "player":
+                rec["player"] = cell.text_content().strip()
+                rec["fbref_id"] = cell.get("data-append-csv") or rec["player"]
+            elif stat in want:
+                rec[stat] = cell.text_content().strip()
+        if rec.get("player"):
+            rows.append(rec)
+    df = pd.DataFrame(rows, columns=KEY_COLS + columns)
+    for c in columns:
+        df[c] = pd.to_numeric(df[c].str.replace(",", "", regex=False), errors="coerce")
+    return df
+
+def join_tables(tables: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Left-join every page's stats onto the union of (fbref_id, team) keys; compact dtypes."""
+    out = pd.concat([df[KEY_COLS] for df in tables.values()]).drop_duplicates(["fbref_id", "team"])
+    for df in tables.values():
+        stats = [c for c in df.columns if c not in KEY_COLS and c not in out.columns]
+        out = out.merge(df.drop_duplicates(["fbref_id", "team"])[["fbref_id", "team"] + stats],
+                        on=["fbref_id", "team"], how="left")
+    for c in out.columns:
+        if c in INT_STATS:
+            out[c] = out[c].fillna(0).astype(np.int32)
+        elif c in ("team", "position"):
+            out[c] = out[c].fillna("").astype("category")
+        elif c not in ("fbref_id", "player", "age"):
+            out[c] = out[c].astype(np.float32)
+    return out.reset_index(drop=True)
 
 class FBRefProvider:
     def __init__(self, config_path: str = "configs/config.toml"):
@@ -21,18 +100,37 @@ class FBRefProvider:
             "Referer": FBREF_BASE + "/en/",
         }
         self.timeout = int(self.cfg.get("network", {}).get("timeout_seconds", 25))
+        x = self.cfg.get("xgxa", {})
+        self.season = int(x.get("season", 2024))
+        self.pages = list(x.get("fbref_pages", list(PAGES)))
+        self.limiter = PoliteLimiter(float(x.get("fbref_min_interval_seconds", 4.0)))
+        self.cache = HttpCache.from_config(self.cfg)
+        self.session = requests.Session()   # one pool for every page this provider fetches
+        self.session.headers.update(self.headers)
 
-    def _get_html_with_retry(self, path: str) -> str:
-        s = requests.Session()
-        s.headers.update(self.headers)
-        urls = [FBREF_BASE + path, FBREF_BASE + EPL_FALLBACK]
+    def _urls(self, page: str) -> List[str]:
+        return [FBREF_BASE + SEASON_PAGE.format(s=self.season, e=self.season + 1, page=page),
+                FBREF_BASE + CURRENT_PAGE.format(page=page)]
+
+    def _get_html_with_retry(self, urls: List[str]) -> str:
+        s = self.session
         last = None
         for url in urls:
+            body, extra, entry = self.cache.begin(url)
+            if body is not None:
+                return body.decode("utf-8")
             for attempt in range(4):
-                r = s.get(url, timeout=self.timeout)
-                if r.status_code == 200:
-                    return r.text
-                if r.status_code == 403:
+                self.limiter.wait()
+                t0 = time.perf_counter()
+                try:
+                    r = s.get(url, timeout=self.timeout, headers=extra)
+                except requests.RequestException:
+                    metrics.http(url, "error", time.perf_counter() - t0)
+                    raise
+                metrics.http(url, r.status_code, time.perf_counter() - t0, len(r.content))
+                if r.status_code == 200 or (r.status_code == 304 and entry is not None):
+                    return self.cache.finish(url, None, entry, r.status_code, r.headers, r.content).decode("utf-8")
+                if r.status_code in (403, 429):
                     # gentle backoff then retry
                     time.sleep(1.5 * (attempt + 1))
                     continue
@@ -42,28 +140,36 @@ class FBRefProvider:
             last.raise_for_status()
         raise RuntimeError("FBref: unable to fetch page")
 
-    def fetch_players(self):
-        html = self._get_html_with_retry(EPL_2024_SQUAD_SHOOTING)
-        soup = BeautifulSoup(html, "lxml")
-        tables = pd.read_html(str(soup), flavor="lxml")
-
-        shoot = None
-        for t in tables:
-            # flatten multiindex if present and normalize
-            if hasattr(t.columns, "get_level_values"):
-                cols = [str(c).lower() for c in t.columns.get_level_values(-1)]
-            else:
-                cols = [str(c).lower() for c in t.columns]
-            if "xg" in cols and ("xag" in cols or "xa" in cols):
-                shoot = t
-                break
-        if shoot is None:
-            raise RuntimeError("FBref: xG/xAG table not found")
+    def _page_table(self, page: str) -> pd.DataFrame:
+        table_id, cols = PAGES[page]
+        return extract_table(self._get_html_with_retry(self._urls(page)), table_id, cols)
 
-        shoot.columns = ["_".join([str(x) for x in col if str(x) != ""]) if isinstance(col, tuple) else str(col) for col in shoot.columns.values]
-        shoot = shoot.rename(columns=lambda c: c.strip().replace(" ", "_").lower())
+    def fetch_table(self, pages: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        One typed row per player and squad with every configured page's stats. Pages are fetched
+        on parallel threads but request starts stay spaced by the polite limiter; each page is parsed
+        once and only its player table. Shooting is required, the other pages are best effort.
+        """
+        pages = pages or self.pages
+        with ThreadPoolExecutor(max_workers=len(pages), thread_name_prefix="fbref") as ex:
+            futs = {p: ex.submit(self._page_table, p) for p in pages}
+        tables, errors = {}, {}
+        for p, f in futs.items():
+            try:
+                tables[p] = f.result()
+            except Exception as e:
+                errors[p] = f"{type(e).__name__}: {e}"
+        if "shooting" not in tables:
+            raise RuntimeError(f"FBref: shooting table unavailable ({errors.get('shooting')})")
+        if errors:
+            print("FBref: skipped pages", errors)
+        return join_tables({p: tables[p] for p in pages if p in tables})
 
-        data = shoot.to_dict(orient="records")
+    def fetch_players(self):
+        table = self.fetch_table()
+        plain = table.astype({c: (str if c in ("team", "position") else "float64")
+                              for c in table.columns if c in ("team", "position") or table[c].dtype == np.float32})
+        data = plain.astype(object).where(plain.notna(), None).to_dict(orient="records")
         ts = utcnow_str(self.cfg.get("caching", {}).get("timestamp_format", "%Y-%m-%dT%H-%M-%SZ"))
-        write_json(data, f"data/raw/xgxa_fbref_{ts}.json")
-        return {"players": data}
+        SnapshotStore.from_config(self.cfg).put("xgxa_fbref", data, ts)
+        return {"players": data, "table": table}
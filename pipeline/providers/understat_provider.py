@@ -1,33 +1,99 @@
-
 from __future__ import annotations
-import asyncio, aiohttp, json, re
-from utils import read_toml, utcnow_str, write_json
+import asyncio, aiohttp, json, re, time
+from typing import Dict, Iterable, Optional
+from utils import read_toml, utcnow_str
+from snapshots import SnapshotStore
+from fpl_client import RateLimiter
+from http_cache import HttpCache
+import metrics
 
 UNDERSTAT_LEAGUE_URL = "https://understat.com/league/EPL/{season}"
+UNDERSTAT_PLAYER_URL = "https://understat.com/player/{pid}"
 PLAYERS_RE = re.compile(r"var\s+playersData\s*=\s*JSON.parse\('([^']+)'\);", re.MULTILINE)
+MATCHES_RE = re.compile(r"var\s+matchesData\s*=\s*JSON.parse\('([^']+)'\);", re.MULTILINE)
+
+def _decode(m) -> list:
+    return json.loads(m.group(1).encode("utf-8").decode("unicode_escape"))
 
 class UnderstatProvider:
+    """
+    Understat scraper. Used as ``async with UnderstatProvider() as prov:`` one aiohttp session
+    (and connection pool) serves the league page and every per-player match log; calling the
+    fetch methods outside the context opens a short-lived session as before.
+    """
     def __init__(self, config_path: str = "configs/config.toml"):
         self.cfg = read_toml(config_path)
         self.headers = {"User-Agent": self.cfg.get("user_agent", {}).get("value", "FPL-Analytics/Advanced")}
+        x = self.cfg.get("xgxa", {})
+        self.concurrency = int(x.get("match_log_concurrency", 6))
+        self.limiter = RateLimiter(float(x.get("match_log_rate_per_second", 4.0)))
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.cache = HttpCache.from_config(self.cfg)
+
+    def _new_session(self) -> aiohttp.ClientSession:
+        timeout = aiohttp.ClientTimeout(total=self.cfg.get("network", {}).get("timeout_seconds", 25))
+        return aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=self.concurrency))
+
+    async def __aenter__(self):
+        self.session = self._new_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+        self.session = None
 
     async def _fetch_text(self, session: aiohttp.ClientSession, url: str) -> str:
-        async with session.get(url, headers=self.headers, timeout=self.cfg.get("network", {}).get("timeout_seconds", 25)) as r:
-            r.raise_for_status()
-            return await r.text()
+        body, extra, entry = self.cache.begin(url)
+        if body is None:
+            await self.limiter.wait()
+            t0 = time.perf_counter()
+            try:
+                async with session.get(url, headers={**self.headers, **extra}, timeout=self.cfg.get("network", {}).get("timeout_seconds", 25)) as r:
+                    content = await r.read()
+                    metrics.http(url, r.status, time.perf_counter() - t0, len(content))
+                    if r.status != 304:
+                        r.raise_for_status()
+                    body = self.cache.finish(url, None, entry, r.status, r.headers, content)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                metrics.http(url, "error", time.perf_counter() - t0)
+                raise
+        return body.decode("utf-8")
+
+    async def _get(self, url: str) -> str:
+        if self.session is not None or self.cache.mode == "offline":
+            return await self._fetch_text(self.session, url)
+        async with self._new_session() as session:
+            return await self._fetch_text(session, url)
 
     async def fetch_players(self, season: int):
-        url = UNDERSTAT_LEAGUE_URL.format(season=season)
-        timeout = aiohttp.ClientTimeout(total=self.cfg.get("network", {}).get("timeout_seconds", 25))
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            html = await self._fetch_text(session, url)
+        html = await self._get(UNDERSTAT_LEAGUE_URL.format(season=season))
         m = PLAYERS_RE.search(html)
         if not m:
             raise RuntimeError("Understat: playersData not found")
-        encoded = m.group(1)
-        decoded = encoded.encode("utf-8").decode("unicode_escape")
-        data = json.loads(decoded)
+        data = _decode(m)
         # cache raw
         ts = utcnow_str(self.cfg.get("caching", {}).get("timestamp_format", "%Y-%m-%dT%H-%M-%SZ"))
-        write_json(data, f"data/raw/xgxa_understat_{ts}.json")
+        SnapshotStore.from_config(self.cfg).put("xgxa_understat", data, ts)
         return data
+
+    async def fetch_player_matches(self, pid) -> list:
+        """Every league match the player has on Understat (all seasons), newest first."""
+        html = await self._get(UNDERSTAT_PLAYER_URL.format(pid=pid))
+        m = MATCHES_RE.search(html)
+        if not m:
+            raise RuntimeError(f"Understat: matchesData not found for player {pid}")
+        return _decode(m)
+
+    async def fetch_match_logs(self, pids: Iterable) -> tuple[Dict[str, list], Dict[str, str]]:
+        """Match logs for many players, at most ``concurrency`` in flight and ``rate`` starts per second."""
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(pid):
+            async with sem:
+                return await self.fetch_player_matches(pid)
+
+        pids = [str(p) for p in pids]
+        res = await asyncio.gather(*(one(p) for p in pids), return_exceptions=True)
+        logs = {p: r for p, r in zip(pids, res) if not isinstance(r, Exception)}
+        errors = {p: f"{type(r).__name__}: {r}" for p, r in zip(pids, res) if isinstance(r, Exception)}
+        return logs, errors
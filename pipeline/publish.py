@@ -0,0 +1,174 @@
+"""
+Atomic, versioned publishing of pipeline outputs.
+
+The pipeline keeps writing into data/cache (its working area). ``publish`` copies the files the
+app reads into a fresh directory ``data/published/versions/<version>/`` with a manifest.json
+(input hashes, stage timings, per-file rows / bytes / sha256), then makes it current. The copy
+is staged under a temporary name and renamed into place. CURRENT, a one-line pointer file, is
+then replaced in one ``os.replace``, so a reader sees the old version or the new one, never a
+mix. ``gc`` keeps the newest ``keep`` versions, which always include the current and the
+previous version, so readers that resolved a directory just before a swap can still finish.
+
+Readers call ``current()`` once per run (one tiny file read) and use that directory for every
+file. The version string doubles as a cache key that changes once per publish. With nothing
+published (a fresh clone, the load test workspace) they fall back to data/cache.
+
+    python pipeline/publish.py publish [--keep 5]
+    python pipeline/publish.py show | list | gc
+"""
+from __future__ import annotations
+import argparse, hashlib, json, os, shutil, time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = "data/published"
+CACHE = "data/cache"
+POINTER = "CURRENT"
+FILES = [
+    "projections_next_gw.csv", "projections_next_3gws.csv", "projections_next_5gws.csv",
+    "captaincy_rankings.csv", "ep_components.csv", "price_predictions.csv", "xgxa_players.csv",
+    "bootstrap-static.json", "fixtures.json",
+]
+KEEP = 5
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _rows(path: str) -> Optional[int]:
+    if path.endswith(".csv"):
+        with open(path, "rb") as f:
+            return max(0, sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) - 1)
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            obj = json.load(f)
+        return len(obj) if isinstance(obj, list) else len(obj.get("elements", [])) if isinstance(obj, dict) else None
+    return None
+
+# ============================================================
+# Readers
+# ============================================================
+def current(root: str = ROOT, fallback: str = CACHE) -> Tuple[str, Path]:
+    """(version, directory) of the published outputs, or ("cache", data/cache) if none."""
+    try:
+        with open(os.path.join(root, POINTER), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except OSError:
+        return "cache", Path(fallback)
+    d = Path(root) / "versions" / version
+    return (version, d) if version and d.is_dir() else ("cache", Path(fallback))
+
+def manifest(version: Optional[str] = None, root: str = ROOT) -> Optional[dict]:
+    version = version or current(root)[0]
+    try:
+        with open(os.path.join(root, "versions", version, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+def versions(root: str = ROOT) -> List[str]:
+    """Published versions, oldest first (names sort by creation time)."""
+    d = os.path.join(root, "versions")
+    return sorted(v for v in os.listdir(d) if not v.startswith(".")) if os.path.isdir(d) else []
+
+# ============================================================
+# Writer
+# ============================================================
+def publish(src: str = CACHE, root: str = ROOT, files: Optional[List[str]] = None, *,
+            inputs: Optional[Dict[str, str]] = None, timings: Optional[Dict[str, float]] = None,
+            keep: int = KEEP) -> Tuple[str, bool]:
+    """Publish ``files`` present in ``src`` as a new version; (version, published). An unchanged set is not republished."""
+    t0 = time.perf_counter()
+    names = [n for n in (files or FILES) if os.path.exists(os.path.join(src, n))]
+    if not names:
+        raise FileNotFoundError(f"nothing to publish in {src}")
+    cur = manifest(root=root) if current(root)[0] != "cache" else None
+    stage = os.path.join(root, "versions", f".staging-{os.getpid()}-{time.time_ns()}")
+    os.makedirs(stage)
+    try:
+        meta = {}
+        for n in names:
+            dst = os.path.join(stage, n)
+            shutil.copyfile(os.path.join(src, n), dst)   # hash the copy: the source may be rewritten meanwhile
+            meta[n] = {"sha256": _sha256(dst), "bytes": os.path.getsize(dst), "rows": _rows(dst)}
+        if cur is not None and {n: m["sha256"] for n, m in cur.get("files", {}).items()} == {n: m["sha256"] for n, m in meta.items()}:
+            shutil.rmtree(stage)
+            return cur["version"], False
+        digest = hashlib.sha256("".join(meta[n]["sha256"] for n in names).encode()).hexdigest()[:8]
+        version = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%fZ}-{digest}"
+        man = {"version": version, "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+               "previous": cur["version"] if cur else None, "files": meta, "inputs": inputs or {},
+               "timings": {k: round(float(v), 3) for k, v in (timings or {}).items()},
+               "publish_seconds": round(time.perf_counter() - t0, 3)}
+        with open(os.path.join(stage, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(man, f, indent=2)
+        os.rename(stage, os.path.join(root, "versions", version))
+    except BaseException:
+        shutil.rmtree(stage, ignore_errors=True)
+        raise
+    tmp = os.path.join(root, f".{POINTER}.{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, POINTER))   # the swap
+    gc(root, keep)
+    return version, True
+
+def gc(root: str = ROOT, keep: int = KEEP, stale_seconds: float = 3600) -> List[str]:
+    """Drop all but the newest ``keep`` versions (never the current one) and abandoned staging dirs."""
+    keep = max(2, int(keep))
+    cur = current(root)[0]
+    all_v = versions(root)
+    drop = [v for v in all_v[:-keep] if v != cur]
+    base = os.path.join(root, "versions")
+    for v in drop:
+        shutil.rmtree(os.path.join(base, v), ignore_errors=True)
+    if os.path.isdir(base):
+        for d in os.listdir(base):
+            p = os.path.join(base, d)
+            if d.startswith(".staging-") and time.time() - os.path.getmtime(p) > stale_seconds:
+                shutil.rmtree(p, ignore_errors=True)
+    return drop
+
+def publish_settings(cfg: dict) -> dict:
+    p = cfg.get("publish", {})
+    return {"root": p.get("root", ROOT), "keep": int(p.get("keep", KEEP))}
+
+def main():
+    from utils import read_toml
+    ap = argparse.ArgumentParser(description="Versioned, atomically swapped pipeline outputs")
+    ap.add_argument("cmd", choices=["publish", "show", "list", "gc"])
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--keep", type=int, default=None)
+    args = ap.parse_args()
+    cfg = read_toml(args.config)
+    ps = publish_settings(cfg)
+    keep = args.keep or ps["keep"]
+    src = cfg.get("caching", {}).get("cache_dir", CACHE)
+    if args.cmd == "publish":
+        version, new = publish(src, ps["root"], keep=keep)
+        print(f"{'Published' if new else 'Unchanged, still'} {version}")
+    elif args.cmd == "gc":
+        print(f"Removed {len(gc(ps['root'], keep))} old versions")
+    elif args.cmd == "list":
+        cur = current(ps["root"])[0]
+        for v in versions(ps["root"]):
+            print(("* " if v == cur else "  ") + v)
+    else:
+        m = manifest(root=ps["root"])
+        if m is None:
+            print(f"Nothing published under {ps['root']}; readers use {src}")
+            return
+        print(f"{m['version']} (created {m['created_at']}, previous {m['previous']})")
+        for n, f in m["files"].items():
+            print(f"  {n:<28} {f['rows'] if f['rows'] is not None else '-':>7} rows {f['bytes']:>10} bytes  {f['sha256'][:12]}")
+        if m["timings"]:
+            print("  timings: " + ", ".join(f"{k} {v:.2f}s" for k, v in m["timings"].items()))
+
+if __name__ == "__main__":
+    main()
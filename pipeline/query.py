@@ -0,0 +1,230 @@
+"""
+SQL over the pipeline's files (DuckDB >= 1.3, in requirements.txt; the sandbox needs
+``allowed_directories`` / ``lock_configuration``).
+
+``connect`` opens an in-memory DuckDB database and defines views over the files where they
+are. No data is loaded at connect time. These files are read:
+- the projection, captaincy, component, price-odds and xG/xA CSVs, plus bootstrap-static and
+  fixtures JSON, from the published version (pipeline/publish.py) or data/cache
+- the price series parquet parts (pipeline/price_series.py)
+- the raw snapshot store index (pipeline/snapshots.py)
+- the training matrices (pipeline/train.py)
+
+A query reads only the columns it names. Its filters are evaluated inside the scans: parquet
+row groups whose min/max rule them out are skipped, and a ``horizon = 5`` filter on
+``projections`` only opens the 5-GW file. A view whose source file is missing is left out, and
+so is any view built on it.
+
+    python pipeline/query.py "SELECT * FROM player_projections ORDER BY ep_5 DESC LIMIT 10"
+    python pipeline/query.py --views
+    python pipeline/query.py -f my.sql --format csv --out result.csv
+    python pipeline/query.py --example fixture_runs
+"""
+from __future__ import annotations
+import argparse, os, sys, time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+try:
+    import duckdb
+except ImportError:  # the rest of the pipeline and the app still run without it
+    duckdb = None
+try:
+    import publish
+except ImportError:  # imported from the app as pipeline.query
+    from pipeline import publish
+
+# (name, description, files it reads, SQL). {data} is the published version / data/cache; {prices},
+# {store} and {train} come from [prices] root, [snapshots] root and [train] cache_dir. Views may use
+# earlier views.
+VIEWS: List[Tuple[str, str, List[str], str]] = [
+    ("teams", "FPL teams with strength ratings", ["{data}/bootstrap-static.json"], """
+        SELECT id, name, short_name, strength, strength_attack_home, strength_attack_away,
+               strength_defence_home, strength_defence_away
+        FROM (SELECT unnest(teams, recursive := true) FROM read_json('{data}/bootstrap-static.json'))"""),
+    ("events", "Gameweeks: deadline, finished / current / next flags", ["{data}/bootstrap-static.json"], """
+        SELECT id AS event, name, CAST(deadline_time AS TIMESTAMPTZ) AS deadline_time, finished,
+               is_previous, is_current, is_next
+        FROM (SELECT unnest(events, recursive := true) FROM read_json('{data}/bootstrap-static.json'))"""),
+    ("players", "Current player list: team, position, price, status, form, ownership", ["{data}/bootstrap-static.json"], """
+        SELECT e.id, e.web_name, e.first_name, e.second_name, e.team, t.name AS team_name,
+               ['GK', 'DEF', 'MID', 'FWD'][e.element_type] AS position, e.now_cost / 10 AS price,
+               e.status, e.chance_of_playing_next_round, TRY_CAST(e.form AS DOUBLE) AS form,
+               TRY_CAST(e.selected_by_percent AS DOUBLE) AS selected_by_percent, e.total_points, e.minutes, e.news
+        FROM (SELECT unnest(elements, recursive := true) FROM read_json('{data}/bootstrap-static.json')) e
+        LEFT JOIN teams t ON t.id = e.team"""),
+    ("fixtures", "Fixtures with difficulty and scores", ["{data}/fixtures.json"], """
+        SELECT id AS fixture, event, CAST(kickoff_time AS TIMESTAMPTZ) AS kickoff_time, team_h, team_a,
+               team_h_difficulty, team_a_difficulty, team_h_score, team_a_score, finished
+        FROM read_json('{data}/fixtures.json')"""),
+    ("team_fixtures", "One row per team per fixture: opponent, home/away, FPL difficulty", [], """
+        SELECT f.event, f.fixture, f.kickoff_time, f.team, t.name AS team_name, f.opp, o.short_name AS opp_short,
+               f.is_home, f.difficulty, f.finished
+        FROM (SELECT event, fixture, kickoff_time, team_h AS team, team_a AS opp, true AS is_home,
+                     team_h_difficulty AS difficulty, finished FROM fixtures
+              UNION ALL
+              SELECT event, fixture, kickoff_time, team_a, team_h, false, team_a_difficulty, finished FROM fixtures) f
+        LEFT JOIN teams t ON t.id = f.team LEFT JOIN teams o ON o.id = f.opp"""),
+    ("team_fixture_runs", "Each team's next 5 GWs: fixture count, mean difficulty, easy / hard counts, run", [], """
+        SELECT tf.team, tf.team_name, count(*) AS fixtures, round(avg(tf.difficulty), 2) AS avg_difficulty,
+               count_if(tf.difficulty <= 2) AS easy, count_if(tf.difficulty >= 4) AS hard,
+               string_agg(tf.opp_short || CASE WHEN tf.is_home THEN ' (H)' ELSE ' (A)' END, ', '
+                          ORDER BY tf.event, tf.kickoff_time) AS run
+        FROM team_fixtures tf, (SELECT min(event) AS gw FROM events WHERE NOT finished) nxt
+        WHERE tf.event >= nxt.gw AND tf.event < nxt.gw + 5
+        GROUP BY ALL"""),
+    ("projections", "EP per player by horizon (1, 3, 5 GWs), long form", [
+        "{data}/projections_next_gw.csv", "{data}/projections_next_3gws.csv", "{data}/projections_next_5gws.csv"], """
+        SELECT 1 AS horizon, * FROM read_csv('{data}/projections_next_gw.csv')
+        UNION ALL BY NAME SELECT 3 AS horizon, * FROM read_csv('{data}/projections_next_3gws.csv')
+        UNION ALL BY NAME SELECT 5 AS horizon, * FROM read_csv('{data}/projections_next_5gws.csv')"""),
+    ("player_projections", "EP per player over 1, 3 and 5 GWs side by side", [], """
+        SELECT id, any_value(web_name) AS web_name, any_value(team_name) AS team_name,
+               any_value(position) AS position, any_value(price) AS price,
+               max(ep_total) FILTER (horizon = 1) AS ep_1, max(ep_total) FILTER (horizon = 3) AS ep_3,
+               max(ep_total) FILTER (horizon = 5) AS ep_5, max(exp_minutes) FILTER (horizon = 1) AS exp_minutes
+        FROM projections GROUP BY id"""),
+    ("captaincy", "Captaincy rankings (top 50 by next-GW EP)", ["{data}/captaincy_rankings.csv"],
+        "SELECT * FROM read_csv('{data}/captaincy_rankings.csv')"),
+    ("ep_components", "Per player x fixture EP breakdown", ["{data}/ep_components.csv"],
+        "SELECT * FROM read_csv('{data}/ep_components.csv')"),
+    ("price_predictions", "Overnight price-change odds", ["{data}/price_predictions.csv"],
+        "SELECT * FROM read_csv('{data}/price_predictions.csv')"),
+    ("xgxa", "Provider xG/xA per 90 mapped to FPL ids", ["{data}/xgxa_players.csv"],
+        "SELECT * FROM read_csv('{data}/xgxa_players.csv')"),
+    ("price_history", "Price, ownership and transfers per player at every bootstrap snapshot", ["{prices}"], """
+        SELECT s.ts, s.event, s.id, p.web_name, p.team_name, p.position, s.now_cost / 10 AS price,
+               s.selected_by_percent, s.transfers_in_event, s.transfers_out_event,
+               s.transfers_in_event - s.transfers_out_event AS net_transfers_event, s.total_players
+        FROM read_parquet('{prices}/*.parquet') s LEFT JOIN players p ON p.id = s.id"""),
+    ("price_changes", "Snapshots where a player's price moved, with the change", [], """
+        SELECT * FROM (
+            SELECT ts, event, id, web_name, team_name, price,
+                   round(price - lag(price) OVER (PARTITION BY id ORDER BY ts), 1) AS change
+            FROM price_history)
+        WHERE change <> 0"""),
+    ("snapshots", "Raw snapshot store index: payload name, time, content hash", ["{store}/index.jsonl"], """
+        SELECT name, strptime(ts, '%Y-%m-%dT%H-%M-%SZ') AS ts, sha
+        FROM read_json('{store}/index.jsonl', format = 'newline_delimited')"""),
+    ("player_gameweeks", "Training matrix: player x finished GW features and outcomes", ["{train}/player_gw.parquet"],
+        "SELECT * FROM read_parquet('{train}/player_gw.parquet')"),
+    ("team_fixture_history", "Training matrix: team x finished fixture ratings and results", ["{train}/team_fixtures.parquet"],
+        "SELECT * FROM read_parquet('{train}/team_fixtures.parquet')"),
+]
+
+EXAMPLES: Dict[str, str] = {
+    "top_picks": """SELECT web_name, team_name, position, price, ep_1, ep_3, ep_5
+FROM player_projections WHERE price <= 6.0 ORDER BY ep_5 DESC LIMIT 20""",
+    "fixture_runs": "SELECT * FROM team_fixture_runs ORDER BY avg_difficulty, team_name",
+    "value": """SELECT position, web_name, team_name, price, ep_5, round(ep_5 / price, 2) AS ep_per_m
+FROM player_projections WHERE exp_minutes > 60
+QUALIFY row_number() OVER (PARTITION BY position ORDER BY ep_5 / price DESC) <= 5
+ORDER BY position, ep_per_m DESC""",
+    "price_risers": """SELECT web_name, team_name, round(sum(change), 1) AS change, count(*) AS moves
+FROM price_changes WHERE ts >= now() - INTERVAL 14 DAY GROUP BY ALL ORDER BY change DESC LIMIT 20""",
+    "ownership_trend": """SELECT date_trunc('day', ts) AS day, web_name, max(selected_by_percent) AS selected_by_percent
+FROM price_history WHERE web_name = 'M.Salah' GROUP BY ALL ORDER BY day""",
+}
+
+def query_settings(cfg: dict) -> dict:
+    q = cfg.get("query", {})
+    return {"data_root": cfg.get("publish", {}).get("root", publish.ROOT),
+            "cache": cfg.get("caching", {}).get("cache_dir", publish.CACHE),
+            "prices": cfg.get("prices", {}).get("root", "data/cache/price_series"),
+            "store": cfg.get("snapshots", {}).get("root", "data/raw/store"),
+            "train": cfg.get("train", {}).get("cache_dir", "data/cache/train"),
+            "threads": int(q.get("threads", 2)), "memory_limit": str(q.get("memory_limit", "512MB")),
+            "max_rows": int(q.get("max_rows", 5000))}
+
+def _sources(qs: dict, data_dir: Optional[Path]) -> Dict[str, str]:
+    data = data_dir if data_dir is not None else publish.current(qs["data_root"], qs["cache"])[1]
+    return {k: Path(v).resolve().as_posix() for k, v in
+            (("data", data), ("prices", qs["prices"]), ("store", qs["store"]), ("train", qs["train"]))}
+
+def _present(path: str) -> bool:
+    if os.path.isdir(path):
+        return any(f.endswith(".parquet") for f in os.listdir(path))
+    return os.path.exists(path)
+
+def connect(qs: dict, data_dir: Optional[Path] = None, *, sandbox: bool = False):
+    """(connection, views created, views skipped). ``sandbox``: no file access beyond the sources."""
+    if duckdb is None:
+        raise RuntimeError("SQL queries need DuckDB: pip install duckdb")
+    src = _sources(qs, data_dir)
+    fill = lambda s: s.format(**{k: v.replace("'", "''") for k, v in src.items()})
+    con = duckdb.connect(":memory:", config={"threads": qs["threads"], "memory_limit": qs["memory_limit"]})
+    made, skipped = [], []
+    for name, _, files, sql in VIEWS:
+        missing = [f for f in files if not _present(f.format(**src))]
+        if missing:
+            skipped.append(name)
+            continue
+        try:
+            con.execute(f"CREATE VIEW {name} AS {fill(sql)}")
+            made.append(name)
+        except duckdb.Error:   # built on a skipped view
+            skipped.append(name)
+    if sandbox:
+        dirs = sorted({v.rstrip("/") + "/" for v in src.values()})
+        con.execute(f"SET allowed_directories = {dirs!r}")
+        con.execute("SET enable_external_access = false")
+        con.execute("SET lock_configuration = true")
+    return con, made, skipped
+
+def read_only(con, sql: str) -> bool:
+    """True when every statement in ``sql`` is a SELECT (incl. WITH ... SELECT)."""
+    stmts = con.extract_statements(sql)
+    return bool(stmts) and all(s.type == duckdb.StatementType.SELECT for s in stmts)
+
+def describe(con, made: List[str]) -> List[Tuple[str, str, List[str]]]:
+    """(view, description, columns) for the views that exist."""
+    about = {n: d for n, d, _, _ in VIEWS}
+    return [(n, about[n], [r[0] for r in con.execute(f"DESCRIBE {n}").fetchall()]) for n in made]
+
+def main():
+    from utils import read_toml
+    ap = argparse.ArgumentParser(description="SQL over projections, fixtures, price/ownership history and snapshots (DuckDB)")
+    ap.add_argument("sql", nargs="?", help="query (or -f FILE, --example NAME, or stdin)")
+    ap.add_argument("-f", "--file", default=None)
+    ap.add_argument("--example", choices=sorted(EXAMPLES), default=None)
+    ap.add_argument("--views", action="store_true", help="list the views and their columns")
+    ap.add_argument("--explain", action="store_true", help="show the query plan instead of running it")
+    ap.add_argument("--format", choices=["table", "csv", "json", "parquet"], default="table")
+    ap.add_argument("--out", default=None, help="write the result here (stdout for table / csv / json)")
+    ap.add_argument("--max-rows", type=int, default=50, help="rows shown in table format")
+    ap.add_argument("--config", default="configs/config.toml")
+    args = ap.parse_args()
+    try:
+        con, made, skipped = connect(query_settings(read_toml(args.config)))
+    except RuntimeError as e:
+        raise SystemExit(str(e))
+    if args.views:
+        for n, d, cols in describe(con, made):
+            print(f"{n:<22} {d}\n{'':<22} {', '.join(cols)}")
+        if skipped:
+            print(f"(no source files yet: {', '.join(skipped)})")
+        return
+    sql = (EXAMPLES[args.example] if args.example else open(args.file, encoding="utf-8").read() if args.file
+           else args.sql or sys.stdin.read())
+    if args.explain:
+        print(con.execute(f"EXPLAIN {sql}").fetchall()[0][1])
+        return
+    t0 = time.perf_counter()
+    rel = con.sql(sql)
+    if rel is None:   # a statement without a result
+        return
+    if args.format == "table" and not args.out:
+        rel.show(max_rows=args.max_rows)
+    elif args.out and args.format in ("csv", "parquet"):
+        (rel.write_csv if args.format == "csv" else rel.write_parquet)(args.out)
+    else:
+        df = rel.df()
+        text = df.to_json(orient="records", date_format="iso") if args.format == "json" else df.to_csv(index=False)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text + ("\n" if args.format == "json" else ""))
+    print(f"({time.perf_counter() - t0:.3f}s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
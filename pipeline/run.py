@@ -0,0 +1,393 @@
+"""
+Dependency-aware pipeline runner.
+
+Every stage declares the files (or directories) it reads and writes; a stage depends on the
+stages that write its inputs, so the DAG follows from the declarations. A stage is skipped when
+the content hash of its inputs, its code and the config is the one recorded after its last
+successful run, and its outputs are still what that run wrote (data/cache/pipeline_state.json).
+Network stages (``volatile``) always run unless ``--no-fetch`` or their ``min_interval_minutes``
+says otherwise; when they bring nothing new, their outputs hash the same and downstream skips.
+Ready stages run concurrently on a thread pool (``--jobs``), each in its own interpreter. The last
+stage publishes the app-facing files as a new version (pipeline/publish.py).
+
+    python pipeline/run.py                    # everything stale
+    python pipeline/run.py project            # a target plus what it needs
+    python pipeline/run.py --no-fetch         # recompute from the cached inputs only
+    python pipeline/run.py --force project --jobs 2
+    python pipeline/run.py --list | --dry-run
+"""
+from __future__ import annotations
+import argparse, hashlib, json, os, subprocess, sys, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional
+import pandas as pd
+import metrics, publish
+from utils import read_toml
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+STATE_PATH = "data/cache/pipeline_state.json"
+LOCK_PATH = "data/cache/pipeline.lock"
+CACHE = "data/cache"
+
+@dataclass
+class Stage:
+    name: str
+    cmd: Optional[List[str]] = None            # script + args, run with this interpreter; "{config}" is substituted
+    fn: Optional[Callable[["Runner"], None]] = None    # or an in-process callable, given the runner
+    inputs: List[str] = field(default_factory=list)     # "{publish_root}" is substituted from the config
+    outputs: List[str] = field(default_factory=list)
+    code: List[str] = field(default_factory=list)
+    volatile: bool = False                     # reads the network
+
+# ============================================================
+# In-process stages
+# ============================================================
+EXPORT_DIR = "data/exports"
+
+def export_tables(cache: str = CACHE, out_dir: str = EXPORT_DIR) -> None:
+    """One projections table (EP over 1/3/5 GWs + captaincy rank) and the 4-4-2 suggested XI."""
+    p = pd.read_csv(os.path.join(cache, "projections_next_gw.csv")).rename(columns={"ep_total": "ep_1"})
+    for n in (3, 5):
+        q = pd.read_csv(os.path.join(cache, f"projections_next_{n}gws.csv"))
+        p = p.merge(q[["id", "ep_total"]].rename(columns={"ep_total": f"ep_{n}"}), on="id", how="left")
+    cap = pd.read_csv(os.path.join(cache, "captaincy_rankings.csv"))
+    p["captain_rank"] = p["id"].map({int(i): r + 1 for r, i in enumerate(cap["id"])}).astype("Int64")
+    p = p.sort_values("ep_1", ascending=False)
+    xi = pd.concat([p[p["position"] == pos].head(k) for pos, k in (("GK", 1), ("DEF", 4), ("MID", 4), ("FWD", 2))])
+    os.makedirs(out_dir, exist_ok=True)
+    p.to_csv(os.path.join(out_dir, "projections.csv"), index=False)
+    xi[["id", "web_name", "team_name", "position", "price", "ep_1"]].to_csv(os.path.join(out_dir, "suggested_xi.csv"), index=False)
+    print(f"Exported {len(p)} players and a {len(xi)}-man XI to {out_dir}/")
+
+def publish_outputs(runner: "Runner") -> None:
+    """Publish the app-facing files; the manifest records the DAG's source inputs and this run's timings."""
+    ps = publish.publish_settings(read_toml(runner.config))
+    produced = [o for s in runner.stages for o in s.outputs]
+    sources = sorted({i for s in runner.stages for i in s.inputs if not any(_overlap(i, o) for o in produced)}
+                     | {runner.config} | {o for s in runner.stages if s.volatile for o in s.outputs})
+    timings = {n: r["seconds"] for n, r in runner.results.items() if r["status"] == "ran"}
+    version, new = publish.publish(CACHE, ps["root"], inputs={p: file_hash(p) for p in sources},
+                                   timings=timings, keep=ps["keep"])
+    print(f"{'Published' if new else 'Unchanged, still'} {version}")
+
+# ============================================================
+# Stages
+# ============================================================
+def _c(name: str) -> str:
+    return f"{CACHE}/{name}"
+
+BOOTSTRAP, FIXTURES = _c("bootstrap-static.json"), _c("fixtures.json")
+CHECK_OK = _c("check.ok")   # written by a passing scoring check; publish reads it so a failed check blocks it
+PROJECTIONS = [_c("projections_next_gw.csv"), _c("projections_next_3gws.csv"), _c("projections_next_5gws.csv")]
+
+STAGES: List[Stage] = [
+    Stage("bootstrap", ["pipeline/fetch_fpl_data.py", "bootstrap", "--config", "{config}"],
+          outputs=[BOOTSTRAP, _c("price_series")], code=["pipeline/fetch_fpl_data.py", "pipeline/fpl_client.py"], volatile=True),
+    Stage("fixtures", ["pipeline/fetch_fpl_data.py", "fixtures", "--config", "{config}"],
+          outputs=[FIXTURES], code=["pipeline/fetch_fpl_data.py", "pipeline/fpl_client.py"], volatile=True),
+    Stage("xgxa_fetch", ["pipeline/ingest_xgxa.py", "--stage", "fetch", "--config", "{config}"],
+          outputs=[_c("xgxa_raw"), _c("understat_matches.parquet"), _c("fbref_players.parquet")], code=["pipeline/ingest_xgxa.py", "pipeline/providers", "pipeline/match_logs.py"], volatile=True),
+    Stage("xgxa_map", ["pipeline/ingest_xgxa.py", "--stage", "map", "--config", "{config}"],
+          inputs=[BOOTSTRAP, _c("xgxa_raw"), "configs/xgxa_overrides.csv"],
+          outputs=[_c("xgxa_players.csv"), _c("xgxa_crosswalk.csv")], code=["pipeline/ingest_xgxa.py", "pipeline/mapping.py", "pipeline/players.py"]),
+    Stage("team_model", ["pipeline/team_model.py", "update", "--config", "{config}"],
+          inputs=[BOOTSTRAP, FIXTURES], outputs=[_c("team_model.json")], code=["pipeline/team_model.py", "pipeline/compute_phase3.py"]),
+    Stage("prices", ["pipeline/price_series.py", "predict", "--calibrate", "--config", "{config}"],
+          inputs=[_c("price_series")], outputs=[_c("price_predictions.csv")], code=["pipeline/price_series.py"]),
+    Stage("project", ["pipeline/compute_phase3.py", "--stage", "project"],
+          inputs=[BOOTSTRAP, FIXTURES, _c("xgxa_players.csv"), _c("team_model.json"), "configs/model_params.toml"],
+          outputs=PROJECTIONS + [_c("ep_components.csv")],
+          code=["pipeline/compute_phase3.py", "pipeline/players.py", "pipeline/scoring.py", "pipeline/team_model.py"]),
+    Stage("captaincy", ["pipeline/compute_phase3.py", "--stage", "captaincy"],
+          inputs=[PROJECTIONS[0]], outputs=[_c("captaincy_rankings.csv")], code=["pipeline/compute_phase3.py"]),
+    Stage("check", ["pipeline/scoring.py", "check", "--ok", CHECK_OK], inputs=[_c("ep_components.csv")],
+          outputs=[CHECK_OK], code=["pipeline/scoring.py"]),
+    Stage("export", fn=lambda runner: export_tables(), inputs=PROJECTIONS + [_c("captaincy_rankings.csv")],
+          outputs=[f"{EXPORT_DIR}/projections.csv", f"{EXPORT_DIR}/suggested_xi.csv"], code=["pipeline/run.py"]),
+    Stage("publish", fn=publish_outputs, inputs=[_c(n) for n in publish.FILES] + [CHECK_OK],
+          outputs=[f"{{publish_root}}/{publish.POINTER}"], code=["pipeline/run.py", "pipeline/publish.py"]),
+]
+
+def resolve(stages: List[Stage], cfg: dict) -> List[Stage]:
+    """Stages with their config-dependent paths filled in (the publish root publish_outputs writes to)."""
+    root = publish.publish_settings(cfg)["root"]
+    sub = lambda paths: [p.replace("{publish_root}", root) for p in paths]
+    return [replace(s, inputs=sub(s.inputs), outputs=sub(s.outputs)) for s in stages]
+
+# ============================================================
+# Hashing & graph
+# ============================================================
+def file_hash(path: str) -> str:
+    """sha256 of a file's bytes, of a directory's (relative path, file hash) list, or "missing"."""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for f in sorted(files):
+                p = os.path.join(root, f)
+                h.update(os.path.relpath(p, path).encode() + b"\0" + file_hash(p).encode())
+        return h.hexdigest()
+    if not os.path.exists(path):
+        return "missing"
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _overlap(a: str, b: str) -> bool:
+    a, b = os.path.normpath(a), os.path.normpath(b)
+    return a == b or a.startswith(b + os.sep) or b.startswith(a + os.sep)
+
+def upstream(stages: List[Stage]) -> Dict[str, List[str]]:
+    """stage -> stages writing one of its inputs."""
+    return {s.name: [t.name for t in stages if t is not s and any(_overlap(i, o) for i in s.inputs for o in t.outputs)]
+            for s in stages}
+
+def select(stages: List[Stage], targets: Iterable[str]) -> List[Stage]:
+    """The targets plus everything upstream of them (all stages when no target is given)."""
+    targets = list(targets)
+    if not targets:
+        return list(stages)
+    by_name, deps = {s.name: s for s in stages}, upstream(stages)
+    unknown = [t for t in targets if t not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s) {unknown}; have {list(by_name)}")
+    keep, todo = set(), list(targets)
+    while todo:
+        n = todo.pop()
+        if n not in keep:
+            keep.add(n)
+            todo += deps[n]
+    return [s for s in stages if s.name in keep]
+
+# ============================================================
+# Runner
+# ============================================================
+class RunLocked(RuntimeError):
+    pass
+
+class RunLock:
+    """Exclusive, non-blocking lock file: two runs (cron, the scheduler, a manual refresh) never overlap."""
+    def __init__(self, path: str = LOCK_PATH):
+        self.path, self.f = path, None
+
+    def acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        f = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        self.f = f
+        return True
+
+    def release(self) -> None:
+        if self.f is not None:
+            self.f.close()   # closing drops the lock
+            self.f = None
+
+class Runner:
+    def __init__(self, stages: List[Stage], config: str = "configs/config.toml", state_path: str = STATE_PATH,
+                 jobs: int = 4, force: Iterable[str] = (), no_fetch: bool = False, fresh: Iterable[str] = (),
+                 min_interval_minutes: Optional[Dict[str, float]] = None, dry_run: bool = False,
+                 lock_path: Optional[str] = LOCK_PATH):
+        cfg = read_toml(config, {})
+        self.stages, self.config, self.state_path = resolve(stages, cfg), config, state_path
+        self.jobs, self.force, self.no_fetch, self.dry_run = max(1, int(jobs)), set(force), no_fetch, dry_run
+        self.fresh = set(fresh)        # network stages the caller has just fetched itself
+        self.lock = RunLock(lock_path) if lock_path else None   # None: the caller holds it
+        self.min_interval = min_interval_minutes or {}
+        self.deps = upstream(self.stages)
+        try:
+            with open(state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {}
+        self.results: Dict[str, dict] = {}
+        self.metrics = metrics.metrics_settings(cfg)
+
+    def fingerprint(self, s: Stage) -> str:
+        parts = {"cmd": s.cmd or s.name, "inputs": {p: file_hash(p) for p in s.inputs + [self.config]},
+                 "code": {p: file_hash(p) for p in s.code}}
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def skip_reason(self, s: Stage, fp: str) -> Optional[str]:
+        """Why ``s`` need not run, or None."""
+        if s.name in self.force:
+            return None
+        prev = self.state.get(s.name)
+        if s.volatile:
+            if s.name in self.fresh:
+                return "fetched by caller"
+            if self.no_fetch:
+                return "--no-fetch"
+            age = (time.time() - prev["finished"]) / 60 if prev else None
+            limit = float(self.min_interval.get(s.name, 0))
+            if age is not None and limit and age < limit:
+                return f"fetched {age:.0f} min ago"
+            return None
+        if not prev or prev.get("fingerprint") != fp:
+            return None
+        if any(file_hash(o) != prev.get("outputs", {}).get(o) for o in s.outputs):
+            return None
+        return "inputs unchanged"
+
+    def _execute(self, s: Stage) -> tuple:
+        t0 = time.perf_counter()
+        if s.fn is not None:
+            try:
+                s.fn(self)
+                return 0, "", time.perf_counter() - t0
+            except Exception as e:
+                return 1, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+        argv = [sys.executable] + [a.replace("{config}", self.config) for a in s.cmd]
+        env = dict(os.environ, FPL_METRICS_JOB=s.name, FPL_METRICS_DIR=self.metrics["dir"]) if self.metrics["enabled"] else None
+        p = subprocess.run(argv, capture_output=True, text=True, env=env)
+        return p.returncode, (p.stdout + p.stderr).strip(), time.perf_counter() - t0
+
+    def _start(self, s: Stage, pool: ThreadPoolExecutor):
+        fp = self.fingerprint(s)
+        reason = self.skip_reason(s, fp)
+        if reason is not None or self.dry_run:
+            self.results[s.name] = {"status": "skipped" if reason else "would run", "seconds": 0.0,
+                                    "note": reason or "", "changed": False}
+            return None
+        return pool.submit(self._execute, s), fp
+
+    def run(self) -> Dict[str, dict]:
+        """Run every stale stage; raises RunLocked when another run holds the lock."""
+        if self.lock is None or self.dry_run:
+            return self._run()
+        if not self.lock.acquire():
+            raise RunLocked(f"another pipeline run holds {self.lock.path}")
+        try:
+            return self._run()
+        finally:
+            self.lock.release()
+
+    def _run(self) -> Dict[str, dict]:
+        t_wall = time.perf_counter()
+        pending = {s.name: s for s in self.stages}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.jobs, thread_name_prefix="stage") as pool:
+            while pending or running:
+                for name in list(pending):
+                    if any(d not in self.results for d in self.deps[name]):
+                        continue
+                    s = pending.pop(name)
+                    bad = [d for d in self.deps[name] if self.results.get(d, {}).get("status") in ("failed", "blocked")]
+                    if bad:
+                        self.results[name] = {"status": "blocked", "seconds": 0.0, "note": f"after {', '.join(bad)}", "changed": False}
+                        continue
+                    started = self._start(s, pool)
+                    if started:
+                        running[started[0]] = (s, started[1])
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    s, fp = running.pop(fut)
+                    self._finish(s, fp, *fut.result())
+        self.wall = time.perf_counter() - t_wall
+        if not self.dry_run:
+            self._save_state()
+            if self.metrics["enabled"]:
+                self._write_metrics()
+        return self.results
+
+    def _finish(self, s: Stage, fp: str, code: int, log: str, seconds: float) -> None:
+        prefix = f"[{s.name}] "
+        if log:
+            print("\n".join(prefix + line for line in log.splitlines()[-40:]), flush=True)
+        if code != 0:
+            self.results[s.name] = {"status": "failed", "seconds": seconds, "note": f"exit {code}", "changed": False}
+            return
+        outputs = {o: file_hash(o) for o in s.outputs}
+        prev = self.state.get(s.name, {})
+        changed = outputs != prev.get("outputs")
+        self.results[s.name] = {"status": "ran", "seconds": seconds, "note": "" if changed else "outputs unchanged",
+                                "changed": changed}
+        self.state[s.name] = {"fingerprint": self.fingerprint(s) if s.volatile else fp, "outputs": outputs,
+                              "seconds": round(seconds, 3), "finished": time.time(),
+                              "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+    def _save_state(self) -> None:
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.state_path)
+
+    def _write_metrics(self) -> None:
+        """The ``pipeline`` metrics job: this run's stage durations and status, every stage's last success."""
+        reg = metrics.Registry()
+        reg.set("fpl_pipeline_run_timestamp_seconds", time.time())
+        reg.set("fpl_pipeline_run_duration_seconds", self.wall)
+        for name, r in self.results.items():
+            reg.set("fpl_pipeline_stage_duration_seconds", r["seconds"], stage=name)
+            reg.set("fpl_pipeline_stage_status", 1, stage=name, status=r["status"])
+        for name, st in self.state.items():
+            reg.set("fpl_pipeline_stage_last_success_timestamp_seconds", st["finished"], stage=name)
+        try:
+            reg.write("pipeline", self.metrics["dir"])
+        except OSError as e:
+            print(f"metrics: not written ({e})", flush=True)
+
+    def summary(self) -> str:
+        rows = [(s.name, self.results.get(s.name, {})) for s in self.stages]
+        w = max(len(n) for n, _ in rows)
+        lines = [f"{'stage':<{w}}  {'status':<9} {'seconds':>8}  note"]
+        for n, r in rows:
+            lines.append(f"{n:<{w}}  {r.get('status', '-'):<9} {r.get('seconds', 0.0):>8.2f}  {r.get('note', '')}")
+        busy = sum(r.get("seconds", 0.0) for _, r in rows)
+        lines.append(f"{len([1 for _, r in rows if r.get('status') == 'ran'])} ran, "
+                     f"{len([1 for _, r in rows if r.get('status') == 'skipped'])} skipped; "
+                     f"{busy:.2f}s of stage time in {self.wall:.2f}s wall ({self.jobs} jobs)")
+        return "\n".join(lines)
+
+def main():
+    ap = argparse.ArgumentParser(description="Run the pipeline DAG, skipping stages whose inputs are unchanged")
+    ap.add_argument("targets", nargs="*", help="stages to bring up to date (default: all)")
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--jobs", type=int, default=None)
+    ap.add_argument("--force", nargs="*", default=[], help="run these stages even if up to date (no names: all)")
+    ap.add_argument("--no-fetch", action="store_true", help="skip network stages, use the cached inputs")
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--list", action="store_true")
+    args = ap.parse_args()
+    cfg = read_toml(args.config)
+    pcfg = cfg.get("pipeline", {})
+    stages = select(STAGES, args.targets)
+
+    if args.list:
+        stages = resolve(stages, cfg)
+        deps = upstream(stages)
+        for s in stages:
+            print(f"{s.name:<11} {'(network) ' if s.volatile else ''}after: {', '.join(deps[s.name]) or '-'}")
+            print(f"{'':<11} in:  {', '.join(s.inputs) or '-'}\n{'':<11} out: {', '.join(s.outputs) or '-'}")
+        return
+    force = [s.name for s in stages] if args.force == [] and "--force" in sys.argv else args.force
+    runner = Runner(stages, config=args.config, state_path=pcfg.get("state_path", STATE_PATH),
+                    jobs=args.jobs or int(pcfg.get("jobs", 4)), force=force, no_fetch=args.no_fetch,
+                    min_interval_minutes=pcfg.get("min_interval_minutes"), dry_run=args.dry_run,
+                    lock_path=pcfg.get("lock_path", LOCK_PATH))
+    try:
+        res = runner.run()
+    except RunLocked as e:
+        raise SystemExit(str(e))
+    print(runner.summary())
+    if any(r["status"] in ("failed", "blocked") for r in res.values()):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Deadline-aware refresh daemon.
+
+Polls bootstrap-static and fixtures with conditional GETs (the shared HTTP cache in ``refresh``
+mode, so an unchanged feed costs a 304) on an interval set by the next ``events[].deadline_time``:
+``[scheduler] tiers`` tighten it as the deadline approaches, the overnight price-change window
+tightens it again, and between gameweeks it backs off to ``idle_seconds``. A payload whose
+content differs from the last one seen is held until no run is in flight, then saved and handed
+to the pipeline runner (pipeline/run.py), which recomputes only the stages downstream of what
+changed, on its bounded stage pool. Runs go through one worker: changes seen during a run are
+coalesced into a single follow-up run rather than queued, and the runner's lock file keeps the
+cron job or a manual ``make refresh`` from overlapping with it.
+
+    python pipeline/scheduler.py              # until Ctrl-C
+    python pipeline/scheduler.py --once       # one poll (+ run if changed)
+    python pipeline/scheduler.py --plan 7     # the poll schedule for the next 7 days
+"""
+from __future__ import annotations
+import argparse, asyncio, hashlib, json, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from utils import read_toml
+import fetch_fpl_data as ffd
+import metrics
+import run as pipeline_run
+
+FEEDS = {"bootstrap-static": "bootstrap", "fixtures": "fixtures"}   # cached name -> pipeline stage
+DEFAULT_TIERS = [[1, 120], [6, 300], [24, 900], [72, 1800]]
+
+def digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+def deadlines(bs: Optional[dict]) -> List[float]:
+    """Every GW deadline in epoch seconds, sorted."""
+    return sorted(datetime.fromisoformat(e["deadline_time"].replace("Z", "+00:00")).timestamp()
+                  for e in (bs or {}).get("events") or [] if e.get("deadline_time"))
+
+def _seconds_of_day(hhmm: str) -> int:
+    h, m = hhmm.split(":")
+    return int(h) * 3600 + int(m) * 60
+
+def poll_interval(now: float, dl: List[float], scfg: dict) -> Tuple[float, str]:
+    """(seconds until the next poll, why) at epoch time ``now``."""
+    secs, why = float(scfg.get("idle_seconds", 10800)), "between gameweeks"
+    nxt = next((d for d in dl if d > now), None)
+    if nxt is not None:
+        hours = (nxt - now) / 3600
+        for h, s in sorted(scfg.get("tiers", DEFAULT_TIERS)):
+            if hours <= h:
+                secs, why = float(s), f"deadline within {h:g} h"
+                break
+        secs = min(secs, nxt - now + 60)   # one poll just after the deadline (GW flips to current)
+    window = scfg.get("price_window_utc")
+    if window:
+        start, end = (_seconds_of_day(t) for t in window)
+        into, length = (now - start) % 86400, (end - start) % 86400
+        if into < length:
+            ps = float(scfg.get("price_poll_seconds", 300))
+            if ps < secs:
+                secs, why = ps, "price window"
+        else:
+            secs = min(secs, 86400 - into)   # wake up for the window
+    return max(secs, 1.0), why
+
+class Scheduler:
+    def __init__(self, cfg: dict, *, config_path: str = "configs/config.toml", base_url: Optional[str] = None,
+                 jobs: Optional[int] = None, targets: Optional[List[str]] = None):
+        self.cfg = dict(cfg, http_cache=dict(cfg.get("http_cache", {}), mode="refresh"))
+        self.scfg, self.pcfg = cfg.get("scheduler", {}), cfg.get("pipeline", {})
+        self.config_path, self.base_url = config_path, base_url
+        self.jobs = int(jobs or self.pcfg.get("jobs", 4))
+        self.stages = pipeline_run.select(pipeline_run.STAGES, targets or self.scfg.get("targets") or [])
+        self.cache_dir = cfg["caching"]["cache_dir"]
+        self.seen: Dict[str, Optional[str]] = {n: digest(p) if p is not None else None
+                                               for n, p in ((n, self._cached(n)) for n in FEEDS)}
+        self.held: Dict[str, object] = {}   # changed payloads not saved yet (a run may be reading the files)
+        self.dirty = True                   # one catch-up run at start; the runner skips what is fresh
+        self.future = None
+        self.lock = threading.RLock()
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pipeline")
+        self._dl: Tuple[Optional[str], List[float]] = (None, [])
+        self.stats = {"polls": 0, "not_modified": 0, "changes": 0, "runs": 0, "coalesced": 0, "errors": 0}
+        metrics.collector(self._metrics)
+
+    def _metrics(self, reg) -> None:
+        for k, v in self.stats.items():
+            reg.set("fpl_scheduler_events_total", v, event=k)
+
+    def _cached(self, name: str):
+        try:
+            with open(os.path.join(self.cache_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def deadlines(self) -> List[float]:
+        key = self.seen.get("bootstrap-static")
+        if self._dl[0] != key or not self._dl[1]:
+            with self.lock:
+                bs = self.held.get("bootstrap-static")
+            self._dl = (key, deadlines(bs if bs is not None else self._cached("bootstrap-static")))
+        return self._dl[1]
+
+    # ---------------- polling ----------------
+    async def poll(self, cli) -> List[str]:
+        """Conditional GETs of both feeds; returns the names whose content changed."""
+        self.stats["polls"] += 1
+        got = await asyncio.gather(cli.get_bootstrap(), cli.get_fixtures())
+        changed = []
+        for name, (payload, new) in zip(FEEDS, got):
+            if not new:
+                self.stats["not_modified"] += 1
+                continue
+            d = digest(payload)
+            if d == self.seen.get(name):
+                continue
+            self.seen[name] = d
+            changed.append(name)
+            with self.lock:
+                self.held[name] = payload
+        self.stats["changes"] += len(changed)
+        return changed
+
+    # ---------------- runs ----------------
+    def kick(self) -> str:
+        """Start a run for held changes unless one is in flight; that run's completion starts the next."""
+        with self.lock:
+            if not self.held and not self.dirty:
+                return "idle"
+            if self.future is not None and not self.future.done():
+                self.stats["coalesced"] += 1
+                return "busy"
+            held, self.held, self.dirty = self.held, {}, False
+            self.future = self.pool.submit(self._run, held)
+            self.future.add_done_callback(self._follow_up)
+            return "started"
+
+    def _follow_up(self, future) -> None:
+        if future.exception() is not None:   # _run put the payloads back: the next poll retries
+            print(f"{_now()} run failed: {future.exception()!r}; retrying after the next poll", flush=True)
+        elif future.result() and self.held:   # changes that arrived during the run
+            self.kick()
+
+    def _run(self, held: Dict[str, object]) -> bool:
+        lock = pipeline_run.RunLock(self.pcfg.get("lock_path", pipeline_run.LOCK_PATH))
+        if not lock.acquire():   # another process is running the pipeline: keep the payloads for later
+            print(f"{_now()} another pipeline run holds {lock.path}; retrying after the next poll", flush=True)
+            with self.lock:
+                self.held, self.dirty = {**held, **self.held}, True
+            return False
+        try:
+            for name, payload in held.items():
+                ffd.save(payload, name, self.cfg)
+            r = pipeline_run.Runner(self.stages, config=self.config_path, jobs=self.jobs, fresh=FEEDS.values(),
+                                    state_path=self.pcfg.get("state_path", pipeline_run.STATE_PATH),
+                                    min_interval_minutes=self.pcfg.get("min_interval_minutes"), lock_path=None)
+            r.run()
+        except Exception:
+            # keep the changes (newer ones that arrived meanwhile win) and re-arm: the next poll retries
+            with self.lock:
+                self.held, self.dirty = {**held, **self.held}, True
+            self.stats["errors"] += 1
+            raise
+        finally:
+            lock.release()
+        self.stats["runs"] += 1
+        failed = [n for n, res in r.results.items() if res["status"] in ("failed", "blocked")]
+        if failed:   # payloads are saved; a catch-up run after the next poll re-runs the stale stages
+            with self.lock:
+                self.dirty = True
+            self.stats["errors"] += 1
+        print(f"{_now()} run for {', '.join(held) or 'catch-up'}:\n{r.summary()}"
+              + (f"\n{_now()} {', '.join(failed)} did not complete; retrying after the next poll" if failed else ""), flush=True)
+        return True
+
+    def wait(self) -> None:
+        """Block until the run in flight, and any follow-up its completion started, is done."""
+        seen = None
+        while True:
+            with self.lock:
+                f = self.future
+            if f is None or f is seen:
+                return
+            f.exception()   # waits; a failed run is already reported by _follow_up
+            seen = f
+
+    # ---------------- loop ----------------
+    async def serve(self, once: bool = False) -> None:
+        backoff, emax = 0.0, float(self.scfg.get("error_backoff_max_seconds", 1800))
+        async with ffd.make_client(self.cfg, self.base_url) as cli:
+            while True:
+                try:
+                    changed = await self.poll(cli)
+                    backoff, note = 0.0, f"changed: {', '.join(changed)}" if changed else "no change"
+                except Exception as e:   # keep polling; the cached data stays valid
+                    self.stats["errors"] += 1
+                    backoff = min(max(2 * backoff, 60.0), emax)
+                    note = f"poll failed ({type(e).__name__}: {e})"
+                status = self.kick()
+                secs, why = poll_interval(time.time(), self.deadlines(), self.scfg)
+                if backoff:
+                    secs, why = max(secs, backoff), f"error backoff, {why}"
+                print(f"{_now()} poll {self.stats['polls']}: {note}; run {status}; next in {secs:.0f}s ({why})", flush=True)
+                metrics.flush()
+                if once:
+                    await asyncio.to_thread(self.wait)
+                    return
+                await asyncio.sleep(secs)
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%SZ")
+
+def plan(dl: List[float], scfg: dict, days: float, start: Optional[float] = None) -> None:
+    """Print the poll schedule (one line per stretch with the same reason) and polls per day."""
+    t = start if start is not None else time.time()
+    end, stretches, per_day = t + days * 86400, [], {}
+    while t < end:
+        secs, why = poll_interval(t, dl, scfg)
+        if not stretches or stretches[-1][1] != why:
+            stretches.append([t, why, secs])
+        stretches[-1][2] = max(stretches[-1][2], secs)
+        day = datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d")
+        per_day[day] = per_day.get(day, 0) + 1
+        t += secs
+    for t0, why, secs in stretches:
+        print(f"{datetime.fromtimestamp(t0, timezone.utc):%a %Y-%m-%d %H:%M}Z  every {secs:>6.0f}s  {why}")
+    print("polls per day:", ", ".join(f"{d[5:]} {n}" for d, n in per_day.items()))
+
+def main():
+    ap = argparse.ArgumentParser(description="Deadline-aware refresh daemon")
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--base-url", default=None, help="API root (e.g. a local stub server)")
+    ap.add_argument("--jobs", type=int, default=None, help="concurrent pipeline stages")
+    ap.add_argument("--targets", nargs="*", default=None, help="pipeline stages to keep fresh (default: [scheduler] targets)")
+    ap.add_argument("--once", action="store_true")
+    ap.add_argument("--plan", type=float, default=None, metavar="DAYS", help="print the poll schedule and exit")
+    args = ap.parse_args()
+    cfg = read_toml(args.config)
+    s = Scheduler(cfg, config_path=args.config, base_url=args.base_url, jobs=args.jobs, targets=args.targets)
+    if args.plan is not None:
+        plan(s.deadlines(), s.scfg, args.plan)
+        return
+    ms = metrics.metrics_settings(cfg)
+    if ms["enabled"]:
+        metrics.start("scheduler", ms["dir"], ms["flush_seconds"])
+    try:
+        asyncio.run(s.serve(once=args.once))
+    except KeyboardInterrupt:
+        print("Stopping; waiting for the run in flight ...", flush=True)
+    finally:
+        s.pool.shutdown(wait=True)
+        print(" ".join(f"{k}={v}" for k, v in s.stats.items()))
+
+if __name__ == "__main__":
+    main()
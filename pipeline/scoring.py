@@ -0,0 +1,219 @@
+"""
+FPL scoring-rule kernels on NumPy arrays.
+
+One set of point tables and vectorised kernels for every place that turns football into FPL
+points: compute_phase3 (expected points per player-fixture), pipeline/whatif.py, pipeline/train.py
+(realised attacking points), simulations (sampled stats, any batch shape) and the Team Builder's
+objective. Positions are indices into the tables (``pos_index``); unknown positions score 0.
+
+Sampled stats are scored by ``points``: appearance 1 below 60 minutes and 2 from 60, goals and
+assists by position, clean sheets from 60 minutes, -1 per 2 conceded (GK/DEF), +1 per 3 saves
+(GK). ``expected_points`` is the projection path: the same tables applied to expected minutes,
+per-90 rates and clean-sheet / concession probabilities.
+
+    python pipeline/scoring.py check [--samples 1000]   # kernels vs data/cache/ep_components.csv
+
+``check`` is a runtime sanity check only: ep_components.csv is written by these same kernels, so
+it cannot catch a scoring regression. tests/test_scoring.py pins the pre-kernel baselines.
+"""
+from __future__ import annotations
+import argparse, json, os, time
+from typing import Dict
+import numpy as np
+import pandas as pd
+
+POSITIONS = ("GK", "DEF", "MID", "FWD")
+UNKNOWN = len(POSITIONS)                       # row of zeros at the end of every table
+GOAL_PTS = np.array([6.0, 6.0, 5.0, 4.0, 0.0])
+ASSIST_PTS = np.array([3.0, 3.0, 3.0, 3.0, 0.0])
+CS_PTS = np.array([4.0, 4.0, 1.0, 0.0, 0.0])
+CONCEDED_PTS = np.array([-1.0, -1.0, 0.0, 0.0, 0.0])   # per CONCEDED_PER goals conceded
+SAVE_PTS = np.array([1.0, 0.0, 0.0, 0.0, 0.0])         # per SAVES_PER saves
+CONCEDED_PER, SAVES_PER = 2, 3
+APPEARANCE_PTS = 2.0         # 60+ minutes
+SUB_APPEARANCE_PTS = 1.0     # 1..59 minutes
+FULL_MINUTES = 60.0          # appearance and clean-sheet threshold
+
+def pos_index(position) -> np.ndarray:
+    """Table rows for position labels ("GK".."FWD") or FPL element_type (1..4); anything else -> UNKNOWN."""
+    a = np.asarray(position)
+    if a.dtype.kind in "iuf":
+        et = np.nan_to_num(a.astype(float), nan=0.0).astype(np.int64)
+        return np.where((et >= 1) & (et <= 4), et - 1, UNKNOWN)
+    idx = pd.Index(POSITIONS).get_indexer(a.astype(str).ravel()).reshape(a.shape)
+    return np.where(idx < 0, UNKNOWN, idx)
+
+def position_labels(element_type) -> np.ndarray:
+    """element_type 1..4 -> "GK".."FWD" (None otherwise)."""
+    return np.array(POSITIONS + (None,), dtype=object)[pos_index(element_type)]
+
+def _f(x) -> np.ndarray:
+    return np.asarray(x, dtype=float)
+
+# ============================================================
+# Sampled / realised stats
+# ============================================================
+def appearance_points(minutes) -> np.ndarray:
+    m = _f(minutes)
+    return np.where(m >= FULL_MINUTES, APPEARANCE_PTS, np.where(m > 0, SUB_APPEARANCE_PTS, 0.0))
+
+def goal_points(goals, pos) -> np.ndarray:
+    return _f(goals) * GOAL_PTS[pos]
+
+def assist_points(assists, pos) -> np.ndarray:
+    return _f(assists) * ASSIST_PTS[pos]
+
+def clean_sheet_points(clean_sheet, pos, minutes=None) -> np.ndarray:
+    """Clean sheet (0/1 or probability) points; with ``minutes`` only from the 60-minute mark."""
+    cs = _f(clean_sheet) * CS_PTS[pos]
+    return cs if minutes is None else np.where(_f(minutes) >= FULL_MINUTES, cs, 0.0)
+
+def goals_conceded_points(conceded, pos) -> np.ndarray:
+    return np.floor(_f(conceded) / CONCEDED_PER) * CONCEDED_PTS[pos]
+
+def save_points(saves, pos) -> np.ndarray:
+    return np.floor(_f(saves) / SAVES_PER) * SAVE_PTS[pos]
+
+def points(pos, minutes, goals=0, assists=0, clean_sheet=0, conceded=0, saves=0) -> np.ndarray:
+    """FPL points for sampled or realised stats; every argument broadcasts (e.g. samples x players)."""
+    return (appearance_points(minutes) + goal_points(goals, pos) + assist_points(assists, pos)
+            + clean_sheet_points(clean_sheet, pos, minutes) + goals_conceded_points(conceded, pos)
+            + save_points(saves, pos))
+
+# ============================================================
+# Expectations
+# ============================================================
+def expected_appearance_points(plays=1.0, plays_full=1.0) -> np.ndarray:
+    """1 point for any minutes plus 1 more from 60: expected appearances + expected 60-minute ones."""
+    return SUB_APPEARANCE_PTS * _f(plays) + (APPEARANCE_PTS - SUB_APPEARANCE_PTS) * _f(plays_full)
+
+def attack_points(minutes, xg90, xa90, pos, att_mult=1.0) -> np.ndarray:
+    """Expected goal + assist points: per-90 rates over expected minutes, scaled by the fixture multiplier."""
+    return (_f(minutes) / 90.0).clip(min=0.0) * att_mult * (_f(xg90) * GOAL_PTS[pos] + _f(xa90) * ASSIST_PTS[pos])
+
+def _poisson_floor_mean(lam, per: int, kmax: int = 30) -> np.ndarray:
+    """E[floor(X / per)] for X ~ Poisson(lam), elementwise."""
+    lam = _f(lam)
+    k = np.arange(1, kmax + 1)
+    pmf = np.exp(-lam)[..., None] * np.cumprod(lam[..., None] / k, axis=-1)
+    return (pmf * (k // per)).sum(axis=-1)
+
+def expected_goals_conceded_points(xg_against, pos) -> np.ndarray:
+    return _poisson_floor_mean(xg_against, CONCEDED_PER) * CONCEDED_PTS[pos]
+
+def expected_save_points(xsaves, pos) -> np.ndarray:
+    return _poisson_floor_mean(xsaves, SAVES_PER) * SAVE_PTS[pos]
+
+def expected_points(pos, minutes, xg90, xa90, att_mult=1.0, cs_prob=0.0, *, plays=1.0, plays_full=1.0,
+                    xg_against=None, xsaves=None) -> Dict[str, np.ndarray]:
+    """
+    Expected points by component for player-fixtures (any broadcastable shape); ``plays`` /
+    ``plays_full`` are P(appears) / P(60+) per fixture, or counts over a horizon. The projection
+    engine counts a full appearance per fixture and leaves concessions and saves out
+    (``xg_against`` / ``xsaves`` None); simulations and other callers can switch them on.
+    """
+    out = {"appearance_pts": np.broadcast_to(expected_appearance_points(plays, plays_full), np.shape(pos)).astype(float),
+           "att_pts": attack_points(minutes, xg90, xa90, pos, att_mult),
+           "cs_pts": _f(cs_prob) * CS_PTS[pos]}
+    total = out["appearance_pts"] + out["att_pts"] + out["cs_pts"]
+    if xg_against is not None:
+        out["conceded_pts"] = expected_goals_conceded_points(xg_against, pos)
+        total = total + out["conceded_pts"]
+    if xsaves is not None:
+        out["save_pts"] = expected_save_points(xsaves, pos)
+        total = total + out["save_pts"]
+    out["ep"] = total
+    return out
+
+# ============================================================
+# App objective
+# ============================================================
+def bookmaker_multiplier(pos, cs_prob, gs_prob, strength: float) -> np.ndarray:
+    """(1 - s) + s·factor, factor 0.3 + 0.7·team CS prob for GK/DEF and 0.3 + 0.7·team scoring prob for MID/FWD."""
+    s = max(0.0, min(1.0, float(strength)))
+    pos = np.asarray(pos)
+    factor = np.where(pos <= 1, 0.3 + 0.7 * _f(cs_prob).clip(0, 1),
+                      np.where(pos <= 3, 0.3 + 0.7 * _f(gs_prob).clip(0, 1), 1.0))
+    return (1 - s) + s * factor
+
+def objective(ep, play_prob, minutes_scale: float, bm_mult=1.0) -> np.ndarray:
+    """EP scaled by (1 - scale) + scale·P(plays) and the bookmaker multiplier."""
+    return _f(ep) * ((1.0 - minutes_scale) + minutes_scale * _f(play_prob)) * bm_mult
+
+# ============================================================
+# Consistency check
+# ============================================================
+def sample_stats(rng: np.random.Generator, samples: int, minutes, xg90, xa90, att_mult, cs_prob,
+                 xg_against=None) -> Dict[str, np.ndarray]:
+    """
+    (samples x player-fixture) stats with the projection's means: Poisson goals and assists; with
+    ``xg_against`` Poisson goals conceded and a clean sheet when none go in, else Bernoulli CS.
+    """
+    scale = (_f(minutes) / 90.0).clip(min=0.0) * att_mult
+    shape = (samples, len(scale))
+    out = {"minutes": np.broadcast_to(_f(minutes), shape),
+           "goals": rng.poisson(np.broadcast_to(scale * _f(xg90), shape)),
+           "assists": rng.poisson(np.broadcast_to(scale * _f(xa90), shape))}
+    if xg_against is None:
+        out["clean_sheet"] = rng.random(shape) < _f(cs_prob)
+    else:
+        out["conceded"] = rng.poisson(np.broadcast_to(_f(xg_against), shape))
+        out["clean_sheet"] = out["conceded"] == 0
+    return out
+
+def check(comp: pd.DataFrame, samples: int = 1000, seed: int = 0) -> dict:
+    """
+    Runtime sanity check (not a regression test; see tests/test_scoring.py). Kernels against
+    ep_components: the expected path must reproduce each stored component, and
+    the mean of ``points`` over sampled stats must match ``expected_points`` within sampling error.
+    Rows are taken at 90 expected minutes for the sampled part so the 60-minute rules are exact.
+    """
+    pos = pos_index(comp["position"])
+    a = {c: comp[c].to_numpy(float) for c in ("exp_minutes", "xg_per90", "xa_per90", "att_mult", "cs_prob")}
+    t0 = time.perf_counter()
+    e = expected_points(pos, a["exp_minutes"], a["xg_per90"], a["xa_per90"], a["att_mult"], a["cs_prob"])
+    ms = (time.perf_counter() - t0) * 1000
+    report = {"rows": len(comp), "expected_ms": ms}
+    for c in ("appearance_pts", "att_pts", "cs_pts", "ep"):
+        report[f"max_diff_{c}"] = float(np.abs(e[c] - comp[c].to_numpy(float)).max()) if len(comp) else 0.0
+
+    rng = np.random.default_rng(seed)
+    full = np.full(len(comp), 90.0)
+    xga = -np.log(np.clip(a["cs_prob"], 1e-6, 1.0))            # Poisson rate with the same P(0)
+    t0 = time.perf_counter()
+    s = sample_stats(rng, samples, full, a["xg_per90"], a["xa_per90"], a["att_mult"], a["cs_prob"], xga)
+    pts = points(pos, s["minutes"], s["goals"], s["assists"], s["clean_sheet"], s["conceded"])
+    report["sampled_ms"] = (time.perf_counter() - t0) * 1000
+    want = expected_points(pos, full, a["xg_per90"], a["xa_per90"], a["att_mult"], a["cs_prob"], xg_against=xga)["ep"]
+    z = (pts.mean(axis=0) - want) / np.maximum(pts.std(axis=0) / np.sqrt(samples), 1e-9)
+    report["samples"] = samples
+    report["max_abs_z"] = float(np.abs(z).max()) if len(z) else 0.0
+    report["mean_abs_z"] = float(np.abs(z).mean()) if len(z) else 0.0
+    return report
+
+def main():
+    ap = argparse.ArgumentParser(description="FPL scoring kernels: consistency check")
+    ap.add_argument("cmd", choices=["check"])
+    ap.add_argument("--components", default="data/cache/ep_components.csv")
+    ap.add_argument("--samples", type=int, default=1000)
+    ap.add_argument("--tol", type=float, default=1e-9, help="max allowed difference on the expected path")
+    ap.add_argument("--ok", default=None, help="marker file written on success and removed on a mismatch")
+    args = ap.parse_args()
+    r = check(pd.read_csv(args.components), samples=args.samples)
+    print(f"{r['rows']} player-fixtures: expected path {r['expected_ms']:.1f} ms, "
+          f"{r['samples']} samples scored in {r['sampled_ms']:.0f} ms")
+    for c in ("appearance_pts", "att_pts", "cs_pts", "ep"):
+        print(f"  {c:15s} max |kernel - stored| = {r['max_diff_' + c]:.2e}")
+    print(f"  sampled mean vs expected: mean |z| = {r['mean_abs_z']:.2f}, max |z| = {r['max_abs_z']:.2f}")
+    ok = all(r[f"max_diff_{c}"] <= args.tol for c in ("appearance_pts", "att_pts", "cs_pts", "ep")) and r["max_abs_z"] < 6
+    print("OK" if ok else "MISMATCH")
+    if args.ok:   # the pipeline's publish stage reads the marker, so a mismatch never goes live
+        if ok:
+            with open(args.ok, "w", encoding="utf-8") as f:   # timings left out: same components, same bytes
+                json.dump({k: v for k, v in r.items() if not k.endswith("_ms")}, f, sort_keys=True)
+        elif os.path.exists(args.ok):
+            os.remove(args.ok)
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Content-addressed raw snapshot store.
+
+Layout under ``root`` (default data/raw/store):
+  blobs/ab/abcdef....json.zst|.json.gz   compressed payloads or JSON-patch deltas, named by sha256
+  objects.jsonl                           one line per distinct payload: sha, kind (full|delta), blob, base, depth
+  index.jsonl                             one line per snapshot: name, ts, sha
+
+A payload is hashed on its canonical JSON (sorted keys, compact), so re-fetching an unchanged
+payload only appends an index line. With ``deltas`` on, a new payload is stored as an RFC 6902
+patch against the previous snapshot of the same name when that is smaller; chains are cut
+every ``max_chain`` versions by a full copy. ``at(name, T)`` is a bisect over the in-memory
+index plus at most ``max_chain`` patch applications.
+"""
+from __future__ import annotations
+import argparse, bisect, glob, gzip, hashlib, json, os, re
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+try:
+    import zstandard as zstd
+except ImportError:  # optional: gzip is always available
+    zstd = None
+
+TS_FMT = "%Y-%m-%dT%H-%M-%SZ"
+LEGACY_RE = re.compile(r"^(?P<name>.+)_(?P<ts>\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2}Z)\.json$")
+
+def canonical(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def to_ts(t, fmt: str = TS_FMT) -> str:
+    if isinstance(t, datetime):
+        return t.astimezone(timezone.utc).strftime(fmt) if t.tzinfo else t.strftime(fmt)
+    return str(t)
+
+# ============================================================
+# JSON patch (RFC 6902 subset: add / remove / replace)
+# ============================================================
+def _ptr(path: str, key) -> str:
+    return f"{path}/{str(key).replace('~', '~0').replace('/', '~1')}"
+
+def json_diff(a: Any, b: Any, path: str = "") -> List[dict]:
+    """Patch turning ``a`` into ``b``. Lists are diffed by position (FPL arrays keep their order)."""
+    if type(a) is not type(b):
+        return [{"op": "replace", "path": path, "value": b}]
+    if isinstance(a, dict):
+        ops = [{"op": "remove", "path": _ptr(path, k)} for k in a if k not in b]
+        for k, v in b.items():
+            if k not in a:
+                ops.append({"op": "add", "path": _ptr(path, k), "value": v})
+            elif a[k] != v:
+                ops += json_diff(a[k], v, _ptr(path, k))
+        return ops
+    if isinstance(a, list):
+        n = min(len(a), len(b))
+        ops = []
+        for i in range(n):
+            if a[i] != b[i]:
+                ops += json_diff(a[i], b[i], _ptr(path, i))
+        ops += [{"op": "remove", "path": _ptr(path, i)} for i in range(len(a) - 1, n - 1, -1)]
+        ops += [{"op": "add", "path": _ptr(path, i), "value": b[i]} for i in range(n, len(b))]
+        return ops
+    return [] if a == b else [{"op": "replace", "path": path, "value": b}]
+
+def apply_patch(doc: Any, ops: List[dict]) -> Any:
+    """Apply ``ops`` in place (the caller passes a private copy) and return the document."""
+    for op in ops:
+        if op["path"] == "":
+            doc = op.get("value")
+            continue
+        parts = [p.replace("~1", "/").replace("~0", "~") for p in op["path"].split("/")[1:]]
+        parent = doc
+        for p in parts[:-1]:
+            parent = parent[int(p)] if isinstance(parent, list) else parent[p]
+        last = parts[-1]
+        if isinstance(parent, list):
+            i = len(parent) if last == "-" else int(last)
+            if op["op"] == "remove": del parent[i]
+            elif op["op"] == "add": parent.insert(i, op["value"])
+            else: parent[i] = op["value"]
+        else:
+            if op["op"] == "remove": del parent[last]
+            else: parent[last] = op["value"]
+    return doc
+
+# ============================================================
+# Store
+# ============================================================
+class SnapshotStore:
+    def __init__(self, root: str = "data/raw/store", *, codec: str = "zstd", level: int = 10,
+                 deltas: bool = True, max_chain: int = 24, ts_format: str = TS_FMT, cache_size: int = 4):
+        self.root = root
+        self.codec = "zst" if codec == "zstd" and zstd is not None else "gz"
+        self.level = level
+        self.deltas, self.max_chain, self.ts_format = deltas, max_chain, ts_format
+        self.objects: Dict[str, dict] = {}
+        self.index: Dict[str, List[tuple]] = {}     # name -> sorted [(ts, sha)]
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_size = cache_size
+        self._load()
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> "SnapshotStore":
+        s = cfg.get("snapshots", {})
+        return cls(s.get("root", os.path.join(cfg.get("caching", {}).get("raw_dir", "data/raw"), "store")),
+                   codec=s.get("codec", "zstd"), level=s.get("level", 10), deltas=s.get("deltas", True),
+                   max_chain=s.get("max_chain", 24),
+                   ts_format=cfg.get("caching", {}).get("timestamp_format", TS_FMT))
+
+    # ---------------- persistence ----------------
+    def _p(self, *parts) -> str:
+        return os.path.join(self.root, *parts)
+
+    def _load(self) -> None:
+        for line in self._lines("objects.jsonl"):
+            self.objects[line["sha"]] = line
+        for line in self._lines("index.jsonl"):
+            self._insert(line["name"], line["ts"], line["sha"])
+
+    def _lines(self, fname: str):
+        try:
+            with open(self._p(fname), "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+
+    def _append(self, fname: str, rec: dict) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._p(fname), "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+    def _rewrite(self, fname: str, recs) -> None:
+        tmp = self._p(fname + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rec in recs:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._p(fname))
+
+    def _insert(self, name: str, ts: str, sha: str) -> None:
+        bisect.insort(self.index.setdefault(name, []), (ts, sha))
+
+    def _blob_path(self, key: str, codec: str) -> str:
+        return self._p("blobs", key[:2], f"{key}.json.{codec}")
+
+    def _write_blob(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(key, self.codec)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.codec == "zst":
+                packed = zstd.ZstdCompressor(level=self.level).compress(data)
+            else:
+                packed = gzip.compress(data, compresslevel=min(self.level, 9), mtime=0)
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(packed)
+            os.replace(tmp, path)
+        return key
+
+    def _read_blob(self, key: str, codec: str) -> bytes:
+        with open(self._blob_path(key, codec), "rb") as f:
+            packed = f.read()
+        if codec == "zst":
+            if zstd is None:
+                raise RuntimeError("snapshot blob is zstd-compressed; pip install zstandard to read it")
+            return zstd.ZstdDecompressor().decompress(packed)
+        return gzip.decompress(packed)
+
+    # ---------------- write ----------------
+    def put(self, name: str, payload: Any, ts=None) -> dict:
+        """Record ``payload`` as snapshot ``name`` at ``ts`` (default now). Returns the object record."""
+        ts = to_ts(ts or datetime.now(timezone.utc), self.ts_format)
+        data = canonical(payload)
+        sha = hashlib.sha256(data).hexdigest()
+        if sha not in self.objects:
+            rec = {"sha": sha, "kind": "full", "codec": self.codec, "size": len(data), "base": None, "depth": 0}
+            prev = self._latest_before(name, ts)
+            if self.deltas and prev is not None and self.objects[prev]["depth"] + 1 < self.max_chain:
+                patch = canonical(json_diff(json.loads(self.get_bytes(prev)), payload))
+                if len(patch) < len(data) // 2:
+                    rec.update(kind="delta", base=prev, depth=self.objects[prev]["depth"] + 1)
+                    data = patch
+            rec["blob"] = self._write_blob(data)
+            rec["stored"] = os.path.getsize(self._blob_path(rec["blob"], self.codec))
+            self.objects[sha] = rec
+            self._append("objects.jsonl", rec)
+        self._insert(name, ts, sha)
+        self._append("index.jsonl", {"name": name, "ts": ts, "sha": sha})
+        return self.objects[sha]
+
+    # ---------------- read ----------------
+    def _latest_before(self, name: str, ts: str) -> Optional[str]:
+        rows = self.index.get(name, [])
+        i = bisect.bisect_right(rows, (ts, "\uffff"))
+        return rows[i - 1][1] if i else None
+
+    def get_bytes(self, sha: str) -> bytes:
+        """Canonical JSON bytes of a payload, rebuilding delta chains from their last full copy."""
+        if sha in self._cache:
+            self._cache.move_to_end(sha)
+            return self._cache[sha]
+        rec = self.objects[sha]
+        if rec["kind"] == "full":
+            data = self._read_blob(rec["blob"], rec["codec"])
+        else:
+            doc = json.loads(self.get_bytes(rec["base"]))
+            data = canonical(apply_patch(doc, json.loads(self._read_blob(rec["blob"], rec["codec"]))))
+        self._cache[sha] = data
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return data
+
+    def names(self) -> List[str]:
+        return sorted(self.index)
+
+    def list(self, name: str) -> List[tuple]:
+        return list(self.index.get(name, []))
+
+    def at(self, name: str, t=None) -> Optional[Any]:
+        """Payload of the latest snapshot of ``name`` taken at or before ``t`` (default: latest)."""
+        rows = self.index.get(name, [])
+        sha = (rows[-1][1] if rows else None) if t is None else self._latest_before(name, to_ts(t, self.ts_format))
+        return None if sha is None else json.loads(self.get_bytes(sha))
+
+    # ---------------- retention ----------------
+    def prune(self, keep_all_days: int = 14, keep_daily_days: int = 120, now: Optional[datetime] = None) -> dict:
+        """
+        Keep every snapshot from the last ``keep_all_days``, the last one per day up to
+        ``keep_daily_days``, the last one per ISO week beyond that, and always the latest per
+        name. Objects no longer reachable (directly or as a delta base) are deleted.
+        """
+        now = now or datetime.now(timezone.utc)
+        cut_all = to_ts(now - timedelta(days=keep_all_days), self.ts_format)
+        cut_daily = to_ts(now - timedelta(days=keep_daily_days), self.ts_format)
+        kept, dropped = {}, 0
+        for name, rows in self.index.items():
+            buckets: Dict[str, tuple] = {}
+            out = []
+            for ts, sha in rows:
+                if ts >= cut_all:
+                    out.append((ts, sha))
+                    continue
+                dt = datetime.strptime(ts, self.ts_format)
+                key = dt.strftime("%Y-%m-%d") if ts >= cut_daily else "%d-W%02d" % dt.isocalendar()[:2]
+                buckets[key] = (ts, sha)   # rows are sorted: the last one per bucket wins
+            out = sorted(set(out) | set(buckets.values()) | {rows[-1]})
+            dropped += len(rows) - len(out)
+            kept[name] = out
+        self.index = kept
+        self._rewrite("index.jsonl", ({"name": n, "ts": ts, "sha": sha} for n, rows in kept.items() for ts, sha in rows))
+
+        live = set()
+        for rows in kept.values():
+            for _, sha in rows:
+                while sha and sha not in live:
+                    live.add(sha)
+                    sha = self.objects[sha]["base"]
+        dead = [s for s in self.objects if s not in live]
+        freed = 0
+        for sha in dead:
+            rec = self.objects.pop(sha)
+            path = self._blob_path(rec["blob"], rec["codec"])
+            if os.path.exists(path) and not any(r["blob"] == rec["blob"] for r in self.objects.values()):
+                freed += os.path.getsize(path)
+                os.remove(path)
+            self._cache.pop(sha, None)
+        self._rewrite("objects.jsonl", self.objects.values())
+        return {"snapshots_dropped": dropped, "objects_dropped": len(dead), "bytes_freed": freed}
+
+    def stats(self) -> dict:
+        raw = sum(self.objects[sha]["size"] for rows in self.index.values() for _, sha in rows)
+        stored = sum(r.get("stored", 0) for r in self.objects.values())
+        return {"snapshots": sum(len(r) for r in self.index.values()), "objects": len(self.objects),
+                "deltas": sum(r["kind"] == "delta" for r in self.objects.values()),
+                "logical_bytes": raw, "stored_bytes": stored, "codec": self.codec}
+
+    def import_legacy(self, raw_dir: str, delete: bool = False) -> int:
+        """Ingest ``<name>_<ts>.json`` files written by the old save() (oldest first)."""
+        files = []
+        for path in glob.glob(os.path.join(raw_dir, "*.json")):
+            m = LEGACY_RE.match(os.path.basename(path))
+            if m:
+                files.append((m["ts"], m["name"], path))
+        for ts, name, path in sorted(files):
+            with open(path, "r", encoding="utf-8") as f:
+                self.put(name, json.load(f), ts)
+            if delete:
+                os.remove(path)
+        return len(files)
+
+def main():
+    try:
+        from utils import read_toml
+    except ImportError:
+        from pipeline.utils import read_toml
+    ap = argparse.ArgumentParser(description="Raw snapshot store")
+    ap.add_argument("cmd", choices=["stats", "ls", "at", "prune", "import"])
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--name", default="bootstrap-static")
+    ap.add_argument("--at", default=None, help=f"timestamp ({TS_FMT}); default latest")
+    ap.add_argument("--out", default=None, help="at: write the payload here instead of stdout")
+    ap.add_argument("--delete", action="store_true", help="import: remove legacy files once stored")
+    args = ap.parse_args()
+
+    cfg = read_toml(args.config)
+    store = SnapshotStore.from_config(cfg)
+    if args.cmd == "stats":
+        print(json.dumps(store.stats(), indent=2))
+    elif args.cmd == "ls":
+        for name in store.names():
+            for ts, sha in store.list(name):
+                rec = store.objects[sha]
+                print(f"{name:24s} {ts}  {sha[:12]}  {rec['kind']:5s} {rec['size']:>10,d} -> {rec.get('stored', 0):>9,d}")
+    elif args.cmd == "at":
+        payload = store.at(args.name, args.at)
+        if payload is None:
+            raise SystemExit(f"No {args.name} snapshot at or before {args.at}")
+        text = json.dumps(payload, ensure_ascii=False)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            print(text)
+    elif args.cmd == "prune":
+        r = cfg.get("snapshots", {})
+        print(store.prune(r.get("keep_all_days", 14), r.get("keep_daily_days", 120)))
+    elif args.cmd == "import":
+        n = store.import_legacy(cfg["caching"]["raw_dir"], delete=args.delete)
+        print(f"Imported {n} files.", json.dumps(store.stats()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Batch squad evaluation: best XI, captain, bench and EP for many squads at once.
+
+Input is a JSONL file with one squad per line, or a directory of ``*.json`` files (searched
+recursively). Each squad is in the app's ``state.json`` format (app/state.py); only ``squad``,
+its 15 player ids, is read. A line may also be a bare list of ids. Each squad is named by its
+``name`` or ``entry`` field, then by its file path, then by its line number.
+
+The projections (1/3/5 GWs, from the published version or data/cache) become one matrix indexed
+by player id: ``EP[id, h]``, plus ``POS[id]``. A batch of ``n`` squads is an ``(n, 15)`` id array,
+and everything after it is whole-array work:
+- gather ``EP[S]`` and ``POS[S]``
+- sort every squad by (position, -EP), so each squad has its 2 GK / 5 DEF / 5 MID / 3 FWD in
+  fixed slots
+- pick the XI: the best GK, 3 DEF, 2 MID and 1 FWD, plus the best 4 of the other 7 outfielders.
+  That is the best valid formation: 3-5 DEF, 2-5 MID, 1-3 FWD.
+
+Per horizon ``h``:
+- ``ep_h`` is the XI chosen for that horizon, plus its captain counted twice.
+- ``squad_ep_h`` is all 15 summed, like the Team Planner's totals.
+
+The lineup columns come from the ``--pick`` horizon (default 1, the next GW):
+- ``xi`` and ``bench``: the bench has its GK first, then the rest by EP.
+- ``captain`` and ``vice``, and ``formation``.
+
+Unlike ``choose_starting_xi``, the formation is not fixed at 3-4-3. A squad with unknown ids,
+duplicates or the wrong position counts is reported with ``valid`` false and no EP. Input chunks
+are parsed and scored in a process pool.
+
+    python pipeline/squads.py league.jsonl --out data/exports/league_eval.csv
+    python pipeline/squads.py data/user_state --pick 3
+    python pipeline/squads.py candidates.jsonl --workers 4 --out eval.parquet
+"""
+from __future__ import annotations
+import argparse, glob, json, os, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+try:
+    import publish, scoring
+except ImportError:  # imported from the app as pipeline.squads
+    from pipeline import publish, scoring
+
+HORIZONS = (1, 3, 5)
+FILES = {1: "projections_next_gw.csv", 3: "projections_next_3gws.csv", 5: "projections_next_5gws.csv"}
+SQUAD = 15
+NEED = np.array([2, 5, 5, 3])            # squad slots per position, GK..FWD
+START = np.array([0, 2, 3, 4, 7, 8, 12])  # always in the XI once sorted: 1 GK, 3 DEF, 2 MID, 1 FWD
+FLEX = np.array([5, 6, 9, 10, 11, 13, 14])  # the other outfielders; the best 4 complete the XI
+CHUNK = 20000
+
+class Matrix:
+    """EP per player id x horizon (0 where unprojected) and position code per id (-1 unknown)."""
+
+    def __init__(self, data_dir: Path):
+        frames = {h: pd.read_csv(Path(data_dir) / f, usecols=["id", "web_name", "position", "ep_total"])
+                  for h, f in FILES.items()}
+        base = frames[1]
+        n = int(max(f["id"].max() for f in frames.values())) + 1
+        self.ep = np.zeros((n, len(HORIZONS)), dtype=np.float32)
+        for j, h in enumerate(HORIZONS):
+            f = frames[h]
+            self.ep[f["id"].to_numpy(), j] = f["ep_total"].fillna(0).to_numpy(np.float32)
+        self.pos = np.full(n, -1, dtype=np.int8)
+        code = scoring.pos_index(base["position"].to_numpy())
+        self.pos[base["id"].to_numpy()] = np.where(code == scoring.UNKNOWN, -1, code)
+        self.names = np.full(n, "", dtype=object)
+        self.names[base["id"].to_numpy()] = base["web_name"].astype(str).to_numpy()
+
+    def ids(self, squads: List[list]) -> Tuple[np.ndarray, np.ndarray]:
+        """(n, 15) id array (0 pads short squads, unknown ids become 0) and a per-squad validity mask."""
+        arr = np.zeros((len(squads), SQUAD), dtype=np.int64)
+        ok = np.ones(len(squads), dtype=bool)
+        for i, s in enumerate(squads):
+            if len(s) != SQUAD:
+                ok[i] = False
+                s = s[:SQUAD]
+            try:
+                arr[i, :len(s)] = s
+            except (TypeError, ValueError):
+                ok[i] = False
+        inside = (arr > 0) & (arr < len(self.pos))
+        ok &= inside.all(axis=1)
+        arr[~inside] = 0
+        pos = self.pos[arr]
+        ok &= (pos >= 0).all(axis=1)
+        for p, need in enumerate(NEED):
+            ok &= (pos == p).sum(axis=1) == need
+        srt = np.sort(arr, axis=1)
+        ok &= (srt[:, 1:] != srt[:, :-1]).all(axis=1)
+        return arr, ok
+
+def lineups(ep: np.ndarray, pos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For (n, 15) EP and position codes of valid squads: slot order (by position, EP desc) and the XI mask over it."""
+    order = np.lexsort((-ep, pos), axis=1)
+    e = np.take_along_axis(ep, order, axis=1)
+    xi = np.zeros(ep.shape, dtype=bool)
+    xi[:, START] = True
+    best4 = np.argpartition(-e[:, FLEX], 3, axis=1)[:, :4]
+    np.put_along_axis(xi, FLEX[best4], True, axis=1)
+    return order, xi
+
+def evaluate(m: Matrix, squads: List[list], pick: int = 1) -> Dict[str, np.ndarray]:
+    """Per squad: valid, EP per horizon (XI + captain, and all 15), and the ``pick``-horizon lineup."""
+    ids, ok = m.ids(squads)
+    ep, pos = m.ep[ids], m.pos[ids].astype(np.int64)   # (n, 15, H), (n, 15)
+    out: Dict[str, np.ndarray] = {"valid": ok}
+    for j, h in enumerate(HORIZONS):
+        e = ep[:, :, j]
+        order, xi = lineups(e, pos)
+        es = np.take_along_axis(e, order, axis=1)
+        xe = np.where(xi, es, -np.inf)
+        out[f"ep_{h}"] = np.where(ok, np.where(xi, es, 0).sum(axis=1) + xe.max(axis=1), np.nan)
+        out[f"squad_ep_{h}"] = np.where(ok, e.sum(axis=1), np.nan)
+        if h != pick:
+            continue
+        sid = np.take_along_axis(ids, order, axis=1)
+        cap = np.take_along_axis(sid, np.argsort(-xe, axis=1, kind="stable")[:, :2], axis=1)
+        bench_key = np.where(xi, np.inf, -es)
+        bench_key[:, 1] = -np.inf   # slot 1 is the second GK: first on the bench
+        sp = np.take_along_axis(pos, order, axis=1)
+        out.update(captain=cap[:, 0], vice=cap[:, 1], xi=sid[xi].reshape(-1, 11),
+                   bench=np.take_along_axis(sid, np.argsort(bench_key, axis=1, kind="stable")[:, :4], axis=1),
+                   formation=np.stack([((sp == p) & xi).sum(axis=1) for p in (1, 2, 3)], axis=1))
+    return out
+
+def to_frame(names: List[str], res: Dict[str, np.ndarray], m: Matrix) -> pd.DataFrame:
+    ok = res["valid"]
+    def join(a):   # ids -> "1 2 3"; %-formatting is ~3x faster than str.join(map(str, ...))
+        fmt = " ".join(["%d"] * a.shape[1])
+        return np.where(ok, [fmt % tuple(r) for r in a.tolist()], "")
+    f = pd.DataFrame(res["formation"]).astype(str)
+    df = pd.DataFrame({"squad": names, "valid": ok,
+                       "formation": np.where(ok, f[0] + "-" + f[1] + "-" + f[2], ""),
+                       "captain": np.where(ok, res["captain"], -1), "vice": np.where(ok, res["vice"], -1)})
+    df["captain_name"] = np.where(ok, m.names[df["captain"].clip(lower=0)], "")
+    df["xi"], df["bench"] = join(res["xi"]), join(res["bench"])
+    for h in HORIZONS:
+        df[f"ep_{h}"] = res[f"ep_{h}"].astype(float).round(2)
+    for h in HORIZONS:
+        df[f"squad_ep_{h}"] = res[f"squad_ep_{h}"].astype(float).round(2)
+    return df
+
+# ============================================================
+# Input + process pool
+# ============================================================
+def _parse(item, fallback: str) -> Tuple[str, list]:
+    """(name, ids) of one state.json-style object or bare id list; unreadable input -> no ids (invalid)."""
+    state = item if isinstance(item, dict) else {"squad": item if isinstance(item, list) else []}
+    name = state.get("name", state.get("entry"))
+    squad = state.get("squad")
+    return (fallback if name in (None, "") else str(name)), squad if isinstance(squad, list) else []
+
+def _read_lines(lines: List[str], start: int) -> Tuple[List[str], List[list]]:
+    numbered = [(k, line) for k, line in enumerate(lines, start + 1) if line.strip()]
+    try:   # the whole chunk as one JSON array: one decoder call instead of one per line
+        items = json.loads("[" + ",".join(line for _, line in numbered) + "]")
+    except json.JSONDecodeError:
+        items = []
+        for _, line in numbered:
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append(None)
+    names, squads = [], []
+    for (k, _), item in zip(numbered, items):
+        n, s = _parse(item, f"line {k}")
+        names.append(n)
+        squads.append(s)
+    return names, squads
+
+def _read_files(paths: List[str], root: str) -> Tuple[List[str], List[list]]:
+    names, squads = [], []
+    for p in paths:
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                item = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            item = None
+        n, s = _parse(item, os.path.relpath(p, root))
+        names.append(n)
+        squads.append(s)
+    return names, squads
+
+def chunks(src: str, size: int = CHUNK) -> List[tuple]:
+    """Work items: ("lines", lines, first line number) for a JSONL file, ("files", paths, root) for a directory."""
+    if os.path.isdir(src):
+        paths = sorted(glob.glob(os.path.join(src, "**", "*.json"), recursive=True))
+        return [("files", paths[i:i + size], src) for i in range(0, len(paths), size)]
+    with open(src, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+    return [("lines", lines[i:i + size], i) for i in range(0, len(lines), size)]
+
+_MATRIX: Optional[Matrix] = None
+
+def _init_worker(data_dir: str) -> None:
+    global _MATRIX
+    _MATRIX = Matrix(Path(data_dir))
+
+def _task(args) -> pd.DataFrame:
+    kind, items, where, pick = args
+    names, squads = _read_lines(items, where) if kind == "lines" else _read_files(items, where)
+    return to_frame(names, evaluate(_MATRIX, squads, pick), _MATRIX)
+
+def run(src: str, data_dir: Path, *, pick: int = 1, workers: int = 1, size: int = CHUNK) -> pd.DataFrame:
+    tasks = [(k, items, where, pick) for k, items, where in chunks(src, size)]
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(data_dir),)) as pool:
+            frames = list(pool.map(_task, tasks))
+    else:
+        _init_worker(str(data_dir))
+        frames = [_task(t) for t in tasks]
+    if not frames:
+        _init_worker(str(data_dir))
+        return to_frame([], evaluate(_MATRIX, [], pick), _MATRIX)
+    return pd.concat(frames, ignore_index=True)
+
+def squads_settings(cfg: dict) -> dict:
+    s = cfg.get("squads", {})
+    return {"workers": int(s.get("workers", 0)), "chunk_size": int(s.get("chunk_size", CHUNK)),
+            "pick_horizon": int(s.get("pick_horizon", 1)),
+            "data_root": cfg.get("publish", {}).get("root", publish.ROOT),
+            "cache": cfg.get("caching", {}).get("cache_dir", publish.CACHE)}
+
+def main():
+    from utils import read_toml
+    ap = argparse.ArgumentParser(description="Best XI, captain, bench and 1/3/5-GW EP for many squads")
+    ap.add_argument("src", help="JSONL file (one state.json-style squad per line) or a directory of *.json")
+    ap.add_argument("--out", default=None, help=".csv or .parquet (default: print the top squads)")
+    ap.add_argument("--pick", type=int, choices=HORIZONS, default=None, help="horizon the lineup is picked for")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default [squads] workers, 0 = CPUs)")
+    ap.add_argument("--data-dir", default=None, help="projections directory (default: the published version)")
+    ap.add_argument("--config", default="configs/config.toml")
+    args = ap.parse_args()
+
+    if not os.path.exists(args.src):
+        raise SystemExit(f"{args.src} missing")
+    ss = squads_settings(read_toml(args.config))
+    data_dir = Path(args.data_dir) if args.data_dir else publish.current(ss["data_root"], ss["cache"])[1]
+    workers = args.workers if args.workers is not None else ss["workers"]
+    workers = workers or os.cpu_count() or 1
+    pick = args.pick or ss["pick_horizon"]
+    t0 = time.perf_counter()
+    df = run(args.src, data_dir, pick=pick, workers=workers, size=ss["chunk_size"])
+    secs = time.perf_counter() - t0
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        df.to_parquet(args.out, index=False) if args.out.endswith(".parquet") else df.to_csv(args.out, index=False)
+    else:
+        print(df.sort_values(f"ep_{pick}", ascending=False).head(20).drop(columns=["xi", "bench"]).to_string(index=False))
+    bad = int((~df["valid"]).sum())
+    print(f"{len(df)} squads ({bad} invalid) evaluated in {secs:.2f}s ({workers} workers, projections from {data_dir})"
+          + (f" -> {args.out}" if args.out else ""))
+
+if __name__ == "__main__":
+    main()
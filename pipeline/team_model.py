@@ -0,0 +1,226 @@
+"""
+Results-driven team strengths: a Poisson goals model fitted to finished fixtures.
+
+    log λ_home = mu + home + att[h] - def[a]        log λ_away = mu + att[a] - def[h]
+
+Fitted by penalised IRLS over every finished fixture, each weighted by exp(-ξ·age) (Dixon-Coles
+time decay, no low-score correction). The prior pulls att/def towards FPL's static strengths, so
+the first GWs of a season stay sensible. The state keeps θ and the data precision matrix; a newly
+finished fixture is one Newton step on that Laplace approximation (decay the old information, add
+the match's, solve one (2T+2)² system), well under a millisecond, with no refit.
+
+Outputs, on compute_phase3's scale (3.0 = league average):
+  * ratings()        att_rating / def_rating = 3·exp(att), 3·exp(def), centred per fit
+  * fixture_xg(ft)   per team-fixture xg_for / xg_against, and opp_factor = xg_for against this
+                     opponent and venue over xg_for against an average one at a neutral venue
+
+    python pipeline/team_model.py fit       # full refit, writes data/cache/team_model.json
+    python pipeline/team_model.py update    # fold in fixtures finished since the last run
+    python pipeline/team_model.py show
+"""
+from __future__ import annotations
+import argparse, json, math, os, time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+import numpy as np
+import pandas as pd
+
+STATE_PATH = "data/cache/team_model.json"
+
+def finished_results(fixtures: Iterable[dict]) -> pd.DataFrame:
+    """
+    Finished, scored fixtures with ``day`` = kickoff in days since epoch. A result without a
+    kickoff time is dated like the latest dated one (it counts at full weight, not ~50 years old).
+    """
+    f = pd.DataFrame(list(fixtures))
+    if f.empty or "finished" not in f:
+        return pd.DataFrame(columns=["id", "team_h", "team_a", "team_h_score", "team_a_score", "day"])
+    f = f[f["finished"].fillna(False).astype(bool) & f["team_h_score"].notna() & f["team_a_score"].notna()].copy()
+    kickoff = pd.to_datetime(f.get("kickoff_time", pd.Series(None, index=f.index)), utc=True, errors="coerce")
+    day = (kickoff - pd.Timestamp(0, tz="UTC")) / pd.Timedelta(days=1)
+    f["day"] = day.fillna(day.max() if day.notna().any() else time.time() / 86400.0)
+    return f.sort_values(["day", "id"])[["id", "team_h", "team_a", "team_h_score", "team_a_score", "day"]]
+
+class TeamModel:
+    def __init__(self, teams: Iterable[int], prior_att=None, prior_def=None, *, half_life_days: float = 180.0,
+                 prior_precision: float = 4.0):
+        self.teams = [int(t) for t in teams]
+        self.idx = {t: i for i, t in enumerate(self.teams)}
+        T = len(self.teams)
+        self.P = 2 * T + 2
+        self.xi = math.log(2) / float(half_life_days)
+        # prior: mu ~ log(1.35 goals), home ~ 0.2, att/def ~ FPL static strengths
+        self.m0 = np.zeros(self.P)
+        self.m0[0], self.m0[1] = math.log(1.35), 0.2
+        if prior_att is not None: self.m0[2:2 + T] = prior_att
+        if prior_def is not None: self.m0[2 + T:] = prior_def
+        self.R = np.diag([1e-3, 1.0] + [float(prior_precision)] * (2 * T))
+        self.theta = self.m0.copy()
+        self.info = np.zeros((self.P, self.P))   # data precision, decayed to ``as_of``
+        self.seen: set = set()
+        self.as_of: Optional[float] = None        # days since epoch
+
+    # ---------------- design ----------------
+    def _design(self, h: np.ndarray, a: np.ndarray) -> np.ndarray:
+        """Rows [home goals..., away goals...] for fixtures with home team indices h, away a."""
+        T, n = len(self.teams), len(h)
+        X = np.zeros((2 * n, self.P))
+        r = np.arange(n)
+        X[:, 0] = 1.0
+        X[r, 1] = 1.0
+        X[r, 2 + h] = 1.0
+        X[r, 2 + T + a] = -1.0
+        X[n + r, 2 + a] = 1.0
+        X[n + r, 2 + T + h] = -1.0
+        return X
+
+    def _rows(self, res: pd.DataFrame):
+        h = res["team_h"].map(self.idx).to_numpy()
+        a = res["team_a"].map(self.idx).to_numpy()
+        ok = ~(pd.isna(h) | pd.isna(a))
+        res, h, a = res[ok], h[ok].astype(int), a[ok].astype(int)
+        y = np.concatenate([res["team_h_score"].to_numpy(float), res["team_a_score"].to_numpy(float)])
+        day = np.concatenate([res["day"].to_numpy(float)] * 2)
+        return res, self._design(h, a), y, day
+
+    # ---------------- fitting ----------------
+    def fit(self, fixtures: Iterable[dict], now: Optional[float] = None, iters: int = 30) -> "TeamModel":
+        """Full penalised, time-weighted Poisson fit (IRLS) on every finished fixture."""
+        res, X, y, day = self._rows(finished_results(fixtures))
+        now = float(day.max()) if now is None and len(day) else (now or time.time() / 86400.0)
+        w = np.exp(-self.xi * np.clip(now - day, 0, None))
+        theta = self.m0.copy()
+        for _ in range(iters):
+            lam = np.exp(X @ theta)
+            g = X.T @ (w * (y - lam)) - self.R @ (theta - self.m0)
+            H = X.T @ (X * (w * lam)[:, None]) + self.R
+            step = np.linalg.solve(H, g)
+            theta += step
+            if np.abs(step).max() < 1e-8:
+                break
+        lam = np.exp(X @ theta)
+        self.theta, self.info = theta, X.T @ (X * (w * lam)[:, None])
+        self.seen, self.as_of = set(int(i) for i in res["id"]), now
+        return self
+
+    def update(self, fixtures: Iterable[dict]) -> List[int]:
+        """Fold in finished fixtures not seen yet, one Newton step each (no pandas); returns their ids."""
+        new = sorted((f for f in fixtures
+                      if f.get("finished") and f.get("team_h_score") is not None and f.get("team_a_score") is not None
+                      and int(f["id"]) not in self.seen and f["team_h"] in self.idx and f["team_a"] in self.idx),
+                     key=lambda f: (f.get("kickoff_time") or "\uffff", f["id"]))   # undated last, as in fit
+        for f in new:
+            X = self._design(np.array([self.idx[f["team_h"]]]), np.array([self.idx[f["team_a"]]]))
+            y = np.array([f["team_h_score"], f["team_a_score"]], dtype=float)
+            t = (datetime.fromisoformat(f["kickoff_time"].replace("Z", "+00:00")).timestamp() / 86400.0
+                 if f.get("kickoff_time") else (self.as_of if self.as_of is not None else time.time() / 86400.0))
+            if self.as_of is not None and t > self.as_of:
+                self.info *= math.exp(-self.xi * (t - self.as_of))
+            self.as_of = t if self.as_of is None else max(self.as_of, t)
+            lam = np.exp(X @ self.theta)
+            self.info += X.T @ (X * lam[:, None])
+            self.theta = self.theta + np.linalg.solve(self.info + self.R, X.T @ (y - lam))
+            self.seen.add(int(f["id"]))
+        return [int(f["id"]) for f in new]
+
+    # ---------------- outputs ----------------
+    def _parts(self):
+        T = len(self.teams)
+        return self.theta[0], self.theta[1], self.theta[2:2 + T], self.theta[2 + T:]
+
+    def ratings(self) -> pd.DataFrame:
+        """team, att_rating, def_rating on the mean-3 scale of build_team_strengths."""
+        _, _, att, dfn = self._parts()
+        return pd.DataFrame({"team": self.teams, "att_rating": 3.0 * np.exp(att - att.mean()),
+                             "def_rating": 3.0 * np.exp(dfn - dfn.mean())})
+
+    def fixture_xg(self, ft: pd.DataFrame) -> pd.DataFrame:
+        """Add xg_for / xg_against / opp_factor to team-centric fixture rows (team, opp, home)."""
+        mu, home, att, dfn = self._parts()
+        t = ft["team"].map(self.idx)
+        o = ft["opp"].map(self.idx)
+        known = t.notna() & o.notna()
+        ti, oi = t.fillna(0).astype(int).to_numpy(), o.fillna(0).astype(int).to_numpy()
+        hm = ft["home"].to_numpy(float)
+        out = ft.copy()
+        out["xg_for"] = np.where(known, np.exp(mu + home * hm + att[ti] - dfn[oi]), np.nan)
+        out["xg_against"] = np.where(known, np.exp(mu + home * (1 - hm) + att[oi] - dfn[ti]), np.nan)
+        out["opp_factor"] = np.where(known, np.exp(home * (hm - 0.5) - (dfn[oi] - dfn.mean())), np.nan)
+        return out
+
+    # ---------------- persistence ----------------
+    def to_dict(self) -> dict:
+        return {"teams": self.teams, "xi": self.xi, "m0": self.m0.tolist(), "R": np.diag(self.R).tolist(),
+                "theta": self.theta.tolist(), "info": self.info.tolist(), "seen": sorted(self.seen),
+                "as_of": self.as_of, "saved_at": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "TeamModel":
+        m = cls(d["teams"])
+        m.xi, m.m0, m.R = float(d["xi"]), np.array(d["m0"]), np.diag(d["R"])
+        m.theta, m.info = np.array(d["theta"]), np.array(d["info"])
+        m.seen, m.as_of = set(d["seen"]), d["as_of"]
+        return m
+
+    def save(self, path: str = STATE_PATH) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp, path)
+
+def load(path: str = STATE_PATH) -> Optional[TeamModel]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return TeamModel.from_dict(json.load(f))
+
+def new_model(bs: dict, static: pd.DataFrame, cfg: dict) -> TeamModel:
+    """Empty model for this season's teams, prior centred on ``static`` (build_team_strengths output)."""
+    s = static.set_index("team")
+    teams = [int(t["id"]) for t in bs["teams"]]
+    prior = lambda col: np.log(s[col].reindex(teams).fillna(3.0).to_numpy() / 3.0)
+    return TeamModel(teams, prior("att_rating"), prior("def_rating"),
+                     half_life_days=float(cfg.get("half_life_days", 180)),
+                     prior_precision=float(cfg.get("prior_precision", 4.0)))
+
+def main():
+    import compute_phase3 as cp3
+    from utils import read_toml
+    ap = argparse.ArgumentParser(description="Poisson team strength model")
+    ap.add_argument("cmd", choices=["fit", "update", "show"])
+    ap.add_argument("--config", default="configs/config.toml")
+    args = ap.parse_args()
+    cfg = read_toml(args.config)
+    tm = cfg.get("team_model", {})
+    path = tm.get("state_path", STATE_PATH)
+    cache = cfg.get("caching", {}).get("cache_dir", "data/cache")
+    with open(os.path.join(cache, "bootstrap-static.json"), "r", encoding="utf-8") as f:
+        bs = json.load(f)
+    with open(os.path.join(cache, "fixtures.json"), "r", encoding="utf-8") as f:
+        fx = json.load(f)
+
+    model = load(path)
+    teams = sorted(int(t["id"]) for t in bs["teams"])
+    if args.cmd == "fit" or (args.cmd == "update" and (model is None or sorted(model.teams) != teams)):
+        t0 = time.perf_counter()
+        model = new_model(bs, cp3.build_team_strengths(bs, model=None), tm).fit(fx)
+        print(f"Fitted on {len(model.seen)} finished fixtures in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        model.save(path)
+    elif args.cmd == "update":
+        t0 = time.perf_counter()
+        new = model.update(fx)
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"Updated with {len(new)} fixtures in {ms:.2f} ms" + (f" ({ms / len(new):.3f} ms each)" if new else ""))
+        if new:
+            model.save(path)
+    if model is None:
+        raise SystemExit(f"{path} missing; run `python pipeline/team_model.py fit`")
+    names = {int(t["id"]): t["name"] for t in bs["teams"]}
+    r = model.ratings().assign(name=lambda d: d["team"].map(names)).sort_values("att_rating", ascending=False)
+    mu, home, _, _ = model._parts()
+    print(f"mu={math.exp(mu):.2f} goals, home x{math.exp(home):.2f}")
+    print(r[["team", "name", "att_rating", "def_rating"]].round(2).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Fit the minutes / attack / clean-sheet coefficients of compute_phase3 from past gameweeks.
+
+``build`` turns player_history.csv (``fetch_fpl_data.py history``), fixtures.json and the raw
+snapshot store into two cached matrices under ``[train] cache_dir``:
+
+  * player_gw.parquet     one row per player × finished GW: as-of features (position, availability,
+                          form, selected-by; from the bootstrap-static snapshot taken before the GW
+                          deadline when the store has one, otherwise derived from history; xG/xA
+                          per 90 from earlier GWs only, 0 under ``min_prior_minutes``), the attack
+                          design columns and the targets (minutes, points, goals, assists)
+  * team_fixtures.parquet one row per team × finished fixture: team / opponent ratings as of the
+                          deadline, ease and whether the team kept a clean sheet
+
+Only GWs missing from the cache are built, so a weekly refresh decodes one or two snapshots.
+``fit`` then solves, on those arrays:
+
+  * minutes      n_fix·avail·base[pos]·form_bump·sel_bump  (Gauss-Newton least squares)
+  * attack       w_def·3/opp_def + w_ease·ease              (non-negative least squares)
+  * clean sheet  logistic on team_def - opp_att and ease    (IRLS)
+
+and writes configs/model_params.toml, which compute_phase3 (and so whatif) loads on import. The
+before/after errors are measured on the last ``[train] holdout_gws`` GWs, fitted without them; the
+written parameters are then refitted on every GW.
+
+    python pipeline/train.py fit [--dry-run] [--rebuild]
+    python pipeline/train.py build
+"""
+from __future__ import annotations
+import argparse, bisect, json, os, time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+import numpy as np
+import pandas as pd
+from utils import read_toml, utcnow_str
+from snapshots import SnapshotStore
+import compute_phase3 as cp3
+import scoring
+
+PLAYER_GW = "player_gw.parquet"
+TEAM_FIXTURES = "team_fixtures.parquet"
+
+# ============================================================
+# Feature matrices
+# ============================================================
+def _deadlines(bs: dict) -> Dict[int, str]:
+    return {int(e["id"]): e.get("deadline_time") for e in bs.get("events", [])}
+
+def team_fixture_rows(fx: pd.DataFrame) -> pd.DataFrame:
+    """Finished fixtures -> one row per side with ease, goals conceded and the clean-sheet flag."""
+    f = fx[fx["finished"].fillna(False).astype(bool)]
+    cols = dict(fixture=f["id"].to_numpy(), event=f["event"].to_numpy())
+    home = pd.DataFrame(dict(cols, team=f["team_h"].to_numpy(), opp=f["team_a"].to_numpy(), home=1,
+                             difficulty=f["team_h_difficulty"].to_numpy(), conceded=f["team_a_score"].to_numpy()))
+    away = pd.DataFrame(dict(cols, team=f["team_a"].to_numpy(), opp=f["team_h"].to_numpy(), home=0,
+                             difficulty=f["team_a_difficulty"].to_numpy(), conceded=f["team_h_score"].to_numpy()))
+    out = pd.concat([home, away], ignore_index=True)
+    out["ease"] = out["difficulty"].map(cp3.ease_from_difficulty)
+    out["cs"] = (out["conceded"] == 0).astype(np.int8)
+    return out
+
+def asof_bootstraps(bs: dict, store: Optional[SnapshotStore], events,
+                    max_age_days: float = 7.0) -> Dict[int, Tuple[dict, str]]:
+    """
+    {gw: (bootstrap-static as of its deadline, 'snapshot'|'current')}. A snapshot older than
+    ``max_age_days`` at the deadline is ignored (its flags and form belong to another GW).
+    """
+    deadlines, out = _deadlines(bs), {}
+    rows = store.list("bootstrap-static") if store is not None else []
+    for ev in events:
+        snap, dl = None, deadlines.get(ev)
+        if rows and dl:
+            deadline = datetime.fromisoformat(dl.replace("Z", "+00:00"))
+            i = bisect.bisect_right(rows, (deadline.strftime(store.ts_format), "\uffff"))
+            if i:
+                taken = datetime.strptime(rows[i - 1][0], store.ts_format).replace(tzinfo=timezone.utc)
+                if (deadline - taken).total_seconds() <= max_age_days * 86400:
+                    snap = json.loads(store.get_bytes(rows[i - 1][1]))
+        out[ev] = (snap, "snapshot") if snap else (bs, "current")
+    return out
+
+def _ratings(boots: Dict[int, Tuple[dict, str]]) -> pd.DataFrame:
+    return pd.concat([cp3.build_team_strengths(b).assign(event=ev) for ev, (b, _) in boots.items()], ignore_index=True)
+
+def asof_elements(boots: Dict[int, Tuple[dict, str]]) -> pd.DataFrame:
+    keep = ["id", "element_type", "chance_of_playing_next_round", "form", "selected_by_percent"]
+    frames = []
+    for ev, (b, src) in boots.items():
+        e = pd.DataFrame(b["elements"]).reindex(columns=keep).assign(event=ev, asof=src)
+        if src != "snapshot":   # today's flags and form say nothing about a past deadline
+            e[["chance_of_playing_next_round", "form", "selected_by_percent"]] = np.nan
+        frames.append(e)
+    return pd.concat(frames, ignore_index=True).rename(columns={"id": "element"})
+
+def history_features(hist: pd.DataFrame, min_minutes: float, form_window: int, total_players: float) -> pd.DataFrame:
+    """
+    Per player × GW, from earlier GWs only: xG/xA per 90 (NaN under ``min_minutes``), form (mean
+    points of the last ``form_window`` GWs) and selected-by % at the GW (history ``selected`` count).
+    """
+    xg = "expected_goals" if "expected_goals" in hist.columns else "goals_scored"
+    xa = "expected_assists" if "expected_assists" in hist.columns else "assists"
+    h = hist.assign(_xg=pd.to_numeric(hist[xg], errors="coerce").fillna(0.0),
+                    _xa=pd.to_numeric(hist[xa], errors="coerce").fillna(0.0),
+                    _sel=pd.to_numeric(hist["selected"], errors="coerce") if "selected" in hist.columns else np.nan)
+    g = h.groupby(["element", "round"], sort=True).agg(
+        minutes=("minutes", "sum"), _xg=("_xg", "sum"), _xa=("_xa", "sum"),
+        total_points=("total_points", "sum"), _sel=("_sel", "first")).reset_index()
+    by = g.groupby("element")
+    prior = {c: by[c].cumsum() - g[c] for c in ("minutes", "_xg", "_xa")}
+    ok = prior["minutes"] >= min_minutes
+    g["xg90"] = np.where(ok, prior["_xg"] / prior["minutes"].clip(lower=1) * 90.0, np.nan)
+    g["xa90"] = np.where(ok, prior["_xa"] / prior["minutes"].clip(lower=1) * 90.0, np.nan)
+    g["form_hist"] = by["total_points"].transform(lambda x: x.shift(1).rolling(form_window, min_periods=1).mean())
+    g["sel_hist"] = g["_sel"] / max(float(total_players), 1.0) * 100.0
+    return g.rename(columns={"round": "event"})[["element", "event", "xg90", "xa90", "form_hist", "sel_hist"]]
+
+def build_player_gw(hist: pd.DataFrame, tf: pd.DataFrame, elements: pd.DataFrame, ratings: pd.DataFrame,
+                    events, total_players: float, min_prior_minutes: float, form_window: int) -> pd.DataFrame:
+    """Player × GW features and targets for ``events`` (see module docstring)."""
+    h = hist[hist["round"].isin(events)].copy()
+    h["was_home"] = h["was_home"].astype(str).str.lower().isin(("true", "1"))
+    fixside = tf.set_index(["fixture", "home"])
+    key = pd.MultiIndex.from_arrays([h["fixture"], h["was_home"].astype(int)])
+    for c in ("team", "opp", "ease"):
+        h[c] = fixside[c].reindex(key).to_numpy()
+    h = h.dropna(subset=["team"])
+    h["event"] = h["round"].astype(int)
+    r = ratings.set_index(["event", "team"])["def_rating"]
+    h["opp_def"] = r.reindex(pd.MultiIndex.from_arrays([h["event"], h["opp"].astype(int)])).fillna(3.0).to_numpy()
+
+    # as-of player rows: snapshot features where we have them, history-derived otherwise
+    h = h.merge(elements, on=["element", "event"], how="left").merge(
+        history_features(hist, min_prior_minutes, form_window, total_players), on=["element", "event"], how="left")
+    # no as-of rate yet -> 0; today's xgxa_players.csv covers the GWs being fitted
+    h["xg90"] = h["xg90"].fillna(0.0)
+    h["xa90"] = h["xa90"].fillna(0.0)
+    h["form"] = pd.to_numeric(h["form"], errors="coerce").fillna(h["form_hist"])
+    h["selected_by_percent"] = pd.to_numeric(h["selected_by_percent"], errors="coerce").fillna(h["sel_hist"])
+    h["position"] = scoring.position_labels(h["element_type"])
+
+    # attack design: actual minutes × player rate × pts, times each blend term
+    pos = scoring.pos_index(h["element_type"])
+    base = scoring.attack_points(h["minutes"], h["xg90"], h["xa90"], pos)
+    h["x_def"] = base * 3.0 / h["opp_def"].where(h["opp_def"] != 0, 3.0)
+    h["x_ease"] = base * h["ease"]
+    h["y_att"] = scoring.goal_points(h["goals_scored"], pos) + scoring.assist_points(h["assists"], pos)
+    out = h.groupby(["element", "event"], sort=True).agg(
+        position=("position", "first"), team=("team", "last"), asof=("asof", "first"), n_fix=("fixture", "size"),
+        chance=("chance_of_playing_next_round", "first"), form=("form", "first"),
+        selected_by=("selected_by_percent", "first"), xg90=("xg90", "first"), xa90=("xa90", "first"),
+        minutes=("minutes", "sum"), total_points=("total_points", "sum"), goals=("goals_scored", "sum"),
+        assists=("assists", "sum"), x_def=("x_def", "sum"), x_ease=("x_ease", "sum"), y_att=("y_att", "sum"),
+    ).reset_index()
+    out = out.dropna(subset=["position"])
+    for c in ("n_fix", "minutes", "total_points", "goals", "assists"):
+        out[c] = out[c].astype(np.int16)
+    for c in ("chance", "form", "selected_by", "xg90", "xa90", "x_def", "x_ease", "y_att"):
+        out[c] = pd.to_numeric(out[c], errors="coerce").astype(np.float32)
+    out["team"] = out["team"].astype(np.int16)
+    return out
+
+def build(cfg: dict, bs: dict, fx: list, hist: pd.DataFrame, rebuild: bool = False):
+    """Append the finished GWs missing from the cache; returns (player_gw, team_fixtures, new GWs)."""
+    t = cfg.get("train", {})
+    cache_dir = t.get("cache_dir", "data/cache/train")
+    pg_path, tf_path = os.path.join(cache_dir, PLAYER_GW), os.path.join(cache_dir, TEAM_FIXTURES)
+    have_pg = pd.read_parquet(pg_path) if os.path.exists(pg_path) and not rebuild else None
+    have_tf = pd.read_parquet(tf_path) if os.path.exists(tf_path) and not rebuild else None
+
+    fxd = pd.DataFrame(fx)
+    tf_all = team_fixture_rows(fxd)
+    done = set() if have_pg is None else set(int(e) for e in have_pg["event"].unique())
+    todo = sorted(set(int(e) for e in tf_all["event"].dropna().unique()) & set(int(e) for e in hist["round"].unique()) - done)
+    if not todo:
+        return have_pg, have_tf, []
+
+    store = SnapshotStore.from_config(cfg) if cfg.get("snapshots") else None
+    boots = asof_bootstraps(bs, store, todo, float(t.get("max_snapshot_age_days", 7)))
+    ratings = _ratings(boots)
+    tf = tf_all[tf_all["event"].isin(todo)].copy()
+    rk = ratings.set_index(["event", "team"])
+    for col, side, src in (("team_def", "team", "def_rating"), ("team_att", "team", "att_rating"),
+                           ("opp_def", "opp", "def_rating"), ("opp_att", "opp", "att_rating")):
+        tf[col] = rk[src].reindex(pd.MultiIndex.from_arrays([tf["event"], tf[side]])).fillna(3.0).to_numpy()
+    pg = build_player_gw(hist, tf, asof_elements(boots), ratings, todo, bs.get("total_players") or 1e7,
+                         float(t.get("min_prior_minutes", 270)), int(t.get("form_window", 4)))
+
+    pg = pg if have_pg is None else pd.concat([have_pg, pg], ignore_index=True)
+    tf = tf if have_tf is None else pd.concat([have_tf, tf], ignore_index=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    pg.to_parquet(pg_path, index=False)
+    tf.to_parquet(tf_path, index=False)
+    return pg, tf, todo
+
+# ============================================================
+# Fits
+# ============================================================
+def minutes_predict(pg: pd.DataFrame, m: dict) -> np.ndarray:
+    avail, form_u, sel_u = cp3.minutes_inputs(pg["chance"], pg["form"], pg["selected_by"])
+    base = pg["position"].map(m["base_min"]).fillna(75.0).to_numpy(float)
+    return (pg["n_fix"].to_numpy(float) * avail.to_numpy() * base
+            * (m["form_lo"] + m["form_span"] * form_u.to_numpy()) * (m["sel_lo"] + m["sel_span"] * sel_u.to_numpy()))
+
+def fit_minutes(pg: pd.DataFrame, m0: dict, iters: int = 30) -> dict:
+    """
+    Gauss-Newton on θ = (base[GK..FWD], a, b) with bumps 1 + a(form_u - ½) and 1 + b(sel_u - ½)
+    (so lo = 1 - span/2, as the defaults are). Starts from the current parameters.
+    """
+    y = pg["minutes"].to_numpy(float)
+    avail, form_u, sel_u = cp3.minutes_inputs(pg["chance"], pg["form"], pg["selected_by"])
+    w = pg["n_fix"].to_numpy(float) * avail.to_numpy()
+    u, v = form_u.to_numpy() - 0.5, sel_u.to_numpy() - 0.5
+    P = pd.Categorical(pg["position"], categories=scoring.POSITIONS).codes
+    onehot = np.eye(len(scoring.POSITIONS))[P]
+    theta = np.array([m0["base_min"][p] for p in scoring.POSITIONS] + [m0["form_span"], m0["sel_span"]], dtype=float)
+    for _ in range(iters):
+        base, a, b = theta[P], theta[4], theta[5]
+        fb, sb = 1 + a * u, 1 + b * v
+        pred = w * base * fb * sb
+        J = np.column_stack([onehot * (w * fb * sb)[:, None], w * base * u * sb, w * base * fb * v])
+        step = np.linalg.lstsq(J, y - pred, rcond=None)[0]
+        theta = theta + step
+        theta[:4] = theta[:4].clip(0.0, 90.0)
+        theta[4:] = theta[4:].clip(-1.9, 1.9)   # keep both bumps positive
+        if np.abs(step).max() < 1e-6:
+            break
+    a, b = float(theta[4]), float(theta[5])
+    return {"base_min": {p: round(float(x), 4) for p, x in zip(scoring.POSITIONS, theta[:4])},
+            "form_lo": round(1 - a / 2, 5), "form_span": round(a, 5), "sel_lo": round(1 - b / 2, 5), "sel_span": round(b, 5)}
+
+def fit_attack(pg: pd.DataFrame) -> dict:
+    """Least squares y_att ≈ w_def·x_def + w_ease·x_ease over player-GWs, weights kept ≥ 0."""
+    X = pg[["x_def", "x_ease"]].to_numpy(float)
+    y = pg["y_att"].to_numpy(float)
+    w = np.linalg.lstsq(X, y, rcond=None)[0]
+    if (w < 0).any():   # 2-variable NNLS: best single-term fit
+        cand = [np.array([max(0.0, X[:, 0] @ y / max(X[:, 0] @ X[:, 0], 1e-12)), 0.0]),
+                np.array([0.0, max(0.0, X[:, 1] @ y / max(X[:, 1] @ X[:, 1], 1e-12))])]
+        w = min(cand, key=lambda c: float(((X @ c - y) ** 2).sum()))
+    return {"w_def": round(float(w[0]), 5), "w_ease": round(float(w[1]), 5)}
+
+def fit_clean_sheet(tf: pd.DataFrame, iters: int = 25, ridge: float = 1e-4) -> dict:
+    """Logistic regression cs ~ bias + k_def·(team_def - opp_att) + k_ease·(ease - 1) by IRLS."""
+    X = np.column_stack([np.ones(len(tf)), tf["team_def"] - tf["opp_att"], tf["ease"] - 1.0]).astype(float)
+    y = tf["cs"].to_numpy(float)
+    beta = np.zeros(3)
+    for _ in range(iters):
+        p = 1 / (1 + np.exp(-(X @ beta)))
+        W = np.clip(p * (1 - p), 1e-6, None)
+        step = np.linalg.solve(X.T @ (X * W[:, None]) + ridge * np.eye(3), X.T @ (y - p) - ridge * beta)
+        beta += step
+        if np.abs(step).max() < 1e-8:
+            break
+    return {"bias": round(float(beta[0]), 5), "k_def": round(float(beta[1]), 5), "k_ease": round(float(beta[2]), 5)}
+
+def evaluate(pg: pd.DataFrame, tf: pd.DataFrame, params: dict) -> dict:
+    """Errors of a parameter set on these rows (RMSE minutes / attacking points, CS log-loss)."""
+    rm = float(np.sqrt(np.mean((minutes_predict(pg, params["minutes"]) - pg["minutes"]) ** 2)))
+    a = params["attack"]
+    ra = float(np.sqrt(np.mean((a["w_def"] * pg["x_def"] + a["w_ease"] * pg["x_ease"] - pg["y_att"]) ** 2)))
+    p = np.clip(cp3.clean_sheet_probability(tf["team_def"], tf["opp_att"], tf["ease"], params), 1e-9, 1 - 1e-9)
+    ll = float(-np.mean(tf["cs"] * np.log(p) + (1 - tf["cs"]) * np.log(1 - p)))
+    return {"rmse_minutes": round(rm, 4), "rmse_att_pts": round(ra, 4), "logloss_cs": round(ll, 4)}
+
+def _fit_params(played: pd.DataFrame, tf: pd.DataFrame, start: dict) -> dict:
+    return {"minutes": fit_minutes(played, start["minutes"]),
+            "attack": fit_attack(played[(played["x_def"] > 0) | (played["x_ease"] > 0)]),
+            "clean_sheet": fit_clean_sheet(tf)}
+
+def fit(pg: pd.DataFrame, tf: pd.DataFrame, start: Optional[dict] = None, holdout_gws: int = 3) -> Tuple[dict, dict]:
+    """
+    Parameters fitted on every GW, and a report whose before/after errors are out of sample: the
+    last ``holdout_gws`` GWs scored with parameters fitted on the GWs before them. With too few
+    GWs to hold any out the errors are in-sample (``holdout`` is then empty).
+    """
+    start = start or cp3.DEFAULT_PARAMS
+    played = pg[pg["n_fix"] > 0]
+    events = sorted(int(e) for e in played["event"].unique())
+    test = events[-holdout_gws:] if 0 < holdout_gws < len(events) else []
+    if test:
+        cut = test[0]
+        p_in, p_out = played[played["event"] < cut], played[played["event"] >= cut]
+        t_in, t_out = tf[tf["event"] < cut], tf[tf["event"] >= cut]
+        scored = (p_out, t_out, _fit_params(p_in, t_in, start))
+    params = _fit_params(played, tf, start)
+    p_out, t_out, held = scored if test else (played, tf, params)
+    report = {"player_gw_rows": int(len(played)), "team_fixture_rows": int(len(tf)),
+              "events": [events[0], events[-1]], "holdout": [test[0], test[-1]] if test else [],
+              "before": evaluate(p_out, t_out, start), "after": evaluate(p_out, t_out, held)}
+    return params, report
+
+# ============================================================
+# Output
+# ============================================================
+def _toml_value(v) -> str:
+    if isinstance(v, str):
+        return json.dumps(v)
+    if isinstance(v, (list, tuple)):
+        return "[" + ", ".join(_toml_value(x) for x in v) + "]"
+    return repr(v)
+
+def write_params(params: dict, report: dict, path: str = cp3.MODEL_PARAMS_PATH) -> None:
+    """Flat TOML: one table per section, nested dicts as sub-tables; the fit report goes to [fit]."""
+    lines = ["# Fitted by pipeline/train.py; delete to fall back to the hand-tuned defaults.", ""]
+    def table(name, d):
+        lines.append(f"[{name}]")
+        lines.extend(f"{k} = {_toml_value(v)}" for k, v in d.items() if not isinstance(v, dict))
+        lines.append("")
+        for k, v in d.items():
+            if isinstance(v, dict):
+                table(f"{name}.{k}", v)
+    for sec, d in params.items():
+        table(sec, d)
+    table("fit", dict(report, fitted_at=utcnow_str()))
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+    os.replace(tmp, path)
+
+def main():
+    ap = argparse.ArgumentParser(description="Fit compute_phase3 coefficients from past GWs")
+    ap.add_argument("cmd", choices=["build", "fit"])
+    ap.add_argument("--config", default="configs/config.toml")
+    ap.add_argument("--rebuild", action="store_true", help="drop the cached matrices first")
+    ap.add_argument("--dry-run", action="store_true", help="print the fit, don't write params")
+    ap.add_argument("--out", default=cp3.MODEL_PARAMS_PATH)
+    args = ap.parse_args()
+
+    cfg = read_toml(args.config)
+    t, cache = cfg.get("train", {}), cfg.get("caching", {}).get("cache_dir", "data/cache")
+    hist_path = t.get("history_path", os.path.join(cache, "player_history.csv"))
+    if not os.path.exists(hist_path):
+        raise SystemExit(f"{hist_path} missing; run `python pipeline/fetch_fpl_data.py history`")
+    with open(os.path.join(cache, "bootstrap-static.json"), "r", encoding="utf-8") as f:
+        bs = json.load(f)
+    with open(os.path.join(cache, "fixtures.json"), "r", encoding="utf-8") as f:
+        fx = json.load(f)
+
+    t0 = time.perf_counter()
+    pg, tf, new = build(cfg, bs, fx, pd.read_csv(hist_path), rebuild=args.rebuild)
+    print(f"Feature cache: +{len(new)} GWs {new if new else ''} -> {0 if pg is None else len(pg)} player-GW rows "
+          f"({time.perf_counter() - t0:.2f}s)")
+    if args.cmd == "build" or pg is None or not len(pg):
+        return
+    t1 = time.perf_counter()
+    params, report = fit(pg, tf, start=cp3.DEFAULT_PARAMS, holdout_gws=int(t.get("holdout_gws", 3)))
+    print(f"Fit in {time.perf_counter() - t1:.2f}s on {report['player_gw_rows']} player-GWs / "
+          f"{report['team_fixture_rows']} team-fixtures (GW{report['events'][0]}-{report['events'][1]})")
+    ho = report["holdout"]
+    print(f"Errors on held-out GW{ho[0]}-{ho[1]}, fitted without them:" if ho else
+          "Errors in-sample (too few GWs to hold any out):")
+    for k in report["before"]:
+        print(f"  {k:14s} {report['before'][k]:>8.4f} -> {report['after'][k]:>8.4f}")
+    print(json.dumps(params, indent=2))
+    if not args.dry_run:
+        write_params(params, report, args.out)
+        print(f"Wrote {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+"""
+What-if override engine on top of data/cache/ep_components.csv.
+
+Holds the per player × fixture inputs written by compute_phase3 as flat arrays and
+re-derives EP with the same formulas as ep_engine, touching only what an override
+affects:
+
+  * player minutes / availability -> that player
+  * team attack/defence rating    -> fixtures involving the team -> players of the
+                                     team and of its opponents
+  * fixture difficulty (per side) -> that team-fixture -> players of that team
+
+    eng = WhatIfEngine.load()
+    eng.set_player_availability(381, 0.5)
+    eng.set_team_strength(12, def_rating=2.4)
+    eng.ep(5)            # per-player EP over the next 5 GWs, aligned with eng.ids
+    eng.breakdown(381)   # per-fixture appearance / attacking / CS points
+"""
+from __future__ import annotations
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+try:
+    import compute_phase3 as cp3, scoring
+except ImportError:  # imported from the app as pipeline.whatif
+    from pipeline import compute_phase3 as cp3, scoring
+
+COMPONENTS_PATH = "data/cache/ep_components.csv"
+HORIZONS = (1, 3, 5)
+
+class WhatIfEngine:
+    def __init__(self, comp: pd.DataFrame, horizons: Iterable[int] = HORIZONS):
+        comp = comp.sort_values(["id", "event", "fixture"]).reset_index(drop=True)
+        self.gw_start = int(comp["gw_start"].iloc[0]) if len(comp) else 1
+        self.horizons = tuple(sorted(set(int(h) for h in horizons)))
+
+        # ---- players (one row each)
+        pl = comp.drop_duplicates("id")
+        self.ids = pl["id"].to_numpy(np.int64)
+        self.row_of: Dict[int, int] = {int(p): i for i, p in enumerate(self.ids)}
+        self.pos = scoring.pos_index(pl["position"])
+        self.cs_pts = scoring.CS_PTS[self.pos]
+        self.xg = pl["xg_per90"].to_numpy(float)
+        self.xa = pl["xa_per90"].to_numpy(float)
+        self.base_minutes = (pl["base_min"] * pl["form_bump"] * pl["sel_bump"]).fillna(0.0).to_numpy(float)
+        self.base_avail = pl["avail"].fillna(0.0).to_numpy(float)
+
+        # ---- teams and team-fixture rows (one per team per fixture)
+        model_cols = [c for c in ("opp_factor", "xg_against") if c in comp.columns]
+        tf = comp.drop_duplicates(["team", "fixture"])[
+            ["team", "opp", "fixture", "event", "home", "ease", "difficulty",
+             "team_att", "team_def", "opp_att", "opp_def"] + model_cols].reset_index(drop=True)
+        teams = np.union1d(tf["team"].to_numpy(), tf["opp"].to_numpy()).astype(np.int64)
+        self.team_ids = teams
+        self.team_of: Dict[int, int] = {int(t): i for i, t in enumerate(teams)}
+        names = comp.drop_duplicates("team").set_index("team")["team_name"].astype(str)
+        self.team_names: Dict[int, str] = {int(t): names.get(t, str(t)) for t in teams}
+        t_idx = np.searchsorted(teams, tf["team"].to_numpy())
+        o_idx = np.searchsorted(teams, tf["opp"].to_numpy())
+        self.base_att = np.full(len(teams), 3.0)
+        self.base_def = np.full(len(teams), 3.0)
+        self.base_att[t_idx], self.base_def[t_idx] = tf["team_att"].to_numpy(float), tf["team_def"].to_numpy(float)
+        self.base_att[o_idx], self.base_def[o_idx] = tf["opp_att"].to_numpy(float), tf["opp_def"].to_numpy(float)
+        self.f_team, self.f_opp = t_idx, o_idx
+        self.f_fixture = tf["fixture"].to_numpy(np.int64)
+        self.f_event = tf["event"].to_numpy(np.int64)
+        self.f_home = tf["home"].to_numpy(np.int64)
+        self.base_ease = tf["ease"].to_numpy(float)
+        self.base_difficulty = tf["difficulty"].to_numpy(float)
+        # team-model runs: per-fixture opp_factor / xg_against, rescaled by rating overrides
+        model = len(model_cols) == 2 and tf["xg_against"].notna().all()
+        self.base_opp_factor = tf["opp_factor"].to_numpy(float) if model else None
+        self.base_xg_against = tf["xg_against"].to_numpy(float) if model else None
+        self.f_in_h = np.stack([self.f_event < self.gw_start + h for h in self.horizons])  # H × R
+        self.frow_of = {(int(f), int(t)): r for r, (f, t) in enumerate(zip(tf["fixture"], tf["team"]))}
+
+        self.player_team = np.searchsorted(teams, pl["team"].to_numpy())
+        self.players_by_team: List[np.ndarray] = [np.flatnonzero(self.player_team == t) for t in range(len(teams))]
+        self.rows_by_team: List[np.ndarray] = [np.flatnonzero(t_idx == t) for t in range(len(teams))]
+        self.rows_vs_team: List[np.ndarray] = [np.flatnonzero(o_idx == t) for t in range(len(teams))]
+
+        self.reset()
+
+    @classmethod
+    def load(cls, path: str = COMPONENTS_PATH, horizons: Iterable[int] = HORIZONS) -> "WhatIfEngine":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"{path} missing; run `python pipeline/compute_phase3.py`")
+        return cls(pd.read_csv(path), horizons=horizons)
+
+    def copy(self) -> "WhatIfEngine":
+        """Cheap per-session copy: shares the static arrays, copies the mutable state."""
+        new = object.__new__(WhatIfEngine)
+        new.__dict__.update(self.__dict__)
+        for k in ("minutes", "att", "def_", "ease", "att_mult", "cs_prob", "s_att", "s_cs", "n_fix",
+                  "app", "att_pts", "cs_pts_total", "overrides"):
+            v = getattr(self, k)
+            setattr(new, k, v.copy())
+        return new
+
+    # ---------------------------- state ----------------------------
+    def reset(self) -> None:
+        """Drop every override and rebuild the baseline state."""
+        self.minutes = self.base_minutes * self.base_avail
+        self.att = self.base_att.copy()
+        self.def_ = self.base_def.copy()
+        self.ease = self.base_ease.copy()
+        self.att_mult, self.cs_prob = self._fixture_terms(slice(None))
+        H, T = len(self.horizons), len(self.team_ids)
+        self.s_att = np.zeros((H, T))
+        self.s_cs = np.zeros((H, T))
+        self.n_fix = np.zeros((H, T))
+        for h in range(H):
+            w = self.f_in_h[h]
+            self.s_att[h] = np.bincount(self.f_team, weights=self.att_mult * w, minlength=T)
+            self.s_cs[h] = np.bincount(self.f_team, weights=self.cs_prob * w, minlength=T)
+            self.n_fix[h] = np.bincount(self.f_team, weights=w.astype(float), minlength=T)
+        P = len(self.ids)
+        self.app = np.zeros((H, P))
+        self.att_pts = np.zeros((H, P))
+        self.cs_pts_total = np.zeros((H, P))
+        self.overrides: Dict[tuple, float] = {}
+        self._recompute_players(np.arange(P))
+
+    def _recompute_players(self, rows: np.ndarray) -> None:
+        t = self.player_team[rows]
+        rate = scoring.attack_points(self.minutes[rows], self.xg[rows], self.xa[rows], self.pos[rows])
+        self.app[:, rows] = scoring.expected_appearance_points(self.n_fix[:, t], self.n_fix[:, t])
+        self.att_pts[:, rows] = rate * self.s_att[:, t]
+        self.cs_pts_total[:, rows] = self.cs_pts[rows] * self.s_cs[:, t]
+
+    def _fixture_terms(self, r):
+        """(att_mult, cs_prob) for fixture rows ``r`` under the current ratings / ease."""
+        t, o = self.f_team[r], self.f_opp[r]
+        opp_factor = xg_against = None
+        if self.base_xg_against is not None:
+            # ratings are 3·exp(param) in the team model, so rating ratios are its goal-rate ratios
+            opp_factor = self.base_opp_factor[r] * self.base_def[o] / self.def_[o]
+            xg_against = self.base_xg_against[r] * (self.att[o] / self.base_att[o]) * (self.base_def[t] / self.def_[t])
+        return (cp3.attack_multiplier(self.def_[o], self.ease[r], opp_factor=opp_factor),
+                cp3.clean_sheet_probability(self.def_[t], self.att[o], self.ease[r], xg_against=xg_against))
+
+    def _recompute_fixture_rows(self, frows: np.ndarray) -> Set[int]:
+        self.att_mult[frows], self.cs_prob[frows] = self._fixture_terms(frows)
+        teams = set(int(t) for t in self.f_team[frows])
+        for t in teams:
+            r = self.rows_by_team[t]
+            w = self.f_in_h[:, r]
+            self.s_att[:, t] = (self.att_mult[r] * w).sum(axis=1)
+            self.s_cs[:, t] = (self.cs_prob[r] * w).sum(axis=1)
+        return teams
+
+    def _player_row(self, pid: int) -> int:
+        i = self.row_of.get(int(pid))
+        if i is None:
+            raise KeyError(f"player {pid} has no fixtures in ep_components")
+        return i
+
+    # ---------------------------- overrides ----------------------------
+    def set_player_minutes(self, pid: int, minutes_per_fixture: Optional[float]) -> np.ndarray:
+        """Expected minutes per fixture (None restores the model). Returns touched player rows."""
+        i = self._player_row(pid)
+        if minutes_per_fixture is None:
+            self.overrides.pop(("minutes", int(pid)), None)
+            self.minutes[i] = self.base_minutes[i] * self.base_avail[i]
+        else:
+            self.overrides[("minutes", int(pid))] = float(minutes_per_fixture)
+            self.minutes[i] = max(0.0, float(minutes_per_fixture))
+        rows = np.array([i])
+        self._recompute_players(rows)
+        return rows
+
+    def set_player_availability(self, pid: int, prob: Optional[float]) -> np.ndarray:
+        """Chance of playing (0..1) in place of chance_of_playing_next_round; None restores it."""
+        i = self._player_row(pid)
+        if prob is None:
+            self.overrides.pop(("avail", int(pid)), None)
+            avail = self.base_avail[i]
+        else:
+            avail = min(1.0, max(0.0, float(prob)))
+            self.overrides[("avail", int(pid))] = avail
+        self.minutes[i] = self.base_minutes[i] * avail
+        rows = np.array([i])
+        self._recompute_players(rows)
+        return rows
+
+    def set_team_strength(self, team: int, att_rating: Optional[float] = None, def_rating: Optional[float] = None) -> np.ndarray:
+        """Override a team's attack and/or defence rating (3.0 = league average)."""
+        t = self.team_of[int(team)]
+        if att_rating is not None:
+            self.att[t] = float(att_rating)
+            self.overrides[("att", int(team))] = float(att_rating)
+        if def_rating is not None:
+            self.def_[t] = float(def_rating)
+            self.overrides[("def", int(team))] = float(def_rating)
+        # own fixtures (CS via team_def) + opponents' fixtures (att_mult via our def, CS via our att)
+        frows = np.concatenate([self.rows_by_team[t], self.rows_vs_team[t]])
+        teams = self._recompute_fixture_rows(frows)
+        rows = np.concatenate([self.players_by_team[x] for x in teams]) if teams else np.array([], dtype=np.int64)
+        self._recompute_players(rows)
+        return rows
+
+    def set_fixture_difficulty(self, fixture: int, team: int, difficulty: Optional[float]) -> np.ndarray:
+        """Override FPL difficulty (2..5) for one side of a fixture; None restores it."""
+        r = self.frow_of[(int(fixture), int(team))]
+        d = self.base_difficulty[r] if difficulty is None else float(difficulty)
+        if difficulty is None:
+            self.overrides.pop(("difficulty", int(fixture), int(team)), None)
+        else:
+            self.overrides[("difficulty", int(fixture), int(team))] = d
+        self.ease[r] = cp3.ease_from_difficulty(d)
+        teams = self._recompute_fixture_rows(np.array([r]))
+        rows = np.concatenate([self.players_by_team[x] for x in teams])
+        self._recompute_players(rows)
+        return rows
+
+    def apply(self, overrides: Iterable[dict]) -> np.ndarray:
+        """
+        Apply serialisable overrides, e.g. from app session state:
+          {"kind": "minutes", "id": 381, "value": 60}
+          {"kind": "avail", "id": 381, "value": 0.5}
+          {"kind": "team", "team": 12, "att": 3.4, "def": 2.6}
+          {"kind": "difficulty", "fixture": 11, "team": 1, "value": 4}
+        Returns the union of touched player rows.
+        """
+        touched = [np.array([], dtype=np.int64)]
+        for o in overrides:
+            kind = o.get("kind")
+            if kind == "minutes":
+                touched.append(self.set_player_minutes(o["id"], o.get("value")))
+            elif kind == "avail":
+                touched.append(self.set_player_availability(o["id"], o.get("value")))
+            elif kind == "team":
+                touched.append(self.set_team_strength(o["team"], o.get("att"), o.get("def")))
+            elif kind == "difficulty":
+                touched.append(self.set_fixture_difficulty(o["fixture"], o["team"], o.get("value")))
+            else:
+                raise ValueError(f"unknown override kind: {kind!r}")
+        return np.unique(np.concatenate(touched))
+
+    # ---------------------------- outputs ----------------------------
+    def _h(self, horizon: int) -> int:
+        try:
+            return self.horizons.index(int(horizon))
+        except ValueError:
+            raise ValueError(f"horizon {horizon} not tracked (have {self.horizons})") from None
+
+    def ep(self, horizon: int = 1, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        h = self._h(horizon)
+        sl = slice(None) if rows is None else rows
+        return self.app[h, sl] + self.att_pts[h, sl] + self.cs_pts_total[h, sl]
+
+    def to_frame(self, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """id + ep_{h} and per-component totals for every tracked horizon."""
+        sl = slice(None) if rows is None else rows
+        out = {"id": self.ids[sl]}
+        for h, hz in enumerate(self.horizons):
+            out[f"ep_{hz}"] = self.ep(hz, rows)
+            out[f"appearance_pts_{hz}"] = self.app[h, sl]
+            out[f"att_pts_{hz}"] = self.att_pts[h, sl]
+            out[f"cs_pts_{hz}"] = self.cs_pts_total[h, sl]
+        out["exp_minutes_per_fixture"] = self.minutes[sl]
+        return pd.DataFrame(out)
+
+    def breakdown(self, pid: int, horizon: Optional[int] = None) -> pd.DataFrame:
+        """Per-fixture appearance / attacking / CS points for one player under current overrides."""
+        i = self._player_row(pid)
+        t = self.player_team[i]
+        r = self.rows_by_team[t]
+        if horizon is not None:
+            r = r[self.f_in_h[self._h(horizon), r]]
+        pts = scoring.expected_points(np.full(len(r), self.pos[i]), self.minutes[i], self.xg[i], self.xa[i],
+                                      self.att_mult[r], self.cs_prob[r])
+        out = pd.DataFrame({
+            "event": self.f_event[r], "fixture": self.f_fixture[r],
+            "opp": self.team_ids[self.f_opp[r]], "home": self.f_home[r],
+            "ease": self.ease[r], "att_mult": self.att_mult[r], "cs_prob": self.cs_prob[r],
+            "appearance_pts": pts["appearance_pts"], "att_pts": pts["att_pts"], "cs_pts": pts["cs_pts"], "ep": pts["ep"],
+        })
+        return out.sort_values(["event", "fixture"]).reset_index(drop=True)
@@ -0,0 +1,62 @@
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+# Pipeline scripts import their siblings bare (run from the repo root as `python pipeline/x.py`)
+for p in (ROOT, ROOT / "pipeline"):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+TEAMS = [(1, "Alpha", 4, 1250, 1300), (2, "Bravo", 3, 1100, 1080), (3, "Charlie", 2, 1000, 1010), (4, "Delta", 3, 1150, 1120)]
+PLAYERS = [(1, 1, 1), (2, 1, 3), (3, 2, 2), (4, 2, 4), (5, 3, 3), (6, 3, 2), (7, 4, 4), (8, 4, 1)]   # id, team, element_type
+ROUNDS = [[(1, 2), (3, 4)], [(1, 3), (2, 4)], [(4, 1), (3, 2)], [(2, 1), (4, 3)], [(3, 1), (4, 2)]]
+
+@pytest.fixture
+def league(tmp_path):
+    """
+    Tiny season on disk: four teams, eight players, GW1-3 finished (scores, kickoff times, player
+    history with xG/xA), GW4 current and GW5 to come. Returns the bootstrap, fixtures, history and paths.
+    """
+    rng = np.random.default_rng(0)
+    teams = [{"id": i, "name": n, "short_name": n[:3].upper(), "strength": s, "strength_attack_home": a,
+              "strength_attack_away": a - 50, "strength_defence_home": d, "strength_defence_away": d - 40}
+             for i, n, s, a, d in TEAMS]
+    elements = [{"id": i, "web_name": f"P{i}", "first_name": "F", "second_name": f"S{i}", "team": t, "element_type": et,
+                 "now_cost": 50 + 5 * i, "status": "a", "form": "4.0", "selected_by_percent": "10.0",
+                 "chance_of_playing_next_round": None} for i, t, et in PLAYERS]
+    events = [{"id": g, "deadline_time": f"2025-08-{8 * g:02d}T17:30:00Z", "finished": g <= 3,
+               "is_current": g == 4, "is_next": g == 5} for g in range(1, 6)]
+    fixtures, history = [], []
+    for g, games in enumerate(ROUNDS, start=1):
+        for k, (h, a) in enumerate(games):
+            fid, done = 10 * g + k, g <= 3
+            hs, as_ = (int(rng.integers(0, 4)), int(rng.integers(0, 3))) if done else (None, None)
+            kickoff = f"2025-08-{8 * g + 1:02d}T14:00:00Z"
+            fixtures.append({"id": fid, "event": g, "team_h": h, "team_a": a, "team_h_difficulty": 3, "team_a_difficulty": 3,
+                             "finished": done, "team_h_score": hs, "team_a_score": as_, "kickoff_time": kickoff})
+            if not done:
+                continue
+            for pid, team, et in PLAYERS:
+                if team not in (h, a):
+                    continue
+                mins = int(rng.choice([0, 60, 90]))
+                goals = int(rng.integers(0, 2)) if mins and et > 2 else 0
+                history.append({"element": pid, "round": g, "fixture": fid, "was_home": team == h,
+                                "opponent_team": a if team == h else h, "kickoff_time": kickoff, "minutes": mins,
+                                "goals_scored": goals, "assists": 0, "expected_goals": round(0.3 * goals + 0.1 * (mins > 0), 2),
+                                "expected_assists": 0.05 if mins else 0.0, "total_points": (2 if mins else 0) + 5 * goals,
+                                "selected": 100000 * pid})
+    bs = {"teams": teams, "elements": elements, "events": events, "total_players": 1_000_000}
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    (cache / "bootstrap-static.json").write_text(json.dumps(bs), encoding="utf-8")
+    (cache / "fixtures.json").write_text(json.dumps(fixtures), encoding="utf-8")
+    hist = pd.DataFrame(history)
+    hist.to_csv(cache / "player_history.csv", index=False)
+    return {"bs": bs, "fixtures": fixtures, "history": hist, "cache_dir": str(cache),
+            "history_path": str(cache / "player_history.csv")}
@@ -0,0 +1,28 @@
+import pandas as pd
+
+import backtest
+
+CFG = {"train": {"min_prior_minutes": 90}}
+
+def _replay(league, xg, xa):
+    pd.DataFrame({"fpl_id": range(1, 9), "xg_per90": xg, "xa_per90": xa}).to_csv(
+        f"{league['cache_dir']}/xgxa_players.csv", index=False)
+    return backtest.Replay(CFG, league["cache_dir"], league["history_path"])
+
+def test_replay_ignores_todays_xgxa(league):
+    a = _replay(league, [0.0] * 8, [0.0] * 8).inputs(3, 3)
+    b = _replay(league, [0.9] * 8, [0.6] * 8).inputs(3, 3)
+    pd.testing.assert_frame_equal(a[2], b[2])
+    pd.testing.assert_frame_equal(backtest.project(a, 3, backtest.cp3.DEFAULT_PARAMS),
+                                  backtest.project(b, 3, backtest.cp3.DEFAULT_PARAMS))
+
+def test_replay_rates_are_as_of(league):
+    h = league["history"]
+    prior = h[h["round"] < 3].groupby("element")[["minutes", "expected_goals"]].sum()
+    xgxa = _replay(league, [0.9] * 8, [0.6] * 8).inputs(3, 1)[2].set_index("fpl_id")
+    short = prior.index[prior["minutes"] < 90]
+    assert len(short) and (xgxa.loc[short, ["xg_per90", "xa_per90"]] == 0.0).all().all()
+    ok = prior[prior["minutes"] >= 90]
+    assert len(ok)
+    pd.testing.assert_series_equal(xgxa.loc[ok.index, "xg_per90"], ok["expected_goals"] / ok["minutes"] * 90,
+                                   check_names=False, check_index_type=False)
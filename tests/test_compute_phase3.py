@@ -0,0 +1,22 @@
+import json
+import sys
+
+import pandas as pd
+import pytest
+
+import compute_phase3 as cp3
+
+@pytest.mark.parametrize("next_n", [1, 3])
+def test_next_n_keeps_full_component_horizon(league, tmp_path, monkeypatch, next_n):
+    cache = tmp_path / "run" / "data" / "cache"
+    cache.mkdir(parents=True)
+    bs = dict(league["bs"], events=[dict(e, finished=False, is_current=e["id"] == 1, is_next=e["id"] == 2)
+                                    for e in league["bs"]["events"]])   # season start: five GWs ahead
+    (cache / "bootstrap-static.json").write_text(json.dumps(bs), encoding="utf-8")
+    (cache / "fixtures.json").write_text(json.dumps(league["fixtures"]), encoding="utf-8")
+    monkeypatch.chdir(tmp_path / "run")
+    monkeypatch.setattr(sys, "argv", ["compute_phase3.py", "--next_n", str(next_n)])
+    cp3.main()
+    comp = pd.read_csv(cache / "ep_components.csv")
+    assert (comp["gw_start"] == 1).all() and sorted(comp["event"].unique()) == [1, 2, 3, 4, 5]
+    assert len(pd.read_csv(cache / ("projections_next_gw.csv" if next_n == 1 else "projections_next_3gws.csv")))
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from providers.fbref_provider import extract_table, join_tables
+
+def _row(pid, name, team, **stats):
+    cells = "".join(f'<td data-stat="{k}">{v}</td>' for k, v in stats.items())
+    return (f'<tr><th data-stat="ranker">1</th><td data-stat="player" data-append-csv="{pid}"><a>{name}</a></td>'
+            f'<td data-stat="team">{team}</td><td data-stat="position">FW</td><td data-stat="age">25-100</td>{cells}</tr>')
+
+def _page(table_id, rows, commented=True):
+    table = (f'<table class="stats_table" id="{table_id}"><thead><tr><th>Player</th></tr></thead><tbody>'
+             + rows[0] + '<tr class="thead"><th data-stat="player">Player</th></tr>' + "".join(rows[1:])
+             + "</tbody></table>")
+    other = '<table id="stats_squads_standard_for"><tbody>' + _row("x", "Squad row", "Arsenal", goals=99) + "</tbody></table>"
+    return f"<html><body>{other}<div>" + (f"<!--\n{table}\n-->" if commented else table) + "</div></body></html>"
+
+SHOOTING = _page("stats_shooting", [_row("a1", "Bukayo Saka", "Arsenal", goals=3, xg="2.4", shots="1,204"),
+                                    _row("b2", "Cole Palmer", "Chelsea", goals=5, xg="4.1", shots=""),
+                                    _row("a1", "Bukayo Saka", "Chelsea", goals=1, xg="0.3", shots=4)])
+PASSING = _page("stats_passing", [_row("a1", "Bukayo Saka", "Arsenal", assists=4, xg_assist="3.2")], commented=False)
+
+def test_extract_table():
+    df = extract_table(SHOOTING, "stats_shooting", ["goals", "xg", "shots"])
+    assert list(df["fbref_id"]) == ["a1", "b2", "a1"]                      # header row skipped, other table ignored
+    assert list(df["player"]) == ["Bukayo Saka", "Cole Palmer", "Bukayo Saka"]
+    assert df["shots"].iloc[0] == 1204 and np.isnan(df["shots"].iloc[1])  # thousands separator, empty cell
+    assert list(df["xg"]) == [2.4, 4.1, 0.3]
+    with pytest.raises(RuntimeError):
+        extract_table(SHOOTING, "stats_gca", ["gca"])
+
+def test_join_tables():
+    t = join_tables({"shooting": extract_table(SHOOTING, "stats_shooting", ["goals", "xg", "shots"]),
+                     "passing": extract_table(PASSING, "stats_passing", ["assists", "xg_assist"])})
+    assert len(t) == 3   # one row per player and squad (a mid-season transfer keeps both)
+    saka = t[(t["fbref_id"] == "a1") & (t["team"] == "Arsenal")].iloc[0]
+    assert (saka["goals"], saka["assists"]) == (3, 4) and saka["xg_assist"] == pytest.approx(3.2)
+    assert t.loc[t["fbref_id"] == "b2", "assists"].item() == 0                 # missing from a page: 0 / NaN
+    assert np.isnan(t.loc[t["fbref_id"] == "b2", "xg_assist"].item())
+    assert t["goals"].dtype == np.int32 and t["xg"].dtype == np.float32 and t["team"].dtype == "category"
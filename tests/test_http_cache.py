@@ -0,0 +1,76 @@
+import asyncio
+
+import httpx
+import pytest
+
+import http_cache
+from fpl_client import AsyncFPLClient
+from http_cache import HttpCache, OfflineCacheMiss
+
+class Server:
+    """Answers every GET with ``payload`` and an ETag; a matching If-None-Match gets a 304."""
+    def __init__(self):
+        self.payload, self.etag, self.seen = {"v": 1}, '"e1"', []
+
+    def __call__(self, request):
+        self.seen.append(request.headers.get("if-none-match"))
+        if request.headers.get("if-none-match") == self.etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=self.payload, headers={"etag": self.etag})
+
+@pytest.fixture(autouse=True)
+def _no_env(monkeypatch):
+    monkeypatch.delenv("FPL_HTTP_CACHE", raising=False)
+
+def _get(cache, server, path="bootstrap-static/"):
+    async def go():
+        async with AsyncFPLClient(cache=cache, transport=httpx.MockTransport(server), max_retries=0) as cli:
+            return await cli.get_json(path)
+    return asyncio.run(go())
+
+def test_ttl_then_revalidate(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(http_cache.time, "time", lambda: clock[0])
+    cache, srv = HttpCache(str(tmp_path), default_ttl=60), Server()
+    assert _get(cache, srv) == ({"v": 1}, True) and srv.seen == [None]
+    clock[0] += 30
+    assert _get(cache, srv) == ({"v": 1}, False) and len(srv.seen) == 1          # fresh: no request
+    clock[0] += 60
+    assert _get(cache, srv) == ({"v": 1}, False) and srv.seen[-1] == '"e1"'      # stale: 304
+    clock[0] += 30
+    assert _get(cache, srv) == ({"v": 1}, False) and len(srv.seen) == 2          # the 304 restarted the TTL
+    srv.payload, srv.etag = {"v": 2}, '"e2"'
+    clock[0] += 61
+    assert _get(cache, srv) == ({"v": 2}, True)
+    assert cache.stats == {"hit": 2, "revalidated": 1, "miss": 1, "stored": 2}
+
+def test_refresh_always_revalidates(tmp_path):
+    srv = Server()
+    _get(HttpCache(str(tmp_path)), srv)
+    assert _get(HttpCache(str(tmp_path), mode="refresh"), srv) == ({"v": 1}, False) and srv.seen == [None, '"e1"']
+
+def test_offline(tmp_path, monkeypatch):
+    srv = Server()
+    _get(HttpCache(str(tmp_path)), srv)
+    monkeypatch.setenv("FPL_HTTP_CACHE", "offline")   # the environment beats the configured mode
+    offline = HttpCache(str(tmp_path), mode="normal", default_ttl=0)
+    assert offline.mode == "offline"
+    assert _get(offline, srv) == ({"v": 1}, False)
+    with pytest.raises(OfflineCacheMiss):
+        _get(offline, srv, "fixtures/")
+    assert len(srv.seen) == 1   # offline never touches the network
+
+def test_ttl_rules_and_keys(tmp_path):
+    c = HttpCache(str(tmp_path), default_ttl=10, ttl={"understat.com": 600, "understat.com/player": 30})
+    assert c.ttl_for("https://understat.com/player/1250") == 30      # longest matching pattern wins
+    assert c.ttl_for("https://understat.com/league/EPL") == 600
+    assert c.ttl_for("https://fbref.com/en/comps/9") == 10
+    assert http_cache.cache_key("u", {"a": 1, "b": 2}) == http_cache.cache_key("u", {"b": 2, "a": 1})
+    with pytest.raises(ValueError):
+        HttpCache(str(tmp_path), mode="sometimes")
+
+def test_errors_are_not_stored(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    with pytest.raises(httpx.HTTPStatusError):
+        _get(cache, lambda r: httpx.Response(404, json={}))
+    assert cache.lookup("https://fantasy.premierleague.com/api/bootstrap-static/") is None
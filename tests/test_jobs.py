@@ -0,0 +1,20 @@
+import time
+
+from app.jobs import JobRunner
+
+def _wait(job, timeout=5.0):
+    end = time.time() + timeout
+    while not job.done and time.time() < end:
+        time.sleep(0.01)
+    assert job.done
+
+def test_finished_jobs_stay_until_collected():
+    runner = JobRunner(max_workers=1, cache_size=1)
+    first = runner.submit(lambda x: x, 1, key="first")
+    _wait(first)
+    for k in ("second", "third"):
+        _wait(runner.submit(lambda x: x, 2, key=k))
+    assert runner.get(first.id) is first      # pinned: nobody had seen it done
+    assert first.result == 1
+    _wait(runner.submit(lambda x: x, 3, key="fourth"))
+    assert runner.get(first.id) is None       # collected above, so evictable now
@@ -0,0 +1,64 @@
+import json
+
+import pandas as pd
+import pytest
+
+import live
+
+GW = 7
+COMP = pd.DataFrame({"id": [1, 2, 3, 4], "fixture": [100, 100, 101, 101], "event": GW, "ep": [4.0, 3.0, 5.0, 2.0]})
+
+def _fixture(fid, started=False, finished=False, minutes=0):
+    return {"id": fid, "event": GW, "started": started, "finished": finished, "minutes": minutes}
+
+def _live(**pts):   # id -> (minutes, points)
+    return {"elements": [{"id": i, "stats": {"minutes": m, "total_points": p}}
+                         for i, (m, p) in ((int(k[1:]), v) for k, v in pts.items())]}
+
+FRAMES = [   # (live, fixtures); None = not in the frame (304)
+    (_live(p1=(0, 0), p2=(0, 0), p3=(0, 0), p4=(0, 0)), [_fixture(100), _fixture(101)]),
+    (None, [_fixture(100, True, minutes=45), _fixture(101)]),
+    (_live(p1=(0, 0), p2=(45, 6), p3=(0, 0), p4=(0, 0)), None),
+    (_live(p1=(0, 0), p2=(90, 8), p3=(90, 2), p4=(30, 1)),
+     [_fixture(100, True, True, 90), _fixture(101, True, True, 90)]),
+]
+# changed players, live, remaining EP with captain 1 / vice 2 / bench 4, armband
+EXPECT = [
+    ({1, 2, 3, 4}, 0, 4 * 2 + 3 + 5, 1),
+    ({1, 2}, 0, 2 * 2 + 1.5 + 5, 1),
+    ({2}, 6, 2 * 2 + 1.5 + 5, 1),
+    ({1, 2, 3, 4}, 8 * 2 + 2, 0.0, 2),   # captain finished on 0 minutes: the vice is doubled
+]
+
+@pytest.fixture
+def recorded(tmp_path):
+    for seq, (lv, fx) in enumerate(FRAMES, start=1):
+        for name, obj in (("live", lv), ("fixtures", fx)):
+            if obj is not None:
+                (tmp_path / f"{name}_{seq:04d}.json").write_text(json.dumps(obj), encoding="utf-8")
+    return str(tmp_path)
+
+def test_replayed_polls(recorded):
+    tracker = live.LiveTracker(live.LiveState(COMP, GW), live.ReplayFeed(recorded), min_interval=0)
+    for changed, pts, rem, armband in EXPECT:
+        info = tracker.tick()
+        assert info["error"] is None and info["players"] == changed
+        tot = tracker.state.squad([1, 2, 3], captain=1, vice=2, bench=[4])
+        assert (tot["live"], tot["armband"]) == (pts, armband)
+        assert tot["remaining_ep"] == pytest.approx(rem)
+    assert tracker.feed.exhausted and tot["bench_live"] == 1
+
+def test_captain_keeps_armband_until_done():
+    s = live.LiveState(COMP, GW)
+    s.apply_fixtures([_fixture(100, True, minutes=80), _fixture(101, True, True, 90)])
+    s.apply_live(_live(p1=(0, 0), p2=(80, 2), p3=(90, 5)))
+    assert s.squad([1, 2, 3], captain=1, vice=2)["armband"] == 1      # could still come on
+    assert s.squad([1, 2, 3], captain=3, vice=2)["armband"] == 3      # played
+    s.apply_live(_live(p1=(10, 1), p2=(80, 2), p3=(90, 5)))
+    s.apply_fixtures([_fixture(100, True, True, 90)])
+    assert s.squad([1, 2, 3], captain=1, vice=2)["live"] == 1 * 2 + 2 + 5
+
+def test_blank_captain_promotes_vice():
+    s = live.LiveState(COMP, GW)
+    s.apply_live(_live(p2=(90, 3)))
+    assert s.squad([9, 2], captain=9, vice=2)["live"] == 6
@@ -0,0 +1,28 @@
+import pandas as pd
+
+from mapping import build_player_mapping
+from players import player_table
+
+def _bootstrap():
+    teams = [{"id": 1, "name": "Arsenal"}, {"id": 2, "name": "Chelsea"}]
+    el = lambda i, web, first, second, team, et: {
+        "id": i, "web_name": web, "first_name": first, "second_name": second, "team": team,
+        "element_type": et, "now_cost": 50, "status": "a", "form": "1.0", "selected_by_percent": "2.0",
+        "chance_of_playing_next_round": None}
+    return {"teams": teams, "elements": [
+        el(1, "Saka", "Bukayo", "Saka", 1, 3),
+        el(2, "Palmer", "Cole", "Palmer", 2, 3),
+        el(3, "Newbie", "New", "Player", 2, 5),    # element_type outside 1..4 -> position NaN
+        el(4, "Loanee", "Lo", "Anee", 99, 2),      # unknown team id -> team_name NaN
+    ]}
+
+def test_mapping_handles_unknown_position_and_team():
+    fpl = player_table(_bootstrap())
+    assert fpl["position"].isna().sum() == 1 and fpl["team_name"].isna().sum() == 1
+    prov = pd.DataFrame({"player_name": ["Bukayo Saka", "Cole Palmer", "New Player"],
+                         "team_name": ["Arsenal", "Chelsea", "Chelsea"], "position": ["M", "M", "F"]})
+    out = build_player_mapping(fpl, prov, "player_name", provider_team_col="team_name",
+                               provider_position_col="position")
+    got = dict(zip(out["fpl_id"], out["provider_match_name"]))
+    assert got[1] == "Bukayo Saka" and got[2] == "Cole Palmer"
+    assert len(out) == 4
@@ -0,0 +1,17 @@
+import pandas as pd
+
+from app import optimizer
+
+def _players():
+    # squad: 1 (MID, 6.0 EP); market: 2 loses 0.5 EP but is a sure riser, 3 gains 0.2 EP and is a faller
+    return pd.DataFrame({"id": [1, 2, 3], "web_name": ["Out", "Riser", "Faller"], "team_name": ["A", "B", "C"],
+                         "position": ["MID"] * 3, "price": [7.0, 7.0, 7.0], "ep_1": [6.0, 5.5, 6.2],
+                         "minutes_scale": [1.0] * 3, "price_drift": [0.0, 0.1, -0.1]})
+
+def test_drift_off_by_default():
+    best = optimizer.suggest_transfers(_players(), [1], bank_left=0.0)
+    assert best["in"] == 3 and round(best["delta_ep1"], 6) == 0.2
+
+def test_drift_never_pays_for_lost_ep():
+    best = optimizer.suggest_transfers(_players(), [1], bank_left=0.0, drift_weight=100.0)
+    assert best["in"] is None   # the riser loses EP; the faller gains EP but its drift outweighs it
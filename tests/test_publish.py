@@ -0,0 +1,48 @@
+import os
+import time
+
+import publish
+
+def _write(src, n, text):
+    (src / n).write_text(text, encoding="utf-8")
+
+def test_pointer_swap(tmp_path):
+    src, root = tmp_path / "cache", tmp_path / "published"
+    src.mkdir()
+    assert publish.current(str(root), str(src)) == ("cache", src)             # nothing published yet
+    _write(src, "projections_next_gw.csv", "id,ep_total\n1,5.0\n2,3.0\n")
+    _write(src, "fixtures.json", "[{\"id\": 1}]")
+    v1, new = publish.publish(str(src), str(root), inputs={"a": "h1"}, timings={"project": 1.23456})
+    assert new and publish.current(str(root))[0] == v1
+    m = publish.manifest(root=str(root))
+    assert m["files"]["projections_next_gw.csv"]["rows"] == 2 and m["files"]["fixtures.json"]["rows"] == 1
+    assert m["previous"] is None and m["inputs"] == {"a": "h1"} and m["timings"] == {"project": 1.235}
+    assert publish.publish(str(src), str(root)) == (v1, False)                 # unchanged: not republished
+    _write(src, "projections_next_gw.csv", "id,ep_total\n1,6.0\n")
+    d1 = publish.current(str(root))[1]
+    v2, new = publish.publish(str(src), str(root))
+    version, d2 = publish.current(str(root))
+    assert new and version == v2 != v1 and publish.manifest(root=str(root))["previous"] == v1
+    assert (d1 / "projections_next_gw.csv").read_text() == "id,ep_total\n1,5.0\n2,3.0\n"   # old readers keep their copy
+    assert (d2 / "projections_next_gw.csv").read_text() == "id,ep_total\n1,6.0\n"
+    assert not [f for f in os.listdir(root) if f.startswith(".")]              # no temp pointer left
+
+def test_gc_keeps_at_least_two(tmp_path):
+    src, root = tmp_path / "cache", tmp_path / "published"
+    src.mkdir()
+    made = []
+    for i in range(4):
+        _write(src, "captaincy_rankings.csv", f"id\n{i}\n")
+        made.append(publish.publish(str(src), str(root), keep=1)[0])
+    assert publish.versions(str(root)) == made[-2:]                          # keep=1 still keeps current + previous
+    stale = root / "versions" / ".staging-1-2"
+    stale.mkdir()
+    os.utime(stale, (time.time() - 7200, time.time() - 7200))
+    fresh = root / "versions" / ".staging-1-3"
+    fresh.mkdir()
+    assert publish.gc(str(root), keep=5) == [] and not stale.exists() and fresh.exists()
+    _write(src, "captaincy_rankings.csv", "id\n9\n")
+    made.append(publish.publish(str(src), str(root), keep=5)[0])
+    (root / publish.POINTER).write_text(made[-3] + "\n", encoding="utf-8")  # rolled back to an older version
+    assert publish.gc(str(root), keep=2) == []                                 # current is never dropped
+    assert publish.versions(str(root)) == made[-3:]
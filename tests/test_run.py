@@ -0,0 +1,49 @@
+import sys
+
+import pandas as pd
+import pytest
+
+import run as pipeline_run
+import scoring
+
+def _components(path, tamper=0.0):
+    comp = pd.DataFrame({"position": ["GK", "DEF", "MID", "FWD"], "exp_minutes": [90.0, 80.0, 70.0, 30.0],
+                         "xg_per90": [0.0, 0.1, 0.4, 0.6], "xa_per90": [0.0, 0.1, 0.3, 0.1],
+                         "att_mult": [1.0, 1.2, 0.9, 1.1], "cs_prob": [0.4, 0.3, 0.35, 0.2]})
+    e = scoring.expected_points(scoring.pos_index(comp["position"]), *(comp[c].to_numpy(float) for c in
+                                ("exp_minutes", "xg_per90", "xa_per90", "att_mult", "cs_prob")))
+    for c in ("appearance_pts", "att_pts", "cs_pts", "ep"):
+        comp[c] = e[c]
+    comp.loc[0, "ep"] += tamper
+    comp.to_csv(path, index=False)
+
+def _check(monkeypatch, comp, ok):
+    monkeypatch.setattr(sys, "argv", ["scoring.py", "check", "--components", str(comp), "--ok", str(ok), "--samples", "200"])
+    with pytest.raises(SystemExit) as e:
+        scoring.main()
+    return e.value.code
+
+def test_publish_waits_for_the_check():
+    assert "check" in pipeline_run.upstream(pipeline_run.STAGES)["publish"]
+
+def test_check_marker(tmp_path, monkeypatch):
+    comp, ok = tmp_path / "ep_components.csv", tmp_path / "check.ok"
+    _components(comp)
+    assert _check(monkeypatch, comp, ok) == 0 and ok.exists()
+    first = ok.read_bytes()
+    assert _check(monkeypatch, comp, ok) == 0 and ok.read_bytes() == first   # stable: publish doesn't re-run for nothing
+    _components(comp, tamper=0.5)
+    assert _check(monkeypatch, comp, ok) == 1 and not ok.exists()
+
+def test_publish_output_follows_the_config():
+    stages = pipeline_run.resolve(pipeline_run.STAGES, {"publish": {"root": "/srv/fpl/published"}})
+    pub = next(s for s in stages if s.name == "publish")
+    assert pub.outputs == ["/srv/fpl/published/CURRENT"]
+    assert next(s for s in pipeline_run.STAGES if s.name == "publish").outputs == ["{publish_root}/CURRENT"]
+
+def test_runner_resolves_from_its_config(tmp_path):
+    cfg = tmp_path / "config.toml"
+    cfg.write_text(f'[publish]\nroot = "{tmp_path / "pub"}"\n', encoding="utf-8")
+    r = pipeline_run.Runner(pipeline_run.select(pipeline_run.STAGES, ["publish"]), config=str(cfg),
+                            state_path=str(tmp_path / "state.json"), lock_path=None)
+    assert next(s for s in r.stages if s.name == "publish").outputs == [f"{tmp_path / 'pub'}/CURRENT"]
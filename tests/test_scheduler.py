@@ -0,0 +1,41 @@
+import pytest
+
+import fetch_fpl_data as ffd
+import run as pipeline_run
+import scheduler
+
+@pytest.fixture
+def sched(tmp_path, monkeypatch):
+    cfg = {"caching": {"cache_dir": str(tmp_path)},
+           "pipeline": {"lock_path": str(tmp_path / "pipeline.lock"), "state_path": str(tmp_path / "state.json")}}
+    s = scheduler.Scheduler(cfg)
+    s.dirty = False
+    yield s
+    s.pool.shutdown(wait=True)
+
+def test_failed_run_keeps_payloads_and_rearms(sched, monkeypatch):
+    def boom(payload, name, cfg):
+        raise OSError("disk full")
+    monkeypatch.setattr(ffd, "save", boom)
+    sched.held = {"fixtures": [{"id": 1}]}
+    assert sched.kick() == "started"
+    sched.wait()
+    assert sched.held == {"fixtures": [{"id": 1}]}
+    assert sched.dirty and sched.stats["errors"] == 1 and sched.stats["runs"] == 0
+
+def test_failed_stage_rearms(sched, monkeypatch):
+    saved = []
+    monkeypatch.setattr(ffd, "save", lambda payload, name, cfg: saved.append(name))
+    class Runner:
+        def __init__(self, *a, **k):
+            self.results = {"project": {"status": "failed"}}
+        def run(self):
+            return self.results
+        def summary(self):
+            return "project failed"
+    monkeypatch.setattr(pipeline_run, "Runner", Runner)
+    sched.held = {"bootstrap-static": {"events": []}}
+    sched.kick()
+    sched.wait()
+    assert saved == ["bootstrap-static"] and sched.held == {}
+    assert sched.dirty and sched.stats["errors"] == 1 and sched.stats["runs"] == 1
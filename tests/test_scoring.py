@@ -0,0 +1,130 @@
+"""
+Scoring kernels against baselines pinned from the scoring code before pipeline/scoring.py existed
+(compute_phase3's ep_engine / ep_components tables, and the scalar ``appearance_points`` /
+``compute_fixture_ep`` helpers). The numbers below were produced by that code on the small
+league in ``_inputs``; the kernels and the engine built on them must reproduce them.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import compute_phase3 as cp
+import scoring
+
+def _inputs():
+    """Four teams, eight players (every position, NaN / 0 / 100 chance, no xG/xA row), a DGW and a blank."""
+    teams = [{"id": i, "name": n, "short_name": n[:3].upper(), "strength": s, "strength_attack_home": ah,
+              "strength_attack_away": aa, "strength_defence_home": dh, "strength_defence_away": da}
+             for i, n, s, ah, aa, dh, da in [(1, "Alpha", 4, 1250, 1200, 1300, 1250), (2, "Bravo", 3, 1100, 1050, 1080, 1040),
+                                            (3, "Charlie", 2, 1000, 980, 1010, 990), (4, "Delta", 3, 1150, 1100, 1120, 1100)]]
+    def el(i, team, et, form, sel, chance):
+        return {"id": i, "web_name": f"P{i}", "first_name": "F", "second_name": f"S{i}", "team": team, "element_type": et,
+                "now_cost": 50, "status": "a", "form": form, "selected_by_percent": sel, "chance_of_playing_next_round": chance}
+    elements = [el(1, 1, 1, "3.0", "10.0", None), el(2, 1, 2, "5.5", "25.0", 75), el(3, 2, 3, "8.0", "40.0", None),
+                el(4, 2, 4, "2.0", "5.0", 50), el(5, 3, 3, "0.0", "0.5", 0), el(6, 4, 2, "12.0", "60.0", 100),
+                el(7, 3, 4, "6.5", "15.0", None), el(8, 4, 1, "1.0", "2.0", 25)]
+    events = [{"id": 1, "finished": True, "is_current": False, "is_next": False},
+              {"id": 2, "finished": False, "is_current": True, "is_next": False},
+              {"id": 3, "finished": False, "is_current": False, "is_next": True},
+              {"id": 4, "finished": False, "is_current": False, "is_next": False}]
+    fx = [{"id": 10, "event": 2, "team_h": 1, "team_a": 2, "team_h_difficulty": 3, "team_a_difficulty": 4},
+          {"id": 11, "event": 2, "team_h": 3, "team_a": 4, "team_h_difficulty": 2, "team_a_difficulty": 3},
+          {"id": 12, "event": 3, "team_h": 2, "team_a": 3, "team_h_difficulty": 2, "team_a_difficulty": 5},
+          {"id": 13, "event": 3, "team_h": 4, "team_a": 1, "team_h_difficulty": 4, "team_a_difficulty": 2},
+          {"id": 14, "event": 3, "team_h": 1, "team_a": 3, "team_h_difficulty": 2, "team_a_difficulty": 4},
+          {"id": 15, "event": 4, "team_h": 1, "team_a": 4, "team_h_difficulty": 3, "team_a_difficulty": 3}]
+    xgxa = pd.DataFrame({"fpl_id": [2, 3, 4, 5, 6, 7], "fpl_name": ["P2", "P3", "P4", "P5", "P6", "P7"],
+                         "xg_per90": [0.08, 0.45, 0.62, 0.2, 0.05, 0.33], "xa_per90": [0.12, 0.30, 0.10, 0.15, 0.21, 0.07]})
+    return {"teams": teams, "elements": elements, "events": events}, fx, xgxa
+
+# id, fixture, position, exp_minutes, xg90, xa90, att_mult, cs_prob -> appearance_pts, att_pts, cs_pts, ep (3 GWs from GW2)
+COMPONENTS = [
+    (1, 10, 'GK', 75.924, 0.0, 0.0, 1.42414037, 0.68756773, 2.0, 0.0, 2.75027092, 4.75027092),
+    (1, 13, 'GK', 75.924, 0.0, 0.0, 1.6005623, 0.69564153, 2.0, 0.0, 2.78256614, 4.78256614),
+    (1, 14, 'GK', 75.924, 0.0, 0.0, 1.65581918, 0.76090352, 2.0, 0.0, 3.04361407, 5.04361407),
+    (1, 15, 'GK', 75.924, 0.0, 0.0, 1.4005623, 0.66074777, 2.0, 0.0, 2.64299109, 4.64299109),
+    (2, 10, 'DEF', 63.00802083, 0.08, 0.12, 1.42414037, 0.68756773, 2.0, 0.83750115, 2.75027092, 5.58777207),
+    (2, 13, 'DEF', 63.00802083, 0.08, 0.12, 1.6005623, 0.69564153, 2.0, 0.94125045, 2.78256614, 5.72381659),
+    (2, 14, 'DEF', 63.00802083, 0.08, 0.12, 1.65581918, 0.76090352, 2.0, 0.97374563, 3.04361407, 6.01735971),
+    (2, 15, 'DEF', 63.00802083, 0.08, 0.12, 1.4005623, 0.66074777, 2.0, 0.82363548, 2.64299109, 5.46662658),
+    (3, 10, 'MID', 73.0236, 0.45, 0.3, 1.13568912, 0.43492731, 2.0, 2.90262377, 0.43492731, 5.33755108),
+    (3, 12, 'MID', 73.0236, 0.45, 0.3, 1.65581918, 0.65356475, 2.0, 4.23198571, 0.65356475, 6.88555046),
+    (4, 10, 'FWD', 35.79333333, 0.62, 0.1, 1.13568912, 0.43492731, 2.0, 1.25563639, 0.0, 3.25563639),
+    (4, 12, 'FWD', 35.79333333, 0.62, 0.1, 1.65581918, 0.65356475, 2.0, 1.83070067, 0.0, 3.83070067),
+    (5, 11, 'MID', 0.0, 0.2, 0.15, 1.6005623, 0.5391537, 2.0, 0.0, 0.5391537, 2.5391537),
+    (5, 12, 'MID', 0.0, 0.2, 0.15, 1.02414037, 0.4499384, 2.0, 0.0, 0.4499384, 2.4499384),
+    (5, 14, 'MID', 0.0, 0.2, 0.15, 1.13568912, 0.39925411, 2.0, 0.0, 0.39925411, 2.39925411),
+    (6, 11, 'DEF', 95.37, 0.05, 0.21, 1.45581918, 0.64475592, 2.0, 1.43469524, 2.57902368, 6.01371893),
+    (6, 13, 'DEF', 95.37, 0.05, 0.21, 1.13568912, 0.46494401, 2.0, 1.11921027, 1.85977602, 4.97898629),
+    (6, 15, 'DEF', 95.37, 0.05, 0.21, 1.33568912, 0.50488624, 2.0, 1.31630827, 2.01954495, 5.33585322),
+    (7, 11, 'FWD', 70.07715, 0.33, 0.07, 1.6005623, 0.5391537, 2.0, 1.90676836, 0.0, 3.90676836),
+    (7, 12, 'FWD', 70.07715, 0.33, 0.07, 1.02414037, 0.4499384, 2.0, 1.22007025, 0.0, 3.22007025),
+    (7, 14, 'FWD', 70.07715, 0.33, 0.07, 1.13568912, 0.39925411, 2.0, 1.35295956, 0.0, 3.35295956),
+    (8, 11, 'GK', 20.24, 0.0, 0.0, 1.45581918, 0.64475592, 2.0, 0.0, 2.57902368, 4.57902368),
+    (8, 13, 'GK', 20.24, 0.0, 0.0, 1.13568912, 0.46494401, 2.0, 0.0, 1.85977602, 3.85977602),
+    (8, 15, 'GK', 20.24, 0.0, 0.0, 1.33568912, 0.50488624, 2.0, 0.0, 2.01954495, 4.01954495),
+]
+EP_1 = [  # id, ep_total, exp_minutes
+    (1, 4.75, 75.924),
+    (2, 5.59, 63.00802083),
+    (3, 5.34, 73.0236),
+    (4, 3.26, 35.79333333),
+    (5, 2.54, 0.0),
+    (6, 6.01, 95.37),
+    (7, 3.91, 70.07715),
+    (8, 4.58, 20.24),
+]
+EP_3 = [  # id, ep_total, exp_minutes
+    (1, 19.22, 303.696),
+    (2, 22.8, 252.03208333),
+    (3, 12.22, 146.0472),
+    (4, 7.09, 71.58666667),
+    (5, 7.39, 0.0),
+    (6, 16.33, 286.11),
+    (7, 10.48, 210.23145),
+    (8, 12.46, 60.72),
+]
+APPEARANCE = [(1, 1.0), (30, 1.0), (59, 1.0), (60, 2.0), (90, 2.0)]  # minutes -> points
+# compute_fixture_ep (flat 4 per goal, CS for GK/DEF only) agrees with the tables for FWDs and
+# goalless GKs over 60 minutes; those rows are pinned: (id, fixture, ep)
+LEGACY_FIXTURE_EP = [(1, 10, 4.75027092), (1, 13, 4.78256614), (1, 14, 5.04361407), (1, 15, 4.64299109), (7, 11, 3.90676836), (7, 12, 3.22007025), (7, 14, 3.35295956)]
+
+COLS = ["appearance_pts", "att_pts", "cs_pts", "ep"]
+
+def test_expected_points_kernel_matches_baseline():
+    pos, mins, xg, xa, mult, cs = (np.array([row[k] for row in COMPONENTS]) for k in range(2, 8))
+    got = scoring.expected_points(scoring.pos_index(pos), mins.astype(float), xg.astype(float), xa.astype(float),
+                                  mult.astype(float), cs.astype(float))
+    for j, c in enumerate(COLS):
+        np.testing.assert_allclose(got[c], [row[8 + j] for row in COMPONENTS], atol=1e-6, err_msg=c)
+
+def test_engine_components_match_baseline():
+    bs, fx, xgxa = _inputs()
+    comp = cp.ep_components(cp.elements_df(bs), cp.build_fixture_rows(bs, fx, horizon=3), xgxa,
+                            cp.build_team_strengths(bs, None), params=cp.DEFAULT_PARAMS)
+    assert list(zip(comp["id"], comp["fixture"])) == [(row[0], row[1]) for row in COMPONENTS]
+    for j, c in enumerate(["exp_minutes", "xg_per90", "xa_per90", "att_mult", "cs_prob"] + COLS):
+        np.testing.assert_allclose(comp[c].to_numpy(float), [row[3 + j] for row in COMPONENTS], atol=1e-6, err_msg=c)
+
+@pytest.mark.parametrize("n, want", [(1, EP_1), (3, EP_3)])
+def test_engine_ep_total_matches_baseline(n, want):
+    bs, fx, xgxa = _inputs()
+    out = cp.ep_engine(cp.elements_df(bs), cp.build_fixture_rows(bs, fx, horizon=n), n, xgxa,
+                       cp.build_team_strengths(bs, None), params=cp.DEFAULT_PARAMS).sort_values("id")
+    assert out["id"].tolist() == [w[0] for w in want]
+    np.testing.assert_allclose(out["ep_total"].to_numpy(float), [w[1] for w in want], atol=1e-9)
+    np.testing.assert_allclose(out["exp_minutes"].to_numpy(float), [w[2] for w in want], atol=1e-6)
+
+def test_appearance_points_match_legacy_rule():
+    minutes, want = zip(*APPEARANCE)
+    np.testing.assert_array_equal(scoring.appearance_points(minutes), want)
+    assert scoring.appearance_points(0) == 0.0   # no minutes, no appearance (the old helper gave 1)
+
+def test_fixture_ep_matches_legacy_where_rules_agree():
+    rows = {(row[0], row[1]): row for row in COMPONENTS}
+    for pid, fixture, want in LEGACY_FIXTURE_EP:
+        row = rows[(pid, fixture)]
+        pos = scoring.pos_index([row[2]])
+        got = scoring.expected_points(pos, [row[3]], [row[4]], [row[5]], [row[6]], [row[7]])["ep"][0]
+        assert got == pytest.approx(want, abs=1e-6)
+
@@ -0,0 +1,59 @@
+import copy
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from snapshots import SnapshotStore, apply_patch, json_diff
+
+NOW = datetime(2025, 12, 1, tzinfo=timezone.utc)
+
+def _payload(i):
+    return {"events": [{"id": 1, "finished": i > 3}], "elements": [{"id": k, "now_cost": 50 + (k == i)} for k in range(30)]}
+
+def test_dedup_and_deltas(tmp_path):
+    s = SnapshotStore(str(tmp_path), codec="gzip")
+    a = s.put("bootstrap-static", _payload(0), NOW - timedelta(hours=2))
+    assert s.put("bootstrap-static", _payload(0), NOW - timedelta(hours=1)) == a   # unchanged: index line only
+    b = s.put("bootstrap-static", _payload(5), NOW)
+    assert len(s.objects) == 2 and len(s.list("bootstrap-static")) == 3
+    assert b["kind"] == "delta" and b["base"] == a["sha"]
+    assert len(os.listdir(tmp_path / "blobs" / a["blob"][:2])) >= 1
+    again = SnapshotStore(str(tmp_path), codec="gzip")   # reloaded from the jsonl files
+    assert again.at("bootstrap-static") == _payload(5)
+    assert again.at("bootstrap-static", NOW - timedelta(minutes=30)) == _payload(0)
+    assert again.at("bootstrap-static", NOW - timedelta(days=1)) is None
+
+def test_chain_cut(tmp_path):
+    s = SnapshotStore(str(tmp_path), codec="gzip", max_chain=3)
+    recs = [s.put("b", _payload(i), NOW + timedelta(hours=i)) for i in range(7)]
+    assert max(r["depth"] for r in recs) < 3 and sum(r["kind"] == "full" for r in recs) >= 3
+    assert all(s.at("b", NOW + timedelta(hours=i)) == _payload(i) for i in range(7))
+
+def test_patch_roundtrip():
+    a, b = {"x": [1, 2, 3], "y/z": {"k": 1}, "gone": 1}, {"x": [1, 5], "y/z": {"k": 2, "n": None}, "new": [1]}
+    assert apply_patch(copy.deepcopy(a), json_diff(a, b)) == b
+
+def _pruned(root, deltas):
+    s = SnapshotStore(str(root), codec="gzip", deltas=deltas)
+    stamps = [NOW - timedelta(days=d, hours=h) for d in (200, 199, 60, 1) for h in (6, 12)]   # two a day
+    for i, t in enumerate(sorted(stamps)):
+        s.put("b", {"v": i, "pad": "x" * 200}, t)
+    return s, s.prune(keep_all_days=14, keep_daily_days=120, now=NOW)
+
+def test_prune(tmp_path):
+    s, r = _pruned(tmp_path, deltas=False)
+    kept = [ts for ts, _ in s.list("b")]
+    # days 200 / 199 share an ISO week -> its last; day 60 -> that day's last; day 1 -> both
+    assert kept == ["2025-05-15T18-00-00Z", "2025-10-01T18-00-00Z", "2025-11-29T12-00-00Z", "2025-11-29T18-00-00Z"]
+    assert r["snapshots_dropped"] == 4 and r["objects_dropped"] == 4 and r["bytes_freed"] > 0
+    blobs = [f for _, _, fs in os.walk(tmp_path / "blobs") for f in fs]
+    assert len(blobs) == 4
+    again = SnapshotStore(str(tmp_path), codec="gzip")
+    assert [ts for ts, _ in again.list("b")] == kept and len(again.objects) == 4
+    assert again.at("b") == {"v": 7, "pad": "x" * 200}
+
+def test_prune_keeps_delta_bases(tmp_path):
+    s, r = _pruned(tmp_path, deltas=True)
+    assert r["snapshots_dropped"] == 4 and r["objects_dropped"] < 4   # dropped snapshots still carry later deltas
+    again = SnapshotStore(str(tmp_path), codec="gzip")
+    assert [json.loads(again.get_bytes(sha))["v"] for _, sha in again.list("b")] == [3, 5, 6, 7]
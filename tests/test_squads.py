@@ -0,0 +1,57 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import squads
+
+POOL = {"GK": range(1, 7), "DEF": range(7, 25), "MID": range(25, 43), "FWD": range(43, 55)}
+
+@pytest.fixture
+def matrix(tmp_path):
+    rng = np.random.default_rng(7)
+    rows = [(i, f"p{i}", pos) for pos, ids in POOL.items() for i in ids]
+    for h, f in squads.FILES.items():
+        df = pd.DataFrame(rows, columns=["id", "web_name", "position"])
+        df["ep_total"] = rng.integers(0, 200, len(df)) / 10 * h   # one decimal: exact in float32
+        df.to_csv(tmp_path / f, index=False)
+    return squads.Matrix(tmp_path)
+
+def _random_squads(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [[int(i) for pos, k in zip(POOL, squads.NEED) for i in rng.choice(list(POOL[pos]), k, replace=False)]
+            for _ in range(n)]
+
+def _brute(m, squad, j):
+    """Best XI + captain over every 11 of the 15 in a valid formation."""
+    best = -1.0
+    for xi in combinations(squad, 11):
+        c = np.bincount(m.pos[list(xi)], minlength=4)
+        if c[0] == 1 and 3 <= c[1] <= 5 and 2 <= c[2] <= 5 and 1 <= c[3] <= 3:
+            e = m.ep[list(xi), j].astype(float)
+            best = max(best, e.sum() + e.max())
+    return best
+
+def test_xi_matches_brute_force(matrix):
+    sq = _random_squads(25)
+    res = squads.evaluate(matrix, sq, pick=1)
+    assert res["valid"].all()
+    for j, h in enumerate(squads.HORIZONS):
+        want = [_brute(matrix, s, j) for s in sq]
+        assert res[f"ep_{h}"] == pytest.approx(want, abs=1e-3)
+    for k, s in enumerate(sq):
+        xi, bench = res["xi"][k], res["bench"][k]
+        assert sorted(np.r_[xi, bench]) == sorted(s)
+        e = matrix.ep[:, 0]
+        assert res["captain"][k] == xi[np.argmax(e[xi])] and res["vice"][k] != res["captain"][k]
+        assert e[xi].sum() + e[res["captain"][k]] == pytest.approx(res["ep_1"][k], abs=1e-3)
+        assert matrix.pos[bench[0]] == 0 and res["formation"][k].sum() == 10
+
+def test_invalid_squads(matrix):
+    good = _random_squads(1)[0]
+    three_gk = [1, 2] + good[2:12] + [43, 44, 3]     # three GKs, two forwards
+    bad = [good[:14], good[:14] + [good[0]], three_gk, good[:14] + [999], ["x"] * 15, good]
+    res = squads.evaluate(matrix, bad)
+    assert res["valid"].tolist() == [False] * 5 + [True]
+    assert np.isnan(res["ep_1"][:5]).all() and not np.isnan(res["ep_1"][5])
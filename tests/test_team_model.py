@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import compute_phase3 as cp3
+import team_model
+
+def _model(league):
+    bs = league["bs"]
+    return team_model.new_model(bs, cp3.build_team_strengths(bs), {"half_life_days": 180, "prior_precision": 1.0})
+
+def test_finished_results(league):
+    fx = league["fixtures"] + [{"id": 99, "event": 3, "team_h": 1, "team_a": 4, "finished": True,
+                                "team_h_score": 2, "team_a_score": 0, "kickoff_time": None}]
+    res = team_model.finished_results(fx)
+    assert sorted(res["id"]) == [10, 11, 20, 21, 30, 31, 99]   # only finished, scored fixtures
+    days = res.set_index("id")["day"]
+    assert days[10] == pytest.approx((pd.Timestamp("2025-08-09T14:00Z") - pd.Timestamp(0, tz="UTC")).days + 14 / 24)
+    assert days[99] == days.max() == days[31]                   # undated: as recent as the latest result
+    assert team_model.finished_results([]).empty
+
+def test_fit_on_tiny_league(league):
+    fx = [dict(f, team_h_score=3, team_a_score=0) if f["finished"] and f["team_h"] == 1 else
+          dict(f, team_h_score=0, team_a_score=3) if f["finished"] and f["team_a"] == 1 else f
+          for f in league["fixtures"]]                           # team 1 wins every game 3-0
+    m = _model(league).fit(fx)
+    r = m.ratings().set_index("team")
+    assert r["att_rating"].idxmax() == 1 and r["def_rating"].idxmax() == 1
+    assert np.log(r["att_rating"] / 3.0).mean() == pytest.approx(0.0, abs=1e-12) and len(m.seen) == 6   # centred
+    ft = cp3.build_fixture_rows(league["bs"], fx, horizon=2, start=4)
+    xg = m.fixture_xg(ft)
+    one = xg[xg["team"] == 1]
+    assert (one["xg_for"] > one["xg_against"]).all() and xg[["xg_for", "xg_against", "opp_factor"]].notna().all().all()
+
+def test_update_matches_new_results(league, tmp_path):
+    fx = league["fixtures"]
+    early = [f if f["event"] < 3 else dict(f, finished=False, team_h_score=None, team_a_score=None) for f in fx]
+    m = _model(league).fit(early)
+    assert m.update(early) == []
+    new = m.update(fx + [{"id": 98, "event": 3, "team_h": 2, "team_a": 3, "finished": True,
+                          "team_h_score": 1, "team_a_score": 1, "kickoff_time": None}])
+    assert new == [30, 31, 98] and m.update(fx) == []
+    full = _model(league).fit(fx)
+    assert np.abs(m.theta - full.theta).max() < 0.1   # one Newton step per result stays close to a refit
+    m.save(str(tmp_path / "tm.json"))
+    back = team_model.load(str(tmp_path / "tm.json"))
+    assert np.allclose(back.theta, m.theta) and back.seen == m.seen
+    assert team_model.load(str(tmp_path / "missing.json")) is None
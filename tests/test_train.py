@@ -0,0 +1,33 @@
+import pandas as pd
+
+import train
+
+def _build(league, tmp_path):
+    cfg = {"train": {"cache_dir": str(tmp_path / "train"), "min_prior_minutes": 90}}
+    return train.build(cfg, league["bs"], league["fixtures"], league["history"])
+
+def test_features_are_as_of(league, tmp_path):
+    pg, tf, new = _build(league, tmp_path)
+    assert new == [1, 2, 3] and set(tf["event"]) == {1, 2, 3}
+    h = league["history"]
+    gw3 = pg[pg["event"] == 3].set_index("element")
+    prior = h[h["round"] < 3].groupby("element")[["minutes", "expected_goals"]].sum().reindex(gw3.index, fill_value=0)
+    short = prior["minutes"] < 90
+    assert short.any() and (gw3.loc[short, "xg90"] == 0).all()
+    want = (prior["expected_goals"] / prior["minutes"] * 90)[~short]
+    pd.testing.assert_series_equal(gw3.loc[~short, "xg90"].astype(float), want, check_names=False, atol=1e-5)
+    assert (pg[pg["event"] == 1]["xg90"] == 0).all()
+
+def test_fit_reports_held_out_gws(league, tmp_path):
+    pg, tf, _ = _build(league, tmp_path)
+    params, report = train.fit(pg, tf, holdout_gws=1)
+    assert report["events"] == [1, 3] and report["holdout"] == [3, 3]
+    played = pg[pg["n_fix"] > 0]
+    early = train._fit_params(played[played["event"] < 3], tf[tf["event"] < 3], train.cp3.DEFAULT_PARAMS)
+    assert report["after"] == train.evaluate(played[played["event"] == 3], tf[tf["event"] == 3], early)
+    assert params == train._fit_params(played, tf, train.cp3.DEFAULT_PARAMS)
+
+def test_fit_without_enough_gws_is_in_sample(league, tmp_path):
+    pg, tf, _ = _build(league, tmp_path)
+    params, report = train.fit(pg, tf, holdout_gws=3)
+    assert report["holdout"] == [] and report["after"] == train.evaluate(pg[pg["n_fix"] > 0], tf, params)
@@ -0,0 +1,11 @@
+import pytest
+
+from utils import read_toml
+
+def test_read_toml(tmp_path):
+    p = tmp_path / "c.toml"
+    p.write_text('[live]\npoll_seconds = 5\n', encoding="utf-8")
+    assert read_toml(str(p)) == {"live": {"poll_seconds": 5}}
+    assert read_toml(str(tmp_path / "missing.toml"), {}) == {}
+    with pytest.raises(FileNotFoundError):
+        read_toml(str(tmp_path / "missing.toml"))